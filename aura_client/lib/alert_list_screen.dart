@@ -16,12 +16,31 @@ class _AlertListScreenState extends State<AlertListScreen> {
   List<Map<String, dynamic>> _alerts = [];
   bool _isLoading = true;
   StreamSubscription? _wsSub;
+  Timer? _pollTimer;
 
   @override
   void initState() {
     super.initState();
     _loadAlerts();
     _subscribeToStream();
+    // Cheap when nothing changed: the server answers 304
+    _pollTimer = Timer.periodic(const Duration(seconds: 15), (_) => _pollAlerts());
+  }
+
+  Future<void> _pollAlerts() async {
+    if (widget.api == null || _isLoading) return;
+    final changed = await widget.api!.fetchAlertChanges();
+    if (!mounted || changed.isEmpty) return;
+    setState(() {
+      for (final incident in changed) {
+        final index = _alerts.indexWhere((a) => a['id'] == incident['id']);
+        if (index >= 0) {
+          _alerts[index] = incident;
+        } else {
+          _alerts.insert(0, incident);
+        }
+      }
+    });
   }
 
   Future<void> _loadAlerts() async {
@@ -50,10 +69,13 @@ class _AlertListScreenState extends State<AlertListScreen> {
       final alertData = data['alert'] as Map<String, dynamic>?;
       
       if (alertData != null && (threatLevel == 'critical' || threatLevel == 'warning')) {
+        // Server alerts name their incident; polling refreshes that entry later
+        final incidentId = alertData['incident_id'];
+        if (incidentId != null && _alerts.any((a) => a['id'] == incidentId)) return;
         setState(() {
           // Add to beginning of the list
           _alerts.insert(0, {
-            'id': DateTime.now().millisecondsSinceEpoch,
+            'id': incidentId ?? DateTime.now().millisecondsSinceEpoch,
             'title': alertData['title'] ?? 'New Alert',
             'severity': threatLevel,
             'description': alertData['message'] ?? '',
@@ -67,6 +89,7 @@ class _AlertListScreenState extends State<AlertListScreen> {
 
   @override
   void dispose() {
+    _pollTimer?.cancel();
     _wsSub?.cancel();
     super.dispose();
   }
@@ -17,6 +17,14 @@ class ApiService {
   StreamController<Map<String, dynamic>>? _sensorStream;
   Timer? _reconnectTimer;
 
+  // ── Alert polling state ──
+  // ETags let the server answer unchanged polls with an empty 304.
+  String? _activeAlertsEtag;
+  List<Map<String, dynamic>> _activeAlerts = [];
+  String? _alertsEtag;
+  int? alertsVersion; // version of the last /alerts response, for since=
+  int? alertsNextCursor; // id to pass as cursor= for the next (older) page
+
   ApiService() {
     _loadSavedIp();
   }
@@ -55,27 +63,18 @@ class ApiService {
         (data) {
           try {
             final decoded = jsonDecode(data) as Map<String, dynamic>;
-            
-            final sensor = decoded['sensor'] as String? ?? '';
-            final val = decoded['value'] as num? ?? 0.0;
-            String threatLevel = decoded['threat_level'] as String? ?? '';
-            
-            // Reconcile logic with Web Dashboard
-            if (threatLevel.isEmpty || (threatLevel == 'safe' && sensor != 'camera')) {
-               threatLevel = _calculateThreatLevel(sensor, val.toDouble());
-               decoded['threat_level'] = threatLevel;
-            }
-            
-            if (decoded['alert'] == null && threatLevel != 'safe') {
-               decoded['alert'] = {
-                  'title': '${sensor.toUpperCase()} ALERT',
-                  'message': 'Sensor value $val exceeded threshold.',
-                  'severity': threatLevel,
-                  'sensor': sensor,
-               };
-            }
 
-            _sensorStream?.add(decoded);
+            // Control replies (subscription acks, errors) carry a 'type'
+            if (decoded['type'] != null) return;
+
+            // Batched ingest arrives as { sensor: 'batch', readings: [...] }
+            if (decoded['sensor'] == 'batch') {
+              for (final reading in (decoded['readings'] as List? ?? [])) {
+                _handleReading(reading as Map<String, dynamic>);
+              }
+              return;
+            }
+            _handleReading(decoded);
           } catch (e) {
             debugPrint('WS decode error: $e');
           }
@@ -98,6 +97,47 @@ class ApiService {
     }
   }
 
+  /// Ask the server to only push matching readings over the WebSocket.
+  /// Omitted filters match everything; call with no arguments to reset.
+  void subscribe({
+    List<String>? sensors,
+    List<String>? severities,
+    List<String>? nodes,
+    List<double>? bbox, // [minLat, minLng, maxLat, maxLng]
+  }) {
+    final filtered = sensors != null || severities != null || nodes != null || bbox != null;
+    _channel?.sink.add(jsonEncode({
+      'action': filtered ? 'subscribe' : 'unsubscribe',
+      if (sensors != null) 'sensors': sensors,
+      if (severities != null) 'severities': severities,
+      if (nodes != null) 'nodes': nodes,
+      if (bbox != null) 'bbox': bbox,
+    }));
+  }
+
+  void _handleReading(Map<String, dynamic> decoded) {
+    final sensor = decoded['sensor'] as String? ?? '';
+    final val = decoded['value'] as num? ?? 0.0;
+    String threatLevel = decoded['threat_level'] as String? ?? '';
+
+    // Reconcile logic with Web Dashboard
+    if (threatLevel.isEmpty || (threatLevel == 'safe' && sensor != 'camera')) {
+       threatLevel = _calculateThreatLevel(sensor, val.toDouble());
+       decoded['threat_level'] = threatLevel;
+    }
+
+    if (decoded['alert'] == null && threatLevel != 'safe') {
+       decoded['alert'] = {
+          'title': '${sensor.toUpperCase()} ALERT',
+          'message': 'Sensor value $val exceeded threshold.',
+          'severity': threatLevel,
+          'sensor': sensor,
+       };
+    }
+
+    _sensorStream?.add(decoded);
+  }
+
   /// Disconnect WebSocket securely (for changing IP)
   void _closeWebSocket() {
     _reconnectTimer?.cancel();
@@ -127,13 +167,20 @@ class ApiService {
     return [];
   }
 
-  /// Fetch active alerts from the backend
+  /// Fetch active alerts (open incidents) from the backend.
+  /// Repeated calls send If-None-Match and reuse the cached list on 304.
   Future<List<Map<String, dynamic>>> fetchAlerts() async {
     try {
-      final response = await http.get(Uri.parse('$_baseUrl/alerts/active'));
+      final response = await http.get(
+        Uri.parse('$_baseUrl/alerts/active'),
+        headers: {if (_activeAlertsEtag != null) 'If-None-Match': _activeAlertsEtag!},
+      );
+      if (response.statusCode == 304) return _activeAlerts;
       if (response.statusCode == 200) {
         final list = jsonDecode(response.body) as List;
-        return list.cast<Map<String, dynamic>>();
+        _activeAlerts = list.cast<Map<String, dynamic>>();
+        _activeAlertsEtag = response.headers['etag'];
+        return _activeAlerts;
       }
     } catch (e) {
       debugPrint('Fetch alerts error: $e');
@@ -155,14 +202,20 @@ class ApiService {
     return [];
   }
 
-  /// Fetch all alerts (including historical safe ones)
-  Future<List<Map<String, dynamic>>> fetchAllAlerts({int limit = 20}) async {
+  /// Fetch a page of alerts (incidents, open and resolved), newest first.
+  /// Pass [cursor] = [alertsNextCursor] to load the next, older page.
+  Future<List<Map<String, dynamic>>> fetchAllAlerts({int limit = 20, int? cursor}) async {
     try {
-      final response =
-          await http.get(Uri.parse('$_baseUrl/alerts?limit=$limit'));
+      final response = await http.get(Uri.parse(
+          '$_baseUrl/alerts?limit=$limit${cursor != null ? '&cursor=$cursor' : ''}'));
       if (response.statusCode == 200) {
-        final list = jsonDecode(response.body) as List;
-        return list.cast<Map<String, dynamic>>();
+        final page = jsonDecode(response.body) as Map<String, dynamic>;
+        alertsNextCursor = page['next_cursor'] as int?;
+        if (cursor == null) {
+          alertsVersion = page['version'] as int?;
+          _alertsEtag = response.headers['etag'];
+        }
+        return (page['items'] as List).cast<Map<String, dynamic>>();
       }
     } catch (e) {
       debugPrint('Fetch all alerts error: $e');
@@ -170,6 +223,31 @@ class ApiService {
     return [];
   }
 
+  /// Poll for alerts created or changed since the last fetch.
+  /// Returns only the changed incidents; an unchanged server answers 304.
+  Future<List<Map<String, dynamic>>> fetchAlertChanges() async {
+    if (alertsVersion == null) return fetchAllAlerts();
+    final changed = <Map<String, dynamic>>[];
+    try {
+      while (true) {
+        final response = await http.get(
+          Uri.parse('$_baseUrl/alerts?since=$alertsVersion&limit=100'),
+          headers: {if (_alertsEtag != null) 'If-None-Match': _alertsEtag!},
+        );
+        if (response.statusCode != 200) break; // 304: nothing new
+        final page = jsonDecode(response.body) as Map<String, dynamic>;
+        final items = (page['items'] as List).cast<Map<String, dynamic>>();
+        changed.addAll(items);
+        alertsVersion = page['version'] as int?;
+        _alertsEtag = response.headers['etag'];
+        if (items.length < 100) break;
+      }
+    } catch (e) {
+      debugPrint('Poll alerts error: $e');
+    }
+    return changed;
+  }
+
   /// Fetch evacuation route from danger zone
   Future<Map<String, dynamic>?> fetchEvacuationRoute(
       double dangerLat, double dangerLng) async {
@@ -0,0 +1,129 @@
+"""
+Alerts API Benchmark
+Fills a scratch SQLite database with a million incidents through the incident
+log's write path, then times the /alerts queries against it:
+  - first page, the middle page by keyset cursor and the same page by OFFSET
+  - filtered listings (severity, status, sensor, node, combined)
+  - since=<version> deltas of a poller
+  - full HTTP round trips through the router: 200 versus a 304 on a matching ETag
+
+Usage: python -m benchmarks.alerts_benchmark [incidents]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from config.db import Base, enable_sqlite_wal
+from models.incident import IncidentRecord, IncidentStream
+from routes.alerts import router
+from routes.sensor_positions import get_db
+from services.incident_log import IncidentLog, incident_log, incidents_table
+from services.incidents import IncidentEngine
+
+SENSORS = ["temperature", "humidity", "gas-leakage", "ultrasonic", "seismic"]
+SENSOR_WEIGHTS = [0.35, 0.3, 0.2, 0.14, 0.01]
+NODES = 5000
+BATCH = 50000
+
+
+def _rows(start, count, rng):
+    ids = np.arange(start, start + count)
+    sensors = rng.choice(len(SENSORS), count, p=SENSOR_WEIGHTS)
+    nodes = rng.integers(0, NODES, count)
+    critical = rng.random(count) < 0.2
+    rows, streams = [], []
+    for incident_id, sensor, node, is_critical in zip(ids.tolist(), sensors.tolist(), nodes.tolist(), critical.tolist()):
+        severity = "critical" if is_critical else "warning"
+        ts = 1.7e9 + incident_id * 30.0
+        alert = {"id": incident_id, "sensor": SENSORS[sensor], "node_id": str(node), "severity": severity}
+        rows.append({
+            "id": incident_id, "version": incident_id, "status": "resolved", "severity": severity,
+            "title": f"{SENSORS[sensor]} {severity}", "message": "value out of range",
+            "lat": 11.6, "lng": 76.1, "created_at": ts, "updated_at": ts + 60, "resolved_at": ts + 60,
+            "alert_count": 1, "suppressed": 0, "active_streams": 0,
+            "sensors": [SENSORS[sensor]], "node_ids": [str(node)], "alerts": [alert],
+        })
+        streams.append({"sensor": SENSORS[sensor], "incident_id": incident_id, "node_id": str(node)})
+    return rows, streams
+
+
+def _fill(log, count):
+    rng = np.random.default_rng(5)
+    started = time.perf_counter()
+    for start in range(1, count + 1, BATCH):
+        rows, streams = _rows(start, min(BATCH, count + 1 - start), rng)
+        if start + BATCH > count:  # the newest few stay open
+            for row in rows[-50:]:
+                row.update(status="open", resolved_at=None, active_streams=1)
+        log.write_batch(rows, streams)
+    elapsed = time.perf_counter() - started
+    print(f"wrote {count} incidents in {elapsed:.1f}s ({count / elapsed:.0f}/s through write_batch)")
+
+
+def _time(label, fn, repeat=200):
+    fn()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    elapsed = (time.perf_counter() - started) / repeat
+    print(f"  {label:<34} {elapsed * 1000:>8.3f} ms")
+    return result
+
+
+def run(count=1000000):
+    with tempfile.TemporaryDirectory() as scratch:
+        engine = enable_sqlite_wal(create_engine(f"sqlite:///{os.path.join(scratch, 'alerts.db')}"))
+        Base.metadata.create_all(bind=engine, tables=[IncidentRecord.__table__, IncidentStream.__table__])
+        log = IncidentLog(engine, IncidentEngine())
+        _fill(log, count)
+        print(f"database size {os.path.getsize(os.path.join(scratch, 'alerts.db')) / 1e6:.0f} MB")
+
+        with engine.connect() as conn:
+            print("queries (20 rows unless noted):")
+            _time("first page", lambda: log.page(conn, 20))
+            middle = count // 2
+            _time("middle page, cursor", lambda: log.page(conn, 20, cursor=middle))
+            offset = (select(incidents_table).order_by(incidents_table.c.id.desc()).offset(count - middle).limit(20))
+            _time("middle page, OFFSET", lambda: conn.execute(offset).all(), repeat=10)
+            _time("severity=critical", lambda: log.page(conn, 20, severity="critical"))
+            _time("status=open", lambda: log.page(conn, 20, status="open"))
+            _time("sensor=gas-leakage", lambda: log.page(conn, 20, sensor="gas-leakage"))
+            _time("sensor=seismic (1%)", lambda: log.page(conn, 20, sensor="seismic"))
+            _time("node_id=42", lambda: log.page(conn, 20, node_id="42"))
+            _time("sensor+severity, cursor", lambda: log.page(conn, 20, middle, severity="critical", sensor="humidity"))
+            _time("since=latest-50 (50 rows)", lambda: log.changes(conn, count - 50, 100))
+            _time("since=latest (0 rows)", lambda: log.changes(conn, count, 100))
+            _time("page of 500", lambda: log.page(conn, 500), repeat=20)
+
+        Session = sessionmaker(bind=engine)
+
+        def _db():
+            db = Session()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        app = FastAPI()
+        app.include_router(router)
+        app.dependency_overrides[get_db] = _db
+        incident_log.version = count
+        client = TestClient(app)
+        etag = client.get("/alerts").headers["etag"]
+        print("HTTP round trips:")
+        _time("GET /alerts -> 200", lambda: client.get("/alerts"))
+        _time("GET /alerts If-None-Match -> 304", lambda: client.get("/alerts", headers={"If-None-Match": etag}))
+        _time("GET /alerts?since=latest -> 200", lambda: client.get(f"/alerts?since={count}"))
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:2]]
+    run(*args)
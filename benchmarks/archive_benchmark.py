@@ -0,0 +1,89 @@
+"""
+Archive Benchmark
+Builds a year of archived readings for many nodes in a throwaway directory,
+then times year-long history queries against it, plus one compaction run
+over readings written through the reading writer.
+
+Usage: python -m benchmarks.archive_benchmark [nodes] [readings_per_node_per_hour]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+from sqlalchemy import create_engine
+
+import services.history as history
+from config.db import enable_sqlite_wal
+from services.archive import DAY, ArchiveStore
+from services.reading_writer import ReadingWriter, ensure_readings_schema
+
+YEAR_DAYS = 365
+
+
+def _fill_archive(store, engine, nodes, per_hour, first_day):
+    per_day = per_hour * 24
+    names = [str(node) for node in range(nodes)]
+    for day in range(first_day, first_day + YEAR_DAYS * DAY, DAY):
+        ts = day + np.sort(np.random.uniform(0, DAY, (nodes, per_day)), axis=1).ravel()
+        partition = store.write_partition(
+            "temperature", day, np.repeat(names, per_day), ts,
+            25 + np.random.uniform(-5, 5, nodes * per_day), ["safe"] * (nodes * per_day))
+        store._replace_daily_rollup(engine, "temperature", partition)
+    return nodes * per_day * YEAR_DAYS
+
+
+def _time(label, engine, repeat=5, **kwargs):
+    with engine.connect() as conn:
+        samples = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            result = history.query_history(conn, "temperature", **kwargs)
+            samples.append(time.perf_counter() - t0)
+    points = sum(len(series["t"]) for series in result["series"].values())
+    print(f"{label:<30} {result['source']:<18} {points:>7} points  "
+          f"median {sorted(samples)[len(samples) // 2] * 1000:>8.2f} ms")
+
+
+def run(nodes=200, per_hour=12):
+    directory = tempfile.mkdtemp()
+    engine = enable_sqlite_wal(create_engine(f"sqlite:///{directory}/bench.db",
+                                             connect_args={"check_same_thread": False}))
+    ensure_readings_schema(engine)
+    store = history.archive = ArchiveStore(os.path.join(directory, "archive"))
+
+    today = int(time.time() // DAY * DAY)
+    first_day = today - (YEAR_DAYS + 2) * DAY
+    t0 = time.perf_counter()
+    rows = _fill_archive(store, engine, nodes, per_hour, first_day)
+    store._set_archived_until(first_day + YEAR_DAYS * DAY)
+    size = sum(os.path.getsize(os.path.join(root, name))
+               for root, _, files in os.walk(store.root) for name in files)
+    print(f"archived {rows} readings ({nodes} nodes, {YEAR_DAYS} days) in {time.perf_counter() - t0:.1f}s, "
+          f"{size / rows:.1f} bytes/reading")
+
+    start, end = first_day, first_day + YEAR_DAYS * DAY
+    _time("1 node, 1 year, 1d", engine, start=start, end=end, step=DAY, node_ids=["7"])
+    _time("1 node, 1 year, 1h", engine, start=start, end=end, step=3600, node_ids=["7"])
+    _time("1 node, 1 day, 1m", engine, start=start, end=start + DAY, step=60, node_ids=["7"])
+    _time(f"{nodes} nodes, 1 year, 1d", engine, start=start, end=end, step=DAY)
+    _time(f"{nodes} nodes, 1 month, 1h", engine, start=start, end=start + 30 * DAY, step=3600)
+
+    # compaction: two days of hot readings past the horizon
+    writer = ReadingWriter(engine=engine, max_queue=10 ** 7)
+    for ts in np.arange(end, end + 2 * DAY, 3600 / per_hour):
+        for node in range(nodes):
+            writer.submit({"sensor": "temperature", "node_id": str(node),
+                           "value": random.uniform(20, 30), "threat_level": "safe"}, float(ts))
+    writer.flush()
+    t0 = time.perf_counter()
+    moved = store.compact(engine, older_than_days=0)
+    elapsed = time.perf_counter() - t0
+    print(f"compacted {moved} readings in {elapsed:.2f}s ({moved / elapsed:.0f} readings/s)")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    run(*args)
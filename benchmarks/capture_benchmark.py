@@ -0,0 +1,129 @@
+"""
+Capture Benchmark
+Runs N concurrent capture streams through CaptureSupervisor and the vision
+dispatcher on stand-in sources, and reports sampled frames, frame age and
+CPU use. Sources are synthetic frame generators paced at a live frame rate,
+or a local video file looped at its native rate. Every 8th synthetic stream
+fails now and then to exercise reconnect backoff.
+
+Usage: python -m benchmarks.capture_benchmark [streams] [seconds] [video_file]
+"""
+import asyncio
+import resource
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from services import capture
+from services.capture import CaptureSupervisor
+from services.vision import VisionPool
+
+
+class SyntheticSource:
+    """cv2.VideoCapture stand-in producing moving-gradient frames at a fixed rate."""
+
+    def __init__(self, url, width=640, height=480, fps=15.0, fail_every=0):
+        self.interval = 1.0 / fps
+        self.fail_every = fail_every
+        self.count = 0
+        self.next_at = time.time()
+        self.base = np.tile(np.arange(width, dtype=np.uint8), (height, 1))
+        self.frame = None
+
+    def isOpened(self):
+        return True
+
+    def grab(self):
+        delay = self.next_at - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        self.next_at += self.interval
+        self.count += 1
+        if self.fail_every and self.count % self.fail_every == 0:
+            return False
+        self.frame = np.roll(self.base, self.count, axis=1)
+        return True
+
+    def retrieve(self):
+        return True, cv2.cvtColor(self.frame, cv2.COLOR_GRAY2BGR)
+
+    def release(self):
+        pass
+
+
+class PacedFile:
+    """Loops a local video file at its native frame rate, like a live stream."""
+
+    def __init__(self, path):
+        self.cap = cv2.VideoCapture(path)
+        self.interval = 1.0 / (self.cap.get(cv2.CAP_PROP_FPS) or 25.0)
+        self.next_at = time.time()
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def grab(self):
+        delay = self.next_at - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        self.next_at += self.interval
+        if not self.cap.grab():
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            return self.cap.grab()
+        return True
+
+    def retrieve(self):
+        return self.cap.retrieve()
+
+    def release(self):
+        self.cap.release()
+
+
+def _factory(video_file):
+    def open_source(url):
+        if video_file:
+            return PacedFile(video_file)
+        index = int(url.rsplit("/", 1)[-1])
+        return SyntheticSource(url, fail_every=100 if index % 8 == 0 else 0)
+    return open_source
+
+
+async def run(streams=32, seconds=20, video_file=None):
+    capture.CAPTURE_BACKOFF_MIN = 0.5
+    supervisor = CaptureSupervisor(source_factory=_factory(video_file))
+    pool = VisionPool(workers=1, cameras=supervisor)
+    pool.start(asyncio.get_running_loop())
+    for i in range(streams):
+        supervisor.add(f"cam-{i}", f"synthetic://{i}", sampling_fps=2.0)
+
+    cpu_start = resource.getrusage(resource.RUSAGE_SELF)
+    wall_start = time.time()
+    results = 0
+    while time.time() - wall_start < seconds:
+        try:
+            await asyncio.wait_for(pool.results.get(), 0.5)
+            results += 1
+        except asyncio.TimeoutError:
+            pass
+    wall = time.time() - wall_start
+    cpu_end = resource.getrusage(resource.RUSAGE_SELF)
+    cpu = (cpu_end.ru_utime - cpu_start.ru_utime) + (cpu_end.ru_stime - cpu_start.ru_stime)
+
+    report = pool.report()
+    pool.stop()
+    connected = sum(1 for h in report.values() if h["frames_sampled"] > 0)
+    reconnects = sum(h["reconnects"] for h in report.values())
+    ages = sorted(h["frame_age_ms"] for h in report.values() if h["frame_age_ms"] is not None)
+    print(f"{connected}/{streams} streams delivering frames, {reconnects} reconnects")
+    print(f"{results} frames inferred in {wall:.1f}s ({results / wall:.1f}/s)")
+    if ages:
+        print(f"frame age p50 {ages[len(ages) // 2]:.1f} ms  max {ages[-1]:.1f} ms")
+    print(f"API process CPU {cpu / wall * 100:.0f}% of one core (workers excluded)")
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 20
+    asyncio.run(run(count, duration, sys.argv[3] if len(sys.argv) > 3 else None))
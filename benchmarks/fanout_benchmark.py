@@ -0,0 +1,93 @@
+"""
+Fan-out Benchmark
+Simulates thousands of WebSocket clients (1% of them stalled) and measures how
+long the ingest path spends in manager.broadcast, with the old sequential
+send loop as the baseline.
+
+Usage: python -m benchmarks.fanout_benchmark [clients] [messages]
+"""
+import asyncio
+import random
+import sys
+import time
+
+from services.connection_manager import ConnectionManager
+
+
+class FakeSocket:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.sent = 0
+
+    async def accept(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def send_text(self, text):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.sent += 1
+
+    async def send_json(self, message):
+        await self.send_text(message)
+
+
+def _sockets(count, slow_ratio=0.01):
+    return [FakeSocket(0.5 if random.random() < slow_ratio else 0.0) for _ in range(count)]
+
+
+def _message(i):
+    return {"sensor": "temperature", "node_id": str(i % 50), "value": 20 + i % 10,
+            "timestamp": "2026-01-01T00:00:00Z", "threat_level": "safe"}
+
+
+def _stats(samples):
+    ordered = sorted(samples)
+    p50 = ordered[len(ordered) // 2] * 1000
+    p99 = ordered[int(len(ordered) * 0.99)] * 1000
+    return f"p50 {p50:8.3f} ms  p99 {p99:8.3f} ms"
+
+
+async def _sequential(sockets, messages):
+    samples = []
+    for i in range(messages):
+        t0 = time.perf_counter()
+        for ws in sockets:
+            await ws.send_json(_message(i))
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+
+async def _fanout(sockets, messages):
+    manager = ConnectionManager(max_queue=64)
+    for ws in sockets:
+        await manager.connect(ws)
+    samples = []
+    for i in range(messages):
+        t0 = time.perf_counter()
+        await manager.broadcast(_message(i))
+        samples.append(time.perf_counter() - t0)
+        await asyncio.sleep(0.005)  # sensor inter-arrival gap, lets writers drain
+    depth = max(manager.queue_depths())
+    tasks = [client.task for client in manager.clients.values()]
+    for ws in list(manager.clients):
+        manager.disconnect(ws)
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return samples, depth
+
+
+async def run(clients=5000, messages=100):
+    for count in (100, 1000, clients):
+        sockets = _sockets(count)
+        samples, depth = await _fanout(sockets, messages)
+        print(f"fan-out     {count:>5} clients  {_stats(samples)}  max queue {depth}")
+    sockets = _sockets(min(clients, 200))
+    samples = await _sequential(sockets, 5)
+    print(f"sequential  {len(sockets):>5} clients  {_stats(samples)}")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    asyncio.run(run(*args))
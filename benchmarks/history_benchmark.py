@@ -0,0 +1,73 @@
+"""
+History Benchmark
+Fills a throwaway SQLite file with a week of readings for many nodes through
+the reading writer (so rollups are maintained exactly as in production), then
+times chart-style history queries.
+
+Usage: python -m benchmarks.history_benchmark [nodes] [readings_per_node_per_hour]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+
+from config.db import enable_sqlite_wal
+from services.history import query_history
+from services.reading_writer import ReadingWriter, ensure_readings_schema
+
+WEEK = 7 * 86400
+
+
+def _fill(writer, nodes, per_hour, end):
+    start = end - WEEK
+    interval = 3600 / per_hour
+    rows = 0
+    ts = start
+    while ts < end:
+        for node in range(nodes):
+            writer.submit({"sensor": "temperature", "node_id": str(node),
+                           "value": 25 + random.uniform(-5, 5), "threat_level": "safe"},
+                          ts + random.uniform(0, interval))
+            rows += 1
+        writer.flush()
+        ts += interval
+    return rows
+
+
+def _time(label, engine, repeat=20, **kwargs):
+    with engine.connect() as conn:
+        samples = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            result = query_history(conn, "temperature", **kwargs)
+            samples.append(time.perf_counter() - t0)
+    points = sum(len(series["t"]) for series in result["series"].values())
+    print(f"{label:<28} {result['source']:<18} {points:>7} points  "
+          f"median {sorted(samples)[len(samples) // 2] * 1000:>8.2f} ms")
+
+
+def run(nodes=1000, per_hour=12):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = enable_sqlite_wal(create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False}))
+    ensure_readings_schema(engine)
+    writer = ReadingWriter(engine=engine, max_queue=10 ** 7)
+
+    end = time.time()
+    t0 = time.perf_counter()
+    rows = _fill(writer, nodes, per_hour, end)
+    elapsed = time.perf_counter() - t0
+    print(f"wrote {rows} readings ({nodes} nodes, 1 week) in {elapsed:.1f}s ({rows / elapsed:.0f} rows/s)")
+
+    _time("1 node, 6 hours", engine, start=end - 6 * 3600, end=end, node_ids=["7"])
+    _time("1 node, 1 week", engine, start=end - WEEK, end=end, node_ids=["7"])
+    _time("10 nodes, 1 week", engine, start=end - WEEK, end=end, node_ids=[str(n) for n in range(10)])
+    _time(f"{nodes} nodes, 1 week, 1h", engine, repeat=3, start=end - WEEK, end=end, step=3600)
+    _time(f"{nodes} nodes, 1 week, 1d", engine, start=end - WEEK, end=end, step=86400)
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    run(*args)
@@ -0,0 +1,139 @@
+"""
+Position Import Benchmark
+Provisions N positions (about 1% of them invalid) into a throwaway WAL-mode
+SQLite file and reports rows/s for:
+  - the per-row API, POST /positions once per position (the previous way to
+    provision a deployment): a sample of rows, extrapolated to N
+  - services/position_import.py from a JSON lines file and from a CSV file,
+    parse + validate + batched insert + chain entries, then the one seal
+  - the same through POST /positions/import with the body streamed
+Every run ends with an integrity audit of the whole table.
+
+Usage: python -m benchmarks.import_benchmark [rows] [batch_size]
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from functools import partial
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+import routes.sensor_positions as positions_routes
+from config.db import enable_sqlite_wal
+from services.integrity import PositionChain, batches_table, chain_table, positions_table
+from services.outbox import outbox_table
+from services.position_import import IMPORT_BATCH_SIZE, PositionImport, import_lines
+from services.position_snapshot import PositionSnapshot
+
+SENSORS = ["temperature", "humidity", "gas-leakage", "ultra-sonic", "earthquake"]
+PER_ROW_SAMPLE = 500
+
+
+def _rows(count, rng):
+    rows = []
+    for i in range(count):
+        row = {"name": f"site-{i}", "lat": round(6.9 + rng.uniform(-0.1, 0.1), 6),
+               "lng": round(79.86 + rng.uniform(-0.1, 0.1), 6), "sensor_type": rng.choice(SENSORS)}
+        if rng.random() < 0.01:
+            row[rng.choice(["lat", "name"])] = rng.choice(["", "n/a", 1000])
+        rows.append(row)
+    return rows
+
+
+def _fresh(directory, name):
+    engine = enable_sqlite_wal(create_engine(f"sqlite:///{os.path.join(directory, name)}.db",
+                                             connect_args={"check_same_thread": False}))
+    for table in (positions_table, chain_table, batches_table, outbox_table):
+        table.create(bind=engine)
+    return engine
+
+
+def _report(label, job, engine, chain, elapsed):
+    with engine.connect() as conn:
+        stored = conn.execute(select(func.count()).select_from(positions_table)).scalar()
+    audit = chain.audit(workers=1)
+    print(f"  {label:<28} {elapsed:7.2f} s   {job['valid'] / elapsed:9.0f} rows/s   imported {job['imported']}, "
+          f"rejected {job['rejected']}, {stored} stored, audit ok={audit['ok']}")
+
+
+def run(count=100000, batch_size=IMPORT_BATCH_SIZE):
+    directory = tempfile.mkdtemp()
+    rows = _rows(count, random.Random(11))
+    jsonl = os.path.join(directory, "positions.jsonl")
+    with open(jsonl, "w") as f:
+        f.writelines(json.dumps(row) + "\n" for row in rows)
+    csv_path = os.path.join(directory, "positions.csv")
+    with open(csv_path, "w") as f:
+        f.write("name,lat,lng,sensor_type\n")
+        f.writelines(f"{row['name']},{row['lat']},{row['lng']},{row['sensor_type']}\n" for row in rows)
+    print(f"{count} rows, batches of {batch_size}")
+
+    engine = _fresh(directory, "per_row")
+    chain, snapshot = PositionChain(engine=engine), PositionSnapshot(engine=engine)
+    Sessions = sessionmaker(bind=engine)
+
+    def get_db():
+        db = Sessions()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    positions_routes.position_snapshot = snapshot
+    app = FastAPI()
+    app.include_router(positions_routes.router)
+    app.dependency_overrides[positions_routes.get_db] = get_db
+    client = TestClient(app)
+    sample = [row for row in rows[:PER_ROW_SAMPLE * 2] if "n/a" not in str(row.values())][:PER_ROW_SAMPLE]
+    started = time.perf_counter()
+    for row in sample:
+        client.post("/positions", json=row)
+    per_row = (time.perf_counter() - started) / len(sample)
+    print(f"  POST /positions per row      {per_row * count:7.1f} s   {1 / per_row:9.0f} rows/s   "
+          f"(extrapolated from {len(sample)})")
+
+    for fmt, path in (("jsonl", jsonl), ("csv", csv_path)):
+        engine = _fresh(directory, fmt)
+        chain, snapshot = PositionChain(engine=engine), PositionSnapshot(engine=engine)
+        snapshot.load()
+        job = PositionImport(fmt, engine=engine, batch_size=batch_size, chain=chain, snapshot=snapshot)
+        started = time.perf_counter()
+        with open(path, newline="") as f:
+            import_lines(job, f)
+        written = time.perf_counter() - started
+        job.sync()
+        elapsed = time.perf_counter() - started
+        _report(f"import {fmt} (file)", job.report(), engine, chain, elapsed)
+        print(f"    of which parse + insert {written:.2f} s, seal + snapshot {elapsed - written:.2f} s "
+              f"({chain.batches} root, snapshot {snapshot.stats()['positions']} positions)")
+
+    engine = _fresh(directory, "http")
+    chain, snapshot = PositionChain(engine=engine), PositionSnapshot(engine=engine)
+    snapshot.load()
+    positions_routes.position_snapshot = snapshot
+    positions_routes.PositionImport = partial(PositionImport, engine=engine, batch_size=batch_size, chain=chain,
+                                              snapshot=snapshot)
+
+    def body():
+        with open(jsonl, "rb") as f:
+            while True:
+                chunk = f.read(64 * 1024)
+                if not chunk:
+                    return
+                yield chunk
+
+    started = time.perf_counter()
+    report = client.post("/positions/import", content=body()).json()
+    elapsed = time.perf_counter() - started
+    _report("POST /positions/import", report, engine, chain, elapsed)
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    run(*args)
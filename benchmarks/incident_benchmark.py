@@ -0,0 +1,134 @@
+"""
+Incident Benchmark
+Alert volume: noisy sensors hovering around their thresholds at a number of
+sites (several nodes each, ~100 m apart; sites ~1 km apart) at one reading
+every 2 s. Counts what clients would hear about at each stage:
+  - per-reading alerts (every reading above a threshold, the original behaviour)
+  - level transitions without hysteresis
+  - level transitions with the hysteresis bands of config/thresholds.json
+  - notifications after incident grouping and cooldown, and incidents opened
+Query latency: /alerts-style queries against a full store of retained incidents.
+
+Usage: python -m benchmarks.incident_benchmark [sites] [minutes]
+"""
+import sys
+import time
+
+import numpy as np
+
+from services.incidents import IncidentEngine, INCIDENT_RETENTION, OPEN
+from services.threat_detector import ThreatDetector, Rule, load_rules, SAFE
+
+INTERVAL = 2.0
+NODES_PER_SITE = 4
+HOVER = {  # sensor: (level hovered around, noise std) -- the critical threshold, a bad case
+    "temperature": (45.0, 0.6),
+    "humidity": (85.0, 1.2),
+    "gas-leakage": (1200.0, 30.0),
+}
+
+
+def _streams(sites):
+    rng = np.random.default_rng(7)
+    streams = []
+    for site in range(sites):
+        lat, lng = 11.6 + 0.01 * (site // 20), 76.1 + 0.01 * (site % 20)
+        for n in range(NODES_PER_SITE):
+            node_id = f"site{site}-node{n}"
+            position = (lat + rng.uniform(-0.001, 0.001), lng + rng.uniform(-0.001, 0.001))
+            for sensor in HOVER:
+                streams.append((node_id, sensor, position))
+    return streams
+
+
+def _trace(streams, steps):
+    """Slow random walk around the hovered level plus reading noise, shape (steps, streams)."""
+    rng = np.random.default_rng(11)
+    level = np.array([HOVER[sensor][0] for _, sensor, _ in streams])
+    noise = np.array([HOVER[sensor][1] for _, sensor, _ in streams])
+    drift = np.cumsum(rng.normal(0, 0.05, (steps, len(streams))), axis=0) * noise
+    return level + drift + rng.normal(0, 1, (steps, len(streams))) * noise
+
+
+def _replay(detector, streams, values, engine=None):
+    readings = [(sensor, 0.0, node_id) for node_id, sensor, _ in streams]
+    above = transitions = notified = 0
+    for step, row in enumerate(values.tolist()):
+        ts = step * INTERVAL
+        batch = [(sensor, value, node_id) for (sensor, _, node_id), value in zip(readings, row)]
+        for (node_id, sensor, (lat, lng)), (level, alert) in zip(streams, detector.analyze_batch(batch)):
+            above += level != SAFE
+            if alert is None:
+                continue
+            transitions += alert["severity"] != SAFE
+            if engine is not None:
+                _, notify = engine.ingest(alert, lat, lng, ts)
+                notified += notify
+    return above, transitions, notified
+
+
+def _query_latency(count=INCIDENT_RETENTION, repeat=2000):
+    rng = np.random.default_rng(3)
+    engine = IncidentEngine(retention=count)
+    sensors = list(HOVER)
+    for i in range(count):
+        node_id = f"node{rng.integers(0, 500)}"
+        alert = {"node_id": node_id, "sensor": sensors[i % len(sensors)],
+                 "severity": "critical" if i % 4 == 0 else "warning", "title": "t", "message": "m"}
+        # spread out in time and space so every alert opens its own incident
+        engine.ingest(alert, 11.0 + i * 0.01, 76.0, ts=i * engine.window * 2)
+        if i % 3:
+            engine.ingest(dict(alert, severity=SAFE), ts=i * engine.window * 2 + 1)
+    now = count * engine.window * 2
+    queries = {
+        "latest 20": {},
+        "open": {"status": OPEN},
+        "critical": {"severity": "critical"},
+        "sensor": {"sensor": "gas-leakage"},
+        "node": {"node_id": "node42"},
+        "sensor+critical, 100": {"sensor": "humidity", "severity": "critical", "limit": 100},
+    }
+    print(f"query latency over {len(engine.store)} incidents ({len(engine.store.open)} open):")
+    for label, params in queries.items():
+        params = dict(params)
+        limit = params.pop("limit", 20)
+        engine.expire(now)
+        started = time.perf_counter()
+        for _ in range(repeat):
+            found = engine.store.query(limit, **params)
+        elapsed = (time.perf_counter() - started) / repeat
+        started = time.perf_counter()
+        for _ in range(repeat // 10):
+            [incident.to_dict() for incident in found]
+        serialize = (time.perf_counter() - started) / (repeat // 10)
+        print(f"  {label:<22} {elapsed * 1e6:>8.1f} us lookup + {serialize * 1e6:>7.1f} us to_dict  ({len(found)} rows)")
+
+
+def run(sites=50, minutes=60):
+    streams = _streams(sites)
+    steps = int(minutes * 60 / INTERVAL)
+    values = _trace(streams, steps)
+    readings = values.size
+    print(f"{len(streams)} streams at {sites} sites, {minutes} min, {readings} readings")
+
+    flat = {sensor: Rule(rule.op, rule.warning, rule.critical, rule.messages)
+            for sensor, rule in load_rules().items()}
+    above, plain, _ = _replay(ThreatDetector(flat), streams, values)
+    engine = IncidentEngine()
+    started = time.perf_counter()
+    _, held, notified = _replay(ThreatDetector(), streams, values, engine)
+    elapsed = time.perf_counter() - started
+    stats = engine.stats()
+
+    print(f"  per-reading alerts           {above:>9}")
+    print(f"  transitions, no hysteresis   {plain:>9}  ({above / max(plain, 1):.0f}x fewer)")
+    print(f"  transitions, hysteresis      {held:>9}  ({above / max(held, 1):.0f}x fewer)")
+    print(f"  notifications                {notified:>9}  ({above / max(notified, 1):.0f}x fewer)")
+    print(f"  incidents                    {stats['incidents']:>9}  ({stats['open']} open at the end)")
+    print(f"  detector + engine {elapsed / readings * 1e6:.2f} us/reading")
+    _query_latency()
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    run(*args)
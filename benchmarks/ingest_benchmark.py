@@ -0,0 +1,69 @@
+"""
+Ingest Benchmark
+Compares the per-reading sensor endpoints with POST /sensor/batch.
+Runs the app in-process (no network) so the numbers reflect server overhead.
+
+Usage: python -m benchmarks.ingest_benchmark [readings] [batch_size]
+"""
+import asyncio
+import random
+import sys
+import time
+
+import httpx
+
+from main import app
+
+SENSORS = {
+    "temperature": "/sensor/temperature",
+    "humidity": "/sensor/humidity",
+    "gas-leakage": "/sensor/gas-leakage",
+    "seismic": "/sensor/seismic",
+    "ultrasonic": "/sensor/ultrasonic",
+}
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def _readings(count):
+    names = list(SENSORS)
+    return [
+        {"sensor": random.choice(names), "node_id": str(i % 200),
+         "value": random.uniform(0, 100), "ts": time.time()}
+        for i in range(count)
+    ]
+
+
+def _report(label, readings, requests, elapsed, latencies):
+    print(f"{label:<12} {requests / elapsed:>10.0f} req/s {readings / elapsed:>10.0f} readings/s "
+          f"p99 {_percentile(latencies, 99) * 1000:>7.2f} ms")
+
+
+async def run(count=5000, batch_size=100):
+    readings = _readings(count)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        latencies = []
+        start = time.perf_counter()
+        for r in readings:
+            t0 = time.perf_counter()
+            await client.post(SENSORS[r["sensor"]], json={"value": r["value"], "node_id": r["node_id"]})
+            latencies.append(time.perf_counter() - t0)
+        _report("per-reading", count, count, time.perf_counter() - start, latencies)
+
+        latencies = []
+        batches = [readings[i:i + batch_size] for i in range(0, count, batch_size)]
+        start = time.perf_counter()
+        for batch in batches:
+            t0 = time.perf_counter()
+            await client.post("/sensor/batch", json=batch)
+            latencies.append(time.perf_counter() - t0)
+        _report(f"batch x{batch_size}", count, len(batches), time.perf_counter() - start, latencies)
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    asyncio.run(run(*args))
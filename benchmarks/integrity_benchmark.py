@@ -0,0 +1,93 @@
+"""
+Integrity Benchmark
+Provisions positions into a throwaway WAL-mode SQLite file and runs them
+through services/integrity.py:
+  - record_many() for the chain entries, then one seal() for all of them:
+    one Merkle root and one anchor delivery for the whole batch
+  - proof(): cold (tree rebuilt from the batch's leaves) and warm, and
+    verify_proof() on its own, which is all a verifier has to run
+  - audit() of the whole table in-process and on a process pool (which only
+    pays off with the cores to run it), then again after rows are tampered
+    with behind the API's back
+
+Usage: python -m benchmarks.integrity_benchmark [positions] [workers]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+from sqlalchemy import create_engine, func, insert, select, text
+
+from config.db import enable_sqlite_wal
+from services.integrity import (PositionChain, batches_table, chain_table, generate_position_hash,
+                                positions_table, record_many, verify_proof)
+from services.outbox import outbox_table
+
+SENSORS = ["temperature", "humidity", "gas-leakage", "ultra-sonic", "earthquake"]
+
+
+def run(count=100000, workers=4):
+    path = os.path.join(tempfile.mkdtemp(), "integrity.db")
+    engine = enable_sqlite_wal(create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False}))
+    for table in (positions_table, chain_table, batches_table, outbox_table):
+        table.create(bind=engine)
+    rng = random.Random(3)
+    rows = [{"id": i, "name": f"site-{i}", "lat": 6.9 + rng.uniform(-0.1, 0.1), "lng": 79.86 + rng.uniform(-0.1, 0.1),
+             "sensor_type": rng.choice(SENSORS)} for i in range(1, count + 1)]
+    print(f"{count} positions")
+
+    started = time.perf_counter()
+    hashes = [(row["id"], "CREATED", generate_position_hash(row, "CREATED")) for row in rows]
+    with engine.begin() as conn:
+        conn.execute(insert(positions_table), rows)
+        record_many(conn, hashes)
+    print(f"  insert + hash + record         {time.perf_counter() - started:7.2f} s")
+
+    chain = PositionChain(engine=engine, anchor_path="/anchor")
+    started = time.perf_counter()
+    sealed = chain.seal()
+    with engine.connect() as conn:
+        anchors = conn.execute(select(func.count()).select_from(outbox_table)
+                               .where(outbox_table.c.path == "/anchor")).scalar()
+    print(f"  seal                           {time.perf_counter() - started:7.2f} s   "
+          f"({sealed} entries, {anchors} anchor deliveries)")
+
+    ids = rng.sample(range(1, count + 1), 200)
+    chain._trees.clear()
+    started = time.perf_counter()
+    chain.proof(ids[0])
+    print(f"  proof, cold tree               {(time.perf_counter() - started) * 1000:7.1f} ms")
+    timings, verify = [], []
+    for position_id in ids:
+        started = time.perf_counter()
+        proof = chain.proof(position_id)
+        timings.append(time.perf_counter() - started)
+        entry = proof["entries"][0]
+        started = time.perf_counter()
+        assert verify_proof(entry["entry_hash"], entry["proof"], entry["batch"]["root"])
+        verify.append(time.perf_counter() - started)
+    print(f"  proof, warm                    p50 {np.percentile(timings, 50) * 1000:6.2f} ms   "
+          f"{len(proof['entries'][0]['proof'])} siblings; verify_proof p50 "
+          f"{np.percentile(verify, 50) * 1e6:.1f} us")
+
+    for pool in (1, workers):
+        report = chain.audit(workers=pool)
+        print(f"  audit, {pool} worker{'s' if pool > 1 else ' '}               {report['elapsed_s']:7.2f} s   "
+              f"ok={report['ok']}")
+
+    tampered = ids[:5]
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE sensor_positions SET lat = lat + 0.0001 WHERE id IN (%s)"
+                          % ",".join(str(i) for i in tampered)))
+        conn.execute(text("DELETE FROM sensor_positions WHERE id = :id"), {"id": ids[5]})
+    report = chain.audit(workers=1)
+    print(f"  audit after tampering          {report['elapsed_s']:7.2f} s   modified {report['modified']} "
+          f"(expected {sorted(tampered)}), missing {report['missing']}")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    run(*args)
@@ -0,0 +1,90 @@
+"""
+Metrics Benchmark
+Cost of recording into services/metrics.py on the hot path:
+  - Counter.inc() and Histogram.observe() against the same updates behind a
+    threading.Lock, single-threaded and from several threads at once (where
+    the totals are also checked: no increment may be lost)
+  - log.debug() of a reading with debug off, and log.info() once the rate
+    limit is suppressing it
+  - rendering /metrics with a realistic number of label values
+
+Usage: python -m benchmarks.metrics_benchmark [operations] [threads]
+"""
+import io
+import sys
+import threading
+import time
+
+from services.metrics import Counter, EventLog, Histogram, Registry
+
+SENSORS = ["temperature", "humidity", "gas-leakage", "ultrasonic", "seismic", "camera"]
+
+
+class LockedCounter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.count = 0
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.count += amount
+
+
+def _per_op(label, call, operations):
+    started = time.perf_counter()
+    for _ in range(operations):
+        call()
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<40} {elapsed / operations * 1e9:7.0f} ns/op")
+
+
+def _threaded(label, call, operations, threads):
+    workers = [threading.Thread(target=lambda: [call() for _ in range(operations)]) for _ in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<40} {elapsed / (operations * threads) * 1e9:7.0f} ns/op")
+
+
+def run(operations=1000000, threads=4):
+    registry = Registry()
+    counter = Counter("bench_total", "counter", registry=registry)
+    histogram = Histogram("bench_seconds", "histogram", registry=registry)
+    locked = LockedCounter()
+    print(f"{operations} operations, {threads} threads")
+
+    _per_op("empty call (loop overhead)", lambda: None, operations)
+    _per_op("Counter.inc()", counter.inc, operations)
+    _per_op("Lock-guarded counter", locked.inc, operations)
+    _per_op("Histogram.observe()", lambda: histogram.observe(0.0004), operations)
+    child = Counter("bench_labeled_total", "labeled", ["sensor"], registry=registry).labels("temperature")
+    _per_op("labels(...) cached child, inc()", child.inc, operations)
+
+    counter, locked = Counter("bench_threads_total", "threads", registry=registry), LockedCounter()
+    _threaded(f"Counter.inc(), {threads} threads", counter.inc, operations, threads)
+    _threaded(f"Lock-guarded counter, {threads} threads", locked.inc, operations, threads)
+    assert counter.value() == locked.count == operations * threads, (counter.value(), locked.count)
+    print(f"    totals {counter.value():.0f} / {locked.count}: no increments lost")
+
+    log = EventLog(name="bench", level="INFO", stream=io.StringIO())
+    _per_op("log.debug() with debug off", lambda: log.debug("reading", "temperature", sensor="temperature",
+                                                            node="1", value=21.5, threat="safe"), operations)
+    _per_op("log.info() rate-limited", lambda: log.info("reading", "temperature", value=21.5), operations)
+
+    ingest = Histogram("bench_ingest_seconds", "per sensor", labels=["sensor"], registry=registry)
+    for i in range(10000):
+        ingest.labels(SENSORS[i % len(SENSORS)]).observe(i * 1e-6)
+    for i in range(20):
+        Histogram(f"bench_extra_{i}_seconds", "extra", registry=registry).observe(0.01)
+    started = time.perf_counter()
+    text = registry.render()
+    print(f"  render, {len(text.splitlines())} lines                     "
+          f"{(time.perf_counter() - started) * 1000:7.2f} ms")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    run(*args)
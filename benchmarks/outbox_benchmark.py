@@ -0,0 +1,182 @@
+"""
+Outbox Benchmark
+Drains queued position events from a throwaway WAL-mode SQLite file into a
+local stub of sensor_chain's /register with services/outbox.py. The stub is a
+bare ASGI app under uvicorn in its own process, answering after a simulated
+network round trip:
+  - the old send_to_blockchain: two blocking requests.post per event, each on
+    a fresh connection, timed on a sample and extrapolated
+  - enqueue() cost per position change, one transaction per event like the
+    routes do
+  - steady state: deliveries/s through the keep-alive pool
+  - a flaky receiver (a share of 503s, then a 2 s outage): retries, backoff,
+    and that every key still arrives, none of them twice
+  - queueing the same keys again adds nothing
+
+Usage: python -m benchmarks.outbox_benchmark [events] [round trip ms] [failure rate]
+"""
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import requests
+import uvicorn
+from sqlalchemy import create_engine, func, select
+
+from config.db import enable_sqlite_wal
+from services.outbox import DELIVERED, Outbox, enqueue, outbox_table
+
+
+class StubChain:
+    """POST /register counts deliveries per Idempotency-Key and fails on demand;
+    POST /_control sets failure_rate and down_s, GET /_received returns the counts."""
+
+    def __init__(self, round_trip_ms: float):
+        self.delay = round_trip_ms / 1000
+        self.received = Counter()
+        self.failure_rate = 0.0
+        self.down_until = 0.0
+        self.rejected = 0
+
+    async def _reply(self, send, status: int, body: dict):
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": json.dumps(body).encode()})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        if scope["path"] == "/_control":
+            control = json.loads(body)
+            self.failure_rate = control.get("failure_rate", 0.0)
+            self.down_until = time.time() + control.get("down_s", 0.0)
+            return await self._reply(send, 200, {})
+        if scope["path"] == "/_received":
+            return await self._reply(send, 200, {"received": self.received, "rejected": self.rejected})
+        await asyncio.sleep(self.delay)
+        if time.time() < self.down_until or random.random() < self.failure_rate:
+            self.rejected += 1
+            return await self._reply(send, 503, {"error": "unavailable"})
+        json.loads(body)
+        self.received[dict(scope["headers"]).get(b"idempotency-key", b"").decode()] += 1
+        await self._reply(send, 200, {"ok": True})
+
+
+def _stub(port: int, round_trip_ms: float):
+    uvicorn.run(StubChain(round_trip_ms), host="127.0.0.1", port=port, log_level="error", access_log=False)
+
+
+def _serve(round_trip_ms: float):
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    process = multiprocessing.get_context("spawn").Process(target=_stub, args=(port, round_trip_ms), daemon=True)
+    process.start()
+    url = f"http://127.0.0.1:{port}"
+    while True:
+        try:
+            requests.get(url + "/_received", timeout=1)
+            return process, url
+        except requests.ConnectionError:
+            time.sleep(0.05)
+
+
+def _events(count, start=0):
+    for sensor_id in range(start, start + count):
+        data = json.dumps({"action": "CREATED", "data": {"id": sensor_id}}, sort_keys=True)
+        data_hash = hashlib.sha256(data.encode()).hexdigest()
+        yield "/register", {"sensor_id": sensor_id, "data_hash": data_hash}, f"position:{sensor_id}:{data_hash}"
+
+
+def _pending(engine):
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(outbox_table)
+                            .where(outbox_table.c.status != DELIVERED)).scalar()
+
+
+async def _drain(box, engine, timeout=120):
+    task = asyncio.create_task(box.run())
+    await asyncio.sleep(0)
+    started = time.perf_counter()
+    box.notify()
+    while _pending(engine) and time.perf_counter() - started < timeout:
+        await asyncio.sleep(0.02)
+    elapsed = time.perf_counter() - started
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    return elapsed
+
+
+def run(count=5000, round_trip_ms=20.0, failure_rate=0.2):
+    stub, url = _serve(round_trip_ms)
+    path = os.path.join(tempfile.mkdtemp(), "outbox.db")
+    engine = enable_sqlite_wal(create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False}))
+    outbox_table.create(bind=engine)
+    print(f"{count} position events against a local /register stub, {round_trip_ms:.0f} ms round trip")
+
+    sample = list(_events(100, start=10 ** 6))
+    started = time.perf_counter()
+    for route, payload, _ in sample:
+        for _ in range(2):  # send_to_blockchain posted every event twice
+            requests.post(url + route, json=payload, timeout=5).raise_for_status()
+    per_event = (time.perf_counter() - started) / len(sample)
+    print(f"  blocking requests.post x2      {per_event * 1000:7.2f} ms/event   "
+          f"({1 / per_event:7.0f} events/s, x{count} = {per_event * count:.1f}s)")
+
+    started = time.perf_counter()
+    for event in _events(count):
+        with engine.begin() as conn:
+            enqueue(conn, *event)
+    per_event = (time.perf_counter() - started) / count
+    print(f"  enqueue, one commit each       {per_event * 1000:7.3f} ms/event")
+
+    box = Outbox(engine=engine, base_url=url)
+    elapsed = asyncio.run(_drain(box, engine))
+    stats = box.stats()
+    print(f"  outbox drain                   {elapsed:7.2f} s         ({stats['delivered'] / elapsed:7.0f} events/s, "
+          f"{stats['rounds']} rounds, last {stats['last_round_ms']} ms)")
+
+    requests.post(url + "/_control", json={"failure_rate": failure_rate, "down_s": 2}).raise_for_status()
+    for event in _events(count, start=count):
+        with engine.begin() as conn:
+            enqueue(conn, *event)
+    box = Outbox(engine=engine, base_url=url, backoff_base=0.05, backoff_max=1)
+    elapsed = asyncio.run(_drain(box, engine))
+    stats = box.stats()
+    seen = requests.get(url + "/_received").json()
+    keys = {key for _, _, key in _events(2 * count)}
+    missing = len(keys - set(seen["received"]))
+    twice = sum(n > 1 for key, n in seen["received"].items() if key in keys)
+    print(f"  flaky receiver ({failure_rate:.0%} 503s, 2 s down) {elapsed:5.2f} s   "
+          f"{stats['delivered']} delivered, {stats['retried']} retries, {seen['rejected']} rejected; "
+          f"{missing} missing, {twice} delivered twice")
+
+    with engine.begin() as conn:
+        for event in _events(count):
+            enqueue(conn, *event)
+    print(f"  re-queueing {count} known keys    {_pending(engine)} new pending events")
+    stub.terminate()
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    round_trip = float(sys.argv[2]) if len(sys.argv) > 2 else 20.0
+    rate = float(sys.argv[3]) if len(sys.argv) > 3 else 0.2
+    run(count, round_trip, rate)
@@ -0,0 +1,60 @@
+"""
+Persistence Benchmark
+Pushes readings through the write-behind buffer into a throwaway WAL-mode
+SQLite file and reports sustained rows/s, submit() cost and queue high-watermark.
+
+Usage: python -m benchmarks.persistence_benchmark [readings] [rate]
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+
+from config.db import enable_sqlite_wal
+from services.reading_writer import ReadingWriter, ensure_readings_schema
+
+SENSORS = ["temperature", "humidity", "gas-leakage", "seismic", "ultrasonic"]
+
+
+async def run(count=200000, rate=20000):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = enable_sqlite_wal(create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False}))
+    ensure_readings_schema(engine)
+    writer = ReadingWriter(engine=engine)
+    task = asyncio.create_task(writer.run())
+
+    tick = 0.01  # submit in 10 ms slices to hold the target rate
+    per_tick = max(1, int(rate * tick))
+    submit_time = 0.0
+    start = time.perf_counter()
+    sent = 0
+    while sent < count:
+        t0 = time.perf_counter()
+        for _ in range(min(per_tick, count - sent)):
+            payload = {"sensor": random.choice(SENSORS), "node_id": str(sent % 200),
+                       "value": random.uniform(0, 100), "threat_level": "safe"}
+            writer.submit(payload, time.time())
+            sent += 1
+        submit_time += time.perf_counter() - t0
+        await asyncio.sleep(max(0.0, start + sent / rate - time.perf_counter()))
+
+    while writer.written + writer.dropped < count:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    task.cancel()
+
+    stats = writer.stats()
+    print(f"offered {rate} readings/s for {count} readings")
+    print(f"persisted {stats['written']} rows in {elapsed:.2f}s ({stats['written'] / elapsed:.0f} rows/s), "
+          f"dropped {stats['dropped']}")
+    print(f"submit {submit_time / count * 1e6:.2f} us/reading, {stats['flushes']} flushes, "
+          f"last flush {stats['last_flush_ms']} ms, high-watermark {stats['high_watermark']}")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    asyncio.run(run(*args))
@@ -0,0 +1,88 @@
+"""
+Evacuation Planning Benchmark
+Plans a whole flood zone at once on the synthetic district of
+benchmarks/routing_benchmark.py with services/evacuation_planner.py:
+  - one A* route per user (route_on_graph), timed on a sample and
+    extrapolated, against one plan() over the multi-source exit tree
+  - the tree's exit and distance per user checked against the A* routes
+  - capacity-aware assignment: exit loads and the extra walking it costs,
+    with the per-exit trees in-process and on the process pool
+  - include_routes: the cost of drawing every polyline
+
+Usage: python -m benchmarks.planning_benchmark [grid size] [users]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.routing_benchmark import CENTER, write_district
+from services import evacuation, evacuation_planner
+from services.road_graph import RoadGraph
+
+DANGER = (CENTER[0] + 0.004, CENTER[1] - 0.003)
+HAZARDS = [{"lat": CENTER[0] - 0.012, "lng": CENTER[1] + 0.010, "severity": "critical"}]
+
+
+def _loads(result):
+    return ", ".join(f"{e['name']} {e['assigned']}/{e['capacity']}" for e in result["exits"])
+
+
+def run(size=160, users=3000):
+    rng = np.random.default_rng(6)
+    spread = 1200 / 111320
+    crowd = [{"id": str(i), "lat": float(lat), "lng": float(lng)}
+             for i, (lat, lng) in enumerate(np.array(DANGER) + rng.normal(0, spread, (users, 2)))]
+    with tempfile.TemporaryDirectory() as scratch:
+        path = os.path.join(scratch, "district.osm")
+        write_district(path, size)
+        graph = RoadGraph(path)
+        graph.load()
+        evacuation.road_graph = graph
+        print(f"{users} users in the zone, {graph.node_count} junctions")
+
+        zones = [{**h, "radius_m": evacuation.HAZARD_RADIUS_M} for h in HAZARDS]
+        zones.append({"lat": DANGER[0], "lng": DANGER[1], "radius_m": evacuation.HAZARD_RADIUS_M,
+                      "severity": "critical"})
+        blocked = {key for _, key, _ in evacuation.exit_index.within(*DANGER, evacuation.HAZARD_RADIUS_M)}
+        exits = [e for e in evacuation.SAFE_EXITS if e["id"] not in blocked]
+        sample = crowd[:150]
+        started = time.perf_counter()
+        single = [evacuation.route_on_graph(u["lat"], u["lng"], exits, zones, graph) for u in sample]
+        per_user = (time.perf_counter() - started) / len(sample)
+        print(f"  one A* per user               {per_user * 1000:7.2f} ms each, x{users} = {per_user * users:.1f}s")
+
+        started = time.perf_counter()
+        result = evacuation_planner.plan(crowd, *DANGER, HAZARDS, graph=graph)
+        print(f"  plan(), nearest exit          {time.perf_counter() - started:7.2f} s   ({_loads(result)})")
+        by_id = {p["id"]: p for p in result["plans"]}
+        same_exit = sum(by_id[u["id"]]["exit_id"] == s[0]["id"] for u, s in zip(sample, single) if s)
+        gaps = [abs(by_id[u["id"]]["distance_m"] - s[0]["distance_m"]) for u, s in zip(sample, single) if s]
+        print(f"    vs A*: same exit {same_exit}/{len(sample)}, distance gap max {max(gaps)} m")
+        plain = np.mean([p["distance_m"] for p in result["plans"]])
+
+        for workers in (1, 4):
+            evacuation_planner.PLAN_WORKERS = workers
+            evacuation_planner.PLAN_POOL_MIN_NODES = 0
+            if workers > 1:  # start the pool and load the graph in the workers outside the timing
+                evacuation_planner.plan(crowd[:10], *DANGER, HAZARDS, capacity_aware=True, graph=graph)
+            started = time.perf_counter()
+            result = evacuation_planner.plan(crowd, *DANGER, HAZARDS, capacity_aware=True, graph=graph)
+            elapsed = time.perf_counter() - started
+            print(f"  plan(), capacity, {workers} process{'es' if workers > 1 else ''}  {elapsed:7.2f} s   "
+                  f"({_loads(result)})")
+        capped = np.mean([p["distance_m"] for p in result["plans"]])
+        print(f"    mean walk {plain:.0f} m nearest-exit vs {capped:.0f} m capacity-aware")
+        evacuation_planner.shutdown()
+
+        started = time.perf_counter()
+        result = evacuation_planner.plan(crowd, *DANGER, HAZARDS, include_routes=True, graph=graph)
+        points = sum(len(p["route"]) for p in result["plans"])
+        print(f"  plan(), with routes           {time.perf_counter() - started:7.2f} s   ({points} points)")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    run(*args)
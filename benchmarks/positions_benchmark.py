@@ -0,0 +1,108 @@
+"""
+Positions Listing Benchmark
+GET /positions for a deployment of N sensors in a throwaway WAL-mode SQLite
+file, through the real router (routes/sensor_positions.py):
+  - the previous handler, db.query(SensorPosition).all() validated into
+    SensorPositionOut models on every call, for reference
+  - the snapshot (services/position_snapshot.py): full list, a conditional
+    request answered 304, and a ?since_version= delta after a few changes
+  - the same, on the snapshot alone without the HTTP stack
+  - refresh() cost after a create, and load() at startup
+
+Usage: python -m benchmarks.positions_benchmark [positions] [requests]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import List
+
+import numpy as np
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session, sessionmaker
+
+import routes.sensor_positions as positions_routes
+from config.db import enable_sqlite_wal
+from models.position_chain import ChainBatch, PositionChainEntry
+from models.sensor_position import SensorPosition
+from services.integrity import record_many
+from services.position_snapshot import PositionSnapshot
+
+SENSORS = ["temperature", "humidity", "gas-leakage", "ultra-sonic", "earthquake"]
+
+
+def _time(label, call, requests):
+    timings = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - started)
+    timings = np.array(timings) * 1e6
+    print(f"  {label:<34} p50 {np.percentile(timings, 50):9.1f} us   p95 {np.percentile(timings, 95):9.1f} us")
+
+
+def run(count=10000, requests=200):
+    path = os.path.join(tempfile.mkdtemp(), "positions.db")
+    engine = enable_sqlite_wal(create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False}))
+    for model in (SensorPosition, PositionChainEntry, ChainBatch):
+        model.__table__.create(bind=engine)
+    rng = random.Random(5)
+    rows = [{"id": i, "name": f"site-{i}", "lat": 6.9 + rng.uniform(-0.1, 0.1), "lng": 79.86 + rng.uniform(-0.1, 0.1),
+             "sensor_type": rng.choice(SENSORS)} for i in range(1, count + 1)]
+    with engine.begin() as conn:
+        conn.execute(insert(SensorPosition.__table__), rows)
+        record_many(conn, [(row["id"], "CREATED", "0" * 64) for row in rows])
+    Sessions = sessionmaker(bind=engine)
+
+    def get_db():
+        db = Sessions()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    snapshot = PositionSnapshot(engine=engine)
+    started = time.perf_counter()
+    snapshot.load()
+    print(f"{count} positions; snapshot load {(time.perf_counter() - started) * 1000:.1f} ms")
+    positions_routes.position_snapshot = snapshot
+
+    app = FastAPI()
+    app.include_router(positions_routes.router)
+
+    @app.get("/old", response_model=List[positions_routes.SensorPositionOut])
+    def list_positions_old(db: Session = Depends(get_db)):
+        return db.query(SensorPosition).all()
+
+    client = TestClient(app)
+    old = client.get("/old")
+    new = client.get("/positions")
+    assert old.json() == new.json(), "snapshot differs from the ORM listing"
+    etag = new.headers["etag"]
+    version = int(new.headers["x-positions-version"])
+
+    _time("ORM + Pydantic (previous)", lambda: client.get("/old"), max(20, requests // 10))
+    _time("snapshot, full list", lambda: client.get("/positions"), requests)
+    _time("snapshot, If-None-Match -> 304", lambda: client.get("/positions", headers={"If-None-Match": etag}),
+          requests)
+
+    with engine.begin() as conn:
+        conn.execute(insert(SensorPosition.__table__), [{**rows[0], "id": count + 1, "name": "new"}])
+        record_many(conn, [(count + 1, "CREATED", "0" * 64), (5, "DELETED", "0" * 64)])
+        conn.execute(SensorPosition.__table__.delete().where(SensorPosition.__table__.c.id == 5))
+    started = time.perf_counter()
+    snapshot.refresh()
+    print(f"  refresh after 2 changes                {(time.perf_counter() - started) * 1e6:9.1f} us")
+    delta = client.get(f"/positions?since_version={version}").json()
+    print(f"  delta: {len(delta['upserts'])} upserts, deleted {delta['deleted']}, version {delta['version']}")
+    _time("snapshot, ?since_version= delta", lambda: client.get(f"/positions?since_version={version}"), requests)
+    _time("listing() alone", snapshot.listing, requests * 10)
+    _time("delta() alone", lambda: snapshot.delta(version), requests * 10)
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    run(*args)
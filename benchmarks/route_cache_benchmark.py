@@ -0,0 +1,118 @@
+"""
+Route Cache Benchmark
+A crowd around one danger point asks for evacuation routes on the synthetic
+district of benchmarks/routing_benchmark.py, through services/route_cache.py:
+  - uncached get_evacuation_route() per request, for reference
+  - cold cache, requests one after another, then the same crowd from 16
+    threads at once (single-flight: one search per cell however many wait)
+  - precompute() for the danger point, then the crowd against a warm cache
+  - a new hazard on the map: how many entries it drops, and that none of the
+    survivors passes through it
+  - how far the re-anchored distance is from routing each user exactly
+
+Usage: python -m benchmarks.route_cache_benchmark [grid size] [users]
+"""
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks.routing_benchmark import CENTER, write_district
+from services import evacuation
+from services.road_graph import RoadGraph
+from services.route_cache import RouteCache
+from services.spatial import haversine
+
+DANGER = (CENTER[0] + 0.004, CENTER[1] - 0.003)
+HAZARDS = [{"lat": CENTER[0] - 0.012, "lng": CENTER[1] + 0.010, "severity": "critical"},
+           {"lat": CENTER[0] + 0.015, "lng": CENTER[1] + 0.006, "severity": "warning"}]
+
+
+def _crowd(users, rng):
+    spread = 600 / 111320  # ~600 m standard deviation
+    return [(float(lat), float(lng)) for lat, lng in np.array(DANGER) + rng.normal(0, spread, (users, 2))]
+
+
+def _serve(cache, crowd, hazards):
+    timings = []
+    for lat, lng in crowd:
+        started = time.perf_counter()
+        cache.route(DANGER[0], DANGER[1], lat, lng, hazards)
+        timings.append(time.perf_counter() - started)
+    return np.array(timings) * 1000
+
+
+def _report(label, timings):
+    print(f"  {label:<32} total {timings.sum() / 1000:6.2f}s   p50 {np.percentile(timings, 50):7.3f} ms   "
+          f"p95 {np.percentile(timings, 95):7.3f} ms")
+
+
+def run(size=120, users=5000):
+    rng = np.random.default_rng(4)
+    crowd = _crowd(users, rng)
+    with tempfile.TemporaryDirectory() as scratch:
+        path = os.path.join(scratch, "district.osm")
+        write_district(path, size)
+        graph = RoadGraph(path)
+        graph.load()
+        evacuation.road_graph = graph
+        print(f"{users} users around one danger point, {graph.node_count} junctions")
+
+        direct = []
+        for lat, lng in crowd[:200]:
+            started = time.perf_counter()
+            evacuation.get_evacuation_route(DANGER[0], DANGER[1], lat, lng, HAZARDS)
+            direct.append(time.perf_counter() - started)
+        direct = np.array(direct) * 1000
+        print(f"  uncached, per request            p50 {np.percentile(direct, 50):.2f} ms   "
+              f"(x{users} = {np.mean(direct) * users / 1000:.1f}s)")
+
+        cache = RouteCache(graph=graph)
+        _report("cold cache, sequential", _serve(cache, crowd, HAZARDS))
+        print(f"    {cache.stats()}")
+
+        cache = RouteCache(graph=graph)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(16) as pool:
+            list(pool.map(lambda user: cache.route(DANGER[0], DANGER[1], user[0], user[1], HAZARDS), crowd))
+        print(f"  cold cache, 16 threads           total {time.perf_counter() - started:6.2f}s   "
+              f"{cache.stats()['entries']} searches for {users} requests")
+
+        cache = RouteCache(graph=graph)
+        started = time.perf_counter()
+        searched = cache.precompute(DANGER[0], DANGER[1], HAZARDS)
+        print(f"  precompute                       {time.perf_counter() - started:6.2f}s for {searched} cells "
+              f"within {cache.precompute_radius_m:.0f} m")
+        _report("warm cache", _serve(cache, crowd, HAZARDS))
+
+        # a hazard lands near the danger point's main exit corridor
+        entries = cache.stats()["entries"]
+        route = cache.route(DANGER[0], DANGER[1], *crowd[0], HAZARDS)["safe_route"]
+        lat, lng = route[len(route) // 2]
+        new_hazard = {"lat": lat, "lng": lng, "severity": "critical"}
+        started = time.perf_counter()
+        cache.sync(HAZARDS + [new_hazard])
+        elapsed = time.perf_counter() - started
+        crossing = sum(
+            any(haversine(lat, lng, p_lat, p_lng) <= evacuation.HAZARD_RADIUS_M
+                for p_lat, p_lng in entry.route["safe_route"][1:])
+            for entry in cache._entries.values())
+        print(f"  new hazard                       dropped {entries - cache.stats()['entries']} of {entries} "
+              f"entries in {elapsed * 1000:.1f} ms; {crossing} survivors cross it")
+
+        errors = []
+        for lat, lng in crowd[:200]:
+            cached = cache.route(DANGER[0], DANGER[1], lat, lng, HAZARDS + [new_hazard])
+            exact = evacuation.get_evacuation_route(DANGER[0], DANGER[1], lat, lng, HAZARDS + [new_hazard])
+            errors.append(abs(cached["safe_exit"]["distance_m"] - exact["safe_exit"]["distance_m"])
+                          / max(exact["safe_exit"]["distance_m"], 1))
+        print(f"  anchored vs exact distance       median {np.median(errors) * 100:.1f}%, "
+              f"p95 {np.percentile(errors, 95) * 100:.1f}%")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    run(*args)
@@ -0,0 +1,133 @@
+"""
+Routing Benchmark
+Writes a synthetic district as an OSM XML extract (a jittered street grid
+with shape nodes along every block, some blocks missing, diagonal footpaths),
+compiles it with services/road_graph.py and times evacuation routes on it:
+  - parse + compile of the extract, and reload from the .graph.npz cache
+  - get_evacuation_route() from random points to the SAFE_EXITS, with the
+    danger zone plus a few other open hazards to route around
+
+Usage: python -m benchmarks.routing_benchmark [grid size] [queries]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from services import evacuation
+from services.road_graph import RoadGraph
+
+CENTER = (11.68, 76.13)  # the SAFE_EXITS are around here
+SPACING = 0.0008  # degrees between junctions, ~90 m
+SHAPE_NODES = 2  # per block
+
+
+def write_district(path, size, seed=1):
+    rng = random.Random(seed)
+    lat0 = CENTER[0] - size / 2 * SPACING
+    lng0 = CENTER[1] - size / 2 * SPACING
+    ids = iter(range(1, 10 ** 9))
+    with open(path, "w") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<osm version="0.6">\n')
+
+        def node(lat, lng):
+            node_id = next(ids)
+            f.write(f'  <node id="{node_id}" lat="{lat:.7f}" lon="{lng:.7f}"/>\n')
+            return node_id
+
+        grid = [[node(lat0 + r * SPACING + rng.uniform(-1, 1) * SPACING * 0.1,
+                      lng0 + c * SPACING + rng.uniform(-1, 1) * SPACING * 0.1)
+                 for c in range(size)] for r in range(size)]
+        coords = {}
+
+        def street(cells, highway):
+            refs = []
+            for (r1, c1), (r2, c2) in zip(cells, cells[1:]):
+                refs.append(grid[r1][c1])
+                for k in range(1, SHAPE_NODES + 1):
+                    t = k / (SHAPE_NODES + 1)
+                    lat = lat0 + (r1 + (r2 - r1) * t) * SPACING + rng.uniform(-1, 1) * SPACING * 0.05
+                    lng = lng0 + (c1 + (c2 - c1) * t) * SPACING + rng.uniform(-1, 1) * SPACING * 0.05
+                    refs.append(node(lat, lng))
+            refs.append(grid[cells[-1][0]][cells[-1][1]])
+            coords[len(coords)] = (refs, highway)
+
+        for r in range(size):  # east-west streets, broken where a block is missing
+            run = [(r, 0)]
+            for c in range(1, size):
+                if rng.random() < 0.08:
+                    if len(run) > 1:
+                        street(run, "residential")
+                    run = [(r, c)]
+                else:
+                    run.append((r, c))
+            if len(run) > 1:
+                street(run, "residential")
+        for c in range(size):  # north-south streets
+            run = [(0, c)]
+            for r in range(1, size):
+                if rng.random() < 0.08:
+                    if len(run) > 1:
+                        street(run, "residential")
+                    run = [(r, c)]
+                else:
+                    run.append((r, c))
+            if len(run) > 1:
+                street(run, "residential")
+        for _ in range(size * size // 40):  # footpaths across blocks
+            r, c = rng.randrange(size - 1), rng.randrange(size - 1)
+            street([(r, c), (r + 1, c + 1)], "footway")
+
+        for way_id, (refs, highway) in coords.items():
+            f.write(f'  <way id="{way_id + 1}">\n')
+            f.writelines(f'    <nd ref="{ref}"/>\n' for ref in refs)
+            f.write(f'    <tag k="highway" v="{highway}"/>\n  </way>\n')
+        f.write("</osm>\n")
+    return next(ids) - 1
+
+
+def run(size=160, queries=300):
+    rng = np.random.default_rng(2)
+    with tempfile.TemporaryDirectory() as scratch:
+        path = os.path.join(scratch, "district.osm")
+        nodes = write_district(path, size)
+        print(f"district {size}x{size} blocks (~{size * SPACING * 111:.0f} km across), {nodes} OSM nodes, "
+              f"{os.path.getsize(path) / 1e6:.0f} MB of XML")
+
+        graph = RoadGraph(path)
+        started = time.perf_counter()
+        graph.load()
+        print(f"parse + compile {time.perf_counter() - started:.2f}s")
+        graph = RoadGraph(path)
+        started = time.perf_counter()
+        graph.load()
+        print(f"load from cache {time.perf_counter() - started:.2f}s")
+        evacuation.road_graph = graph
+
+        half = size / 2 * SPACING * 0.6
+        timings, lengths, graph_routes = [], [], 0
+        for _ in range(queries):
+            user = CENTER + rng.uniform(-half, half, 2)
+            danger = user + rng.uniform(-0.004, 0.004, 2)
+            hazards = [{"lat": float(lat), "lng": float(lng), "severity": severity}
+                       for (lat, lng), severity in zip(CENTER + rng.uniform(-half, half, (3, 2)),
+                                                       ("critical", "warning", "warning"))]
+            started = time.perf_counter()
+            route = evacuation.get_evacuation_route(float(danger[0]), float(danger[1]),
+                                                    float(user[0]), float(user[1]), hazards)
+            timings.append(time.perf_counter() - started)
+            graph_routes += route["routing"] == "road_graph"
+            lengths.append(route["safe_exit"]["distance_m"])
+        timings = np.array(timings) * 1000
+        print(f"{queries} routes ({graph_routes} on the graph), median length {np.median(lengths) / 1000:.1f} km, "
+              f"{np.median([len(evacuation.get_evacuation_route(*CENTER)['safe_route'])]):.0f}+ points each")
+        print(f"  latency p50 {np.percentile(timings, 50):.1f} ms, p95 {np.percentile(timings, 95):.1f} ms, "
+              f"max {timings.max():.1f} ms (first query, with hazard weights, {timings[0]:.1f} ms)")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    run(*args)
@@ -0,0 +1,88 @@
+"""
+Spatial Index Benchmark
+Scatters points over a district (clustered like sensors around sites, plus a
+uniform background) and times services/spatial.py against the linear scans
+it replaces:
+  - building the index (insert_many) and single inserts/moves
+  - nearest (k=1, k=10) and within(500 m) versus a NumPy haversine scan over
+    every point and the scalar per-point loop find_nearest_exit used to run
+  - nearest_many: the closest of the SAFE_EXITS for a batch of query points
+Results are checked against the brute-force answers.
+
+Usage: python -m benchmarks.spatial_benchmark [points] [queries]
+"""
+import sys
+import time
+
+import numpy as np
+
+from services.evacuation import exit_index, SAFE_EXITS
+from services.spatial import haversine, haversine_np, SpatialIndex
+
+CENTER = (11.68, 76.13)
+SPREAD = 0.05  # degrees, ~5.5 km
+
+
+def _points(count, rng):
+    sites = rng.normal(0, SPREAD, (200, 2))
+    clustered = count * 3 // 4
+    offsets = sites[rng.integers(0, len(sites), clustered)] + rng.normal(0, 0.002, (clustered, 2))
+    uniform = rng.uniform(-2 * SPREAD, 2 * SPREAD, (count - clustered, 2))
+    points = np.vstack((offsets, uniform))
+    return CENTER[0] + points[:, 0], CENTER[1] + points[:, 1]
+
+
+def _time(label, fn, queries, unit="us"):
+    started = time.perf_counter()
+    results = [fn(q) for q in queries]
+    elapsed = (time.perf_counter() - started) / len(queries)
+    scale = 1e6 if unit == "us" else 1e3
+    print(f"  {label:<36} {elapsed * scale:>10.1f} {unit}/query")
+    return results
+
+
+def run(count=100000, queries=2000):
+    rng = np.random.default_rng(7)
+    lats, lngs = _points(count, rng)
+    q_lats, q_lngs = _points(queries, rng)
+    query_points = list(zip(q_lats.tolist(), q_lngs.tolist()))
+
+    started = time.perf_counter()
+    index = SpatialIndex(cell_m=250)
+    index.insert_many(range(count), lats, lngs)
+    print(f"{count} points: insert_many {time.perf_counter() - started:.2f}s, {index.stats()['cells']} cells")
+    started = time.perf_counter()
+    for key in range(1000):
+        index.insert(key, lats[key] + 0.001, lngs[key])  # move
+    print(f"  move one point                        {(time.perf_counter() - started) / 1000 * 1e6:>10.1f} us")
+
+    print(f"{queries} queries:")
+    nearest = _time("nearest k=1", lambda q: index.nearest(q[0], q[1]), query_points)
+    _time("nearest k=10", lambda q: index.nearest(q[0], q[1], 10), query_points)
+    within = _time("within 500 m", lambda q: index.within(q[0], q[1], 500), query_points)
+
+    sample = query_points[:200]
+    scans = _time("numpy haversine scan, k=1", lambda q: int(np.argmin(haversine_np(q[0], q[1], lats, lngs))),
+                  sample, unit="ms")
+    _time("python haversine loop, k=1", lambda q: min(range(count), key=lambda i: haversine(
+        q[0], q[1], lats[i], lngs[i])), sample[:5], unit="ms")
+    # the moved points are only moved in the index: compare on the rest
+    mismatches = sum(hit[0][1] != scan for hit, scan in zip(nearest, scans) if hit[0][1] >= 1000 and scan >= 1000)
+    for q, hits in zip(sample, within):
+        d = haversine_np(q[0], q[1], lats, lngs)
+        expected = {int(i) for i in np.flatnonzero(d <= 500) if i >= 1000}
+        mismatches += expected != {key for _, key, _ in hits if key >= 1000}
+    print(f"  mismatches against the scans: {mismatches}")
+
+    print(f"nearest of {len(SAFE_EXITS)} SAFE_EXITS:")
+    _time("exit_index.nearest", lambda q: exit_index.nearest(q[0], q[1]), query_points)
+    started = time.perf_counter()
+    distances, keys = exit_index.nearest_many(lats, lngs)
+    elapsed = time.perf_counter() - started
+    print(f"  nearest_many over {count} points      {elapsed * 1000:>10.1f} ms ({elapsed / count * 1e6:.2f} us/point), "
+          f"median {np.median(distances):.0f} m")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    run(*args)
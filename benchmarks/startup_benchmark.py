@@ -0,0 +1,54 @@
+"""
+Startup Benchmark
+Starts the API with uvicorn and measures how long until /health answers,
+then how long until the vision subsystem reports ready (model loaded and
+warmed up in the worker processes).
+
+Usage: python -m benchmarks.startup_benchmark [port]
+"""
+import json
+import subprocess
+import sys
+import time
+import urllib.request
+
+VISION_TIMEOUT = 300
+
+
+def _health(port):
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+            return json.loads(response.read())
+    except OSError:
+        return None
+
+
+def run(port=8765):
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        status = None
+        while status is None:
+            if server.poll() is not None:
+                raise SystemExit("uvicorn exited before becoming ready")
+            time.sleep(0.02)
+            status = _health(port)
+        print(f"API ready after {time.perf_counter() - started:.2f}s")
+
+        deadline = time.perf_counter() + VISION_TIMEOUT
+        while not status["vision"]["ready"] and time.perf_counter() < deadline:
+            time.sleep(0.2)
+            status = _health(port) or status
+        vision = status["vision"]
+        print(f"vision ready after {time.perf_counter() - started:.2f}s "
+              f"(model {vision['model']} [{vision['format']}], loaded: {vision['model_loaded']})")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 8765)
@@ -1,141 +1,156 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import Body, FastAPI, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
 from pydantic import BaseModel
-from typing import List
+from typing import List, Literal, Optional
 from datetime import datetime, timezone
 import asyncio
-import cv2
+import json
+import time
 import numpy as np
 import urllib.request
 
-from config.db import engine, Base
+from config.db import engine, Base, SessionLocal
 from models.sensor_position import SensorPosition  # ensure model is registered
 from routes.sensor_positions import router as positions_router
-from services.threat_detector import ThreatDetector
-
-# Initialize the threat detector
-threat_analyzer = ThreatDetector()
+from services.threat_detector import threat_detector, SAFE, WARNING, CRITICAL, _create_alert
+from services.anomaly import anomaly_detector
+from services.incidents import incident_engine
+from services.incident_log import incident_log
+from services.sensor_store import latest_readings
+from services.connection_manager import ConnectionManager
+from services.subscriptions import Subscription
+from services.delta import DeltaFilter
+from services.vision import vision_pool, classify
+from models.camera import Camera
+from models.sensor_threshold import SensorThreshold
+from models.incident import IncidentRecord, IncidentStream  # ensure models are registered
+from models.outbox import OutboxEvent  # ensure model is registered
+from models.position_chain import PositionChainEntry, ChainBatch  # ensure models are registered
+from routes.alerts import router as alerts_router
+from routes.cameras import router as cameras_router
+from routes.history import router as history_router
+from routes.thresholds import router as thresholds_router
+from services.reading_writer import reading_writer, ensure_readings_schema
+from services.archive import archive
+from services.outbox import outbox
+from services.integrity import position_chain
+from services.position_snapshot import position_snapshot
+from services.route_cache import route_cache
+from services import evacuation_planner
+from services.road_graph import road_graph
+from services.metrics import CONTENT_TYPE, Counter, Gauge, Histogram, log, registry
 
 # Create DB tables on startup
+ensure_readings_schema(engine)
 Base.metadata.create_all(bind=engine)
 
 app = FastAPI(title="AURA Sensor Dashboard")
 
-# Global in-memory store for latest readings per sensor
-latest_sensor_data = {}
+# Latest reading per (node_id, sensor) lives in services.sensor_store.latest_readings
 
 # ----------------------------
-# DroidCam Background Task
+# Camera / Vision Background Tasks
 # ----------------------------
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Used only when no camera is registered in the cameras table
 DROIDCAM_URL = os.getenv("DROIDCAM_URL", "http://192.168.1.4:4747/video")
+DROIDCAM_FPS = float(os.getenv("DROIDCAM_FPS", "1"))
 
-# Try to load YOLOv8 model for Fire & Accident detection
-FIRE_MODEL = None
-try:
-    from ultralytics import YOLO
-    # We will use the pretrained yolov8m.pt model for now, which can detect cars, trucks, etc.
-    # A true fire model would require a custom trained .pt file, but we will load yolov8m as a placeholder/base.
-    FIRE_MODEL = YOLO("yolov8m.pt")
-    print("Loaded YOLOv8 model successfully.")
-except ImportError:
-    print("Ultralytics not installed. Running without YOLO model.")
-except Exception as e:
-    print(f"Error loading YOLO model: {e}")
-
-import threading
-
-def poll_camera_fire_detection_sync():
-    print(f"Starting DroidCam Fire/Accident Detection Polling on {DROIDCAM_URL}...")
-    
-    cap = cv2.VideoCapture(DROIDCAM_URL)
-    
+# YOLO runs in vision worker processes (services/vision.py), never in the API process
+
+
+def _camera_payload(result: dict) -> dict:
+    node_id = result["camera_id"]  # Camera.camera_id doubles as the reading's node_id
+    danger = classify(result["detections"])
+    payload = {
+        "sensor": "camera",
+        "node_id": node_id,
+        "value": 0,
+        "timestamp": _iso_timestamp(result["captured_at"]),
+        "threat_level": "safe",
+    }
+    if danger:
+        danger_type, confidence_val = danger[0].upper(), danger[1]
+        log.warning("danger_detected", node_id, camera=node_id, label=danger_type, confidence=confidence_val)
+        payload["value"] = int(confidence_val * 100)
+        payload["threat_level"] = "critical"
+        alert = _create_alert("camera", CRITICAL, f"{danger_type} DETECTED!",
+                              f"Camera detected {danger_type} with {confidence_val:.2f} confidence.",
+                              payload["value"], node_id)
+        payload.update(latest_readings.location(node_id))
+        # every inferred frame re-detects the hazard; only a new incident reaches clients
+        _, notify = incident_engine.ingest(alert, payload.get("lat"), payload.get("lng"),
+                                           result["captured_at"], transient=True)
+        if notify:
+            payload["alert"] = alert
+            _warm_routes(payload)
+        return payload
+    payload.update(latest_readings.location(node_id))
+    return payload
+
+
+async def consume_detections():
+    """Turn detections coming back from the vision workers into camera readings."""
+    ingest_seconds, readings = INGEST_SECONDS.labels("camera"), READINGS.labels("camera")
     while True:
-        try:
-            if not cap.isOpened():
-                print("Reconnecting to DroidCam video stream...")
-                cap.open(DROIDCAM_URL)
-                import time
-                time.sleep(2)
-                continue
-
-            ret, frame = cap.read()
-            
-            if ret and frame is not None:
-                is_danger = False
-                danger_type = ""
-                confidence_val = 0.0
-                
-                if FIRE_MODEL is not None:
-                    # Run YOLOv8 inference
-                    results = FIRE_MODEL(frame, verbose=False)
-                    
-                    for r in results:
-                        for box in r.boxes:
-                            label = FIRE_MODEL.names[int(box.cls)]
-                            conf = float(box.conf)
-                            
-                            # Example: check for Fire (if custom model) or cars/trucks for "accident" proxy
-                            # We trigger danger if we see 'fire' or if we want to simulate an accident, 'car' with high conf in a specific zone.
-                            # For hackathon purposes, we will flag 'fire', 'car', 'truck', 'bus' as potential hazards if confidence is very high.
-                            if conf > 0.7:
-                                if label.lower() in ["fire", "smoke", "accident", "car crash", "car", "truck"]:
-                                    is_danger = True
-                                    danger_type = label.upper()
-                                    confidence_val = conf
-                                    print(f"⚠️ DANGER DETECTED!! ({danger_type} - Confidence: {conf:.2f})")
-                
-                if is_danger:
-                    # Push a websocket alert for the camera sensor
-                    alert_payload = {
-                        "sensor": "camera",
-                        "value": int(confidence_val * 100),
-                        "timestamp": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
-                        "threat_level": "critical",
-                        "alert": {
-                            "title": f"{danger_type} DETECTED!",
-                            "message": f"Camera detected {danger_type} with {confidence_val:.2f} confidence.",
-                            "severity": "critical",
-                            "sensor": "camera"
-                        }
-                    }
-                    latest_sensor_data["camera"] = alert_payload
-                    print(f"DEBUG: Camera Alert Sent - {danger_type}")
-                    if manager:
-                        asyncio.run_coroutine_threadsafe(manager.broadcast(alert_payload), loop)
-                else:
-                    # Notify safe state to clear alerts
-                    safe_payload = {
-                        "sensor": "camera",
-                        "value": 0,
-                        "timestamp": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
-                        "threat_level": "safe"
-                    }
-                    latest_sensor_data["camera"] = safe_payload
-                    
-                    if manager:
-                        asyncio.run_coroutine_threadsafe(manager.broadcast(safe_payload), loop)
-            else:
-                print("Failed to read frame, reconnecting...")
-                cap.release()
-                
-        except Exception as e:
-            print(f"Error polling DroidCam: {e}")
-            
-        import time
-        time.sleep(1)
+        result = await vision_pool.results.get()
+        started = time.perf_counter()
+        payload = _camera_payload(result)
+        latest_readings.update(payload)
+        reading_writer.submit(payload, result["captured_at"])
+        await publish(payload)
+        readings.inc()
+        ingest_seconds.observe(time.perf_counter() - started)
+
+background_tasks = []
 
 @app.on_event("startup")
 async def startup_event():
     global loop
     loop = asyncio.get_running_loop()
-    threading.Thread(target=poll_camera_fire_detection_sync, daemon=True).start()
+
+    db = SessionLocal()
+    try:
+        latest_readings.load_positions(db.query(SensorPosition).all())
+        threat_detector.load_overrides(db.query(SensorThreshold).all())
+        cameras = db.query(Camera).all()
+    finally:
+        db.close()
+    incident_log.load()
+    position_chain.adopt()
+    position_snapshot.listeners.append(latest_readings.apply_position_changes)  # incl. imports from the CLI
+    position_snapshot.load()
+
+    loop.run_in_executor(None, road_graph.load)  # parsing an extract can take a while; routes fall back until then
+    vision_pool.start(loop)
+    if cameras:
+        vision_pool.cameras.sync(cameras)
+    else:
+        vision_pool.cameras.add(latest_readings.resolve_node("camera"), DROIDCAM_URL, DROIDCAM_FPS)
+    background_tasks.append(asyncio.create_task(consume_detections()))
+    background_tasks.append(asyncio.create_task(broadcast_keyframes()))
+    background_tasks.append(asyncio.create_task(reading_writer.run()))
+    background_tasks.append(asyncio.create_task(archive.run()))
+    background_tasks.append(asyncio.create_task(incident_log.run()))
+    background_tasks.append(asyncio.create_task(position_chain.run()))
+    background_tasks.append(asyncio.create_task(position_snapshot.run()))
+    background_tasks.append(asyncio.create_task(outbox.run()))  # batch roots for sensor_chain
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task in background_tasks:
+        task.cancel()
+    vision_pool.stop()
+    reading_writer.flush()  # persist whatever the write-behind buffer still holds
+    incident_log.flush()
+    evacuation_planner.shutdown()
 
 # ----------------------------
 # CORS — allow browser connections from any origin on the LAN
@@ -152,6 +167,10 @@ app.add_middleware(
 # Sensor Positions REST API
 # ----------------------------
 app.include_router(positions_router)
+app.include_router(cameras_router)
+app.include_router(alerts_router)
+app.include_router(history_router)
+app.include_router(thresholds_router)
 
 # ----------------------------
 # Serve frontend from /static
@@ -172,6 +191,32 @@ class LoginRequest(BaseModel):
 
 class ValueOnly(BaseModel):
     value: float
+    node_id: Optional[str] = None
+
+
+# the sensor types the threat detector has rules for, by their endpoint names (POST /sensor/<name>)
+SensorName = Literal["temperature", "humidity", "gas-leakage", "ultrasonic", "seismic"]
+
+
+class SensorRecord(BaseModel):
+    sensor: SensorName
+    value: float
+    node_id: Optional[str] = None
+    ts: Optional[float] = None  # unix seconds from the node; server time if omitted or implausible
+
+
+class PlanUser(BaseModel):
+    id: str  # device / user id, echoed back in the plan
+    lat: float
+    lng: float
+
+
+class EvacuationPlanRequest(BaseModel):
+    users: List[PlanUser]
+    danger_lat: Optional[float] = None
+    danger_lng: Optional[float] = None
+    capacity_aware: bool = False  # keep every SAFE_EXITS point within its capacity
+    include_routes: bool = False  # polylines are large; off by default
 
 
 # ----------------------------
@@ -205,36 +250,70 @@ async def login(credentials: LoginRequest):
 # WebSocket Manager
 # ----------------------------
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+manager = ConnectionManager()
+delta_filter = DeltaFilter()
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
+Gauge("aura_ws_connections", "Connected WebSocket clients", lambda: len(manager.clients))
+Gauge("aura_ws_queue_depth", "Messages queued for WebSocket clients, all of them", lambda: sum(manager.queue_depths()))
+Gauge("aura_ws_queue_depth_max", "Messages queued for the most backed-up client",
+      lambda: max(manager.queue_depths(), default=0))
 
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
 
-    async def broadcast(self, message: dict):
-        for connection in self.active_connections:
-            await connection.send_json(message)
+async def publish(payload: dict):
+    """Broadcast a reading unless delta mode decides it adds nothing new."""
+    if delta_filter.should_send(payload):
+        await manager.broadcast(payload)
 
 
-manager = ConnectionManager()
+async def broadcast_keyframes():
+    """Flush readings held back by the per-stream rate limit."""
+    while True:
+        await asyncio.sleep(delta_filter.min_interval or 1.0)
+        payloads = delta_filter.flush_dirty(lambda node_id, sensor: latest_readings.get(sensor, node_id))
+        if payloads:
+            await manager.broadcast({"sensor": "batch", "readings": payloads})
 
 
 # ----------------------------
 # WebSocket Endpoint
 # ----------------------------
 
+def handle_client_message(websocket: WebSocket, text: str):
+    try:
+        message = json.loads(text)
+    except ValueError:
+        return  # plain keep-alive
+    if not isinstance(message, dict):
+        return
+
+    action = message.get("action")
+    if action == "subscribe":
+        try:
+            subscription = Subscription.from_message(message)
+        except (TypeError, ValueError) as e:
+            manager.send(websocket, {"type": "error", "message": str(e)})
+            return
+        manager.subscribe(websocket, subscription)
+        manager.send(websocket, {"type": "subscription", "filters": subscription.to_dict()})
+    elif action == "unsubscribe":
+        manager.subscribe(websocket, Subscription())
+        manager.send(websocket, {"type": "subscription", "filters": {}})
+
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
+    # Late joiners start from the current state; delta mode only sends changes
+    snapshot = latest_readings.snapshot()
+    if snapshot:
+        manager.send(websocket, {"sensor": "batch", "readings": snapshot})
     try:
         while True:
-            await websocket.receive_text()  # keep connection alive
-    except WebSocketDisconnect:
+            text = await websocket.receive_text()  # keep-alives and subscription requests
+            handle_client_message(websocket, text)
+    except (WebSocketDisconnect, RuntimeError):
+        pass  # RuntimeError: the writer already evicted and closed this socket
+    finally:
         manager.disconnect(websocket)
 
 
@@ -242,101 +321,212 @@ async def websocket_endpoint(websocket: WebSocket):
 # Sensor Endpoints (Arduino POSTs here)
 # ----------------------------
 
-async def process_sensor(sensor_name: str, value: float):
+INGEST_SECONDS = Histogram("aura_ingest_seconds", "One reading from arrival to broadcast", labels=["sensor"])
+INGEST_BATCH_SECONDS = Histogram("aura_ingest_batch_seconds", "One /sensor/batch from arrival to broadcast")
+READINGS = Counter("aura_readings_total", "Readings ingested", ["sensor"])
+
+# a node's own ts is used only inside this window around server time; anything
+# else (an unset RTC reporting 1970, a clock years ahead) would expire every
+# incident or skew the trend windows, so the reading gets the server time instead
+NODE_CLOCK_SKEW = float(os.getenv("NODE_CLOCK_SKEW", "60"))  # seconds a node's clock may run ahead
+NODE_MAX_BACKLOG = float(os.getenv("NODE_MAX_BACKLOG", "86400"))  # oldest buffered reading kept at its ts
+SENSOR_BATCH_MAX = int(os.getenv("SENSOR_BATCH_MAX", "1000"))  # readings per /sensor/batch
+
+
+def _iso_timestamp(ts: Optional[float] = None) -> str:
+    when = datetime.fromtimestamp(ts, timezone.utc) if ts is not None else datetime.now(timezone.utc)
+    return when.isoformat().replace("+00:00", "Z")
+
+
+def _warm_routes(payload: dict):
+    """Plan evacuation routes around a new critical danger point before anyone asks for them."""
+    if "lat" in payload and road_graph.ready:
+        loop.run_in_executor(None, route_cache.precompute, payload["lat"], payload["lng"],
+                             incident_engine.hazards())
+
+
+def _reading_ts(ts: Optional[float], node_id: str) -> float:
+    """The node's ts if it is plausible, otherwise server time."""
+    now = time.time()
+    if ts is None:
+        return now
+    if not now - NODE_MAX_BACKLOG <= ts <= now + NODE_CLOCK_SKEW:  # also NaN
+        log.warning("node_clock_skew", node_id, node_id=node_id, ts=ts, skew=ts - now)
+        return now
+    return ts
+
+
+def _build_payload(sensor_name: str, value: float, node_id: str, threat_level: str,
+                   alert: Optional[dict], ts: Optional[float] = None) -> dict:
+    ts = _reading_ts(ts, node_id)
+    # rate-of-change and outlier warnings, even while inside the fixed thresholds
+    trending, trend_alert = anomaly_detector.observe(sensor_name, value, node_id, ts)
+    if trending and threat_level == SAFE:
+        threat_level = WARNING
+    alert = alert or trend_alert
+
     # Base payload structure
     payload = {
         "sensor": sensor_name,
+        "node_id": node_id,
         "value": value,
-        "timestamp": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+        "timestamp": _iso_timestamp(ts),
+        "threat_level": threat_level,
     }
-    
-    # Analyze threat level via ThreatDetector
-    alert = threat_analyzer.analyze(sensor_name, value)
-    
+    payload.update(latest_readings.location(node_id))
+
+    # alerts only exist on level transitions; the incident engine folds repeats and
+    # neighbours into one incident and decides which of them clients hear about
     if alert:
-        payload["threat_level"] = alert["severity"]
-        if alert["severity"] in ["warning", "critical"]:
+        _, notify = incident_engine.ingest(alert, payload.get("lat"), payload.get("lng"), ts,
+                                           transient=alert is trend_alert)
+        if notify and alert["severity"] in (WARNING, CRITICAL):
             payload["alert"] = alert
-    else:
-        payload["threat_level"] = "safe"
+            if alert["severity"] == CRITICAL:
+                _warm_routes(payload)
+
+    latest_readings.update(payload)
+    reading_writer.submit(payload, ts)  # history is written behind, off the request path
+    return payload
 
-    latest_sensor_data[sensor_name] = payload
-    print(f"DEBUG: Received {sensor_name}: {value} | Threat: {payload.get('threat_level')}")
-    await manager.broadcast(payload)  # push to all WebSocket clients (map)
+
+async def process_sensor(sensor_name: str, value: float, node_id: Optional[str] = None):
+    started = time.perf_counter()
+    node_id = latest_readings.resolve_node(sensor_name, node_id)
+    # Analyze threat level via ThreatDetector
+    threat_level, alert = threat_detector.analyze(sensor_name, value, node_id)
+    payload = _build_payload(sensor_name, value, node_id, threat_level, alert)
+    log.debug("reading", sensor_name, sensor=sensor_name, node=node_id, value=value, threat=threat_level)
+    await publish(payload)  # push to interested WebSocket clients (map)
+    READINGS.labels(sensor_name).inc()
+    INGEST_SECONDS.labels(sensor_name).observe(time.perf_counter() - started)
+
+
+async def process_batch(records: List[SensorRecord]) -> int:
+    """Analyze a batch of readings and push them to clients as one message.
+
+    Readings for the same (node, sensor) stream are coalesced so only the
+    newest one is broadcast; all of them still go through the detector.
+    """
+    started = time.perf_counter()
+    node_ids = [latest_readings.resolve_node(r.sensor, r.node_id) for r in records]
+    results = threat_detector.analyze_batch([(r.sensor, r.value, node_id) for r, node_id in zip(records, node_ids)])
+
+    latest = {}
+    for record, node_id, (threat_level, alert) in zip(records, node_ids, results):
+        payload = _build_payload(record.sensor, record.value, node_id, threat_level, alert, record.ts)
+        previous = latest.get((node_id, record.sensor))
+        if previous and "alert" in previous and previous["threat_level"] == payload["threat_level"]:
+            payload.setdefault("alert", previous["alert"])  # keep the transition's alert through coalescing
+        latest[(node_id, record.sensor)] = payload
+
+    readings = [payload for payload in latest.values() if delta_filter.should_send(payload)]
+    if readings:
+        await manager.broadcast({"sensor": "batch", "readings": readings})
+    for record in records:
+        READINGS.labels(record.sensor).inc()
+    INGEST_BATCH_SECONDS.observe(time.perf_counter() - started)
+    return len(readings)
+
+
+@app.get("/health")
+async def health():
+    """API readiness; the vision subsystem warms up in the background."""
+    return {"status": "ok", "vision": vision_pool.status(), "persistence": reading_writer.stats(),
+            "archive": archive.stats(), "incidents": incident_engine.stats(),
+            "incident_log": incident_log.stats(), "routing": road_graph.stats(),
+            "route_cache": route_cache.stats(), "outbox": outbox.stats(),
+            "integrity": position_chain.stats(), "positions": position_snapshot.stats()}
+
+
+@app.get("/metrics")
+async def metrics():
+    """Hot-path metrics in the Prometheus text format (services/metrics.py)."""
+    return Response(registry.render(), media_type=CONTENT_TYPE)
+
+
+@app.get("/vision/stats")
+async def get_vision_stats():
+    """Per-camera frame age, inference latency and dropped frame counts."""
+    return vision_pool.report()
 
 
 @app.get("/sensor/all-data")
-async def get_sensor_data():
-    return list(latest_sensor_data.values())
+async def get_sensor_data(sensor: Optional[str] = None, bbox: Optional[str] = None):
+    """Latest reading per node. bbox is "min_lat,min_lng,max_lat,max_lng"."""
+    box = None
+    if bbox:
+        try:
+            box = tuple(float(v) for v in bbox.split(","))
+        except ValueError:
+            box = ()
+        if len(box) != 4:
+            raise HTTPException(status_code=400, detail="bbox must be min_lat,min_lng,max_lat,max_lng")
+    return latest_readings.snapshot(sensor, box)
+
+
+@app.get("/sensor/trends")
+async def get_sensor_trends(sensor: Optional[str] = None, node_id: Optional[str] = None):
+    """Rolling statistics (EWMA, window std, slope per minute) and active trend warnings per stream."""
+    return anomaly_detector.snapshot(sensor, node_id)
+
+
+@app.post("/sensor/batch")
+async def sensor_batch(records: List[SensorRecord] = Body(max_length=SENSOR_BATCH_MAX)):
+    """Bulk ingest for nodes that buffer readings (see firmware httpQueue)."""
+    broadcast = await process_batch(records)
+    return {"status": "ok", "accepted": len(records), "broadcast": broadcast}
 
 
 @app.post("/sensor/temperature")
 async def temperature(data: ValueOnly):
-    await process_sensor("temperature", data.value)
+    await process_sensor("temperature", data.value, data.node_id)
     return {"status": "ok"}
 
 @app.post("/sensor/seismic")
 async def earthquake(data: ValueOnly):
-    await process_sensor("seismic", data.value)
+    await process_sensor("seismic", data.value, data.node_id)
     return {"status": "ok"}
 
 @app.post("/sensor/humidity")
 async def humidity(data: ValueOnly):
-    await process_sensor("humidity", data.value)
+    await process_sensor("humidity", data.value, data.node_id)
     return {"status": "ok"}
 
 
 @app.post("/sensor/gas-leakage")
 async def gas(data: ValueOnly):
-    await process_sensor("gas-leakage", data.value)
+    await process_sensor("gas-leakage", data.value, data.node_id)
     return {"status": "ok"}
 
 
 @app.get("/evacuation/route")
-async def get_evacuation_route(danger_lat: float, danger_lng: float):
-    # Simulated routing around danger
-    # Real app would use a routing engine like OSRM or Google Maps Directions
-    # Generates a path that cuts through the danger (blocked)
-    # And a path that routes around it in a semicircle (safe)
-    
-    offset = 0.005 # rough degree offset (~500m)
-    
-    start_point = [danger_lat - offset, danger_lng]
-    end_point = [danger_lat + offset, danger_lng]
-    
-    # Blocked route goes straight through the danger point
-    blocked_route = [start_point, [danger_lat, danger_lng], end_point]
-    
-    # Safe route curves around the danger point to the east
-    safe_route = [
-        start_point,
-        [danger_lat - (offset/2), danger_lng + offset],
-        [danger_lat, danger_lng + (offset * 1.5)],
-        [danger_lat + (offset/2), danger_lng + offset],
-        end_point
-    ]
-    
-    return {
-        "status": "success",
-        "danger_zone": [danger_lat, danger_lng],
-        "blocked_route": blocked_route,
-        "safe_route": safe_route,
-        "safe_exit": {
-            "lat": end_point[0],
-            "lng": end_point[1],
-            "distance_m": int(offset * 111000 * 2),  # Rough degree-to-meter conversion
-            "estimated_time_min": 3
-        },
-        "user_location": {
-            "lat": start_point[0],
-            "lng": start_point[1]
-        }
-    }
+async def get_evacuation_route(danger_lat: float, danger_lng: float,
+                               user_lat: Optional[float] = None, user_lng: Optional[float] = None):
+    # Road-graph A* around the danger point and every open incident (straight line without a graph),
+    # shared by everyone in the same ROUTE_CACHE_CELL_M cell
+    route = await asyncio.get_running_loop().run_in_executor(
+        None, route_cache.route, danger_lat, danger_lng, user_lat, user_lng, incident_engine.hazards())
+    return {"status": "success", **route}
+
+
+@app.post("/evacuation/plan")
+async def plan_evacuation(request: EvacuationPlanRequest):
+    """Exits (and optionally routes) for many users at once, e.g. every device in a flood zone."""
+    if len(request.users) > evacuation_planner.PLAN_MAX_USERS:
+        raise HTTPException(status_code=413,
+                            detail=f"At most {evacuation_planner.PLAN_MAX_USERS} users per plan")
+    users = [user.model_dump() for user in request.users]
+    hazards = incident_engine.hazards()
+    result = await asyncio.get_running_loop().run_in_executor(
+        None, evacuation_planner.plan, users, request.danger_lat, request.danger_lng, hazards,
+        request.capacity_aware, request.include_routes)
+    return {"status": "success", **result}
 
 
 @app.post("/sensor/ultrasonic")
 async def ultrasonic(data: ValueOnly):
-    await process_sensor("ultrasonic", data.value)
+    await process_sensor("ultrasonic", data.value, data.node_id)
     return {"status": "ok"}
 
 
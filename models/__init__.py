@@ -1,10 +1,17 @@
-from sqlalchemy import Column, Integer, Float, DateTime
-from datetime import datetime
+from sqlalchemy import Column, Integer, Float, String, Index
 from config.db import Base
 
 class SensorReading(Base):
     __tablename__ = "sensor_readings"
 
-    id = Column(Integer, primary_key=True, index=True)
-    distance = Column(Float)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    id = Column(Integer, primary_key=True)
+    node_id = Column(String, nullable=False)
+    sensor_type = Column(String, nullable=False)
+    value = Column(Float, nullable=False)
+    threat_level = Column(String, nullable=False)
+    ts = Column(Float, nullable=False)  # unix seconds
+
+    __table_args__ = (
+        Index("ix_sensor_readings_stream_ts", "sensor_type", "node_id", "ts"),
+        Index("ix_sensor_readings_ts", "ts"),
+    )
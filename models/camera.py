@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey
+from datetime import datetime
+from config.db import Base
+
+
+class Camera(Base):
+    __tablename__ = "cameras"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+    url = Column(String, nullable=False)  # RTSP/HTTP stream URL or local video file
+    sampling_fps = Column(Float, nullable=False, default=1.0)
+    enabled = Column(Boolean, nullable=False, default=True)
+    # map marker, if placed; one camera per position, as the position id is also its stream key
+    position_id = Column(Integer, ForeignKey("sensor_positions.id"), nullable=True, unique=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    @property
+    def camera_id(self) -> str:
+        """Stream key; also the node_id of its readings, joined to the position when placed."""
+        return str(self.position_id) if self.position_id is not None else f"camera-{self.id}"
@@ -0,0 +1,48 @@
+from sqlalchemy import Column, Integer, String, Float, Text, Index
+from config.db import Base
+
+
+class IncidentRecord(Base):
+    """Persisted state of an incident (services/incidents.py); the rows behind /alerts."""
+    __tablename__ = "incidents"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)  # assigned by the incident engine
+    version = Column(Integer, nullable=False)  # bumped on every change, drives since= and ETags
+    status = Column(String, nullable=False)
+    severity = Column(String, nullable=False)
+    title = Column(String, nullable=False)
+    message = Column(String, nullable=False)
+    lat = Column(Float, nullable=True)
+    lng = Column(Float, nullable=True)
+    created_at = Column(Float, nullable=False)  # unix seconds
+    updated_at = Column(Float, nullable=False)
+    resolved_at = Column(Float, nullable=True)
+    alert_count = Column(Integer, nullable=False)
+    suppressed = Column(Integer, nullable=False)
+    active_streams = Column(Integer, nullable=False)
+    sensors = Column(Text, nullable=False)  # JSON lists, for display; filters use incident_streams
+    node_ids = Column(Text, nullable=False)
+    alerts = Column(Text, nullable=False)
+
+    # every listing pages backwards by id, so each filter index ends in id
+    __table_args__ = (
+        Index("ix_incidents_version", "version", unique=True),
+        Index("ix_incidents_status_id", "status", "id"),
+        Index("ix_incidents_severity_id", "severity", "id"),
+        Index("ix_incidents_created_at", "created_at"),
+    )
+
+
+class IncidentStream(Base):
+    """(node, sensor) streams that contributed to an incident."""
+    __tablename__ = "incident_streams"
+
+    sensor = Column(String, primary_key=True)
+    incident_id = Column(Integer, primary_key=True)
+    node_id = Column(String, primary_key=True)
+
+    __table_args__ = (
+        Index("ix_incident_streams_node", "node_id", "incident_id"),
+        Index("ix_incident_streams_incident", "incident_id"),
+        {"sqlite_with_rowid": False},
+    )
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, Float, String, Text, Index
+from config.db import Base
+
+
+class OutboxEvent(Base):
+    """A delivery to an external service, written in the same transaction as the change it reports."""
+    __tablename__ = "outbox"
+
+    id = Column(Integer, primary_key=True)
+    key = Column(String, nullable=False, unique=True)  # idempotency key, sent as the Idempotency-Key header
+    path = Column(String, nullable=False)  # e.g. /register, relative to OUTBOX_BASE_URL
+    payload = Column(Text, nullable=False)  # JSON body
+    status = Column(String, nullable=False, default="pending")  # pending | delivered | dead
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(Float, nullable=False)  # unix seconds
+    created_at = Column(Float, nullable=False)
+    delivered_at = Column(Float, nullable=True)
+    last_error = Column(String, nullable=True)
+
+    __table_args__ = (
+        Index("ix_outbox_due", "status", "next_attempt_at"),
+    )
@@ -0,0 +1,35 @@
+from sqlalchemy import Column, Integer, Float, String, Index
+from config.db import Base
+
+
+class PositionChainEntry(Base):
+    """One position change in the append-only hash chain; linked and batched by services/integrity.py."""
+    __tablename__ = "position_chain"
+
+    seq = Column(Integer, primary_key=True)  # chain order = commit order
+    position_id = Column(Integer, nullable=False)
+    action = Column(String, nullable=False)  # CREATED | DELETED
+    data_hash = Column(String, nullable=False)  # generate_position_hash() of the row
+    created_at = Column(Float, nullable=False)  # unix seconds
+    prev_hash = Column(String, nullable=True)  # NULL until the entry is sealed into a batch
+    entry_hash = Column(String, nullable=True)  # sha256(prev_hash + data_hash)
+    batch_id = Column(Integer, nullable=True)
+    leaf = Column(Integer, nullable=True)  # index in the batch's Merkle tree
+
+    __table_args__ = (
+        Index("ix_position_chain_position", "position_id"),
+        Index("ix_position_chain_batch", "batch_id", "seq"),
+    )
+
+
+class ChainBatch(Base):
+    """A Merkle root over consecutive chain entries, anchored to sensor_chain through the outbox."""
+    __tablename__ = "chain_batches"
+
+    id = Column(Integer, primary_key=True)
+    first_seq = Column(Integer, nullable=False)
+    last_seq = Column(Integer, nullable=False)
+    size = Column(Integer, nullable=False)
+    root = Column(String, nullable=False)
+    chain_head = Column(String, nullable=False)  # entry_hash of last_seq
+    created_at = Column(Float, nullable=False)
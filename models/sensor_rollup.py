@@ -0,0 +1,36 @@
+from sqlalchemy import Column, Integer, String, Float
+from config.db import Base
+
+
+class _RollupColumns:
+    """One row per (sensor_type, node_id, bucket); buckets start at multiples of `resolution`."""
+    sensor_type = Column(String, primary_key=True)
+    node_id = Column(String, primary_key=True)
+    bucket = Column(Integer, primary_key=True)  # bucket start, unix seconds
+    count = Column(Integer, nullable=False)
+    sum = Column(Float, nullable=False)
+    min = Column(Float, nullable=False)
+    max = Column(Float, nullable=False)
+    last = Column(Float, nullable=False)
+    last_ts = Column(Float, nullable=False)
+
+    # clustered on the primary key: a node's buckets are contiguous on disk
+    __table_args__ = {"sqlite_with_rowid": False}
+
+
+class SensorRollup1m(_RollupColumns, Base):
+    __tablename__ = "sensor_rollups_1m"
+    resolution = 60
+
+
+class SensorRollup1h(_RollupColumns, Base):
+    __tablename__ = "sensor_rollups_1h"
+    resolution = 3600
+
+
+class SensorRollup1d(_RollupColumns, Base):
+    __tablename__ = "sensor_rollups_1d"
+    resolution = 86400
+
+
+ROLLUPS = [SensorRollup1m, SensorRollup1h, SensorRollup1d]  # finest first
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, String, Float, UniqueConstraint
+from config.db import Base
+
+
+class SensorThreshold(Base):
+    """Overrides the config/thresholds.json levels for a sensor type, or for one node of it."""
+    __tablename__ = "sensor_thresholds"
+
+    id = Column(Integer, primary_key=True, index=True)
+    sensor_type = Column(String, nullable=False)
+    node_id = Column(String, nullable=True)  # NULL = every node of this sensor type
+    warning = Column(Float, nullable=False)
+    critical = Column(Float, nullable=False)
+
+    __table_args__ = (UniqueConstraint("sensor_type", "node_id"),)
@@ -1,24 +1,92 @@
-from fastapi import APIRouter
-from services.threat_detector import alert_history
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.orm import Session
+
+from routes.sensor_positions import get_db
+from services.incident_log import incident_log
+from services.incidents import incident_engine, OPEN, RESOLVED
+from services.threat_detector import LEVELS
 
 router = APIRouter(prefix="/alerts", tags=["alerts"])
 
 
+def _not_modified(request: Request, response: Response, version: int) -> Optional[Response]:
+    """304 when the client already holds this version, else stamp the ETag on the response."""
+    etag = f'"{version}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return None
+
+
+# ---------- Endpoints ----------
+
 @router.get("")
-def get_alerts(limit: int = 20):
-    """Return the most recent alerts."""
-    return list(alert_history)[:limit]
+def get_alerts(
+    request: Request,
+    response: Response,
+    limit: int = Query(20, gt=0, le=500),
+    cursor: Optional[int] = Query(None, description="next_cursor of the previous page"),
+    since: Optional[int] = Query(None, ge=0, description="only incidents changed after this version"),
+    status: Optional[str] = Query(None, description="open | resolved"),
+    severity: Optional[str] = Query(None, description="safe | warning | critical"),
+    sensor: Optional[str] = None,
+    node_id: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """Persisted incidents, newest first, one page at a time.
+
+    Follow next_cursor for older pages. Pollers pass the returned version as
+    since= (or its ETag as If-None-Match) to get only what changed, or a 304.
+    The ETag is always the version in the body, so a since= page cut short by
+    limit never answers its own continuation with a 304.
+    """
+    if status not in (None, OPEN, RESOLVED):
+        raise HTTPException(status_code=400, detail=f"Unknown status: {status}")
+    if severity not in (None, *LEVELS):
+        raise HTTPException(status_code=400, detail=f"Unknown severity: {severity}")
+    version = incident_log.version
+    filters = {"status": status, "severity": severity, "sensor": sensor, "node_id": node_id}
+    if since is None or since >= version:
+        not_modified = _not_modified(request, response, version)
+        if not_modified is not None:
+            return not_modified
+        if since is None:
+            items, next_cursor = incident_log.page(db, limit, cursor, **filters)
+            return {"items": items, "next_cursor": next_cursor, "version": version}
+        return {"items": [], "next_cursor": None, "version": version}
+
+    # behind the head: never 304, whatever the client's ETag, there are changes to send
+    items = incident_log.changes(db, since, limit, **filters)
+    if len(items) == limit:
+        version = items[-1]["version"]  # more changes pending: continue from here
+    response.headers["ETag"] = f'"{version}"'
+    return {"items": items, "next_cursor": None, "version": version}
 
 
 @router.get("/latest")
-def get_latest_alert():
-    """Return the single most recent alert, or null."""
-    if alert_history:
-        return alert_history[0]
+async def get_latest_alert():
+    """Return the single most recent incident, or null."""
+    incidents = incident_engine.query(limit=1)
+    if incidents:
+        return incidents[0]
     return {"message": "No alerts"}
 
 
 @router.get("/active")
-def get_active_alerts():
-    """Return only WARNING and CRITICAL alerts (non-safe)."""
-    return [a for a in alert_history if a["severity"] != "safe"]
+async def get_active_alerts(request: Request, response: Response, limit: int = Query(100, gt=0, le=1000)):
+    """Return only open incidents (served from memory)."""
+    incident_engine.expire()
+    not_modified = _not_modified(request, response, incident_engine.version)
+    if not_modified is not None:
+        return not_modified
+    return incident_engine.query(limit, status=OPEN)
+
+
+@router.get("/{incident_id}")
+def get_alert(incident_id: int, db: Session = Depends(get_db)):
+    incident = incident_engine.get(incident_id) or incident_log.get(db, incident_id)
+    if incident is None:
+        raise HTTPException(status_code=404, detail="Incident not found")
+    return incident
@@ -0,0 +1,75 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from models.camera import Camera
+from routes.sensor_positions import get_db
+from services.vision import vision_pool
+
+router = APIRouter(prefix="/cameras", tags=["cameras"])
+
+
+# ---------- Schemas ----------
+
+class CameraCreate(BaseModel):
+    name: str
+    url: str
+    sampling_fps: float = Field(1.0, gt=0, le=30)
+    enabled: bool = True
+    position_id: Optional[int] = None
+
+
+class CameraOut(BaseModel):
+    id: int
+    name: str
+    url: str
+    sampling_fps: float
+    enabled: bool
+    position_id: Optional[int]
+    camera_id: str
+    health: Optional[dict] = None
+
+    class Config:
+        from_attributes = True
+
+
+def _with_health(camera: Camera) -> CameraOut:
+    out = CameraOut.model_validate(camera)
+    stream = vision_pool.cameras.streams.get(camera.camera_id)
+    out.health = stream.health() if stream else None
+    return out
+
+
+# ---------- Endpoints ----------
+
+@router.get("", response_model=List[CameraOut])
+def list_cameras(db: Session = Depends(get_db)):
+    return [_with_health(camera) for camera in db.query(Camera).all()]
+
+
+@router.post("", response_model=CameraOut)
+def create_camera(data: CameraCreate, db: Session = Depends(get_db)):
+    # two cameras on one position would share a stream key and replace each other's capture
+    if data.position_id is not None and \
+            db.query(Camera).filter(Camera.position_id == data.position_id).first() is not None:
+        raise HTTPException(status_code=409, detail=f"Position {data.position_id} already has a camera")
+    camera = Camera(**data.model_dump())
+    db.add(camera)
+    db.commit()
+    db.refresh(camera)
+
+    if camera.enabled:
+        vision_pool.cameras.add(camera.camera_id, camera.url, camera.sampling_fps)
+    return _with_health(camera)
+
+
+@router.delete("/{camera_id}")
+def delete_camera(camera_id: int, db: Session = Depends(get_db)):
+    camera = db.query(Camera).filter(Camera.id == camera_id).first()
+    if not camera:
+        raise HTTPException(status_code=404, detail="Camera not found")
+
+    vision_pool.cameras.remove(camera.camera_id)
+    db.delete(camera)
+    db.commit()
+    return {"status": "deleted"}
@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+import time
+from routes.sensor_positions import get_db
+from services.history import DEFAULT_POINTS, query_history
+from services.sensor_store import normalize_sensor_type
+
+router = APIRouter(prefix="/history", tags=["history"])
+
+DEFAULT_RANGE = 6 * 3600  # seconds
+
+
+# ---------- Endpoints ----------
+
+@router.get("/{sensor_type}")
+def get_history(
+    sensor_type: str,
+    node_id: Optional[List[str]] = Query(None),
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    step: Optional[float] = Query(None, gt=0),
+    points: int = Query(DEFAULT_POINTS, gt=0, le=10000),
+    db: Session = Depends(get_db),
+):
+    """Downsampled readings per node: min/max/avg/last/count per bucket.
+
+    start/end are unix seconds (default: the last 6 hours). Without an
+    explicit step the range is split into about `points` buckets.
+    """
+    end = time.time() if end is None else end
+    start = end - DEFAULT_RANGE if start is None else start
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    return query_history(db, normalize_sensor_type(sensor_type), start, end, step, points, node_id)
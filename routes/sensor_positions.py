@@ -1,57 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import List, Optional
-import hashlib
-import json
-import requests
 from config.db import SessionLocal
 from models.sensor_position import SensorPosition
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-FRONTEND_SERVER_URL = os.getenv("FRONTEND_SERVER_URL", "http://localhost:3030")
+from services.integrity import generate_position_hash, position_chain, position_dict, record
+from services.outbox import outbox
+from services.position_import import FORMATS, PositionImport, stream_lines
+from services.position_snapshot import position_snapshot
+from services.sensor_store import latest_readings
 
 router = APIRouter(prefix="/positions", tags=["positions"])
 
 
-# ---------- Blockchain Integrity ----------
-
-def generate_position_hash(pos_dict: dict, action: str) -> str:
-    """Generates a SHA-256 hash for the sensor position data."""
-    payload = {
-        "action": action,
-        "data": pos_dict
-    }
-    # Sort keys to ensure deterministic hash
-    payload_str = json.dumps(payload, sort_keys=True)
-    return hashlib.sha256(payload_str.encode('utf-8')).hexdigest()
-
-def send_to_blockchain(sensor_id: int, data_hash: str):
-    """Sends the hash to the local Rust blockchain service."""
-    url = f"{FRONTEND_SERVER_URL}/register" 
-    payload = {
-        "sensor_id": sensor_id,
-        "data_hash": data_hash
-    }
-    try:
-        response = requests.post(url, json=payload, timeout=5)
-        response.raise_for_status()
-        print(f"✅ Blockchain sync success for sensor {sensor_id}: {response.json()}")
-    except Exception as e:
-        print(f"❌ Blockchain sync failed for sensor {sensor_id}: {e}")
-
-    # Forward the new sensor registration payload to the standalone Notification Server
-    try:
-        url = f"{FRONTEND_SERVER_URL}/register"
-        response = requests.post(url, json=payload, timeout=5)
-        response.raise_for_status()
-        print(f"✅ Notification server sync success for sensor {sensor_id}: {response.json()}")
-    except Exception as e:
-        print(f"Error notifying Flutter UI for position add: {e}")
-
-
 # ---------- DB Dependency ----------
 
 def get_db():
@@ -85,12 +48,45 @@ class SensorPositionOut(BaseModel):
 # ---------- Endpoints ----------
 
 @router.get("", response_model=List[SensorPositionOut])
-def list_positions(db: Session = Depends(get_db)):
-    return db.query(SensorPosition).all()
+async def list_positions(request: Request, since_version: Optional[int] = Query(None, ge=0)):
+    """Every position, from the in-memory snapshot; the ETag is the positions version.
+
+    With since_version, only what changed after it: {"version", "full", "upserts", "deleted"}
+    ("full": true when that version is too old and upserts is the whole list).
+    """
+    if since_version is None:
+        version, body = position_snapshot.listing()
+    else:
+        version, body = position_snapshot.delta(since_version)
+    headers = {"ETag": f'"{version}"', "X-Positions-Version": str(version)}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+@router.get("/nearby")
+def nearby_positions(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    k: int = Query(10, gt=0, le=1000),
+    radius_m: Optional[float] = Query(None, gt=0),
+    sensor_type: Optional[str] = None,
+):
+    """The k positions closest to a point, optionally within radius_m, from the in-memory index."""
+    return latest_readings.nearby(lat, lng, k, radius_m, sensor_type)
+
+
+@router.get("/{position_id}/proof")
+def position_proof(position_id: int):
+    """The position's chain entries with Merkle inclusion proofs against their anchored batch roots."""
+    proof = position_chain.proof(position_id)
+    if proof is None:
+        raise HTTPException(status_code=404, detail="Position not in the integrity chain")
+    return proof
 
 
 @router.post("", response_model=SensorPositionOut)
-def create_position(data: SensorPositionCreate, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+def create_position(data: SensorPositionCreate, db: Session = Depends(get_db)):
     pos = SensorPosition(
         name=data.name,
         lat=data.lat,
@@ -98,43 +94,58 @@ def create_position(data: SensorPositionCreate, background_tasks: BackgroundTask
         sensor_type=data.sensor_type,
     )
     db.add(pos)
+    db.flush()  # assigns the id the hash covers
+
+    # Blockchain Anti-Tamper: Log Creation in the integrity chain, committed together with the row
+    data_hash = generate_position_hash(position_dict(pos), "CREATED")
+    record(db, pos.id, "CREATED", data_hash)
     db.commit()
     db.refresh(pos)
-
-    # Blockchain Anti-Tamper: Log Creation
-    pos_dict = {
-        "id": pos.id,
-        "name": pos.name,
-        "lat": pos.lat,
-        "lng": pos.lng,
-        "sensor_type": pos.sensor_type
-    }
-    data_hash = generate_position_hash(pos_dict, "CREATED")
-    background_tasks.add_task(send_to_blockchain, pos.id, data_hash)
+    outbox.notify()  # deliver a CHAIN_REGISTER_EACH /register event now rather than on the next poll
+    position_snapshot.refresh()  # and, through its listener, the sensor store
 
     return pos
 
 
 @router.delete("/{position_id}")
-def delete_position(position_id: int, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+def delete_position(position_id: int, db: Session = Depends(get_db)):
     pos = db.query(SensorPosition).filter(SensorPosition.id == position_id).first()
     if not pos:
         raise HTTPException(status_code=404, detail="Position not found")
         
     # Blockchain Anti-Tamper: Log Deletion before it is gone from DB
-    pos_dict = {
-        "id": pos.id,
-        "name": pos.name,
-        "lat": pos.lat,
-        "lng": pos.lng,
-        "sensor_type": pos.sensor_type
-    }
-    data_hash = generate_position_hash(pos_dict, "DELETED")
+    data_hash = generate_position_hash(position_dict(pos), "DELETED")
 
     db.delete(pos)
+    record(db, position_id, "DELETED", data_hash)
     db.commit()
-
-    # Schedule the blockchain sync
-    background_tasks.add_task(send_to_blockchain, position_id, data_hash)
+    outbox.notify()
+    position_snapshot.refresh()
 
     return {"status": "deleted"}
+
+
+@router.post("/import")
+async def import_positions(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(jsonl|csv)$"),
+    dry_run: bool = False,
+):
+    """Bulk provisioning from a streamed JSON lines or CSV body (format defaults from the Content-Type).
+
+    Bad rows are skipped and reported by line; valid ones are committed in batches and sealed
+    into the integrity chain together once the body ends (services/position_import.py).
+    """
+    fmt = format or ("csv" if "csv" in request.headers.get("content-type", "") else FORMATS[0])
+    job = PositionImport(fmt, dry_run=dry_run)
+    loop = asyncio.get_running_loop()
+    try:
+        async for lines in stream_lines(request.stream()):
+            for batch in job.feed(lines):
+                await loop.run_in_executor(None, job.write, batch)
+        await loop.run_in_executor(None, job.write, job.finish())
+    except (UnicodeDecodeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail={"error": str(e), **job.report()})
+    finally:
+        await loop.run_in_executor(None, job.sync)
+    return job.report()
@@ -0,0 +1,71 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from pydantic import BaseModel
+from typing import Optional
+from models.sensor_threshold import SensorThreshold
+from routes.sensor_positions import get_db
+from services.sensor_store import normalize_sensor_type
+from services.threat_detector import threat_detector
+
+router = APIRouter(prefix="/thresholds", tags=["thresholds"])
+
+
+# ---------- Schemas ----------
+
+class ThresholdIn(BaseModel):
+    sensor_type: str
+    node_id: Optional[str] = None  # omit to override every node of the sensor type
+    warning: float
+    critical: float
+
+
+class ThresholdOut(BaseModel):
+    id: int
+    sensor_type: str
+    node_id: Optional[str]
+    warning: float
+    critical: float
+
+    class Config:
+        from_attributes = True
+
+
+# ---------- Endpoints ----------
+
+@router.get("")
+def get_thresholds():
+    """Effective rule per sensor type, with per-node overrides."""
+    return threat_detector.describe()
+
+
+@router.put("", response_model=ThresholdOut)
+def put_threshold(data: ThresholdIn, db: Session = Depends(get_db)):
+    sensor_type = normalize_sensor_type(data.sensor_type)
+    try:
+        threat_detector.set_threshold(sensor_type, data.warning, data.critical, data.node_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown sensor type: {sensor_type}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    same_node = SensorThreshold.node_id.is_(None) if data.node_id is None else SensorThreshold.node_id == data.node_id
+    row = db.query(SensorThreshold).filter(SensorThreshold.sensor_type == sensor_type, same_node).first()
+    if row is None:
+        row = SensorThreshold(sensor_type=sensor_type, node_id=data.node_id)
+        db.add(row)
+    row.warning, row.critical = data.warning, data.critical
+    db.commit()
+    db.refresh(row)
+    return row
+
+
+@router.delete("/{threshold_id}")
+def delete_threshold(threshold_id: int, db: Session = Depends(get_db)):
+    row = db.query(SensorThreshold).filter(SensorThreshold.id == threshold_id).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Threshold not found")
+
+    threat_detector.clear_threshold(row.sensor_type, row.node_id)
+    db.delete(row)
+    db.commit()
+    return {"status": "deleted"}
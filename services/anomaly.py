@@ -0,0 +1,200 @@
+"""
+Trend / Anomaly Detection
+Streaming statistics per (node, sensor) stream that catch what fixed
+thresholds miss: water rising fast while still "safe", a slow gas drift,
+a reading far outside the stream's normal noise.
+Each stream keeps, in constant memory and constant time per reading:
+  - EWMA mean and variance (z-score of the new reading against the EWMA,
+    scaled by the larger of the EWMA and window deviations)
+  - mean, variance and least-squares slope over a ring buffer of the last
+    ANOMALY_WINDOW readings, maintained with running sums
+Trend rules ("trend" blocks in config/thresholds.json) turn the statistics
+into warnings: rising/falling faster than a rate per minute, or |z| above
+ANOMALY_ZSCORE. Like the threshold detector, an alert is only built when a
+condition starts.
+"""
+import json
+import math
+import os
+from typing import Dict, List, Optional, Tuple
+
+from services.threat_detector import THRESHOLDS_FILE, WARNING, _create_alert
+
+ANOMALY_WINDOW = int(os.getenv("ANOMALY_WINDOW", "30"))
+ANOMALY_EWMA_ALPHA = float(os.getenv("ANOMALY_EWMA_ALPHA", "0.1"))
+ANOMALY_ZSCORE = float(os.getenv("ANOMALY_ZSCORE", "5"))
+ANOMALY_MIN_SAMPLES = int(os.getenv("ANOMALY_MIN_SAMPLES", "10"))
+
+
+class TrendRule:
+    __slots__ = ("min_std", "rise_per_min", "fall_per_min", "messages")
+
+    def __init__(self, min_std: float, messages: Dict[str, list],
+                 rise_per_min: Optional[float] = None, fall_per_min: Optional[float] = None):
+        self.min_std = min_std  # noise floor, keeps z-scores of flat signals finite
+        self.rise_per_min = rise_per_min
+        self.fall_per_min = fall_per_min
+        self.messages = messages
+
+
+def load_trend_rules(path: str = THRESHOLDS_FILE) -> Dict[str, TrendRule]:
+    with open(path) as f:
+        table = json.load(f)
+    return {sensor_type: TrendRule(**spec["trend"]) for sensor_type, spec in table.items() if "trend" in spec}
+
+
+class StreamStats:
+    """Rolling statistics of one stream. Times are kept relative to `base` for precision."""
+    __slots__ = ("values", "times", "head", "count", "base",
+                 "mean", "m2", "sum_t", "sum_tt", "sum_tx",
+                 "ewma", "ewvar", "samples", "active", "last")
+
+    def __init__(self, window: int):
+        self.values = [0.0] * window
+        self.times = [0.0] * window
+        self.head = 0  # next slot to overwrite
+        self.count = 0
+        self.base = None
+        self.mean = self.m2 = 0.0  # windowed Welford
+        self.sum_t = self.sum_tt = self.sum_tx = 0.0
+        self.ewma = self.ewvar = 0.0
+        self.samples = 0
+        self.active = frozenset()
+        self.last = None
+
+    def _rebase(self, ts: float):
+        """Re-anchor times at the oldest sample and recompute the time sums, once per lap of the ring."""
+        if self.count == 0:
+            self.base = ts
+            return
+        # head wraps to 0 only once the ring is full, so every slot is in use
+        shift = self.times[self.head]
+        self.base += shift
+        self.sum_t = self.sum_tt = self.sum_tx = 0.0
+        for i, (t, x) in enumerate(zip(self.times, self.values)):
+            t -= shift
+            self.times[i] = t
+            self.sum_t += t
+            self.sum_tt += t * t
+            self.sum_tx += t * x
+
+    def add(self, value: float, ts: float, min_std: float = 0.0) -> float:
+        """Push a reading; returns its z-score against the EWMA before the update."""
+        # score against the statistics before this reading joins them;
+        # the larger of the two noise estimates, as one noisy estimate makes |z| heavy-tailed
+        std = max(math.sqrt(self.ewvar), math.sqrt(max(self.variance(), 0.0)), min_std)
+        diff = value - self.ewma
+        zscore = diff / std if self.samples and std > 0 else 0.0
+
+        if self.base is None or self.head == 0:
+            self._rebase(ts)
+        t = ts - self.base
+        window = len(self.values)
+
+        if self.count == window:
+            old_x, old_t = self.values[self.head], self.times[self.head]
+            mean = self.mean + (value - old_x) / window
+            self.m2 += (value - old_x) * (value - mean + old_x - self.mean)
+            self.mean = mean
+            self.sum_t += t - old_t
+            self.sum_tt += t * t - old_t * old_t
+            self.sum_tx += t * value - old_t * old_x
+        else:
+            self.count += 1
+            delta = value - self.mean
+            self.mean += delta / self.count
+            self.m2 += delta * (value - self.mean)
+            self.sum_t += t
+            self.sum_tt += t * t
+            self.sum_tx += t * value
+        self.values[self.head], self.times[self.head] = value, t
+        self.head = (self.head + 1) % window
+
+        if self.samples == 0:
+            self.ewma = value
+        else:
+            increment = ANOMALY_EWMA_ALPHA * diff
+            self.ewma += increment
+            self.ewvar = (1 - ANOMALY_EWMA_ALPHA) * (self.ewvar + diff * increment)
+        self.samples += 1
+        return zscore
+
+    def slope(self) -> float:
+        """Least-squares slope of the window, in units per second."""
+        n = self.count
+        denominator = n * self.sum_tt - self.sum_t * self.sum_t
+        if n < 2 or denominator <= 0:
+            return 0.0
+        sum_x = self.mean * n
+        return (n * self.sum_tx - self.sum_t * sum_x) / denominator
+
+    def variance(self) -> float:
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "samples": self.samples,
+            "ewma": self.ewma,
+            "ewma_std": math.sqrt(self.ewvar),
+            "window_mean": self.mean,
+            "window_std": math.sqrt(max(self.variance(), 0.0)),
+            "slope_per_min": self.slope() * 60,
+            "last": self.last,
+            "active": sorted(self.active),
+        }
+
+
+class AnomalyDetector:
+    def __init__(self, rules: Optional[Dict[str, TrendRule]] = None, window: int = ANOMALY_WINDOW,
+                 zscore: float = ANOMALY_ZSCORE, min_samples: int = ANOMALY_MIN_SAMPLES):
+        self.rules = rules if rules is not None else load_trend_rules()
+        self.window = window
+        self.zscore = zscore
+        self.min_samples = min_samples
+        self.streams: Dict[Tuple[str, str], StreamStats] = {}  # (node_id, sensor_type) -> stats
+
+    def observe(self, sensor_type: str, value: float, node_id: Optional[str], ts: float) -> Tuple[bool, Optional[dict]]:
+        """(trend warning active, alert) for one reading; alert only when a new condition starts."""
+        rule = self.rules.get(sensor_type)
+        if rule is None:
+            return False, None
+        key = (node_id, sensor_type)
+        stats = self.streams.get(key)
+        if stats is None:
+            stats = self.streams[key] = StreamStats(self.window)
+
+        zscore = stats.add(value, ts, rule.min_std)
+        stats.last = value
+        if stats.samples < self.min_samples:
+            return False, None
+
+        # slopes over a partly filled window are too noisy to act on
+        rate = stats.slope() * 60 if stats.count == self.window else 0.0
+        active = []
+        if rule.rise_per_min is not None and rate >= rule.rise_per_min:
+            active.append("rising")
+        if rule.fall_per_min is not None and -rate >= rule.fall_per_min:
+            active.append("falling")
+        if abs(zscore) >= self.zscore:
+            active.append("spike")
+
+        started = [kind for kind in active if kind not in stats.active]
+        stats.active = frozenset(active)
+        if not started:
+            return bool(active), None
+        kind = started[0]
+        title, message = rule.messages[kind]
+        alert = _create_alert(sensor_type, WARNING, title,
+                              message.format(value=value, rate=abs(rate), zscore=zscore), value, node_id)
+        alert["trend"] = kind
+        return True, alert
+
+    def snapshot(self, sensor_type: Optional[str] = None, node_id: Optional[str] = None) -> List[dict]:
+        return [
+            {"node_id": node, "sensor": sensor, **stats.to_dict()}
+            for (node, sensor), stats in list(self.streams.items())
+            if (sensor_type is None or sensor == sensor_type) and (node_id is None or node == node_id)
+        ]
+
+
+anomaly_detector = AnomalyDetector()
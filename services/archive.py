@@ -0,0 +1,356 @@
+"""
+Columnar Reading Archive
+Readings older than ARCHIVE_AFTER_DAYS move out of sensor_readings into one
+partition per sensor type per UTC day:
+    ARCHIVE_DIR/<sensor_type>/<YYYY-MM-DD>/
+        index.json       node names, per-node row offsets, threat level names
+        ts-<gen>.npy     uint32 milliseconds since the start of the day
+        value-<gen>.npy  float32
+        threat-<gen>.npy uint8 code into the threat level names
+Rows are sorted by (node, ts), so a node's day is one contiguous slice of
+every column. Columns are memory-mapped, never loaded whole, and stay
+uncompressed on purpose (npz compression cannot be mapped); dictionary
+encoding and narrow dtypes bring a reading down to 9 bytes.
+
+Compaction also drops the 1-minute and 1-hour rollups of archived days; the
+1-day rollups stay in the DB, so year-long queries at day resolution never
+touch the archive. Finer queries read the archive up to `archived_until`
+and the DB after it (services/history.py).
+
+Usage: python -m services.archive compact [--days N] [--vacuum]
+       python -m services.archive import PATH [PATH ...]
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import text
+
+from config.db import engine as default_engine
+from models.sensor_rollup import ROLLUPS
+from services.metrics import log
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_COMPACT_INTERVAL = float(os.getenv("ARCHIVE_COMPACT_INTERVAL", "3600"))
+
+DAY = 86400
+COLUMNS = ("ts", "value", "threat")
+# rollups dropped for archived days; coarser ones are kept in the DB
+PRUNED_ROLLUPS = [model for model in ROLLUPS if model.resolution < DAY]
+
+
+def _day_name(day: int) -> str:
+    return datetime.fromtimestamp(day, timezone.utc).strftime("%Y-%m-%d")
+
+
+def _day_start(name: str) -> int:
+    return int(datetime.strptime(name, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp())
+
+
+class Partition:
+    """Memory-mapped columns of one sensor type for one day."""
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, "index.json")) as f:
+            index = json.load(f)
+        self.path = path
+        self.day = _day_start(os.path.basename(path))
+        self.nodes: List[str] = index["nodes"]
+        self.offsets = np.array(index["offsets"], dtype=np.int64)  # len(nodes) + 1
+        self.threat_levels: List[str] = index["threat_levels"]
+        self.generation = index["generation"]
+        for name in COLUMNS:
+            setattr(self, name, np.load(os.path.join(path, f"{name}-{self.generation}.npy"), mmap_mode="r"))
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def node_codes(self) -> np.ndarray:
+        return np.repeat(np.arange(len(self.nodes)), np.diff(self.offsets))
+
+    def timestamps(self, lo: int = 0, hi: Optional[int] = None) -> np.ndarray:
+        return self.day + self.ts[lo:hi] / 1000.0
+
+
+class ArchiveStore:
+    def __init__(self, root: str = ARCHIVE_DIR):
+        self.root = root
+        self._partitions: Dict[str, tuple] = {}  # path -> (index mtime, Partition)
+        # compaction state
+        self.last_run: Optional[float] = None
+        self.last_moved = 0
+
+    # ---------- Manifest ----------
+
+    @property
+    def archived_until(self) -> float:
+        """Readings before this time live in the archive, not in sensor_readings."""
+        try:
+            with open(os.path.join(self.root, "manifest.json")) as f:
+                return json.load(f)["archived_until"]
+        except (OSError, ValueError, KeyError):
+            return 0
+
+    def _set_archived_until(self, until: float):
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, "manifest.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump({"archived_until": until}, f)
+        os.replace(path + ".tmp", path)
+
+    # ---------- Reading ----------
+
+    def open(self, path: str) -> Optional[Partition]:
+        try:
+            mtime = os.stat(os.path.join(path, "index.json")).st_mtime_ns
+        except OSError:
+            return None
+        cached = self._partitions.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = self._partitions[path] = (mtime, Partition(path))
+        return cached[1]
+
+    def partitions(self, sensor_type: str, start: float, end: float) -> List[Partition]:
+        directory = os.path.join(self.root, sensor_type)
+        if not os.path.isdir(directory):
+            return []
+        first = int(start // DAY * DAY)
+        found = []
+        for name in sorted(os.listdir(directory)):
+            try:
+                day = _day_start(name)
+            except ValueError:
+                continue  # temp or foreign entries
+            if first <= day < end:
+                partition = self.open(os.path.join(directory, name))
+                if partition is not None:
+                    found.append(partition)
+        return found
+
+    def fetch_buckets(self, sensor_type: str, start: float, end: float, step: float,
+                      node_ids: Optional[Iterable[str]] = None) -> List[tuple]:
+        """Archived readings grouped to step, as (node_id, bucket, count, sum, min, max, last) rows."""
+        wanted = set(node_ids) if node_ids else None
+        rows = []
+        for partition in self.partitions(sensor_type, start, end):
+            if wanted is None:
+                codes = partition.node_codes()
+                ts, values = partition.timestamps(), partition.value
+            else:
+                # only touch the wanted nodes' slices of the mapped columns
+                slices = [(code, partition.offsets[code], partition.offsets[code + 1])
+                          for code, node in enumerate(partition.nodes) if node in wanted]
+                if not slices:
+                    continue
+                codes = np.concatenate([np.full(hi - lo, code) for code, lo, hi in slices])
+                ts = np.concatenate([partition.timestamps(lo, hi) for _, lo, hi in slices])
+                values = np.concatenate([partition.value[lo:hi] for _, lo, hi in slices])
+            mask = (ts >= start) & (ts < end)
+            if not mask.any():
+                continue
+            codes, ts, values = codes[mask], ts[mask], np.asarray(values[mask], dtype=float)
+            buckets = np.floor(ts / step) * step
+            starts = np.flatnonzero(np.concatenate(([True], (codes[1:] != codes[:-1]) | (buckets[1:] != buckets[:-1]))))
+            ends = np.append(starts[1:], len(ts)) - 1
+            rows.extend(zip(
+                [partition.nodes[code] for code in codes[starts]],
+                buckets[starts].tolist(),
+                np.diff(np.append(starts, len(ts))).tolist(),
+                np.add.reduceat(values, starts).tolist(),
+                np.minimum.reduceat(values, starts).tolist(),
+                np.maximum.reduceat(values, starts).tolist(),
+                values[ends].tolist(),
+            ))
+        return rows
+
+    # ---------- Writing ----------
+
+    def write_partition(self, sensor_type: str, day: int, nodes, ts, values, threat_levels) -> Partition:
+        """Merge readings (parallel sequences, ts in unix seconds) into a day partition.
+
+        Exact duplicates of rows already archived are dropped, so re-running an
+        interrupted compaction or re-importing the same files is harmless.
+        """
+        path = os.path.join(self.root, sensor_type, _day_name(day))
+        ts_ms = np.round((np.asarray(ts, dtype=float) - day) * 1000).astype(np.uint32)
+        values = np.asarray(values, dtype=np.float32)
+        nodes = list(nodes)
+        threat_levels = list(threat_levels)
+
+        existing = self.open(path)
+        if existing is not None:
+            nodes = [existing.nodes[code] for code in existing.node_codes()] + nodes
+            threat_levels = [existing.threat_levels[code] for code in existing.threat] + threat_levels
+            ts_ms = np.concatenate((existing.ts, ts_ms))
+            values = np.concatenate((existing.value, values))
+
+        node_names, node_codes = np.unique(np.array(nodes, dtype=object), return_inverse=True)
+        level_names, level_codes = np.unique(np.array(threat_levels, dtype=object), return_inverse=True)
+        order = np.lexsort((level_codes, values, ts_ms, node_codes))
+        node_codes, ts_ms, values, level_codes = node_codes[order], ts_ms[order], values[order], level_codes[order]
+        keep = np.concatenate(([True], (node_codes[1:] != node_codes[:-1]) | (ts_ms[1:] != ts_ms[:-1])
+                               | (values[1:] != values[:-1]) | (level_codes[1:] != level_codes[:-1])))
+        node_codes, ts_ms, values, level_codes = node_codes[keep], ts_ms[keep], values[keep], level_codes[keep]
+
+        os.makedirs(path, exist_ok=True)
+        generation = existing.generation + 1 if existing is not None else 1
+        columns = {"ts": ts_ms, "value": values, "threat": level_codes.astype(np.uint8)}
+        for name, column in columns.items():
+            np.save(os.path.join(path, f"{name}-{generation}.npy"), column)
+        index = {
+            "nodes": node_names.tolist(),
+            "offsets": np.searchsorted(node_codes, np.arange(len(node_names) + 1)).tolist(),
+            "threat_levels": level_names.tolist(),
+            "generation": generation,
+        }
+        with open(os.path.join(path, "index.json.tmp"), "w") as f:
+            json.dump(index, f)
+        os.replace(os.path.join(path, "index.json.tmp"), os.path.join(path, "index.json"))
+        if existing is not None:
+            for name in COLUMNS:
+                os.remove(os.path.join(path, f"{name}-{existing.generation}.npy"))
+        return self.open(path)
+
+    def compact(self, engine=default_engine, older_than_days: float = ARCHIVE_AFTER_DAYS) -> int:
+        """Move every reading before the day boundary `older_than_days` ago into the archive."""
+        cutoff = int((time.time() - older_than_days * DAY) // DAY * DAY)
+        moved = 0
+        with engine.connect() as conn:
+            days = conn.execute(text(
+                "SELECT DISTINCT sensor_type, CAST(ts / :day AS INTEGER) * :day FROM sensor_readings WHERE ts < :cutoff"
+            ), {"day": DAY, "cutoff": cutoff}).all()
+
+        for sensor_type, day in days:
+            params = {"sensor_type": sensor_type, "start": day, "end": day + DAY}
+            with engine.connect() as conn:
+                rows = conn.execute(text(
+                    "SELECT id, node_id, ts, value, threat_level FROM sensor_readings "
+                    "WHERE sensor_type = :sensor_type AND ts >= :start AND ts < :end"
+                ), params).all()
+            if not rows:
+                continue
+            ids, nodes, ts, values, threat_levels = zip(*rows)
+            self.write_partition(sensor_type, day, nodes, ts, values, threat_levels)
+
+            # rows that landed after the SELECT have larger ids and wait for the next run
+            params["max_id"] = max(ids)
+            with engine.begin() as conn:
+                conn.execute(text(
+                    "DELETE FROM sensor_readings WHERE sensor_type = :sensor_type "
+                    "AND ts >= :start AND ts < :end AND id <= :max_id"
+                ), params)
+                for model in PRUNED_ROLLUPS:
+                    conn.execute(text(
+                        f"DELETE FROM {model.__tablename__} WHERE sensor_type = :sensor_type "
+                        "AND bucket >= :start AND bucket < :end"
+                    ), params)
+            moved += len(rows)
+
+        if cutoff > self.archived_until:
+            self._set_archived_until(cutoff)
+        self.last_run, self.last_moved = time.time(), moved
+        return moved
+
+    def import_archive(self, path: str, engine=default_engine) -> int:
+        """Merge partitions from another archive directory into this one.
+
+        Days past the archive horizon are skipped: those readings belong in
+        sensor_readings. The 1-day rollup of every merged day is recomputed
+        from the merged partition.
+        """
+        horizon = self.archived_until
+        imported = 0
+        for directory, _, files in sorted(os.walk(path)):
+            if "index.json" not in files:
+                continue
+            sensor_type = os.path.basename(os.path.dirname(directory))
+            source = Partition(directory)
+            if source.day + DAY > horizon:
+                log.warning("archive_import_skipped", directory, directory=directory,
+                            reason="newer than the archive horizon", horizon=_day_name(int(horizon)))
+                continue
+            merged = self.write_partition(
+                sensor_type, source.day,
+                [source.nodes[code] for code in source.node_codes()],
+                source.timestamps(),
+                source.value,
+                [source.threat_levels[code] for code in source.threat],
+            )
+            self._replace_daily_rollup(engine, sensor_type, merged)
+            imported += len(source)
+            log.info("archive_imported", directory, directory=directory, readings=len(source))
+        return imported
+
+    def _replace_daily_rollup(self, engine, sensor_type: str, partition: Partition):
+        daily = [model for model in ROLLUPS if model.resolution == DAY][0].__table__
+        values = np.asarray(partition.value, dtype=float)
+        ts = partition.timestamps()
+        starts, ends = partition.offsets[:-1], partition.offsets[1:] - 1
+        present = ends >= starts
+        rows = [
+            {"sensor_type": sensor_type, "node_id": node, "bucket": partition.day,
+             "count": int(end - start + 1), "sum": float(values[start:end + 1].sum()),
+             "min": float(values[start:end + 1].min()), "max": float(values[start:end + 1].max()),
+             "last": float(values[end]), "last_ts": float(ts[end])}
+            for node, start, end, ok in zip(partition.nodes, starts, ends, present) if ok
+        ]
+        with engine.begin() as conn:
+            conn.execute(daily.delete().where(daily.c.sensor_type == sensor_type, daily.c.bucket == partition.day))
+            if rows:
+                conn.execute(daily.insert(), rows)
+
+    # ---------- Background job ----------
+
+    async def run(self, interval: float = ARCHIVE_COMPACT_INTERVAL):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                moved = await loop.run_in_executor(None, self.compact)
+                if moved:
+                    log.info("archive_compacted", readings=moved, older_than_days=ARCHIVE_AFTER_DAYS)
+            except Exception as e:
+                log.error("archive_compaction_failed", error=e)
+            await asyncio.sleep(interval)
+
+    def stats(self) -> dict:
+        return {
+            "archived_until": self.archived_until,
+            "last_run": self.last_run,
+            "last_moved": self.last_moved,
+        }
+
+
+archive = ArchiveStore()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m services.archive")
+    commands = parser.add_subparsers(dest="command", required=True)
+    compact = commands.add_parser("compact", help="move old readings from the DB into the archive")
+    compact.add_argument("--days", type=float, default=ARCHIVE_AFTER_DAYS, help="keep this many days in the DB")
+    compact.add_argument("--vacuum", action="store_true", help="VACUUM the DB afterwards to return space to the OS")
+    restore = commands.add_parser("import", help="merge archive directories into ARCHIVE_DIR")
+    restore.add_argument("paths", nargs="+")
+    args = parser.parse_args(argv)
+
+    started = time.time()
+    if args.command == "compact":
+        moved = archive.compact(older_than_days=args.days)
+        print(f"Archived {moved} readings in {time.time() - started:.1f}s")
+        if args.vacuum:
+            with default_engine.connect() as conn:
+                conn.execute(text("VACUUM"))
+    else:
+        archive.compact()  # the archive must cover every day up to its horizon before merging
+        imported = sum(archive.import_archive(path) for path in args.paths)
+        print(f"Imported {imported} readings in {time.time() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Camera Capture Supervisor
+Runs one capture thread per registered camera. Each stream:
+  - keeps grabbing frames so the decoder never lags behind the live feed,
+    but only decodes one frame per 1/sampling_fps into its LatestFrame slot
+  - reconnects with exponential backoff (CAPTURE_BACKOFF_MIN..MAX seconds),
+    reset after the first good frame
+  - exposes its health (state, last frame age, reconnects, last error)
+"""
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import cv2
+
+from services.metrics import log
+
+CAPTURE_BACKOFF_MIN = float(os.getenv("CAPTURE_BACKOFF_MIN", "1"))
+CAPTURE_BACKOFF_MAX = float(os.getenv("CAPTURE_BACKOFF_MAX", "60"))
+
+STARTING = "starting"
+CONNECTED = "connected"
+RECONNECTING = "reconnecting"
+STOPPED = "stopped"
+
+
+class LatestFrame:
+    """Single-slot mailbox: a new frame replaces whatever was not yet consumed."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._frame = None
+        self._captured_at = 0.0
+        self.dropped = 0
+
+    def put(self, frame):
+        with self._lock:
+            if self._frame is not None:
+                self.dropped += 1
+            self._frame = frame
+            self._captured_at = time.time()
+
+    def take(self):
+        with self._lock:
+            frame, captured_at = self._frame, self._captured_at
+            self._frame = None
+        return frame, captured_at
+
+
+class CaptureStream(threading.Thread):
+    def __init__(self, camera_id: str, url: str, sampling_fps: float,
+                 source_factory: Callable = cv2.VideoCapture):
+        super().__init__(name=f"capture-{camera_id}", daemon=True)
+        self.camera_id = camera_id
+        self.url = url
+        self.interval = 1.0 / sampling_fps if sampling_fps > 0 else 0.0
+        self.source_factory = source_factory
+        self.slot = LatestFrame()
+        self.state = STARTING
+        self.frames_sampled = 0
+        self.reconnects = 0
+        self.last_frame_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._backoff = CAPTURE_BACKOFF_MIN
+        self._stopping = threading.Event()
+
+    def stop(self):
+        self._stopping.set()
+
+    def _fail(self, error: str, cap):
+        self.state = RECONNECTING
+        self.last_error = error
+        self.reconnects += 1
+        if cap is not None:
+            cap.release()
+        log.warning("camera_reconnect", self.camera_id, camera=self.camera_id, error=error, retry_in=self._backoff)
+        self._stopping.wait(self._backoff)
+        self._backoff = min(self._backoff * 2, CAPTURE_BACKOFF_MAX)
+
+    def run(self):
+        log.info("camera_started", self.camera_id, camera=self.camera_id, url=self.url)
+        while not self._stopping.is_set():
+            cap = None
+            try:
+                cap = self.source_factory(self.url)
+                if not cap.isOpened():
+                    self._fail("cannot open stream", cap)
+                    continue
+                self._read_loop(cap)
+            except Exception as e:
+                self._fail(f"capture error: {e}", cap)
+        self.state = STOPPED
+
+    def _read_loop(self, cap):
+        next_due = 0.0
+        while not self._stopping.is_set():
+            if not cap.grab():
+                self._fail("failed to read frame", cap)
+                return
+            now = time.time()
+            if now < next_due:
+                continue
+            ok, frame = cap.retrieve()
+            if not ok or frame is None:
+                self._fail("failed to decode frame", cap)
+                return
+            self.slot.put(frame)
+            self.state = CONNECTED
+            self.frames_sampled += 1
+            self.last_frame_at = now
+            self._backoff = CAPTURE_BACKOFF_MIN
+            next_due = max(next_due + self.interval, now)
+        cap.release()
+
+    def health(self) -> dict:
+        return {
+            "state": self.state,
+            "url": self.url,
+            "sampling_fps": round(1.0 / self.interval, 2) if self.interval else None,
+            "frames_sampled": self.frames_sampled,
+            "frames_dropped": self.slot.dropped,
+            "last_frame_age_s": None if self.last_frame_at is None else round(time.time() - self.last_frame_at, 2),
+            "reconnects": self.reconnects,
+            "last_error": self.last_error,
+        }
+
+
+class CaptureSupervisor:
+    def __init__(self, source_factory: Callable = cv2.VideoCapture):
+        self.source_factory = source_factory
+        self.streams: Dict[str, CaptureStream] = {}
+        self._lock = threading.Lock()
+
+    def add(self, camera_id: str, url: str, sampling_fps: float) -> CaptureStream:
+        self.remove(camera_id)
+        stream = CaptureStream(camera_id, url, sampling_fps, self.source_factory)
+        with self._lock:
+            self.streams[camera_id] = stream
+        stream.start()
+        return stream
+
+    def remove(self, camera_id: str):
+        with self._lock:
+            stream = self.streams.pop(camera_id, None)
+        if stream is not None:
+            stream.stop()
+
+    def sync(self, cameras):
+        """Run exactly the enabled cameras from Camera rows."""
+        wanted = {camera.camera_id: camera for camera in cameras if camera.enabled}
+        for camera_id in list(self.streams):
+            if camera_id not in wanted:
+                self.remove(camera_id)
+        for camera_id, camera in wanted.items():
+            stream = self.streams.get(camera_id)
+            if stream is None or stream.url != camera.url or stream.interval != 1.0 / camera.sampling_fps:
+                self.add(camera_id, camera.url, camera.sampling_fps)
+
+    def stop(self):
+        for camera_id in list(self.streams):
+            self.remove(camera_id)
+
+    def slots(self):
+        with self._lock:
+            return [(camera_id, stream.slot) for camera_id, stream in self.streams.items()]
+
+    def health(self) -> dict:
+        return {camera_id: stream.health() for camera_id, stream in list(self.streams.items())}
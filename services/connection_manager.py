@@ -0,0 +1,181 @@
+"""
+WebSocket Fan-out
+Every connected client gets a bounded send queue and its own writer task, so
+broadcasting is just "serialize once, enqueue everywhere" and never waits on
+a socket. Slow consumers are handled by a drop policy:
+  - coalesce:    keep only the newest message per (node_id, sensor) stream,
+                 drop the oldest queued message when the queue is full
+  - drop_oldest: no coalescing, drop the oldest queued message when full
+Sockets whose send fails or times out are evicted. Clients only receive the
+payloads matching their subscription (see services.subscriptions).
+"""
+import asyncio
+import itertools
+import json
+import os
+import time
+from collections import OrderedDict, defaultdict
+from typing import Dict, Optional
+
+from fastapi import WebSocket
+
+from services.metrics import Counter, Histogram, log
+from services.subscriptions import Subscription, SubscriptionIndex
+
+WS_QUEUE_SIZE = int(os.getenv("WS_QUEUE_SIZE", "256"))
+WS_SLOW_CLIENT_POLICY = os.getenv("WS_SLOW_CLIENT_POLICY", "coalesce")
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "10"))
+
+COALESCE = "coalesce"
+DROP_OLDEST = "drop_oldest"
+
+_unkeyed = itertools.count()
+
+BROADCAST_SECONDS = Histogram("aura_broadcast_seconds", "Fan-out of one message or batch to every matching queue")
+DROPPED = Counter("aura_ws_dropped_total", "Messages dropped from full client queues")
+
+
+def stream_key(message: dict):
+    """Messages for the same (node_id, sensor) stream supersede each other."""
+    sensor = message.get("sensor")
+    if sensor is None or sensor == "batch":
+        return None
+    return (message.get("node_id"), sensor)
+
+
+class _Client:
+    def __init__(self, websocket: WebSocket, max_queue: int, policy: str):
+        self.websocket = websocket
+        self.max_queue = max_queue
+        self.policy = policy
+        self.pending: "OrderedDict[object, str]" = OrderedDict()
+        self.wakeup = asyncio.Event()
+        self.dropped = 0
+        self.closed = False
+        self.task: Optional[asyncio.Task] = None
+
+    def offer(self, key, text: str):
+        if key is None or self.policy != COALESCE:
+            key = next(_unkeyed)
+        elif key in self.pending:
+            self.pending[key] = text
+            return
+        if len(self.pending) >= self.max_queue:
+            self.pending.popitem(last=False)
+            self.dropped += 1
+            DROPPED.inc()
+        self.pending[key] = text
+        self.wakeup.set()
+
+    def close(self):
+        # wait_for can swallow a cancel that races a finished send, so the
+        # writer also checks this flag instead of relying on cancellation alone
+        self.closed = True
+        self.pending.clear()
+        self.wakeup.set()
+
+    async def run(self, send_timeout: float):
+        while not self.closed:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            while self.pending and not self.closed:
+                _, text = self.pending.popitem(last=False)
+                await asyncio.wait_for(self.websocket.send_text(text), send_timeout)
+
+
+class ConnectionManager:
+    def __init__(self, max_queue: int = WS_QUEUE_SIZE, policy: str = WS_SLOW_CLIENT_POLICY,
+                 send_timeout: float = WS_SEND_TIMEOUT):
+        if policy not in (COALESCE, DROP_OLDEST):
+            raise ValueError(f"Unknown slow client policy: {policy}")
+        self.max_queue = max_queue
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self.clients: Dict[WebSocket, _Client] = {}
+        self.subscriptions = SubscriptionIndex()
+
+    @property
+    def active_connections(self):
+        return list(self.clients)
+
+    async def connect(self, websocket: WebSocket):
+        await websocket.accept()
+        self.attach(websocket)
+
+    def attach(self, websocket: WebSocket) -> _Client:
+        """Register an already-accepted socket and start its writer."""
+        client = _Client(websocket, self.max_queue, self.policy)
+        client.task = asyncio.create_task(self._write(client))
+        self.clients[websocket] = client
+        self.subscriptions.add(client)
+        return client
+
+    def subscribe(self, websocket: WebSocket, subscription: Subscription):
+        client = self.clients.get(websocket)
+        if client is not None:
+            self.subscriptions.set(client, subscription)
+
+    def send(self, websocket: WebSocket, message: dict):
+        """Queue a message for one client (goes through its writer like broadcasts)."""
+        client = self.clients.get(websocket)
+        if client is not None:
+            client.offer(None, json.dumps(message))
+
+    def disconnect(self, websocket: WebSocket):
+        client = self.clients.pop(websocket, None)
+        if client is None:
+            return
+        self.subscriptions.remove(client)
+        client.close()
+        if client.task and client.task is not asyncio.current_task():
+            client.task.cancel()
+
+    async def _write(self, client: _Client):
+        try:
+            await client.run(self.send_timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.info("ws_evicted", error=repr(e))
+            self.disconnect(client.websocket)
+            try:
+                await client.websocket.close()
+            except Exception:
+                pass
+
+    async def broadcast(self, message: dict):
+        """Queue a message for every interested client. Never blocks on a socket."""
+        started = time.perf_counter()
+        if message.get("sensor") == "batch":
+            self._broadcast_batch(message["readings"])
+        else:
+            targets = self.subscriptions.match(message)
+            if targets:
+                text = json.dumps(message)
+                key = stream_key(message)
+                for client in targets:
+                    client.offer(key, text)
+        BROADCAST_SECONDS.observe(time.perf_counter() - started)
+
+    def _broadcast_batch(self, readings):
+        everyone, per_client = self.subscriptions.match_batch(readings)
+        if everyone:
+            text = json.dumps({"sensor": "batch", "readings": readings})
+            for client in everyone:
+                client.offer(None, text)
+
+        # Clients with the same filtered view share one serialized message
+        groups = defaultdict(list)
+        for client, indexes in per_client.items():
+            if client not in everyone:
+                groups[tuple(indexes)].append(client)
+        for indexes, clients in groups.items():
+            text = json.dumps({"sensor": "batch", "readings": [readings[i] for i in indexes]})
+            for client in clients:
+                client.offer(None, text)
+
+    def queue_depths(self):
+        return [len(client.pending) for client in self.clients.values()]
+
+    def dropped_messages(self):
+        return sum(client.dropped for client in self.clients.values())
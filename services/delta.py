@@ -0,0 +1,87 @@
+"""
+Delta Broadcasting
+Decides which readings are worth pushing over the WebSocket:
+  - threat level transitions are sent immediately
+  - unchanged values are suppressed
+  - changed values are sent at most WS_STREAM_MAX_RATE times per second per stream
+  - every stream is re-sent at least every WS_KEYFRAME_INTERVAL seconds
+Changes held back by the rate limit are marked dirty and flushed by the
+periodic keyframe task, so clients always converge on the latest value.
+"""
+import os
+import time
+from typing import Dict, List, Tuple
+
+WS_DELTA_MODE = os.getenv("WS_DELTA_MODE", "1") not in ("0", "false", "off")
+WS_STREAM_MAX_RATE = float(os.getenv("WS_STREAM_MAX_RATE", "1"))
+WS_KEYFRAME_INTERVAL = float(os.getenv("WS_KEYFRAME_INTERVAL", "30"))
+WS_VALUE_EPSILON = float(os.getenv("WS_VALUE_EPSILON", "0"))
+
+
+class _StreamState:
+    __slots__ = ("threat_level", "value", "sent_at", "dirty")
+
+    def __init__(self, threat_level, value, sent_at):
+        self.threat_level = threat_level
+        self.value = value
+        self.sent_at = sent_at
+        self.dirty = False
+
+
+class DeltaFilter:
+    def __init__(self, enabled: bool = WS_DELTA_MODE, max_rate: float = WS_STREAM_MAX_RATE,
+                 keyframe_interval: float = WS_KEYFRAME_INTERVAL, epsilon: float = WS_VALUE_EPSILON):
+        self.enabled = enabled
+        self.min_interval = 1.0 / max_rate if max_rate > 0 else 0.0
+        self.keyframe_interval = keyframe_interval
+        self.epsilon = epsilon
+        self._streams: Dict[Tuple[str, str], _StreamState] = {}
+        self.sent = 0
+        self.suppressed = 0
+
+    def should_send(self, payload: dict, now: float = None) -> bool:
+        if not self.enabled:
+            return True
+        now = time.monotonic() if now is None else now
+        key = (payload.get("node_id"), payload["sensor"])
+        threat_level, value = payload.get("threat_level"), payload.get("value")
+        state = self._streams.get(key)
+
+        if state is None:
+            self._streams[key] = _StreamState(threat_level, value, now)
+            self.sent += 1
+            return True
+
+        transition = threat_level != state.threat_level
+        changed = transition or value is None or state.value is None or abs(value - state.value) > self.epsilon
+        elapsed = now - state.sent_at
+        if transition or elapsed >= self.keyframe_interval or (changed and elapsed >= self.min_interval):
+            state.threat_level, state.value, state.sent_at = threat_level, value, now
+            state.dirty = False
+            self.sent += 1
+            return True
+
+        if changed:
+            state.dirty = True
+        self.suppressed += 1
+        return False
+
+    def flush_dirty(self, lookup, now: float = None) -> List[dict]:
+        """Latest payloads of streams with held-back changes.
+
+        lookup(node_id, sensor) returns the stream's current payload; the
+        returned payloads count as sent, so the caller must broadcast them.
+        """
+        now = time.monotonic() if now is None else now
+        payloads = []
+        for (node_id, sensor), state in self._streams.items():
+            if not state.dirty:
+                continue
+            state.dirty = False
+            payload = lookup(node_id, sensor)
+            if payload is None:
+                continue
+            state.threat_level, state.value, state.sent_at = payload.get("threat_level"), payload.get("value"), now
+            payloads.append(payload)
+        self.sent += len(payloads)
+        return payloads
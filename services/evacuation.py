@@ -2,68 +2,100 @@
 Evacuation Route Service
 Calculates escape routes from danger zones to safe exit points.
 For the hackathon prototype, safe exits are predefined.
+With a road graph loaded (services/road_graph.py) routes follow real streets
+and footpaths around every active hazard zone; without one they fall back to
+a straight line nudged away from the danger.
 """
 import math
-from typing import List, Tuple
+import os
+from typing import Dict, List, Optional, Tuple
+
+from services.road_graph import road_graph
+from services.spatial import haversine, SpatialIndex
 
 
 # Predefined safe exit points (for prototype demo)
 # These represent known safe zones / evacuation assembly points
+# capacity: people the point can take, used by capacity-aware bulk planning
 SAFE_EXITS = [
-    {"id": 1, "name": "Safe Zone Alpha", "lat": 11.6700, "lng": 76.1200, "type": "assembly_point"},
-    {"id": 2, "name": "Safe Zone Bravo", "lat": 11.6900, "lng": 76.1450, "type": "assembly_point"},
-    {"id": 3, "name": "Hospital Emergency", "lat": 11.6750, "lng": 76.1400, "type": "hospital"},
-    {"id": 4, "name": "Fire Station", "lat": 11.6820, "lng": 76.1150, "type": "fire_station"},
+    {"id": 1, "name": "Safe Zone Alpha", "lat": 11.6700, "lng": 76.1200, "type": "assembly_point", "capacity": 1500},
+    {"id": 2, "name": "Safe Zone Bravo", "lat": 11.6900, "lng": 76.1450, "type": "assembly_point", "capacity": 1500},
+    {"id": 3, "name": "Hospital Emergency", "lat": 11.6750, "lng": 76.1400, "type": "hospital", "capacity": 400},
+    {"id": 4, "name": "Fire Station", "lat": 11.6820, "lng": 76.1150, "type": "fire_station", "capacity": 300},
 ]
 
+HAZARD_RADIUS_M = float(os.getenv("HAZARD_RADIUS_M", "300"))  # around a danger point / incident
+WALKING_SPEED = 80  # m/min
 
-def haversine(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
-    """Calculate distance between two points in meters."""
-    R = 6371000  # Earth radius in meters
-    phi1, phi2 = math.radians(lat1), math.radians(lat2)
-    d_phi = math.radians(lat2 - lat1)
-    d_lambda = math.radians(lng2 - lng1)
-    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
-    return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+exit_index = SpatialIndex(cell_m=1000)
+exit_index.insert_many([exit_pt["id"] for exit_pt in SAFE_EXITS], [exit_pt["lat"] for exit_pt in SAFE_EXITS],
+                       [exit_pt["lng"] for exit_pt in SAFE_EXITS], SAFE_EXITS)
 
 
 def find_nearest_exit(lat: float, lng: float, avoid_lat: float = None, avoid_lng: float = None) -> dict:
     """Find the nearest safe exit point, optionally avoiding a danger zone."""
-    best = None
-    best_dist = float('inf')
-
-    for exit_pt in SAFE_EXITS:
-        dist = haversine(lat, lng, exit_pt["lat"], exit_pt["lng"])
-
-        # If avoiding a danger zone, penalize exits that are close to it
-        if avoid_lat and avoid_lng:
-            danger_dist = haversine(exit_pt["lat"], exit_pt["lng"], avoid_lat, avoid_lng)
-            if danger_dist < 300:  # exit is within 300m of danger — skip
-                continue
-
-        if dist < best_dist:
-            best_dist = dist
-            best = exit_pt
-
-    if best is None:
+    blocked = set()
+    if avoid_lat and avoid_lng:  # exits inside the danger zone are skipped
+        blocked = {key for _, key, _ in exit_index.within(avoid_lat, avoid_lng, HAZARD_RADIUS_M)}
+    hits = exit_index.nearest(lat, lng, where=lambda exit_pt: exit_pt["id"] not in blocked)
+    if hits:
+        best_dist, _, best = hits[0]
+    else:
         best = SAFE_EXITS[0]  # fallback
         best_dist = haversine(lat, lng, best["lat"], best["lng"])
 
     return {
         **best,
         "distance_m": round(best_dist),
-        "estimated_time_min": round(best_dist / 80, 1),  # ~80m/min walking speed
+        "estimated_time_min": round(best_dist / WALKING_SPEED, 1),
+    }
+
+
+_snapped_exits: Dict[tuple, Tuple[int, float]] = {}  # (graph, exit id) -> (junction, snap distance)
+
+
+def _exit_node(graph, exit_pt: dict) -> Tuple[int, float]:
+    key = (id(graph.node_lat), exit_pt["id"])
+    if key not in _snapped_exits:
+        _snapped_exits[key] = graph.nearest_node(exit_pt["lat"], exit_pt["lng"])
+    return _snapped_exits[key]
+
+
+def route_on_graph(user_lat: float, user_lng: float, exits: List[dict], hazards: List[dict], graph=None
+                   ) -> Optional[Tuple[dict, List[List[float]]]]:
+    """(safe exit, polyline) along the road graph to the cheapest reachable exit, or None."""
+    graph = graph or road_graph
+    source, snap_distance = graph.nearest_node(user_lat, user_lng)
+    targets = {}
+    for exit_pt in exits:
+        node, exit_snap = _exit_node(graph, exit_pt)
+        targets.setdefault(node, (exit_pt, exit_snap))
+    found = graph.astar(source, list(targets), graph.penalties_for(hazards))
+    if found is None:
+        return None
+    target, edges, _ = found
+    exit_pt, exit_snap = targets[target]
+    polyline, length = graph.polyline(edges)
+    distance = snap_distance + length + exit_snap
+    safe_exit = {
+        **exit_pt,
+        "distance_m": round(distance),
+        "estimated_time_min": round(distance / WALKING_SPEED, 1),
     }
+    return safe_exit, [[user_lat, user_lng]] + polyline + [[exit_pt["lat"], exit_pt["lng"]]]
 
 
-def get_evacuation_route(danger_lat: float, danger_lng: float, user_lat: float = None, user_lng: float = None) -> dict:
+def get_evacuation_route(danger_lat: float, danger_lng: float, user_lat: float = None, user_lng: float = None,
+                         hazards: Optional[List[dict]] = None) -> dict:
     """
     Generate an evacuation route from a danger zone.
+    hazards: other active zones to route around, as {"lat", "lng", "severity"}.
     Returns:
     - danger_zone: the threat location
     - safe_exit: nearest safe assembly point
-    - route_points: list of [lat, lng] waypoints for the escape route
+    - safe_route: list of [lat, lng] waypoints for the escape route
     - blocked_route: the route through the danger zone (to show as blocked)
+    - routing: "road_graph" or "straight_line"
     """
     # Use user location or default to slightly offset from danger
     if user_lat is None:
@@ -71,6 +103,27 @@ def get_evacuation_route(danger_lat: float, danger_lng: float, user_lat: float =
     if user_lng is None:
         user_lng = danger_lng - 0.002
 
+    blocked_route = [
+        [user_lat, user_lng],
+        [danger_lat, danger_lng],
+    ]
+    if road_graph.ready:
+        zones = [{"lat": danger_lat, "lng": danger_lng, "radius_m": HAZARD_RADIUS_M, "severity": "critical"}]
+        zones += [{**hazard, "radius_m": HAZARD_RADIUS_M} for hazard in hazards or ()]
+        blocked = {key for _, key, _ in exit_index.within(danger_lat, danger_lng, HAZARD_RADIUS_M)}
+        exits = [exit_pt for exit_pt in SAFE_EXITS if exit_pt["id"] not in blocked]
+        routed = route_on_graph(user_lat, user_lng, exits or SAFE_EXITS, zones)
+        if routed is not None:
+            safe_exit, safe_route = routed
+            return {
+                "danger_zone": {"lat": danger_lat, "lng": danger_lng},
+                "user_location": {"lat": user_lat, "lng": user_lng},
+                "safe_exit": safe_exit,
+                "safe_route": safe_route,
+                "blocked_route": blocked_route + [[safe_exit["lat"], safe_exit["lng"]]],
+                "routing": "road_graph",
+            }
+
     # Find nearest safe exit avoiding the danger zone
     safe_exit = find_nearest_exit(user_lat, user_lng, avoid_lat=danger_lat, avoid_lng=danger_lng)
 
@@ -97,9 +150,6 @@ def get_evacuation_route(danger_lat: float, danger_lng: float, user_lat: float =
             [safe_mid_lat, safe_mid_lng],
             [safe_exit["lat"], safe_exit["lng"]],
         ],
-        "blocked_route": [
-            [user_lat, user_lng],
-            [danger_lat, danger_lng],
-            [safe_exit["lat"], safe_exit["lng"]],
-        ],
+        "blocked_route": blocked_route + [[safe_exit["lat"], safe_exit["lng"]]],
+        "routing": "straight_line",
     }
@@ -0,0 +1,220 @@
+"""
+Evacuation Planner
+Routes for every device in a zone at once (POST /evacuation/plan) instead of
+one /evacuation/route search per person.
+  - nearest exit: one multi-source Dijkstra grown out of every safe exit over
+    the road graph (RoadGraph.shortest_tree); each user reads their exit,
+    distance and path straight off that tree, so thousands of users cost one
+    search plus a snap each
+  - capacity_aware: one tree per exit gives every user's distance to every
+    exit; an overloaded exit then raises its "price" just far enough that its
+    excess users are better off at their next-best exit with room left,
+    round after round (an auction over the users x exits matrix), until no
+    SAFE_EXITS point takes more than its capacity while another one has room
+  - the per-exit trees are independent: on graphs of PLAN_POOL_MIN_NODES
+    junctions or more they run on PLAN_WORKERS processes, each of which loads
+    the compiled graph from its .graph.npz cache once
+Both zones and hazards are routed around the same way as /evacuation/route.
+Without a road graph distances are straight lines and the assignment is the same.
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from services import evacuation
+from services.road_graph import RoadGraph, road_graph
+from services.spatial import haversine_matrix
+
+PLAN_WORKERS = int(os.getenv("PLAN_WORKERS", str(min(4, os.cpu_count() or 1))))
+PLAN_POOL_MIN_NODES = int(os.getenv("PLAN_POOL_MIN_NODES", "20000"))
+PLAN_MAX_USERS = int(os.getenv("PLAN_MAX_USERS", "100000"))
+AUCTION_ROUNDS = 200
+PRICE_STEP = 1e-3  # meters added on top of a shed margin so ties move too
+
+
+# ---------- Worker process side ----------
+
+_GRAPH: Optional[RoadGraph] = None
+
+
+def _init_worker(path: str):
+    global _GRAPH
+    _GRAPH = RoadGraph(path)
+    _GRAPH.load()
+
+
+def _worker_tree(sources: Dict[int, float], penalties: Dict[int, float], targets: List[int]):
+    return _GRAPH.shortest_tree(sources, penalties, targets)
+
+
+# ---------- API process side ----------
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_path: Optional[str] = None
+
+
+def _executor(graph: RoadGraph) -> ProcessPoolExecutor:
+    global _pool, _pool_path
+    if _pool is None or _pool_path != graph.path:
+        shutdown()
+        # spawn: never fork the API process (threads, event loop, sockets)
+        _pool = ProcessPoolExecutor(max_workers=PLAN_WORKERS, mp_context=multiprocessing.get_context("spawn"),
+                                    initializer=_init_worker, initargs=(graph.path,))
+        _pool_path = graph.path
+    return _pool
+
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _trees(graph: RoadGraph, sources: List[Dict[int, float]], penalties: Dict[int, float], targets: List[int]):
+    if PLAN_WORKERS > 1 and len(sources) > 1 and graph.node_count >= PLAN_POOL_MIN_NODES:
+        pool = _executor(graph)
+        return list(pool.map(_worker_tree, sources, [penalties] * len(sources), [targets] * len(sources)))
+    return [graph.shortest_tree(source, penalties, targets) for source in sources]
+
+
+def assign_exits(cost: np.ndarray, capacity: np.ndarray) -> np.ndarray:
+    """Exit index per user (row of cost) keeping every exit within capacity where possible.
+
+    Users who cannot reach any exit (a row of inf) get -1. When the zone
+    holds more people than all exits together, capacities are scaled up
+    in proportion so everyone is still placed.
+    """
+    choice = np.full(len(cost), -1, dtype=np.int64)
+    reachable = np.flatnonzero(np.isfinite(cost).any(axis=1))
+    if not len(reachable):
+        return choice
+    cost = cost[reachable]
+    capacity = capacity.astype(float)
+    if capacity.sum() < len(cost):
+        capacity = np.ceil(capacity * len(cost) / capacity.sum())
+    prices = np.zeros(cost.shape[1])
+    for _ in range(AUCTION_ROUNDS):
+        total = cost + prices
+        picked = total.argmin(axis=1)
+        load = np.bincount(picked, minlength=cost.shape[1])
+        overloaded = np.flatnonzero(load > capacity)
+        if not len(overloaded):
+            break
+        raised = False
+        # shed towards exits with room: users traded between two exits at capacity
+        # only creep both prices up, round after round
+        others = total.copy()
+        others[:, load >= capacity] = np.inf
+        for exit_index in overloaded.tolist():
+            members = np.flatnonzero(picked == exit_index)
+            margins = others[members].min(axis=1) - total[members, exit_index]
+            margins = margins[np.isfinite(margins)]  # users with nowhere else to go stay
+            excess = min(int(load[exit_index] - capacity[exit_index]), len(margins))
+            if excess <= 0:
+                continue
+            prices[exit_index] += np.partition(margins, excess - 1)[excess - 1] + PRICE_STEP
+            raised = True
+        if not raised:
+            break
+    choice[reachable] = (cost + prices).argmin(axis=1)
+    return choice
+
+
+def _summary(users: List[dict], exits: List[dict], choice: np.ndarray, distances: np.ndarray,
+             routes: Optional[List[list]], routing: str, capacity_aware: bool, started: float) -> dict:
+    plans, unreachable = [], []
+    for i, user in enumerate(users):
+        if choice[i] < 0:
+            unreachable.append(user["id"])
+            continue
+        exit_pt = exits[choice[i]]
+        distance = float(distances[i])
+        entry = {
+            "id": user["id"],
+            "exit_id": exit_pt["id"],
+            "distance_m": round(distance),
+            "estimated_time_min": round(distance / evacuation.WALKING_SPEED, 1),
+        }
+        if routes is not None:
+            entry["route"] = routes[i]
+        plans.append(entry)
+    load = np.bincount(choice[choice >= 0], minlength=len(exits))
+    return {
+        "routing": routing,
+        "capacity_aware": capacity_aware,
+        "plans": plans,
+        "exits": [{"id": exit_pt["id"], "name": exit_pt["name"], "capacity": exit_pt.get("capacity"),
+                   "assigned": int(count)} for exit_pt, count in zip(exits, load.tolist())],
+        "unreachable": unreachable,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def plan(users: List[dict], danger_lat: Optional[float] = None, danger_lng: Optional[float] = None,
+         hazards: Optional[List[dict]] = None, capacity_aware: bool = False, include_routes: bool = False,
+         graph: Optional[RoadGraph] = None) -> dict:
+    """Exit, distance and (optionally) route for every user ({"id", "lat", "lng"})."""
+    started = time.perf_counter()
+    graph = graph or road_graph
+    zones = [{**hazard, "radius_m": evacuation.HAZARD_RADIUS_M} for hazard in hazards or ()]
+    exits = evacuation.SAFE_EXITS
+    if danger_lat is not None and danger_lng is not None:
+        zones.append({"lat": danger_lat, "lng": danger_lng, "radius_m": evacuation.HAZARD_RADIUS_M,
+                      "severity": "critical"})
+        blocked = {key for _, key, _ in evacuation.exit_index.within(danger_lat, danger_lng,
+                                                                     evacuation.HAZARD_RADIUS_M)}
+        exits = [exit_pt for exit_pt in exits if exit_pt["id"] not in blocked] or evacuation.SAFE_EXITS
+    capacity = np.array([exit_pt.get("capacity", len(users)) for exit_pt in exits])
+    lats = np.array([user["lat"] for user in users], dtype=float)
+    lngs = np.array([user["lng"] for user in users], dtype=float)
+
+    if not graph.ready:
+        distances = haversine_matrix(lats, lngs, [e["lat"] for e in exits], [e["lng"] for e in exits])
+        choice = assign_exits(distances, capacity) if capacity_aware else distances.argmin(axis=1)
+        picked = distances[np.arange(len(users)), choice] if len(users) else np.zeros(0)
+        routes = None
+        if include_routes:
+            routes = [[[user["lat"], user["lng"]], [exits[j]["lat"], exits[j]["lng"]]]
+                      for user, j in zip(users, choice.tolist())]
+        return _summary(users, exits, choice, picked, routes, "straight_line", capacity_aware, started)
+
+    penalties = graph.penalties_for(zones)
+    nodes, snaps = graph.nearest_nodes(lats, lngs)
+    exit_nodes = [evacuation._exit_node(graph, exit_pt) for exit_pt in exits]
+    targets = sorted(set(nodes.tolist()))
+
+    if capacity_aware:
+        trees = _trees(graph, [{node: snap} for node, snap in exit_nodes], penalties, targets)
+        cost = np.column_stack([tree[0][nodes] for tree in trees]) + snaps[:, None]
+        choice = assign_exits(cost, capacity)
+        tree_of = [trees[j] if j >= 0 else None for j in choice.tolist()]
+    else:
+        sources: Dict[int, float] = {}
+        exit_at: Dict[int, int] = {}
+        for j, (node, snap) in enumerate(exit_nodes):
+            if snap < sources.get(node, np.inf):
+                sources[node], exit_at[node] = snap, j
+        tree = graph.shortest_tree(sources, penalties, targets)
+        roots = tree[3][nodes]
+        choice = np.array([exit_at[root] if root >= 0 else -1 for root in roots.tolist()], dtype=np.int64)
+        tree_of = [tree] * len(users)
+
+    distances = np.zeros(len(users))
+    routes = [] if include_routes else None
+    for i, (node, j) in enumerate(zip(nodes.tolist(), choice.tolist())):
+        if j < 0:
+            if routes is not None:
+                routes.append(None)
+            continue
+        _, length, parent, _ = tree_of[i]
+        # the tree's length starts at the exit's snap distance
+        distances[i] = snaps[i] + length[node]
+        if routes is not None:
+            polyline, _ = graph.polyline(graph.tree_path(parent, node))
+            routes.append([[users[i]["lat"], users[i]["lng"]]] + polyline + [[exits[j]["lat"], exits[j]["lng"]]])
+    return _summary(users, exits, choice, distances, routes, "road_graph", capacity_aware, started)
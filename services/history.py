@@ -0,0 +1,224 @@
+"""
+Sensor History
+Range queries over persisted readings with server-side downsampling.
+  - 1-minute, 1-hour and 1-day rollups (models/sensor_rollup.py) hold
+    count/sum/min/max/last per (sensor_type, node_id, bucket); the reading
+    writer folds every flushed batch into them in the same transaction
+  - a query picks the coarsest rollup that is no wider than the requested
+    step, so a week-long chart reads ~10k rows per node instead of every
+    reading; steps under a minute fall back to the raw sensor_readings table
+  - rollup rows are re-bucketed to the requested step in SQL, raw rows with
+    NumPy; every node comes back as one column-oriented series
+  - ranges older than the archive horizon read the day partitions of
+    services/archive.py instead of the raw table and fine rollups
+"""
+import time
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import case, func, select, text
+from sqlalchemy.dialects.sqlite import insert
+
+from models import SensorReading
+from models.sensor_rollup import ROLLUPS
+from services.archive import PRUNED_ROLLUPS, archive
+
+DEFAULT_POINTS = 500
+REBUILD_CHUNK = 50000
+
+
+# ---------- Incremental maintenance ----------
+
+def _fold(buckets: dict, key, count, total, low, high, last, last_ts):
+    agg = buckets.get(key)
+    if agg is None:
+        buckets[key] = [count, total, low, high, last, last_ts]
+        return
+    agg[0] += count
+    agg[1] += total
+    if low < agg[2]:
+        agg[2] = low
+    if high > agg[3]:
+        agg[3] = high
+    if last_ts >= agg[5]:
+        agg[4], agg[5] = last, last_ts
+
+
+def _upsert_statement(model):
+    table = model.__table__
+    stmt = insert(table)
+    excluded = stmt.excluded
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.sensor_type, table.c.node_id, table.c.bucket],
+        set_={
+            "count": table.c.count + excluded.count,
+            "sum": table.c.sum + excluded.sum,
+            "min": func.min(table.c.min, excluded.min),
+            "max": func.max(table.c.max, excluded.max),
+            "last": case((excluded.last_ts >= table.c.last_ts, excluded.last), else_=table.c.last),
+            "last_ts": func.max(table.c.last_ts, excluded.last_ts),
+        },
+    )
+
+
+_UPSERTS = {model: _upsert_statement(model) for model in ROLLUPS}
+
+
+def upsert_rollups(conn, rows: List[dict]):
+    """Fold reading rows (node_id, sensor_type, value, ts) into every rollup table.
+
+    The batch is pre-aggregated per bucket first, so each rollup gets one
+    UPSERT per touched bucket; coarser rollups are built from the finer ones.
+    """
+    finest = ROLLUPS[0].resolution
+    buckets = {}
+    for row in rows:
+        ts, value = row["ts"], row["value"]
+        key = (row["sensor_type"], row["node_id"], int(ts // finest) * finest)
+        _fold(buckets, key, 1, value, value, value, value, ts)
+
+    for model in ROLLUPS:
+        if model.resolution != finest:
+            coarser = {}
+            for (sensor_type, node_id, bucket), agg in buckets.items():
+                _fold(coarser, (sensor_type, node_id, bucket // model.resolution * model.resolution), *agg)
+            buckets = coarser
+        conn.execute(_UPSERTS[model], [
+            {"sensor_type": sensor_type, "node_id": node_id, "bucket": bucket, "count": agg[0],
+             "sum": agg[1], "min": agg[2], "max": agg[3], "last": agg[4], "last_ts": agg[5]}
+            for (sensor_type, node_id, bucket), agg in buckets.items()
+        ])
+
+
+def rebuild_rollups(engine):
+    """Recompute every rollup from sensor_readings (upgrades, bulk imports)."""
+    with engine.begin() as conn:
+        for model in ROLLUPS:
+            conn.execute(model.__table__.delete())
+        table = SensorReading.__table__
+        last_id = 0
+        while True:
+            rows = conn.execute(
+                select(table.c.id, table.c.node_id, table.c.sensor_type, table.c.value, table.c.ts)
+                .where(table.c.id > last_id).order_by(table.c.id).limit(REBUILD_CHUNK)
+            ).mappings().all()
+            if not rows:
+                break
+            upsert_rollups(conn, rows)
+            last_id = rows[-1]["id"]
+
+
+# ---------- Queries ----------
+
+def pick_source(step: float):
+    """Coarsest rollup no wider than step; None means raw readings."""
+    source = None
+    for model in ROLLUPS:
+        if model.resolution <= step:
+            source = model
+    return source
+
+
+def fetch_buckets(conn, sensor_type: str, start: float, end: float, step: float, source,
+                  node_ids: Optional[Iterable[str]] = None) -> List[tuple]:
+    """(node_id, bucket, count, sum, min, max, last) rows ordered by node and time.
+
+    Rollup rows are already grouped to step in SQL; raw readings come back
+    one row per reading and are grouped by downsample().
+    """
+    params = {"sensor_type": sensor_type, "start": start, "end": end, "step": step}
+    node_filter = ""
+    if node_ids:
+        names = []
+        for i, node_id in enumerate(node_ids):
+            params[f"node_{i}"] = node_id
+            names.append(f":node_{i}")
+        node_filter = f" AND node_id IN ({', '.join(names)})"
+
+    if source is None:
+        sql = ("SELECT node_id, ts, 1, value, value, value, value FROM sensor_readings "
+               "WHERE sensor_type = :sensor_type AND ts >= :start AND ts < :end"
+               f"{node_filter} ORDER BY node_id, ts")
+        return conn.execute(text(sql), params).all()
+
+    table = source.__tablename__
+    params["start"] = start // source.resolution * source.resolution
+    if step == source.resolution:
+        sql = (f"SELECT node_id, bucket, count, sum, min, max, last FROM {table} "
+               f"WHERE sensor_type = :sensor_type AND bucket >= :start AND bucket < :end{node_filter} "
+               "ORDER BY node_id, bucket")
+        return conn.execute(text(sql), params).all()
+
+    # last of a group is the `last` of its newest rollup bucket, joined back on the primary key
+    sql = (f"SELECT g.node_id, g.bucket, g.count, g.sum, g.min, g.max, r.last FROM ("
+           f"SELECT node_id, CAST(bucket / :step AS INTEGER) * :step AS bucket, SUM(count) AS count, "
+           f"SUM(sum) AS sum, MIN(min) AS min, MAX(max) AS max, MAX(bucket) AS last_bucket FROM {table} "
+           f"WHERE sensor_type = :sensor_type AND bucket >= :start AND bucket < :end{node_filter} "
+           f"GROUP BY node_id, 2) g "
+           f"JOIN {table} r ON r.sensor_type = :sensor_type AND r.node_id = g.node_id AND r.bucket = g.last_bucket "
+           f"ORDER BY g.node_id, g.bucket")
+    return conn.execute(text(sql), params).all()
+
+
+def downsample(rows: List[tuple], step: float) -> Dict[str, dict]:
+    """Re-bucket (node_id, bucket, count, sum, min, max, last) rows, ordered by node and time, to step.
+
+    Returns one column-oriented series per node: {"t": [...], "min": [...], ...}.
+    """
+    if not rows:
+        return {}
+    nodes, buckets, counts, sums, lows, highs, lasts = zip(*rows)
+    nodes = np.array(nodes, dtype=object)
+    buckets = np.floor(np.array(buckets, dtype=float) / step) * step
+
+    starts = np.flatnonzero(np.concatenate(([True], (nodes[1:] != nodes[:-1]) | (buckets[1:] != buckets[:-1]))))
+    ends = np.append(starts[1:], len(rows)) - 1
+    counts = np.add.reduceat(np.array(counts, dtype=float), starts)
+    columns = {
+        "t": buckets[starts],
+        "min": np.minimum.reduceat(np.array(lows, dtype=float), starts),
+        "max": np.maximum.reduceat(np.array(highs, dtype=float), starts),
+        "avg": np.add.reduceat(np.array(sums, dtype=float), starts) / counts,
+        "last": np.array(lasts, dtype=float)[ends],
+        "count": counts.astype(np.int64),
+    }
+
+    group_nodes = nodes[starts]
+    cuts = np.flatnonzero(group_nodes[1:] != group_nodes[:-1]) + 1
+    bounds = zip(np.concatenate(([0], cuts)), np.append(cuts, len(starts)))
+    return {
+        group_nodes[lo]: {name: column[lo:hi].tolist() for name, column in columns.items()}
+        for lo, hi in bounds
+    }
+
+
+def query_history(conn, sensor_type: str, start: float, end: Optional[float] = None,
+                  step: Optional[float] = None, points: int = DEFAULT_POINTS,
+                  node_ids: Optional[Iterable[str]] = None) -> dict:
+    end = time.time() if end is None else end
+    step = step or (end - start) / points
+    source = pick_source(step)
+    if source is not None:
+        # buckets must line up with the rollup's own buckets
+        step = max(1, round(step / source.resolution)) * source.resolution
+    rows = []
+    db_start = start
+    if source is None or source in PRUNED_ROLLUPS:
+        # readings and fine rollups before archived_until only exist in the archive
+        archived_until = archive.archived_until
+        if start < archived_until:
+            rows = archive.fetch_buckets(sensor_type, start, min(end, archived_until), step, node_ids)
+            db_start = archived_until
+    if db_start < end:
+        rows += fetch_buckets(conn, sensor_type, db_start, end, step, source, node_ids)
+    if db_start != start:
+        rows.sort(key=lambda row: row[0])  # stable: each node's rows stay in time order
+    return {
+        "sensor": sensor_type,
+        "start": start,
+        "end": end,
+        "step": step,
+        "source": source.__tablename__ if source is not None else SensorReading.__tablename__,
+        "archive": db_start != start,
+        "series": downsample(rows, step),
+    }
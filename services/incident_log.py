@@ -0,0 +1,195 @@
+"""
+Incident Log
+Persists the incident engine's incidents (services/incidents.py) to the
+incidents / incident_streams tables and answers the /alerts history queries.
+The engine stamps every change with the next global version and marks the
+incident dirty; every INCIDENT_FLUSH_INTERVAL seconds a background task
+snapshots the dirty incidents and upserts them in one transaction on a worker
+thread, so repeated changes to an incident between flushes cost one write.
+  - listings page backwards by id with a keyset cursor (id < cursor), so a
+    deep page costs the same as the first one
+  - since=<version> returns what changed after that version, oldest first
+  - the persisted version is the ETag: a poll whose If-None-Match still
+    matches is answered with 304 without touching the database
+"""
+import asyncio
+import json
+import os
+import time
+from typing import List, Optional, Tuple
+
+from sqlalchemy import exists, func, select, text, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from config.db import engine as default_engine
+from models.incident import IncidentRecord, IncidentStream
+from services.incidents import incident_engine, incident_view, OPEN, RESOLVED
+from services.metrics import DB_FLUSH_SECONDS, log
+from services.threat_detector import seed_alert_ids
+
+INCIDENT_FLUSH_INTERVAL = float(os.getenv("INCIDENT_FLUSH_INTERVAL", "0.5"))
+
+FLUSH_SECONDS = DB_FLUSH_SECONDS.labels("incidents")
+
+JSON_COLUMNS = ("sensors", "node_ids", "alerts")
+
+incidents_table = IncidentRecord.__table__
+streams_table = IncidentStream.__table__
+
+
+def _encode(row: dict) -> dict:
+    return {**row, **{column: json.dumps(row[column]) for column in JSON_COLUMNS}}
+
+
+def _decode(row) -> dict:
+    row = dict(row._mapping)
+    for column in JSON_COLUMNS:
+        row[column] = json.loads(row[column])
+    return incident_view(row)
+
+
+def _filters(status: Optional[str], severity: Optional[str], sensor: Optional[str], node_id: Optional[str]):
+    clauses = []
+    if status is not None:
+        clauses.append(incidents_table.c.status == status)
+    if severity is not None:
+        clauses.append(incidents_table.c.severity == severity)
+    if sensor is not None:
+        clauses.append(exists().where(streams_table.c.sensor == sensor,
+                                      streams_table.c.incident_id == incidents_table.c.id))
+    if node_id is not None:
+        # a node is in few incidents: collect them from the node index rather than probing every incident
+        clauses.append(incidents_table.c.id.in_(
+            select(streams_table.c.incident_id).where(streams_table.c.node_id == node_id)))
+    return clauses
+
+
+class IncidentLog:
+    def __init__(self, engine=default_engine, incidents=incident_engine,
+                 flush_interval: float = INCIDENT_FLUSH_INTERVAL):
+        self.engine = engine
+        self.incidents = incidents
+        self.flush_interval = flush_interval
+        upsert = sqlite_insert(incidents_table)
+        self._upsert = upsert.on_conflict_do_update(
+            index_elements=[incidents_table.c.id],
+            set_={column.name: upsert.excluded[column.name] for column in incidents_table.columns if column.name != "id"},
+        )
+        self._insert_streams = sqlite_insert(streams_table).on_conflict_do_nothing()
+        self.version = 0  # every change up to this version is on disk
+        self.written = 0
+        self.flushes = 0
+        self.last_flush_ms: Optional[float] = None
+
+    def load(self):
+        """Continue incident ids/versions and alert ids from the database; close incidents a
+        previous run left open.
+
+        The detectors start from safe after a restart, so a condition that is
+        still there raises a fresh alert and opens a new incident.
+        """
+        with self.engine.begin() as conn:
+            last_id = conn.execute(select(func.max(incidents_table.c.id))).scalar() or 0
+            version = conn.execute(select(func.max(incidents_table.c.version))).scalar() or 0
+            # an incident keeps its newest alerts, so the highest id is always among them
+            last_alert = conn.execute(text("SELECT max(json_extract(value, '$.id')) "
+                                           "FROM incidents, json_each(incidents.alerts)")).scalar() or 0
+            stale = conn.execute(select(incidents_table.c.id, incidents_table.c.updated_at)
+                                 .where(incidents_table.c.status == OPEN)).all()
+            for incident_id, updated_at in stale:
+                version += 1
+                conn.execute(update(incidents_table).where(incidents_table.c.id == incident_id).values(
+                    status=RESOLVED, resolved_at=updated_at, active_streams=0, version=version))
+        if stale:
+            log.info("incidents_closed_on_start", count=len(stale))
+        self.incidents.seed(last_id + 1, version)
+        seed_alert_ids(last_alert + 1)
+        self.version = version
+
+    # ---------- Writes ----------
+
+    def _snapshot(self) -> Tuple[List[dict], List[dict], int]:
+        """Rows of the dirty incidents, taken on the event loop so the worker thread sees a consistent copy."""
+        version = self.incidents.version
+        dirty = self.incidents.take_dirty()
+        rows = [incident.to_row() for incident in dirty]
+        streams = [
+            {"sensor": sensor, "incident_id": incident.id, "node_id": node_id or ""}
+            for incident in dirty for node_id, sensor in incident.streams
+        ]
+        return rows, streams, version
+
+    def write_batch(self, rows: List[dict], streams: List[dict]):
+        started = time.perf_counter()
+        with self.engine.begin() as conn:
+            conn.execute(self._upsert, [_encode(row) for row in rows])
+            if streams:
+                conn.execute(self._insert_streams, streams)
+        elapsed = time.perf_counter() - started
+        FLUSH_SECONDS.observe(elapsed)
+        self.last_flush_ms = elapsed * 1000
+        self.written += len(rows)
+        self.flushes += 1
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if not self.incidents.dirty:
+                continue
+            rows, streams, version = self._snapshot()
+            try:
+                await loop.run_in_executor(None, self.write_batch, rows, streams)
+            except Exception as e:
+                log.error("incidents_flush_failed", rows=len(rows), error=e)
+                for row in rows:  # retry with the next flush unless changed meanwhile
+                    incident = self.incidents.store.get(row["id"])
+                    if incident is not None:
+                        self.incidents.dirty.setdefault(incident.id, incident)
+                continue
+            self.version = version
+
+    def flush(self):
+        """Synchronously write every pending change (shutdown)."""
+        if self.incidents.dirty:
+            rows, streams, version = self._snapshot()
+            self.write_batch(rows, streams)
+            self.version = version
+
+    # ---------- Queries ----------
+
+    def page(self, conn, limit: int = 20, cursor: Optional[int] = None, status: Optional[str] = None,
+             severity: Optional[str] = None, sensor: Optional[str] = None,
+             node_id: Optional[str] = None) -> Tuple[List[dict], Optional[int]]:
+        """Newest incidents first, older than `cursor`; returns (items, next cursor or None)."""
+        query = select(incidents_table).where(*_filters(status, severity, sensor, node_id))
+        if cursor is not None:
+            query = query.where(incidents_table.c.id < cursor)
+        rows = conn.execute(query.order_by(incidents_table.c.id.desc()).limit(limit)).all()
+        items = [_decode(row) for row in rows]
+        return items, (items[-1]["id"] if len(items) == limit else None)
+
+    def changes(self, conn, since: int, limit: int = 100, status: Optional[str] = None,
+                severity: Optional[str] = None, sensor: Optional[str] = None,
+                node_id: Optional[str] = None) -> List[dict]:
+        """Incidents whose latest change is newer than version `since`, oldest change first."""
+        query = (select(incidents_table)
+                 .where(incidents_table.c.version > since, *_filters(status, severity, sensor, node_id))
+                 .order_by(incidents_table.c.version).limit(limit))
+        return [_decode(row) for row in conn.execute(query).all()]
+
+    def get(self, conn, incident_id: int) -> Optional[dict]:
+        row = conn.execute(select(incidents_table).where(incidents_table.c.id == incident_id)).first()
+        return _decode(row) if row is not None else None
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "pending": len(self.incidents.dirty),
+            "written": self.written,
+            "flushes": self.flushes,
+            "last_flush_ms": None if self.last_flush_ms is None else round(self.last_flush_ms, 2),
+        }
+
+
+incident_log = IncidentLog()
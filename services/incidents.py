@@ -0,0 +1,368 @@
+"""
+Incident Engine
+Turns the alert stream of the threshold and trend detectors into incidents:
+one record per situation on the ground instead of one per alert.
+  - grouping:  an alert joins an open incident within INCIDENT_RADIUS_M of it
+               that saw activity in the last INCIDENT_WINDOW seconds (nodes
+               without a position group by node); otherwise it opens a new
+               incident with the next monotonic id
+  - cooldown:  a stream stays bound to its incident for INCIDENT_COOLDOWN
+               seconds after the incident resolves, so a stream flapping
+               around its threshold reopens the same incident
+  - notify:    only a new incident or a raise of its severity is pushed to
+               clients; everything else is counted as suppressed
+An incident resolves once every threshold stream in it is back to safe.
+Transient alerts (trend warnings, camera detections) carry no "back to safe"
+event; incidents made only of those resolve after INCIDENT_WINDOW of silence.
+
+IncidentStore keeps the last INCIDENT_RETENTION incidents in memory with
+indexes by status, sensor and node. Every change stamps the incident with
+the next global version and marks it dirty for services/incident_log.py,
+which persists incidents and serves the paginated /alerts history.
+"""
+import bisect
+import itertools
+import os
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from services.spatial import SpatialIndex
+from services.threat_detector import LEVELS, SAFE
+
+INCIDENT_RADIUS_M = float(os.getenv("INCIDENT_RADIUS_M", "500"))
+INCIDENT_WINDOW = float(os.getenv("INCIDENT_WINDOW", "300"))
+INCIDENT_COOLDOWN = float(os.getenv("INCIDENT_COOLDOWN", "120"))
+INCIDENT_RETENTION = int(os.getenv("INCIDENT_RETENTION", "10000"))
+INCIDENT_RECENT_ALERTS = 10  # alerts kept on each incident for display
+
+OPEN, RESOLVED = "open", "resolved"
+SEVERITY_RANK = {severity: code for code, severity in enumerate(LEVELS)}
+
+
+def _iso(ts: Optional[float]) -> Optional[str]:
+    if ts is None:
+        return None
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def incident_view(row: dict) -> dict:
+    """API shape of an incident from its row (Incident.to_row() or a decoded incidents row)."""
+    return {
+        "id": row["id"],
+        "version": row["version"],
+        "status": row["status"],
+        "severity": row["severity"],
+        "title": row["title"],
+        "message": row["message"],
+        "description": row["message"],
+        "sensor_type": row["sensors"][0] if row["sensors"] else None,
+        "sensors": row["sensors"],
+        "node_ids": row["node_ids"],
+        "lat": row["lat"],
+        "lng": row["lng"],
+        "created_at": _iso(row["created_at"]),
+        "updated_at": _iso(row["updated_at"]),
+        "resolved_at": _iso(row["resolved_at"]),
+        "alert_count": row["alert_count"],
+        "suppressed": row["suppressed"],
+        "active_streams": row["active_streams"],
+        "alerts": row["alerts"],
+    }
+
+
+class Incident:
+    __slots__ = ("id", "version", "status", "severity", "title", "message", "sensors", "node_ids", "streams",
+                 "lat", "lng", "created_ts", "updated_ts", "resolved_ts",
+                 "alert_count", "suppressed", "active", "alerts")
+
+    def __init__(self, incident_id: int, alert: dict, lat: Optional[float], lng: Optional[float], ts: float):
+        self.id = incident_id
+        self.version = 0
+        self.status = OPEN
+        self.severity = alert["severity"]
+        self.title = alert["title"]
+        self.message = alert["message"]
+        self.sensors: List[str] = []
+        self.node_ids: List[str] = []
+        self.streams: Set[Tuple[str, str]] = set()  # (node_id, sensor)
+        self.lat, self.lng = lat, lng  # anchor: position of the first alert
+        self.created_ts = self.updated_ts = ts
+        self.resolved_ts: Optional[float] = None
+        self.alert_count = 0
+        self.suppressed = 0
+        self.active: Dict[Tuple[str, str], str] = {}  # threshold streams not back to safe -> severity
+        self.alerts: List[dict] = []
+
+    def to_row(self) -> dict:
+        """Snapshot in the column layout of models.incident.IncidentRecord (lists not yet JSON)."""
+        return {
+            "id": self.id,
+            "version": self.version,
+            "status": self.status,
+            "severity": self.severity,
+            "title": self.title,
+            "message": self.message,
+            "lat": self.lat,
+            "lng": self.lng,
+            "created_at": self.created_ts,
+            "updated_at": self.updated_ts,
+            "resolved_at": self.resolved_ts,
+            "alert_count": self.alert_count,
+            "suppressed": self.suppressed,
+            "active_streams": len(self.active),
+            "sensors": list(self.sensors),
+            "node_ids": list(self.node_ids),
+            "alerts": list(self.alerts),
+        }
+
+    def to_dict(self) -> dict:
+        return incident_view(self.to_row())
+
+
+class IncidentStore:
+    """Retained incidents, oldest first, with per-status/sensor/node indexes of ascending ids."""
+
+    def __init__(self, retention: int = INCIDENT_RETENTION, on_evict: Optional[Callable[[Incident], None]] = None):
+        self.retention = retention
+        self.on_evict = on_evict  # the engine drops an evicted incident from its other indexes
+        self.by_id: Dict[int, Incident] = {}  # insertion order == id order
+        self.open: Set[int] = set()
+        self.by_sensor: Dict[str, List[int]] = {}
+        self.by_node: Dict[str, List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def get(self, incident_id: int) -> Optional[Incident]:
+        return self.by_id.get(incident_id)
+
+    def add(self, incident: Incident):
+        self.by_id[incident.id] = incident
+        self.open.add(incident.id)
+        while len(self.by_id) > self.retention:
+            self._evict(next(iter(self.by_id)))
+
+    def _evict(self, incident_id: int):
+        incident = self.by_id.pop(incident_id)
+        self.open.discard(incident_id)
+        for index, keys in ((self.by_sensor, incident.sensors), (self.by_node, incident.node_ids)):
+            for key in keys:
+                ids = index[key]
+                ids.pop(bisect.bisect_left(ids, incident_id))
+                if not ids:
+                    del index[key]
+        if self.on_evict is not None:
+            self.on_evict(incident)
+
+    def tag(self, incident: Incident, sensor: str, node_id: Optional[str]):
+        """Record that the incident involves sensor/node, keeping the index lists sorted."""
+        incident.streams.add((node_id, sensor))
+        if sensor not in incident.sensors:
+            incident.sensors.append(sensor)
+            bisect.insort(self.by_sensor.setdefault(sensor, []), incident.id)
+        if node_id is not None and node_id not in incident.node_ids:
+            incident.node_ids.append(node_id)
+            bisect.insort(self.by_node.setdefault(node_id, []), incident.id)
+
+    def query(self, limit: int = 20, status: Optional[str] = None, severity: Optional[str] = None,
+              sensor: Optional[str] = None, node_id: Optional[str] = None) -> List[Incident]:
+        """Newest incidents first, walking the smallest index that covers the filters."""
+        candidates = [self.by_id.keys()]
+        if status == OPEN:
+            candidates.append(sorted(self.open))
+        if sensor is not None:
+            candidates.append(self.by_sensor.get(sensor, ()))
+        if node_id is not None:
+            candidates.append(self.by_node.get(node_id, ()))
+        ids = min(candidates, key=len)
+
+        found = []
+        for incident_id in reversed(ids):
+            incident = self.by_id[incident_id]
+            if ((status is None or incident.status == status)
+                    and (severity is None or incident.severity == severity)
+                    and (sensor is None or sensor in incident.sensors)
+                    and (node_id is None or node_id in incident.node_ids)):
+                found.append(incident)
+                if len(found) >= limit:
+                    break
+        return found
+
+
+class IncidentEngine:
+    def __init__(self, radius_m: float = INCIDENT_RADIUS_M, window: float = INCIDENT_WINDOW,
+                 cooldown: float = INCIDENT_COOLDOWN, retention: int = INCIDENT_RETENTION):
+        self.radius_m = radius_m
+        self.window = window
+        self.cooldown = cooldown
+        self.store = IncidentStore(retention, on_evict=self._unindex)
+        self._ids = itertools.count(1)
+        self._streams: Dict[Tuple[str, str], int] = {}  # (node_id, sensor) -> incident id
+        self.zones = SpatialIndex(cell_m=radius_m)  # open incidents with a position
+        self.version = 0  # last version handed out
+        self.dirty: Dict[int, Incident] = {}  # changed since the incident log last took them
+        self.alerts = 0
+        self.notified = 0
+
+    def seed(self, next_id: int, version: int):
+        """Continue ids and versions after those already persisted."""
+        self._ids = itertools.count(next_id)
+        self.version = version
+
+    def _touch(self, incident: Incident):
+        self.version += 1
+        incident.version = self.version
+        self.dirty[incident.id] = incident
+
+    def take_dirty(self) -> List[Incident]:
+        dirty, self.dirty = self.dirty, {}
+        return list(dirty.values())
+
+    # ---------- Spatial index of open incidents ----------
+
+    def _index(self, incident: Incident):
+        if incident.lat is not None:
+            self.zones.insert(incident.id, incident.lat, incident.lng)
+
+    def _unindex(self, incident: Incident):
+        self.zones.remove(incident.id)
+
+    def _nearby(self, lat: float, lng: float, ts: float) -> Optional[Incident]:
+        """Closest open incident within the radius that was active inside the window."""
+        def recent(incident_id):
+            incident = self.store.get(incident_id)
+            return incident is not None and ts - incident.updated_ts <= self.window
+
+        hits = self.zones.nearest(lat, lng, max_m=self.radius_m, where=recent)
+        return self.store.get(hits[0][1]) if hits else None
+
+    def _same_node(self, node_id: Optional[str], ts: float) -> Optional[Incident]:
+        for incident_id in reversed(self.store.by_node.get(node_id, ())):
+            incident = self.store.get(incident_id)
+            if incident.status == OPEN and ts - incident.updated_ts <= self.window:
+                return incident
+        return None
+
+    # ---------- Lifecycle ----------
+
+    def _resolve(self, incident: Incident, ts: float):
+        incident.status = RESOLVED
+        incident.resolved_ts = ts
+        self.store.open.discard(incident.id)
+        self._unindex(incident)
+
+    def _reopen(self, incident: Incident):
+        incident.status = OPEN
+        incident.resolved_ts = None
+        self.store.open.add(incident.id)
+        self._index(incident)
+
+    def expire(self, now: Optional[float] = None):
+        """Resolve open incidents with no threshold stream held and no alert for a whole window."""
+        now = time.time() if now is None else now
+        for incident_id in list(self.store.open):
+            incident = self.store.get(incident_id)
+            if not incident.active and now - incident.updated_ts >= self.window:
+                self._resolve(incident, incident.updated_ts + self.window)
+                self._touch(incident)
+
+    def _bound(self, stream: Tuple[str, str], ts: float) -> Optional[Incident]:
+        """The stream's incident, while open or within the cooldown after it resolved."""
+        incident_id = self._streams.get(stream)
+        incident = self.store.get(incident_id) if incident_id is not None else None
+        if incident is None:
+            return None
+        if incident.status == RESOLVED:
+            if ts - incident.resolved_ts > self.cooldown:
+                return None
+            self._reopen(incident)
+        return incident
+
+    def ingest(self, alert: dict, lat: Optional[float] = None, lng: Optional[float] = None,
+               ts: Optional[float] = None, transient: bool = False) -> Tuple[Optional[Incident], bool]:
+        """(incident, notify) for one alert; notify is False for alerts folded into an existing incident.
+
+        Threshold alerts must include the stream's return to safe; transient
+        alerts (trends, camera detections) only ever raise.
+        """
+        ts = time.time() if ts is None else ts
+        self.alerts += 1
+        self.expire(ts)
+        stream = (alert.get("node_id"), alert["sensor"])
+
+        if alert["severity"] == SAFE:
+            incident_id = self._streams.get(stream)
+            incident = self.store.get(incident_id) if incident_id is not None else None
+            if incident is None or stream not in incident.active:
+                return incident, False
+            del incident.active[stream]
+            incident.updated_ts = ts
+            if not incident.active and incident.status == OPEN:
+                self._resolve(incident, ts)
+            self._touch(incident)
+            return incident, False
+
+        incident = self._bound(stream, ts)
+        if incident is None:
+            if lat is not None and lng is not None:
+                incident = self._nearby(lat, lng, ts)
+            else:
+                incident = self._same_node(stream[0], ts)
+        created = incident is None
+        if created:
+            incident = Incident(next(self._ids), alert, lat, lng, ts)
+            self.store.add(incident)
+            self._index(incident)
+
+        raised = SEVERITY_RANK[alert["severity"]] > SEVERITY_RANK[incident.severity]
+        if raised:
+            incident.severity = alert["severity"]
+            incident.title, incident.message = alert["title"], alert["message"]
+        self._streams[stream] = incident.id
+        self.store.tag(incident, alert["sensor"], stream[0])
+        if not transient:
+            incident.active[stream] = alert["severity"]
+        incident.updated_ts = ts
+        incident.alert_count += 1
+        alert["incident_id"] = incident.id
+        incident.alerts.append(alert)
+        del incident.alerts[:-INCIDENT_RECENT_ALERTS]
+        self._touch(incident)
+
+        notify = created or raised
+        if notify:
+            self.notified += 1
+        else:
+            incident.suppressed += 1
+        return incident, notify
+
+    # ---------- Queries ----------
+
+    def query(self, limit: int = 20, status: Optional[str] = None, severity: Optional[str] = None,
+              sensor: Optional[str] = None, node_id: Optional[str] = None) -> List[dict]:
+        self.expire()
+        return [incident.to_dict() for incident in self.store.query(limit, status, severity, sensor, node_id)]
+
+    def get(self, incident_id: int) -> Optional[dict]:
+        incident = self.store.get(incident_id)
+        return incident.to_dict() if incident else None
+
+    def hazards(self, now: Optional[float] = None) -> List[dict]:
+        """Positions and severities of the open incidents, for routing around them."""
+        self.expire(now)
+        return [{"lat": lat, "lng": lng, "severity": self.store.get(incident_id).severity}
+                for incident_id, lat, lng, _ in self.zones]
+
+    def stats(self) -> dict:
+        return {
+            "incidents": len(self.store),
+            "version": self.version,
+            "open": len(self.store.open),
+            "alerts": self.alerts,
+            "notified": self.notified,
+            "suppressed": self.alerts - self.notified,
+        }
+
+
+incident_engine = IncidentEngine()
@@ -0,0 +1,454 @@
+"""
+Position Integrity
+Tamper evidence for sensor_positions without one network call per change.
+Every create and delete appends the row's generate_position_hash() to the
+position_chain table in the same transaction as the change; a background task
+seals the new entries every CHAIN_SEAL_INTERVAL seconds:
+  - chain: entry_hash = sha256(prev_hash + data_hash), starting from "0" like
+           sensor_chain, so rewriting any past entry breaks every later link
+  - batch: the sealed entries become the leaves of a Merkle tree whose root is
+           stored in chain_batches and queued in the outbox for sensor_chain's
+           CHAIN_ANCHOR_PATH: one delivery per batch however many positions
+           changed (an empty path keeps roots local)
+  - proof: proof(position_id) returns each of a position's entries with the
+           sibling hashes up to its batch root, log2(batch size) of them; a
+           tree is rebuilt from its batch's leaves on first use and the last
+           CHAIN_TREE_CACHE trees are kept
+  - audit: audit() rehashes every position and chain entry on AUDIT_WORKERS
+           processes, rebuilds every root and diffs the table against the chain
+A receiver that only knows the old per-change /register can still get one
+delivery per change, queued with the change, by setting CHAIN_REGISTER_EACH=1.
+Leaves and inner nodes hash with distinct prefixes (0x00 / 0x01) so an inner
+node can never pass for a leaf; an odd node at the end of a level moves up
+unchanged.
+
+Usage: python -m services.integrity audit [--workers N]
+       python -m services.integrity seal
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, insert, select, update
+
+from config.db import engine as default_engine
+from models.position_chain import ChainBatch, PositionChainEntry
+from models.sensor_position import SensorPosition
+from services.metrics import log
+from services.outbox import enqueue, enqueue_many, outbox, outbox_table, position_event
+
+CHAIN_SEAL_INTERVAL = float(os.getenv("CHAIN_SEAL_INTERVAL", "10"))
+CHAIN_BATCH_MAX = int(os.getenv("CHAIN_BATCH_MAX", "100000"))
+CHAIN_ANCHOR_PATH = os.getenv("CHAIN_ANCHOR_PATH", "/anchor")  # empty keeps roots local
+CHAIN_REGISTER_EACH = os.getenv("CHAIN_REGISTER_EACH", "0") not in ("0", "false", "off")  # per-change /register too
+CHAIN_TREE_CACHE = int(os.getenv("CHAIN_TREE_CACHE", "16"))
+AUDIT_WORKERS = int(os.getenv("AUDIT_WORKERS", str(os.cpu_count() or 1)))
+AUDIT_POOL_MIN_ROWS = 20000  # below this, starting the processes costs more than the hashing
+GENESIS = "0"
+
+_encode = json.encoder.encode_basestring_ascii  # json.dumps' own string encoder (ensure_ascii)
+
+chain_table = PositionChainEntry.__table__
+batches_table = ChainBatch.__table__
+positions_table = SensorPosition.__table__
+
+
+# ---------- Hashing ----------
+
+def position_dict(pos) -> dict:
+    """The fields of a position (ORM object or row) that its hash covers."""
+    return {"id": pos.id, "name": pos.name, "lat": pos.lat, "lng": pos.lng, "sensor_type": pos.sensor_type}
+
+
+def generate_position_hash(pos_dict: dict, action: str) -> str:
+    """Generates a SHA-256 hash for the sensor position data."""
+    payload = {
+        "action": action,
+        "data": pos_dict
+    }
+    # Sort keys to ensure deterministic hash
+    payload_str = json.dumps(payload, sort_keys=True)
+    return hashlib.sha256(payload_str.encode('utf-8')).hexdigest()
+
+
+def position_hash(position_id, name, lat, lng, sensor_type, action: str) -> str:
+    """generate_position_hash(position_dict(row), action), formatted directly instead of through
+    json.dumps (about 3x faster, for the audit); falls back when a field would encode differently."""
+    if not (type(position_id) is int and type(lat) is float and type(lng) is float
+            and math.isfinite(lat) and math.isfinite(lng) and type(name) is str and type(sensor_type) is str):
+        return generate_position_hash({"id": position_id, "name": name, "lat": lat, "lng": lng,
+                                       "sensor_type": sensor_type}, action)
+    payload = (f'{{"action": {_encode(action)}, "data": {{"id": {position_id}, "lat": {lat!r}, "lng": {lng!r}, '
+               f'"name": {_encode(name)}, "sensor_type": {_encode(sensor_type)}}}}}')
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def link_hash(prev_hash: str, data_hash: str) -> str:
+    return hashlib.sha256((prev_hash + data_hash).encode()).hexdigest()
+
+
+def _leaf(entry_hash: str) -> bytes:
+    return hashlib.sha256(b"\x00" + bytes.fromhex(entry_hash)).digest()
+
+
+def _node(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(b"\x01" + left + right).digest()
+
+
+def merkle_levels(entry_hashes: List[str]) -> List[List[bytes]]:
+    """Every level of the tree over entry_hashes, leaves first, the root alone last."""
+    level = [_leaf(entry_hash) for entry_hash in entry_hashes]
+    levels = [level]
+    while len(level) > 1:
+        parent = [_node(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            parent.append(level[-1])
+        levels.append(parent)
+        level = parent
+    return levels
+
+
+def merkle_proof(levels: List[List[bytes]], index: int) -> List[dict]:
+    proof = []
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append({"hash": level[sibling].hex(), "side": "left" if sibling < index else "right"})
+        index //= 2
+    return proof
+
+
+def verify_proof(entry_hash: str, proof: List[dict], root: str) -> bool:
+    """Recompute the root from an entry and its proof: O(log n) hashes."""
+    node = _leaf(entry_hash)
+    for step in proof:
+        sibling = bytes.fromhex(step["hash"])
+        node = _node(sibling, node) if step["side"] == "left" else _node(node, sibling)
+    return node.hex() == root
+
+
+# ---------- Audit workers ----------
+
+def _rehash_positions(rows: List[tuple]) -> List[Tuple[int, str]]:
+    """(id, CREATED hash) per (id, name, lat, lng, sensor_type) row."""
+    return [(row[0], position_hash(*row, "CREATED")) for row in rows]
+
+
+def _broken_links(rows: List[tuple]) -> List[int]:
+    """Seqs whose entry_hash is not sha256(prev_hash + data_hash); rows are (seq, data, prev, entry)."""
+    return [seq for seq, data_hash, prev_hash, entry_hash in rows if link_hash(prev_hash, data_hash) != entry_hash]
+
+
+def _batch_root(entry_hashes: List[str]) -> str:
+    return merkle_levels(entry_hashes)[-1][0].hex()
+
+
+def _chunks(rows: list, parts: int) -> List[list]:
+    size = max(1, math.ceil(len(rows) / parts))
+    return [rows[i:i + size] for i in range(0, len(rows), size)]
+
+
+# ---------- Chain ----------
+
+def record(db, position_id: int, action: str, data_hash: str, now: Optional[float] = None):
+    """Append a change to the chain inside the caller's transaction (Session or Connection); with
+    CHAIN_REGISTER_EACH its /register delivery is queued too, so call outbox.notify() once it commits."""
+    record_many(db, [(position_id, action, data_hash)], now)
+
+
+def record_many(db, changes: List[Tuple[int, str, str]], now: Optional[float] = None,
+                register: Optional[bool] = None):
+    """register: queue a /register delivery per change (default CHAIN_REGISTER_EACH)."""
+    now = time.time() if now is None else now
+    db.execute(insert(chain_table), [{"position_id": position_id, "action": action, "data_hash": data_hash,
+                                      "created_at": now} for position_id, action, data_hash in changes])
+    if CHAIN_REGISTER_EACH if register is None else register:
+        enqueue_many(db, [position_event(position_id, data_hash) for position_id, _, data_hash in changes], now)
+
+
+class PositionChain:
+    def __init__(self, engine=default_engine, seal_interval: float = CHAIN_SEAL_INTERVAL,
+                 batch_max: int = CHAIN_BATCH_MAX, anchor_path: str = CHAIN_ANCHOR_PATH,
+                 tree_cache: int = CHAIN_TREE_CACHE):
+        self.engine = engine
+        self.seal_interval = seal_interval
+        self.batch_max = batch_max
+        self.anchor_path = anchor_path
+        self.tree_cache = tree_cache
+        self._trees: "OrderedDict[int, List[List[bytes]]]" = OrderedDict()
+        self._seal_lock = threading.Lock()
+        self._tree_lock = threading.Lock()
+        self._link = (update(chain_table).where(chain_table.c.seq == bindparam("entry_seq"))
+                      .values(prev_hash=bindparam("prev"), entry_hash=bindparam("entry"),
+                              batch_id=bindparam("batch"), leaf=bindparam("index")))
+        self.batches = 0
+        self.sealed = 0
+        self.last_seal_ms: Optional[float] = None
+        self.last_root: Optional[str] = None
+
+    def adopt(self) -> int:
+        """Record the positions that predate the chain, once, while the chain is still empty."""
+        with self.engine.begin() as conn:
+            if conn.execute(select(chain_table.c.seq).limit(1)).first() is not None:
+                return 0
+            rows = conn.execute(select(positions_table).order_by(positions_table.c.id)).all()
+            if rows:
+                # they predate the chain: anchored with the first batch, not registered again
+                record_many(conn, [(row.id, "CREATED", generate_position_hash(position_dict(row), "CREATED"))
+                                   for row in rows], register=False)
+        if rows:
+            log.info("chain_adopted", positions=len(rows))
+        return len(rows)
+
+    # ---------- Sealing ----------
+
+    def seal(self, now: Optional[float] = None) -> int:
+        """Link the unsealed entries and batch them under one Merkle root; returns how many were sealed."""
+        now = time.time() if now is None else now
+        started = time.perf_counter()
+        with self._seal_lock, self.engine.begin() as conn:
+            rows = conn.execute(select(chain_table.c.seq, chain_table.c.data_hash)
+                                .where(chain_table.c.batch_id.is_(None))
+                                .order_by(chain_table.c.seq).limit(self.batch_max)).all()
+            if not rows:
+                return 0
+            prev = conn.execute(select(batches_table.c.chain_head)
+                                .order_by(batches_table.c.id.desc()).limit(1)).scalar() or GENESIS
+            links = []
+            for row in rows:
+                entry = link_hash(prev, row.data_hash)
+                links.append({"entry_seq": row.seq, "prev": prev, "entry": entry, "index": len(links)})
+                prev = entry
+            levels = merkle_levels([link["entry"] for link in links])
+            root = levels[-1][0].hex()
+            batch_id = conn.execute(insert(batches_table).values(
+                first_seq=rows[0].seq, last_seq=rows[-1].seq, size=len(rows), root=root, chain_head=prev,
+                created_at=now)).inserted_primary_key[0]
+            for link in links:
+                link["batch"] = batch_id
+            conn.execute(self._link, links)
+            if self.anchor_path:
+                enqueue(conn, self.anchor_path, {"batch_id": batch_id, "root": root, "size": len(rows),
+                                                 "first_seq": rows[0].seq, "last_seq": rows[-1].seq,
+                                                 "chain_head": prev}, f"batch:{batch_id}:{root}", now)
+        self._cache(batch_id, levels)
+        if self.anchor_path:
+            outbox.notify()
+        self.batches += 1
+        self.sealed += len(rows)
+        self.last_root = root
+        self.last_seal_ms = (time.perf_counter() - started) * 1000
+        return len(rows)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                sealed = await loop.run_in_executor(None, self.seal)
+            except Exception as e:
+                log.error("chain_seal_failed", error=e)
+                sealed = 0
+            if sealed < self.batch_max:
+                await asyncio.sleep(self.seal_interval)
+
+    # ---------- Proofs ----------
+
+    def _cache(self, batch_id: int, levels: List[List[bytes]]):
+        with self._tree_lock:
+            self._trees[batch_id] = levels
+            self._trees.move_to_end(batch_id)
+            while len(self._trees) > self.tree_cache:
+                self._trees.popitem(last=False)
+
+    def _tree(self, conn, batch_id: int) -> List[List[bytes]]:
+        with self._tree_lock:
+            levels = self._trees.get(batch_id)
+            if levels is not None:
+                self._trees.move_to_end(batch_id)
+                return levels
+        leaves = conn.execute(select(chain_table.c.entry_hash).where(chain_table.c.batch_id == batch_id)
+                              .order_by(chain_table.c.seq)).scalars().all()
+        levels = merkle_levels(leaves)
+        self._cache(batch_id, levels)
+        return levels
+
+    def proof(self, position_id: int) -> Optional[dict]:
+        """A position's chain entries with their inclusion proofs, and whether the row still matches."""
+        with self.engine.connect() as conn:
+            entries = conn.execute(select(chain_table).where(chain_table.c.position_id == position_id)
+                                   .order_by(chain_table.c.seq)).all()
+            if not entries:
+                return None
+            row = conn.execute(select(positions_table).where(positions_table.c.id == position_id)).first()
+            batch_ids = {entry.batch_id for entry in entries if entry.batch_id is not None}
+            batches = {batch.id: batch for batch in conn.execute(
+                select(batches_table).where(batches_table.c.id.in_(batch_ids)))}
+            anchors = dict(conn.execute(select(outbox_table.c.key, outbox_table.c.status).where(
+                outbox_table.c.key.in_([f"batch:{batch.id}:{batch.root}" for batch in batches.values()]))).all())
+            trees = {batch_id: self._tree(conn, batch_id) for batch_id in batch_ids}
+
+        result = []
+        for entry in entries:
+            item = {"seq": entry.seq, "action": entry.action, "data_hash": entry.data_hash,
+                    "created_at": entry.created_at, "sealed": entry.batch_id is not None}
+            if entry.batch_id is not None:
+                batch = batches[entry.batch_id]
+                proof = merkle_proof(trees[batch.id], entry.leaf)
+                item.update({
+                    "prev_hash": entry.prev_hash,
+                    "entry_hash": entry.entry_hash,
+                    "leaf": entry.leaf,
+                    "proof": proof,
+                    "batch": {"id": batch.id, "root": batch.root, "size": batch.size,
+                              "anchor": anchors.get(f"batch:{batch.id}:{batch.root}")},
+                    "verified": link_hash(entry.prev_hash, entry.data_hash) == entry.entry_hash
+                                and verify_proof(entry.entry_hash, proof, batch.root),
+                })
+            result.append(item)
+        created = [entry.data_hash for entry in entries if entry.action == "CREATED"]
+        if row is None:
+            current = None
+            matches = entries[-1].action == "DELETED"  # gone through the API, not behind its back
+        else:
+            current = generate_position_hash(position_dict(row), "CREATED")
+            matches = entries[-1].action == "CREATED" and current == created[-1]
+        return {
+            "position_id": position_id,
+            "exists": row is not None,
+            "current_hash": current,
+            "matches_chain": matches,
+            "entries": result,
+        }
+
+    # ---------- Audit ----------
+
+    def audit(self, workers: int = AUDIT_WORKERS) -> dict:
+        """Rehash the positions table and the whole chain and diff them; read-only."""
+        started = time.perf_counter()
+        with self.engine.connect() as conn:
+            positions = conn.execute(select(
+                positions_table.c.id, positions_table.c.name, positions_table.c.lat, positions_table.c.lng,
+                positions_table.c.sensor_type)).all()
+            entries = conn.execute(select(chain_table.c.seq, chain_table.c.position_id, chain_table.c.action,
+                                          chain_table.c.data_hash, chain_table.c.prev_hash,
+                                          chain_table.c.entry_hash, chain_table.c.batch_id)
+                                   .order_by(chain_table.c.seq)).all()
+            batches = {batch.id: batch for batch in conn.execute(select(batches_table))}
+
+        links = []
+        leaves: Dict[int, List[str]] = {batch_id: [] for batch_id in batches}
+        last: Dict[int, str] = {}  # position id -> its latest action
+        created: Dict[int, str] = {}  # position id -> hash of its latest CREATED entry
+        broken_links = []
+        prev = GENESIS
+        for seq, position_id, action, data_hash, prev_hash, entry_hash, batch_id in entries:
+            last[position_id] = action
+            if action == "CREATED":
+                created[position_id] = data_hash
+            if batch_id is None:
+                continue
+            links.append((seq, data_hash, prev_hash, entry_hash))
+            leaves.setdefault(batch_id, []).append(entry_hash)
+            if prev_hash != prev:  # every sealed entry must point at the one before it
+                broken_links.append(seq)
+            prev = entry_hash
+        batch_ids = list(leaves)
+
+        if workers > 1 and len(positions) + len(links) >= AUDIT_POOL_MIN_ROWS:
+            # spawn: the CLI may be run next to a live API process sharing the DB
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                hashed = pool.map(_rehash_positions, _chunks([tuple(row) for row in positions], workers * 4))
+                broken = pool.map(_broken_links, _chunks(links, workers * 4))
+                roots = pool.map(_batch_root, [leaves[batch_id] for batch_id in batch_ids])
+                current = dict(pair for chunk in hashed for pair in chunk)
+                broken_links.extend(seq for chunk in broken for seq in chunk)
+                roots = dict(zip(batch_ids, roots))
+        else:
+            current = dict(_rehash_positions(positions))
+            broken_links.extend(_broken_links(links))
+            roots = {batch_id: _batch_root(leaves[batch_id]) for batch_id in batch_ids}
+
+        bad_batches = [batch_id for batch_id in batch_ids if batch_id not in batches
+                       or roots[batch_id] != batches[batch_id].root
+                       or len(leaves[batch_id]) != batches[batch_id].size]
+        unrecorded, modified, resurrected = [], [], []
+        for position_id, data_hash in current.items():
+            action = last.get(position_id)
+            if action is None:
+                unrecorded.append(position_id)
+            elif action == "DELETED":
+                resurrected.append(position_id)
+            elif created[position_id] != data_hash:
+                modified.append(position_id)
+        missing = [position_id for position_id, action in last.items()
+                   if action == "CREATED" and position_id not in current]
+        return {
+            "ok": not (unrecorded or modified or resurrected or missing or broken_links or bad_batches),
+            "positions": len(positions),
+            "entries": len(entries),
+            "unsealed": len(entries) - len(links),
+            "batches": len(batches),
+            "modified": sorted(modified),
+            "unrecorded": sorted(unrecorded),
+            "missing": sorted(missing),
+            "resurrected": sorted(resurrected),
+            "broken_links": sorted(set(broken_links)),
+            "bad_batches": bad_batches,
+            "elapsed_s": round(time.perf_counter() - started, 3),
+        }
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "sealed": self.sealed,
+            "last_root": self.last_root,
+            "last_seal_ms": None if self.last_seal_ms is None else round(self.last_seal_ms, 2),
+        }
+
+
+position_chain = PositionChain()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m services.integrity")
+    commands = parser.add_subparsers(dest="command", required=True)
+    audit = commands.add_parser("audit", help="rehash sensor_positions and the chain and report any difference")
+    audit.add_argument("--workers", type=int, default=AUDIT_WORKERS)
+    commands.add_parser("seal", help="seal the unsealed chain entries into a batch now")
+    args = parser.parse_args(argv)
+
+    for table in (chain_table, batches_table, outbox_table):
+        table.create(bind=position_chain.engine, checkfirst=True)
+    if args.command == "seal":
+        total = 0
+        while True:
+            sealed = position_chain.seal()
+            total += sealed
+            if sealed < position_chain.batch_max:
+                break
+        print(f"Sealed {total} entries")
+        return
+    report = position_chain.audit(workers=args.workers)
+    print(f"Audited {report['positions']} positions and {report['entries']} chain entries "
+          f"({report['batches']} batches, {report['unsealed']} unsealed) in {report['elapsed_s']}s")
+    for problem in ("modified", "unrecorded", "missing", "resurrected", "broken_links", "bad_batches"):
+        if report[problem]:
+            shown = ", ".join(str(item) for item in report[problem][:20])
+            more = f" (+{len(report[problem]) - 20} more)" if len(report[problem]) > 20 else ""
+            print(f"  {problem}: {len(report[problem])}: {shown}{more}")
+    print("OK" if report["ok"] else "MISMATCH")
+    sys.exit(0 if report["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+"""
+Metrics and Event Log
+Hot-path instrumentation served at GET /metrics in the Prometheus text format
+(0.0.4), and the log lines that replace the per-reading prints:
+  - counters:   one cell per thread; a thread only ever adds to its own cell
+                and a scrape sums them, so recording takes no lock and the
+                event loop, DB writer threads and vision callbacks never
+                contend. Rates (evaluations/s, ...) are rate() of a counter
+  - histograms: fixed bucket bounds, per-thread cells the same way; a value
+                is one bisect and two adds, buckets are made cumulative only
+                when rendered
+  - gauges:     callbacks read at scrape time (queue depths, sockets,
+                outbox backlog), so keeping them current costs nothing
+  - labels:     a child per label value, created once and cached
+  - log:        log.info("event", key, field=value) writes one logfmt line
+                (ts=... level=... event=... field=...). Each (event, key)
+                gets at most LOG_RATE_LIMIT lines per LOG_RATE_INTERVAL
+                seconds; the next line after a quiet spell says how many
+                were suppressed, and aura_log_suppressed_total counts them
+"""
+import bisect
+import json
+import logging
+import math
+import os
+import sys
+import time
+from threading import get_ident
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_RATE_LIMIT = int(os.getenv("LOG_RATE_LIMIT", "10"))
+LOG_RATE_INTERVAL = float(os.getenv("LOG_RATE_INTERVAL", "10"))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+COUNTER = "counter"
+GAUGE = "gauge"
+HISTOGRAM = "histogram"
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if value != value:
+        return "NaN"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+# ---------- Metrics ----------
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, "_Metric"] = {}
+
+    def register(self, metric: "_Metric"):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self.metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            metric.render(lines)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), registry: Optional[Registry] = registry):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._children: Dict[tuple, object] = {}
+        if registry is not None:
+            registry.register(self)
+
+    def labels(self, *values):
+        """The child for these label values (cache it on hot paths)."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(f"{self.name} takes labels {self.label_names}")
+            child = self._children.setdefault(values, self._child())
+        return child
+
+    def _child(self):
+        raise NotImplementedError
+
+    def _items(self) -> Iterable[Tuple[tuple, object]]:
+        return sorted(self._children.items(), key=lambda item: tuple(str(value) for value in item[0]))
+
+    def render(self, lines: List[str]):
+        raise NotImplementedError
+
+
+class _CounterChild:
+    __slots__ = ("_cells",)
+
+    def __init__(self):
+        self._cells: Dict[int, List[float]] = {}
+
+    def inc(self, amount: float = 1):
+        cell = self._cells.get(get_ident())
+        if cell is None:
+            cell = self._cells.setdefault(get_ident(), [0])
+        cell[0] += amount
+
+    def value(self) -> float:
+        return sum(cell[0] for cell in list(self._cells.values()))
+
+
+class Counter(_Metric):
+    """A monotonic count; name it *_total."""
+    kind = COUNTER
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), registry: Optional[Registry] = registry):
+        super().__init__(name, help, labels, registry)
+        if not self.label_names:
+            self.inc = self.labels().inc  # one call instead of two on the hot path
+
+    def _child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def value(self, *labels) -> float:
+        return self.labels(*labels).value()
+
+    def render(self, lines: List[str]):
+        for values, child in self._items():
+            lines.append(f"{self.name}{_label_text(self.label_names, values)} {_number(child.value())}")
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "_cells")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self._cells: Dict[int, List[float]] = {}
+
+    def observe(self, value: float):
+        cell = self._cells.get(get_ident())
+        if cell is None:
+            cell = self._cells.setdefault(get_ident(), [0] * (len(self.bounds) + 2))  # buckets, +Inf, sum
+        cell[bisect.bisect_left(self.bounds, value)] += 1
+        cell[-1] += value
+
+    def totals(self) -> List[float]:
+        totals = [0] * (len(self.bounds) + 2)
+        for cell in list(self._cells.values()):
+            for i, count in enumerate(cell):
+                totals[i] += count
+        return totals
+
+
+class Histogram(_Metric):
+    """Distribution of durations (seconds) or sizes over fixed buckets."""
+    kind = HISTOGRAM
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS,
+                 labels: Sequence[str] = (), registry: Optional[Registry] = registry):
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, help, labels, registry)
+        if not self.label_names:
+            self.observe = self.labels().observe
+
+    def _child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def render(self, lines: List[str]):
+        for values, child in self._items():
+            totals = child.totals()
+            cumulative = 0
+            for bound, count in zip(self.bounds + (math.inf,), totals):
+                cumulative += count
+                le = 'le="%s"' % _number(bound)
+                lines.append(f"{self.name}_bucket{_label_text(self.label_names, values, le)} {_number(cumulative)}")
+            labels = _label_text(self.label_names, values)
+            lines.append(f"{self.name}_sum{labels} {_number(totals[-1])}")
+            lines.append(f"{self.name}_count{labels} {_number(cumulative)}")
+
+
+class Gauge(_Metric):
+    """A value read at scrape time. read() returns a number, or {label values: number} with labels.
+    kind=COUNTER exposes a monotonic count some component already keeps."""
+
+    def __init__(self, name: str, help: str, read: Callable[[], object], labels: Sequence[str] = (),
+                 kind: str = GAUGE, registry: Optional[Registry] = registry):
+        self.read = read
+        self.kind = kind
+        super().__init__(name, help, labels, registry)
+
+    def render(self, lines: List[str]):
+        try:
+            value = self.read()
+        except Exception:
+            return  # a component that is not up yet reports nothing
+        if value is None:
+            return
+        if not self.label_names:
+            lines.append(f"{self.name} {_number(value)}")
+            return
+        for values, number in sorted(value.items(), key=lambda item: str(item[0])):
+            if number is None:
+                continue
+            values = values if isinstance(values, tuple) else (values,)
+            lines.append(f"{self.name}{_label_text(self.label_names, values)} {_number(number)}")
+
+
+LOG_SUPPRESSED = Counter("aura_log_suppressed_total", "Log lines dropped by the rate limit", ["event"])
+DB_FLUSH_SECONDS = Histogram("aura_db_flush_seconds", "Write-behind transactions (readings, incidents)",
+                             SECONDS_BUCKETS, ["writer"])
+
+
+# ---------- Logging ----------
+
+def _field(value) -> str:
+    if isinstance(value, float):
+        return f"{value:.6g}"
+    text = str(value)
+    if not text or any(c in text for c in ' ="\\\n'):
+        return json.dumps(text)
+    return text
+
+
+class EventLog:
+    def __init__(self, name: str = "aura", level: str = LOG_LEVEL, rate_limit: int = LOG_RATE_LIMIT,
+                 interval: float = LOG_RATE_INTERVAL, stream=None):
+        self.logger = logging.getLogger(name)
+        if not self.logger.handlers:
+            handler = logging.StreamHandler(stream or sys.stderr)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self.logger.addHandler(handler)
+            self.logger.propagate = False
+        self.logger.setLevel(level)
+        self.rate_limit = rate_limit
+        self.interval = interval
+        self._windows: Dict[tuple, List[float]] = {}  # (event, key) -> [window start, lines, suppressed]
+        self._next_sweep = 0.0
+
+    def debug(self, event: str, key=None, **fields):
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self._emit(logging.DEBUG, event, key, fields)
+
+    def info(self, event: str, key=None, **fields):
+        self._emit(logging.INFO, event, key, fields)
+
+    def warning(self, event: str, key=None, **fields):
+        self._emit(logging.WARNING, event, key, fields)
+
+    def error(self, event: str, key=None, **fields):
+        self._emit(logging.ERROR, event, key, fields)
+
+    def _emit(self, level: int, event: str, key, fields: dict):
+        if not self.logger.isEnabledFor(level):
+            return
+        now = time.time()
+        if now >= self._next_sweep:
+            self._sweep(now)
+        window = self._windows.get((event, key))
+        if window is None or now - window[0] >= self.interval:
+            suppressed = window[2] if window is not None else 0
+            window = self._windows[(event, key)] = [now, 0, 0]
+            if suppressed:
+                fields["suppressed"] = int(suppressed)
+        if window[1] >= self.rate_limit:
+            window[2] += 1
+            LOG_SUPPRESSED.labels(event).inc()
+            return
+        window[1] += 1
+        stamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(now)) + f".{int(now % 1 * 1000):03d}Z"
+        line = f"ts={stamp} level={logging.getLevelName(level).lower()} event={event}"
+        if fields:
+            line += " " + " ".join(f"{name}={_field(value)}" for name, value in fields.items())
+        self.logger.log(level, line)
+
+    def _sweep(self, now: float):
+        """Forget windows quiet for a whole interval after they ended: keys are often a node id or
+        sensor name from a request, and one window per key ever seen would never be freed. A
+        suppressed count is still reported if the event comes back within that interval."""
+        self._next_sweep = now + self.interval
+        for window_key, window in list(self._windows.items()):
+            if now - window[0] >= 2 * self.interval:
+                self._windows.pop(window_key, None)
+
+
+log = EventLog()
@@ -0,0 +1,245 @@
+"""
+Outbox
+Deliveries to the sensor_chain / notification server (FRONTEND_SERVER_URL)
+that survive restarts and outages. An event is written into the outbox table
+in the same transaction as the change it reports, so a committed change
+always has its delivery queued (services/integrity.py queues one Merkle root
+per sealed batch of position changes, and a /register event per change when
+CHAIN_REGISTER_EACH is set), and a background task drains it:
+  - delivery:    one httpx.AsyncClient keeps up to OUTBOX_CONCURRENCY
+                 connections alive; each round claims up to OUTBOX_BATCH_SIZE
+                 due events, posts them concurrently and records the outcome
+                 of the whole batch in one transaction
+  - retries:     connection errors, timeouts, 5xx, 408 and 429 come due again
+                 after OUTBOX_BACKOFF_BASE * 2^attempts seconds (capped at
+                 OUTBOX_BACKOFF_MAX, jittered so a recovering server is not hit
+                 by the whole backlog at once); any other 4xx is kept as
+                 "dead" with its error for inspection
+  - idempotency: every event has a unique key, sent as the Idempotency-Key
+                 header; queueing a known key again is a no-op, a 409 counts as
+                 delivered, and an event posted but not yet marked when the
+                 process dies is posted again with the same key
+Delivered events are pruned after OUTBOX_RETENTION seconds.
+"""
+import asyncio
+import json
+import os
+import random
+import time
+from typing import List, Optional, Tuple
+
+import httpx
+from dotenv import load_dotenv
+from sqlalchemy import bindparam, delete, func, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from config.db import engine as default_engine
+from models.outbox import OutboxEvent
+from services.metrics import COUNTER, Gauge, log
+
+load_dotenv()
+OUTBOX_BASE_URL = os.getenv("OUTBOX_BASE_URL", os.getenv("FRONTEND_SERVER_URL", "http://localhost:3030"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "200"))
+OUTBOX_CONCURRENCY = int(os.getenv("OUTBOX_CONCURRENCY", "16"))
+OUTBOX_TIMEOUT = float(os.getenv("OUTBOX_TIMEOUT", "5"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "1"))
+OUTBOX_BACKOFF_BASE = float(os.getenv("OUTBOX_BACKOFF_BASE", "1"))
+OUTBOX_BACKOFF_MAX = float(os.getenv("OUTBOX_BACKOFF_MAX", "300"))
+OUTBOX_RETENTION = float(os.getenv("OUTBOX_RETENTION", str(7 * 86400)))
+PRUNE_INTERVAL = 3600.0
+LOG_INTERVAL = 30.0  # at most one failure summary per interval while the receiver is down
+
+PENDING, DELIVERED, DEAD = "pending", "delivered", "dead"
+RETRY_STATUS = {408, 425, 429}
+
+outbox_table = OutboxEvent.__table__
+
+
+def enqueue(db, path: str, payload: dict, key: str, now: Optional[float] = None):
+    """Queue a delivery inside the caller's transaction (Session or Connection); a known key is ignored."""
+    enqueue_many(db, [(path, payload, key)], now)
+
+
+def enqueue_many(db, events: List[Tuple[str, dict, str]], now: Optional[float] = None):
+    """Queue (path, payload, key) deliveries in one statement."""
+    if not events:
+        return
+    now = time.time() if now is None else now
+    db.execute(sqlite_insert(outbox_table).on_conflict_do_nothing(), [{
+        "key": key,
+        "path": path,
+        "payload": json.dumps(payload),
+        "status": PENDING,
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now,
+    } for path, payload, key in events])
+
+
+def position_event(sensor_id: int, data_hash: str) -> Tuple[str, dict, str]:
+    """The sensor_chain /register delivery for one position change."""
+    return "/register", {"sensor_id": sensor_id, "data_hash": data_hash}, f"position:{sensor_id}:{data_hash}"
+
+
+class Outbox:
+    def __init__(self, engine=default_engine, base_url: str = OUTBOX_BASE_URL,
+                 batch_size: int = OUTBOX_BATCH_SIZE, concurrency: int = OUTBOX_CONCURRENCY,
+                 timeout: float = OUTBOX_TIMEOUT, poll_interval: float = OUTBOX_POLL_INTERVAL,
+                 backoff_base: float = OUTBOX_BACKOFF_BASE, backoff_max: float = OUTBOX_BACKOFF_MAX,
+                 retention: float = OUTBOX_RETENTION):
+        self.engine = engine
+        self.base_url = base_url
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retention = retention
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._claim = (select(outbox_table.c.id, outbox_table.c.key, outbox_table.c.path,
+                              outbox_table.c.payload, outbox_table.c.attempts)
+                       .where(outbox_table.c.status == PENDING, outbox_table.c.next_attempt_at <= bindparam("now"))
+                       .order_by(outbox_table.c.next_attempt_at, outbox_table.c.id)
+                       .limit(batch_size))
+        self._backlog = select(func.count()).select_from(outbox_table).where(outbox_table.c.status == PENDING)
+        self._failed = (update(outbox_table)
+                        .where(outbox_table.c.id == bindparam("event_id"), outbox_table.c.status == PENDING)
+                        .values(status=bindparam("new_status"), attempts=bindparam("new_attempts"),
+                                next_attempt_at=bindparam("due"), last_error=bindparam("error")))
+        self.backlog = 0
+        self.delivered = 0
+        self.retried = 0
+        self.dead = 0
+        self.rounds = 0
+        self.last_round_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._unlogged = 0
+        self._logged_at = 0.0
+
+    def notify(self):
+        """Wake the worker for freshly committed events; safe from any thread."""
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    # ---------- DB side (worker thread) ----------
+
+    def claim(self, now: float) -> list:
+        """The due pending events, oldest first; also refreshes the backlog count."""
+        with self.engine.connect() as conn:
+            events = conn.execute(self._claim, {"now": now}).all()
+            self.backlog = conn.execute(self._backlog).scalar()
+        return events
+
+    def record(self, events: list, errors: List[Optional[Tuple[str, bool]]], now: float):
+        """Mark a delivered batch and reschedule its failures in one transaction."""
+        delivered = [event.id for event, error in zip(events, errors) if error is None]
+        failed = []
+        for event, error in zip(events, errors):
+            if error is None:
+                continue
+            message, retry = error
+            delay = min(self.backoff_max, self.backoff_base * 2 ** event.attempts) * random.uniform(0.5, 1.0)
+            failed.append({"event_id": event.id, "new_status": PENDING if retry else DEAD,
+                           "new_attempts": event.attempts + 1, "due": now + delay, "error": message[:500]})
+        with self.engine.begin() as conn:
+            if delivered:
+                # only pending rows: acknowledging the same event twice changes nothing
+                conn.execute(update(outbox_table)
+                             .where(outbox_table.c.id.in_(delivered), outbox_table.c.status == PENDING)
+                             .values(status=DELIVERED, delivered_at=now, attempts=outbox_table.c.attempts + 1,
+                                     last_error=None))
+            if failed:
+                conn.execute(self._failed, failed)
+        dead = sum(row["new_status"] == DEAD for row in failed)
+        self.delivered += len(delivered)
+        self.retried += len(failed) - dead
+        self.dead += dead
+        self.backlog = max(0, self.backlog - len(delivered) - dead)
+        if failed:
+            self.last_error = failed[-1]["error"]
+            self._unlogged += len(failed)
+            if now - self._logged_at >= LOG_INTERVAL:
+                log.error("outbox_delivery_failed", failed=self._unlogged, pending=self.backlog, error=self.last_error)
+                self._unlogged = 0
+                self._logged_at = now
+
+    def prune(self, now: float) -> int:
+        with self.engine.begin() as conn:
+            return conn.execute(delete(outbox_table).where(outbox_table.c.status == DELIVERED,
+                                                           outbox_table.c.delivered_at < now - self.retention)).rowcount
+
+    # ---------- HTTP side ----------
+
+    async def _post(self, client: httpx.AsyncClient, limit: asyncio.Semaphore, event) -> Optional[Tuple[str, bool]]:
+        """None once the receiver has the event, else (error, worth retrying)."""
+        async with limit:
+            try:
+                response = await client.post(event.path, content=event.payload, headers={
+                    "Content-Type": "application/json", "Idempotency-Key": event.key})
+            except httpx.HTTPError as e:
+                return f"{type(e).__name__}: {e}", True
+        if response.is_success or response.status_code == 409:  # 409: already registered
+            return None
+        retry = response.status_code >= 500 or response.status_code in RETRY_STATUS
+        return f"HTTP {response.status_code} from {event.path}", retry
+
+    async def deliver_due(self, client: httpx.AsyncClient) -> int:
+        """One round: claim a batch, post it, record the outcome. Returns the batch size."""
+        loop = asyncio.get_running_loop()
+        events = await loop.run_in_executor(None, self.claim, time.time())
+        if not events:
+            return 0
+        started = time.perf_counter()
+        limit = asyncio.Semaphore(self.concurrency)
+        errors = await asyncio.gather(*(self._post(client, limit, event) for event in events))
+        await loop.run_in_executor(None, self.record, events, errors, time.time())
+        self.last_round_ms = (time.perf_counter() - started) * 1000
+        self.rounds += 1
+        return len(events)
+
+    def client(self, **kwargs) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            base_url=self.base_url, timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+            **kwargs)
+
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        last_prune = 0.0
+        async with self.client() as client:
+            while True:
+                try:
+                    count = await self.deliver_due(client)
+                except Exception as e:
+                    log.error("outbox_round_failed", error=e)
+                    count = 0
+                if time.time() - last_prune >= PRUNE_INTERVAL:
+                    last_prune = time.time()
+                    await self._loop.run_in_executor(None, self.prune, last_prune)
+                if count < self.batch_size:
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    self._wake.clear()
+
+    def stats(self) -> dict:
+        return {
+            "backlog": self.backlog,
+            "delivered": self.delivered,
+            "retried": self.retried,
+            "dead": self.dead,
+            "rounds": self.rounds,
+            "last_round_ms": None if self.last_round_ms is None else round(self.last_round_ms, 2),
+            "last_error": self.last_error,
+        }
+
+
+outbox = Outbox()
+Gauge("aura_outbox_backlog", "Outbox events waiting for delivery", lambda: outbox.backlog)
+Gauge("aura_outbox_delivered_total", "Outbox events acknowledged by the receiver", lambda: outbox.delivered,
+      kind=COUNTER)
+Gauge("aura_outbox_dead_total", "Outbox events given up on", lambda: outbox.dead, kind=COUNTER)
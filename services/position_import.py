@@ -0,0 +1,288 @@
+"""
+Position Import
+Provisions sensor positions in bulk from JSON lines or CSV without holding the
+file in memory and without a request, a transaction and a seal per position:
+  - parse:     input arrives as chunks of lines (a file, or a streamed request
+               body through stream_lines()); every row is validated on its own
+               and a bad one is reported by line number and skipped, the rest
+               are imported
+  - write:     valid rows are inserted IMPORT_BATCH_SIZE at a time, one
+               transaction per batch, with their ids returned in order; each
+               row's hash is formatted directly (position_hash, no json.dumps)
+               and the batch is recorded in the chain in the same transaction,
+               so a batch is either wholly in or wholly out
+  - sync:      once the input ends, the new chain entries are sealed right away
+               and the outbox is woken to deliver the one Merkle root per
+               CHAIN_BATCH_MAX entries (never a /register per row, whatever
+               CHAIN_REGISTER_EACH says); the position snapshot is refreshed
+               once, which also brings the sensor store up to date
+JSON lines are objects with name, lat, lng and sensor_type; CSV needs a header
+row naming those columns (others are ignored). lat and lng must be finite and
+in range; ids are always assigned by the DB.
+
+Usage: python -m services.position_import FILE [FILE ...] [--format jsonl|csv] [--dry-run]
+       (FILE may be - for stdin)
+"""
+import argparse
+import codecs
+import csv
+import itertools
+import json
+import math
+import os
+import sys
+import time
+from typing import AsyncIterable, AsyncIterator, Iterable, List, Optional
+
+from sqlalchemy import insert
+
+from config.db import engine as default_engine
+from services.integrity import batches_table, chain_table, position_chain, position_hash, positions_table, \
+    record_many
+from services.outbox import outbox, outbox_table
+from services.position_snapshot import position_snapshot
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "5000"))
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "100"))  # reported; every bad row is still counted
+
+FORMATS = ("jsonl", "csv")
+FIELDS = ("name", "lat", "lng", "sensor_type")
+
+
+def _coordinate(value, field: str, limit: float) -> float:
+    if isinstance(value, bool):
+        raise ValueError(f"{field} must be a number")
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} must be a number")
+    if not math.isfinite(value) or not -limit <= value <= limit:
+        raise ValueError(f"{field} must be within [-{limit:g}, {limit:g}]")
+    return value
+
+
+def validate(record) -> dict:
+    """The position fields of one input row; raises ValueError naming the first problem."""
+    if not isinstance(record, dict):
+        raise ValueError("expected an object")
+    for field in ("name", "sensor_type"):
+        value = record.get(field)
+        if not isinstance(value, str) or not value.strip():
+            raise ValueError(f"{field} must be a non-empty string")
+    return {"name": record["name"], "lat": _coordinate(record.get("lat"), "lat", 90),
+            "lng": _coordinate(record.get("lng"), "lng", 180), "sensor_type": record["sensor_type"]}
+
+
+async def stream_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[List[str]]:
+    """The lines of a UTF-8 byte stream, one list per chunk that completes at least one."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    tail = ""
+    async for chunk in chunks:
+        lines = (tail + decoder.decode(chunk)).split("\n")
+        tail = lines.pop()
+        if lines:
+            yield lines
+    tail += decoder.decode(b"", final=True)
+    if tail:
+        yield [tail]
+
+
+class PositionImport:
+    """One import: feed() it lines and write() the batches it hands back, then
+    write(finish()) and sync(), also after a failure."""
+
+    def __init__(self, fmt: str = "jsonl", engine=default_engine, batch_size: int = IMPORT_BATCH_SIZE,
+                 dry_run: bool = False, chain=position_chain, snapshot=position_snapshot,
+                 max_errors: int = IMPORT_MAX_ERRORS):
+        if fmt not in FORMATS:
+            raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+        self.format = fmt
+        self.engine = engine
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.chain = chain
+        self.snapshot = snapshot
+        self.max_errors = max_errors
+        self._pending: List[dict] = []
+        self._header: Optional[List[str]] = None
+        self._insert = insert(positions_table).returning(positions_table.c.id, sort_by_parameter_order=True)
+        self.lines = 0
+        self.valid = 0
+        self.imported = 0
+        self.rejected = 0
+        self.errors: List[dict] = []
+        self.batches = 0
+        self.first_id: Optional[int] = None
+        self.last_id: Optional[int] = None
+        self.started = time.perf_counter()
+        self.elapsed: Optional[float] = None
+
+    # ---------- Parsing ----------
+
+    def _reject(self, line: int, error: str):
+        self.rejected += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "error": error})
+
+    def _accept(self, line: int, record) -> Optional[List[dict]]:
+        try:
+            self._pending.append(validate(record))
+        except ValueError as e:
+            self._reject(line, str(e))
+            return None
+        self.valid += 1
+        if len(self._pending) >= self.batch_size:
+            batch, self._pending = self._pending, []
+            return batch
+        return None
+
+    def feed(self, lines: List[str]) -> List[List[dict]]:
+        """Validate a chunk of lines; returns the batches it completed, ready for write()."""
+        batches = []
+        start = self.lines
+        if self.format == "jsonl":
+            for number, line in enumerate(lines, start + 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    self._reject(number, f"invalid JSON: {e}")
+                    continue
+                batch = self._accept(number, record)
+                if batch:
+                    batches.append(batch)
+            self.lines += len(lines)
+            return batches
+
+        reader = csv.reader(lines)
+        while True:
+            try:
+                values = next(reader)
+            except StopIteration:
+                break
+            except csv.Error as e:
+                self._reject(start + reader.line_num, f"invalid CSV: {e}")
+                continue
+            number = start + reader.line_num
+            if not values or not any(value.strip() for value in values):
+                continue
+            if self._header is None:
+                header = [value.strip().lower() for value in values]
+                missing = [field for field in FIELDS if field not in header]
+                if missing:
+                    raise ValueError(f"CSV header is missing {', '.join(missing)}")
+                self._header = header
+                continue
+            if len(values) != len(self._header):
+                self._reject(number, f"expected {len(self._header)} columns, got {len(values)}")
+                continue
+            batch = self._accept(number, dict(zip(self._header, values)))
+            if batch:
+                batches.append(batch)
+        self.lines += reader.line_num
+        return batches
+
+    def finish(self) -> List[dict]:
+        """The last, partial batch."""
+        batch, self._pending = self._pending, []
+        return batch
+
+    # ---------- Writing ----------
+
+    def write(self, batch: List[dict], now: Optional[float] = None):
+        """Insert a batch and record its chain entries in one transaction; the sealed root is their delivery."""
+        if not batch or self.dry_run:
+            return
+        now = time.time() if now is None else now
+        with self.engine.begin() as conn:
+            ids = conn.execute(self._insert, batch).scalars().all()
+            record_many(conn, [(position_id, "CREATED", position_hash(position_id, row["name"], row["lat"],
+                                                                       row["lng"], row["sensor_type"], "CREATED"))
+                               for position_id, row in zip(ids, batch)], now, register=False)
+        self.batches += 1
+        self.imported += len(ids)
+        if self.first_id is None:
+            self.first_id = ids[0]
+        self.last_id = ids[-1]
+
+    def sync(self):
+        """Seal what was imported now instead of on the next cycle, and refresh the snapshot once."""
+        self.elapsed = time.perf_counter() - self.started
+        if not self.imported:
+            return
+        if self.chain is not None:
+            while self.chain.seal() >= self.chain.batch_max:
+                pass
+        outbox.notify()
+        if self.snapshot is not None:
+            self.snapshot.refresh()
+
+    def report(self) -> dict:
+        elapsed = self.elapsed if self.elapsed is not None else time.perf_counter() - self.started
+        return {
+            "format": self.format,
+            "dry_run": self.dry_run,
+            "lines": self.lines,
+            "valid": self.valid,
+            "imported": self.imported,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "first_id": self.first_id,
+            "last_id": self.last_id,
+            "batches": self.batches,
+            "elapsed_s": round(elapsed, 3),
+            "rows_per_s": round(self.valid / elapsed) if elapsed > 0 else None,
+        }
+
+
+def import_lines(job: PositionImport, lines: Iterable[str]):
+    """Run an iterable of lines (an open file) through job, batch_size lines at a time."""
+    lines = iter(lines)
+    while True:
+        chunk = list(itertools.islice(lines, job.batch_size))
+        if not chunk:
+            break
+        for batch in job.feed(chunk):
+            job.write(batch)
+    job.write(job.finish())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m services.position_import")
+    parser.add_argument("paths", nargs="+", help="JSON lines or CSV files, - for stdin")
+    parser.add_argument("--format", choices=FORMATS, help="default: csv for *.csv, jsonl otherwise")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="validate only")
+    args = parser.parse_args(argv)
+
+    for table in (positions_table, chain_table, batches_table, outbox_table):
+        table.create(bind=default_engine, checkfirst=True)
+    failed = False
+    for path in args.paths:
+        fmt = args.format or ("csv" if path.lower().endswith(".csv") else "jsonl")
+        # the server's snapshot picks the rows up on its next refresh
+        job = PositionImport(fmt, batch_size=args.batch_size, dry_run=args.dry_run, snapshot=None)
+        try:
+            with (open(sys.stdin.fileno(), encoding="utf-8-sig", newline="", closefd=False) if path == "-"
+                  else open(path, encoding="utf-8-sig", newline="")) as f:
+                import_lines(job, f)
+        except (OSError, UnicodeDecodeError, ValueError) as e:
+            print(f"{path}: {e}")
+            failed = True
+        finally:
+            job.sync()
+        report = job.report()
+        verb, count = ("Validated", report["valid"]) if args.dry_run else ("Imported", report["imported"])
+        print(f"{path}: {verb} {count} positions from {report['lines']} lines in {report['elapsed_s']}s "
+              f"({report['rows_per_s']} rows/s), rejected {report['rejected']}")
+        for error in report["errors"]:
+            print(f"  line {error['line']}: {error['error']}")
+        if report["rejected"] > len(report["errors"]):
+            print(f"  (+{report['rejected'] - len(report['errors'])} more)")
+        failed |= report["rejected"] > 0
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Position Snapshot
+GET /positions from memory. The Flutter app refetches the list on every
+screen load; serving it no longer builds ORM objects and Pydantic models per
+request:
+  - version: the seq of the latest position_chain entry applied. Every create
+             and delete commits its chain entry together with the row
+             (services/integrity.py), so the version survives restarts and a
+             client's since_version always means the same set of changes
+  - body:    every position kept as its own pre-encoded JSON fragment; the
+             list body is joined from them on the first request after a change
+             and then served as the same bytes, with the version as its ETag
+  - deltas:  since_version=N answers with the positions created and the ids
+             deleted after N, from the last POSITION_CHANGELOG changes; an
+             older N gets the full list with "full": true
+  - refresh: writers call refresh() after their commit, which applies the
+             chain entries past the current version in seq order; a background
+             task does the same every POSITION_REFRESH_INTERVAL seconds for
+             writes from other processes (the bulk import CLI). Listeners get
+             the created rows and deleted ids of each refresh, in order, which
+             is how the sensor store follows the table
+"""
+import asyncio
+import bisect
+import json
+import os
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select
+
+from config.db import engine as default_engine
+from models.position_chain import PositionChainEntry
+from models.sensor_position import SensorPosition
+from services.metrics import log
+
+POSITION_CHANGELOG = int(os.getenv("POSITION_CHANGELOG", "20000"))
+POSITION_REFRESH_INTERVAL = float(os.getenv("POSITION_REFRESH_INTERVAL", "5"))
+DELTA_CACHE = 64  # encoded deltas kept per version, one per since_version asked for
+
+chain_table = PositionChainEntry.__table__
+positions_table = SensorPosition.__table__
+FIELDS = (positions_table.c.id, positions_table.c.name, positions_table.c.lat, positions_table.c.lng,
+          positions_table.c.sensor_type)
+
+
+def _encode(row) -> bytes:
+    """The SensorPositionOut JSON of a row, as FastAPI's JSONResponse would render it."""
+    return json.dumps({"id": row.id, "name": row.name, "lat": row.lat, "lng": row.lng,
+                       "sensor_type": row.sensor_type},
+                      ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+class PositionSnapshot:
+    def __init__(self, engine=default_engine, changelog: int = POSITION_CHANGELOG,
+                 refresh_interval: float = POSITION_REFRESH_INTERVAL):
+        self.engine = engine
+        self.changelog = changelog
+        self.refresh_interval = refresh_interval
+        self._fragments: Dict[int, bytes] = {}  # position id -> JSON, in id order
+        self._seqs: List[int] = []  # changelog: chain seq and position id of every recent change
+        self._changed: List[int] = []
+        self._floor = 0  # deltas can be answered for any since_version >= this
+        self._body: Optional[bytes] = None
+        self._deltas: Dict[int, bytes] = {}
+        self._lock = threading.Lock()  # held by readers and while a refresh applies its changes
+        self._refresh_lock = threading.Lock()  # one refresh reads the DB at a time, outside _lock
+        self.listeners: List[Callable[[list, List[int]], None]] = []  # (created rows, deleted ids)
+        self.version = 0
+        self.refreshes = 0
+        self.served = 0
+
+    def load(self):
+        """Read the whole positions table and the chain head (startup)."""
+        with self._refresh_lock:
+            with self.engine.connect() as conn:
+                version = conn.execute(select(func.max(chain_table.c.seq))).scalar() or 0
+                rows = conn.execute(select(*FIELDS).order_by(positions_table.c.id)).all()
+            fragments = {row.id: _encode(row) for row in rows}
+            with self._lock:
+                self._fragments = fragments
+                self._seqs, self._changed = [], []
+                self._floor = self.version = version
+                self._body = None
+                self._deltas = {}
+
+    def refresh(self) -> int:
+        """Apply the chain entries committed since the current version; returns how many."""
+        with self._refresh_lock:
+            with self.engine.connect() as conn:
+                entries = conn.execute(select(chain_table.c.seq, chain_table.c.position_id, chain_table.c.action)
+                                       .where(chain_table.c.seq > self.version)
+                                       .order_by(chain_table.c.seq)).all()
+                if not entries:
+                    return 0
+                created = {entry.position_id for entry in entries if entry.action == "CREATED"}
+                rows = {}
+                if len(created) > 500:  # a bulk import: one range scan instead of a huge IN list
+                    rows = {row.id: row for row in conn.execute(select(*FIELDS).where(
+                        positions_table.c.id.between(min(created), max(created)))) if row.id in created}
+                elif created:
+                    rows = {row.id: row for row in conn.execute(
+                        select(*FIELDS).where(positions_table.c.id.in_(created)))}
+            fragments = {position_id: _encode(row) for position_id, row in rows.items()}
+            with self._lock:
+                self._apply(entries, fragments)
+                present = {entry.position_id: entry.position_id in self._fragments for entry in entries}
+            if self.listeners:
+                created = [rows[position_id] for position_id, exists in present.items() if exists]
+                deleted = [position_id for position_id, exists in present.items() if not exists]
+                for listener in self.listeners:
+                    listener(created, deleted)
+            return len(entries)
+
+    def _apply(self, entries: list, fragments: Dict[int, bytes]):
+        last = next(reversed(self._fragments), 0)
+        unordered = False
+        for seq, position_id, action in entries:
+            fragment = fragments.get(position_id) if action == "CREATED" else None
+            if fragment is not None:
+                if position_id not in self._fragments:
+                    unordered |= position_id < last
+                    last = max(last, position_id)
+                self._fragments[position_id] = fragment
+            else:
+                self._fragments.pop(position_id, None)
+            self._seqs.append(seq)
+            self._changed.append(position_id)
+        if unordered:  # an id below the newest one came back: keep the list in id order
+            self._fragments = dict(sorted(self._fragments.items()))
+        if len(self._seqs) > self.changelog:
+            drop = len(self._seqs) - self.changelog
+            self._floor = self._seqs[drop - 1]
+            del self._seqs[:drop], self._changed[:drop]
+        self.version = entries[-1].seq
+        self._body = None
+        self._deltas = {}
+        self.refreshes += 1
+
+    def listing(self) -> Tuple[int, bytes]:
+        """(version, JSON array of every position)."""
+        with self._lock:
+            self.served += 1
+            return self.version, self._listing()
+
+    def _listing(self) -> bytes:
+        if self._body is None:
+            self._body = b"[" + b",".join(self._fragments.values()) + b"]"
+        return self._body
+
+    def delta(self, since: int) -> Tuple[int, bytes]:
+        """(version, {"version", "full", "upserts", "deleted"}) of the changes after since."""
+        with self._lock:
+            body = self._deltas.get(since)
+            if body is None:
+                if since < self._floor or since > self.version:
+                    upserts, deleted, full = self._listing(), [], True
+                else:
+                    touched = dict.fromkeys(self._changed[bisect.bisect_right(self._seqs, since):])
+                    upserts = b"[" + b",".join(self._fragments[position_id] for position_id in touched
+                                               if position_id in self._fragments) + b"]"
+                    deleted = [position_id for position_id in touched if position_id not in self._fragments]
+                    full = False
+                body = (b'{"version":%d,"full":%s,"upserts":%s,"deleted":%s}'
+                        % (self.version, b"true" if full else b"false", upserts,
+                           json.dumps(deleted, separators=(",", ":")).encode()))
+                if len(self._deltas) >= DELTA_CACHE:
+                    self._deltas.clear()
+                self._deltas[since] = body
+            self.served += 1
+            return self.version, body
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await loop.run_in_executor(None, self.refresh)
+            except Exception as e:
+                log.error("position_snapshot_refresh_failed", error=e)
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "positions": len(self._fragments),
+            "changelog": len(self._seqs),
+            "refreshes": self.refreshes,
+            "served": self.served,
+        }
+
+
+position_snapshot = PositionSnapshot()
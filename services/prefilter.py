@@ -0,0 +1,89 @@
+"""
+Frame Pre-filter
+Cheap per-camera check that decides whether a sampled frame is worth a YOLO
+call. Works on a small grayscale/HSV copy of the frame:
+  - motion:  fraction of pixels that changed against the previous frame
+  - fire:    fraction of pixels in the flame colour range (bright, saturated
+             red/orange/yellow)
+  - change:  hue/saturation histogram distance against the previous frame,
+             catches smoke haze and lighting shifts that pixel diffs miss
+A frame is inferred when any score crosses its threshold, or when
+PREFILTER_KEYFRAME_INTERVAL seconds passed since the last inference.
+"""
+import os
+import time
+
+import cv2
+import numpy as np
+
+PREFILTER_ENABLED = os.getenv("PREFILTER_ENABLED", "1") not in ("0", "false", "off")
+PREFILTER_WIDTH = int(os.getenv("PREFILTER_WIDTH", "160"))
+PREFILTER_MOTION = float(os.getenv("PREFILTER_MOTION", "0.02"))
+PREFILTER_FIRE = float(os.getenv("PREFILTER_FIRE", "0.005"))
+PREFILTER_CHANGE = float(os.getenv("PREFILTER_CHANGE", "0.15"))
+PREFILTER_KEYFRAME_INTERVAL = float(os.getenv("PREFILTER_KEYFRAME_INTERVAL", "10"))
+
+PIXEL_DIFF = 25  # grey levels a pixel must move to count as motion
+
+
+class FramePrefilter:
+    def __init__(self, enabled: bool = PREFILTER_ENABLED, width: int = PREFILTER_WIDTH,
+                 motion: float = PREFILTER_MOTION, fire: float = PREFILTER_FIRE,
+                 change: float = PREFILTER_CHANGE, keyframe_interval: float = PREFILTER_KEYFRAME_INTERVAL):
+        self.enabled = enabled
+        self.width = width
+        self.motion_threshold = motion
+        self.fire_threshold = fire
+        self.change_threshold = change
+        self.keyframe_interval = keyframe_interval
+        self._prev_gray = None
+        self._prev_hist = None
+        self._last_inferred = 0.0
+        self.inferred = 0
+        self.skipped = 0
+        self.last_scores = {}
+
+    def scores(self, frame) -> dict:
+        height, width = frame.shape[:2]
+        small = cv2.resize(frame, (self.width, max(1, height * self.width // width)), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+
+        hist = cv2.calcHist([hsv], [0, 1], None, [18, 8], [0, 180, 0, 256])
+        cv2.normalize(hist, hist)
+        fire = cv2.inRange(hsv, (0, 120, 180), (35, 255, 255))
+
+        if self._prev_gray is None:
+            motion, change = 1.0, 1.0
+        else:
+            motion = float(np.count_nonzero(cv2.absdiff(gray, self._prev_gray) > PIXEL_DIFF)) / gray.size
+            change = float(cv2.compareHist(self._prev_hist, hist, cv2.HISTCMP_BHATTACHARYYA))
+        self._prev_gray, self._prev_hist = gray, hist
+
+        return {
+            "motion": motion,
+            "fire": float(np.count_nonzero(fire)) / fire.size,
+            "change": change,
+        }
+
+    def should_infer(self, frame, now: float = None) -> bool:
+        if not self.enabled:
+            self.inferred += 1
+            return True
+        now = time.time() if now is None else now
+        scores = self.last_scores = self.scores(frame)
+        interesting = (
+            scores["motion"] >= self.motion_threshold
+            or scores["fire"] >= self.fire_threshold
+            or scores["change"] >= self.change_threshold
+            or now - self._last_inferred >= self.keyframe_interval
+        )
+        if interesting:
+            self._last_inferred = now
+            self.inferred += 1
+        else:
+            self.skipped += 1
+        return interesting
+
+    def to_dict(self) -> dict:
+        return {"frames_prefiltered_out": self.skipped, "frames_passed": self.inferred}
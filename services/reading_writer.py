@@ -0,0 +1,167 @@
+"""
+Reading Write-Behind Buffer
+Ingest handlers hand every reading to submit(), which only appends to an
+in-memory buffer. A background task flushes the buffer in batches
+(one executemany per transaction) on a worker thread, so the event loop never
+waits on SQLite. The same transaction folds the batch into the 1m/1h/1d
+rollups used by the history API (services/history.py). The buffer is bounded:
+when the DB falls behind, the oldest unflushed readings are dropped and counted
+rather than blocking ingest. A batch whose transaction fails (e.g. "database is
+locked") goes back to the front of the buffer and is retried on the next flush.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from typing import List, Optional
+
+from sqlalchemy import insert, inspect, text
+
+from config.db import engine as default_engine
+from models import SensorReading
+from models.sensor_rollup import ROLLUPS
+from services.history import rebuild_rollups, upsert_rollups
+from services.metrics import COUNTER, DB_FLUSH_SECONDS, Gauge, log
+
+READINGS_QUEUE_SIZE = int(os.getenv("READINGS_QUEUE_SIZE", "200000"))
+READINGS_BATCH_SIZE = int(os.getenv("READINGS_BATCH_SIZE", "5000"))
+READINGS_FLUSH_INTERVAL = float(os.getenv("READINGS_FLUSH_INTERVAL", "0.5"))
+
+FLUSH_SECONDS = DB_FLUSH_SECONDS.labels("readings")
+
+
+def ensure_readings_schema(engine=default_engine):
+    """Older databases have sensor_readings(id, distance, timestamp); move it out of the way."""
+    inspector = inspect(engine)
+    if inspector.has_table("sensor_readings"):
+        columns = {column["name"] for column in inspector.get_columns("sensor_readings")}
+        if "ts" not in columns:
+            with engine.begin() as conn:
+                rows = conn.execute(text("SELECT COUNT(*) FROM sensor_readings")).scalar()
+                if rows:
+                    conn.execute(text("ALTER TABLE sensor_readings RENAME TO sensor_readings_legacy"))
+                    log.info("readings_legacy_kept", rows=rows)
+                else:
+                    conn.execute(text("DROP TABLE sensor_readings"))
+    SensorReading.__table__.create(bind=engine, checkfirst=True)
+
+    missing = [model for model in ROLLUPS if not inspector.has_table(model.__tablename__)]
+    for model in missing:
+        model.__table__.create(bind=engine)
+    if missing:
+        with engine.connect() as conn:
+            has_readings = conn.execute(text("SELECT 1 FROM sensor_readings LIMIT 1")).first()
+        if has_readings:
+            log.info("rollups_rebuild")
+            rebuild_rollups(engine)
+
+
+class ReadingWriter:
+    def __init__(self, engine=default_engine, max_queue: int = READINGS_QUEUE_SIZE,
+                 batch_size: int = READINGS_BATCH_SIZE, flush_interval: float = READINGS_FLUSH_INTERVAL):
+        self.engine = engine
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer = deque()
+        self._batch_ready: Optional[asyncio.Event] = None
+        self._insert = insert(SensorReading.__table__)
+        # backpressure metrics
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.high_watermark = 0
+        self.last_flush_ms: Optional[float] = None
+
+    def submit(self, payload: dict, ts: float):
+        """Queue a reading payload for persistence. Never blocks."""
+        if len(self._buffer) >= self.max_queue:
+            self._buffer.popleft()
+            self.dropped += 1
+        self._buffer.append({
+            "node_id": payload["node_id"],
+            "sensor_type": payload["sensor"],
+            "value": payload["value"],
+            "threat_level": payload.get("threat_level", "safe"),
+            "ts": ts,
+        })
+        self.submitted += 1
+        depth = len(self._buffer)
+        if depth > self.high_watermark:
+            self.high_watermark = depth
+        if depth >= self.batch_size and self._batch_ready is not None:
+            self._batch_ready.set()
+
+    def _take_batch(self) -> List[dict]:
+        count = min(len(self._buffer), self.batch_size)
+        return [self._buffer.popleft() for _ in range(count)]
+
+    def _requeue(self, rows: List[dict]):
+        """Put a batch that failed to write back in front of the buffer, oldest rows
+        dropped first if newer readings have filled it meanwhile."""
+        room = max(0, self.max_queue - len(self._buffer))
+        if len(rows) > room:
+            self.dropped += len(rows) - room
+            rows = rows[len(rows) - room:]
+        self._buffer.extendleft(reversed(rows))
+
+    def write_batch(self, rows: List[dict]):
+        """Persist rows and their rollups in a single transaction (runs on a worker thread)."""
+        started = time.perf_counter()
+        with self.engine.begin() as conn:
+            conn.execute(self._insert, rows)
+            upsert_rollups(conn, rows)
+        elapsed = time.perf_counter() - started
+        FLUSH_SECONDS.observe(elapsed)
+        self.last_flush_ms = elapsed * 1000
+        self.written += len(rows)
+        self.flushes += 1
+
+    async def run(self):
+        self._batch_ready = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            while self._buffer:
+                rows = self._take_batch()
+                try:
+                    await loop.run_in_executor(None, self.write_batch, rows)
+                except Exception as e:
+                    self.failed_flushes += 1
+                    self._requeue(rows)
+                    log.error("readings_flush_failed", rows=len(rows), queued=len(self._buffer), error=e)
+                    break
+                if len(self._buffer) < self.batch_size:
+                    break
+
+    def flush(self):
+        """Synchronously write everything still buffered (shutdown)."""
+        while self._buffer:
+            self.write_batch(self._take_batch())
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": len(self._buffer),
+            "queue_capacity": self.max_queue,
+            "high_watermark": self.high_watermark,
+            "submitted": self.submitted,
+            "written": self.written,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "last_flush_ms": None if self.last_flush_ms is None else round(self.last_flush_ms, 2),
+        }
+
+
+reading_writer = ReadingWriter()
+Gauge("aura_readings_queue_depth", "Readings waiting in the write-behind buffer", lambda: len(reading_writer._buffer))
+Gauge("aura_readings_dropped_total", "Readings dropped because the buffer was full", lambda: reading_writer.dropped,
+      kind=COUNTER)
+Gauge("aura_readings_flush_failures_total", "Write-behind transactions that failed and were requeued",
+      lambda: reading_writer.failed_flushes, kind=COUNTER)
@@ -0,0 +1,402 @@
+"""
+Road Graph
+Walkable road/footpath network for evacuation routing, built from an
+OpenStreetMap XML extract on disk (ROAD_GRAPH_FILE, never downloaded).
+  - ways tagged highway=* (except motorways/trunks and unbuilt roads) are split
+    at junctions; chains of shape nodes collapse into one edge per segment
+    whose geometry is kept for drawing, so the search only visits junctions
+  - adjacency is CSR: indptr/indices/weights arrays over junction ids, every
+    segment in both directions (people on foot ignore oneway)
+  - the compiled arrays are cached next to the extract as <file>.graph.npz
+    and reused while the extract is unchanged
+Routes come from A* towards the nearest of several targets. Hazard zones
+multiply the length of every segment with a shape point inside them
+(ROUTE_CRITICAL_PENALTY / ROUTE_WARNING_PENALTY) rather than cutting it, so
+someone standing inside a zone still gets the shortest way out. Bulk planning
+grows one shortest-path tree out of the exits instead (shortest_tree) and
+reads every user's way out off it.
+
+Build the cache ahead of time: python -m services.road_graph build [FILE]
+"""
+import argparse
+import heapq
+import math
+import os
+import time
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.metrics import log
+from services.spatial import haversine_np, SpatialIndex
+
+ROAD_GRAPH_FILE = os.getenv("ROAD_GRAPH_FILE", os.path.join("data", "roads.osm"))
+ROUTE_CRITICAL_PENALTY = float(os.getenv("ROUTE_CRITICAL_PENALTY", "50"))
+ROUTE_WARNING_PENALTY = float(os.getenv("ROUTE_WARNING_PENALTY", "4"))
+
+EARTH_RADIUS = 6371000.0
+METERS_PER_RADIAN = EARTH_RADIUS
+EXCLUDED_HIGHWAYS = {"motorway", "motorway_link", "trunk", "trunk_link",
+                     "construction", "proposed", "abandoned", "raceway", "bus_guideway"}
+NO_ACCESS = {"no", "private"}
+CACHE_SUFFIX = ".graph.npz"
+CACHE_VERSION = 1
+PENALTY_CACHE_SIZE = 32  # hazard sets whose edge penalties are kept
+NODE_CELL_M = 100.0  # junction index cells
+
+
+def parse_osm(path: str) -> Tuple[Dict[int, Tuple[float, float]], List[List[int]]]:
+    """(node id -> (lat, lng), walkable ways as node id lists) from an .osm XML file."""
+    coords: Dict[int, Tuple[float, float]] = {}
+    ways: List[List[int]] = []
+    refs: List[int] = []
+    tags: Dict[str, str] = {}
+    for _, elem in ET.iterparse(path, events=("end",)):
+        if elem.tag == "node":
+            coords[int(elem.get("id"))] = (float(elem.get("lat")), float(elem.get("lon")))
+        elif elem.tag == "nd":
+            refs.append(int(elem.get("ref")))
+        elif elem.tag == "tag":
+            tags[elem.get("k")] = elem.get("v")
+        elif elem.tag == "way":
+            highway = tags.get("highway")
+            walkable = (highway is not None and highway not in EXCLUDED_HIGHWAYS
+                        and tags.get("foot") not in NO_ACCESS and tags.get("access") not in NO_ACCESS)
+            if walkable and len(refs) >= 2:
+                ways.append(refs)
+            refs, tags = [], {}
+        elif elem.tag == "relation":
+            refs, tags = [], {}
+        if elem.tag in ("node", "way", "relation"):
+            elem.clear()
+    return coords, ways
+
+
+def compile_graph(coords: Dict[int, Tuple[float, float]], ways: List[List[int]]) -> Dict[str, np.ndarray]:
+    """CSR arrays over junctions, plus per-segment geometry."""
+    ways = [[ref for ref in way if ref in coords] for way in ways]
+    uses: Dict[int, int] = {}
+    for way in ways:
+        for ref in way:
+            uses[ref] = uses.get(ref, 0) + 1
+        if len(way) >= 2:  # way ends are junctions
+            uses[way[0]] = uses.get(way[0], 0) + 1
+            uses[way[-1]] = uses.get(way[-1], 0) + 1
+
+    junction: Dict[int, int] = {}
+    seg_from, seg_to, seg_ptr, shape = [], [], [0], []
+    for way in ways:
+        start = 0
+        for i in range(1, len(way)):
+            if uses[way[i]] < 2 and i < len(way) - 1:
+                continue
+            points = way[start:i + 1]
+            start = i
+            if points[0] == points[-1] or len(points) < 2:
+                continue  # loops back onto its own junction: never on a shortest path
+            for ref in (points[0], points[-1]):
+                if ref not in junction:
+                    junction[ref] = len(junction)
+            seg_from.append(junction[points[0]])
+            seg_to.append(junction[points[-1]])
+            shape.extend(coords[ref] for ref in points)
+            seg_ptr.append(len(shape))
+
+    shape = np.array(shape, dtype=np.float64).reshape(-1, 2)
+    seg_ptr = np.array(seg_ptr, dtype=np.int64)
+    steps = haversine_np(shape[:-1, 0], shape[:-1, 1], shape[1:, 0], shape[1:, 1])
+    steps[seg_ptr[1:-1] - 1] = 0.0  # no step across segment boundaries
+    cumulative = np.concatenate(([0.0], np.cumsum(steps)))
+    lengths = cumulative[seg_ptr[1:] - 1] - cumulative[seg_ptr[:-1]]
+
+    node_lat = np.empty(len(junction))
+    node_lng = np.empty(len(junction))
+    for ref, index in junction.items():
+        node_lat[index], node_lng[index] = coords[ref]
+
+    # both directions; edge e -> segment, reversed when walking to -> from
+    seg_from = np.array(seg_from, dtype=np.int64)
+    seg_to = np.array(seg_to, dtype=np.int64)
+    segments = np.arange(len(seg_from))
+    tails = np.concatenate((seg_from, seg_to))
+    order = np.argsort(tails, kind="stable")
+    indptr = np.zeros(len(junction) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(tails, minlength=len(junction)), out=indptr[1:])
+    return {
+        "indptr": indptr,
+        "indices": np.concatenate((seg_to, seg_from))[order].astype(np.int32),
+        "edge_seg": np.concatenate((segments, segments))[order].astype(np.int32),
+        "edge_rev": np.concatenate((np.zeros(len(segments), bool), np.ones(len(segments), bool)))[order],
+        "seg_length": lengths,
+        "seg_ptr": seg_ptr,
+        "shape_lat": shape[:, 0].copy(),
+        "shape_lng": shape[:, 1].copy(),
+        "node_lat": node_lat,
+        "node_lng": node_lng,
+    }
+
+
+class RoadGraph:
+    def __init__(self, path: str = ROAD_GRAPH_FILE):
+        self.path = path
+        self.ready = False
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self._penalty_cache: Dict[tuple, Dict[int, float]] = {}
+
+    # ---------- Loading ----------
+
+    def _cache_path(self) -> str:
+        return self.path + CACHE_SUFFIX
+
+    def _signature(self) -> np.ndarray:
+        stat = os.stat(self.path)
+        return np.array([CACHE_VERSION, stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+    def build(self) -> Dict[str, np.ndarray]:
+        """Parse the extract and write the compiled cache."""
+        arrays = compile_graph(*parse_osm(self.path))
+        np.savez(self._cache_path(), signature=self._signature(), **arrays)
+        return arrays
+
+    def load(self) -> bool:
+        """Load the cached arrays (building them if stale); False when there is no extract."""
+        started = time.perf_counter()
+        if not os.path.exists(self.path):
+            self.error = f"no road graph at {self.path}"
+            return False
+        try:
+            arrays = None
+            if os.path.exists(self._cache_path()):
+                with np.load(self._cache_path()) as cached:
+                    if np.array_equal(cached["signature"], self._signature()):
+                        arrays = {name: cached[name] for name in cached.files if name != "signature"}
+            if arrays is None:
+                arrays = self.build()
+            self._set(arrays)
+        except Exception as e:
+            self.error = f"road graph {self.path}: {e}"
+            log.error("road_graph_failed", path=self.path, error=e)
+            return False
+        self.load_seconds = round(time.perf_counter() - started, 2)
+        log.info("road_graph_loaded", junctions=self.node_count, segments=self.segment_count,
+                 seconds=self.load_seconds)
+        return True
+
+    def _set(self, arrays: Dict[str, np.ndarray]):
+        for name, array in arrays.items():
+            setattr(self, name, array)
+        self.node_count = len(self.node_lat)
+        self.segment_count = len(self.seg_length)
+        # local equirectangular projection in meters, for the heuristic and hazard tests
+        self.lat0 = math.radians(float(self.node_lat.mean())) if self.node_count else 0.0
+        self.lng0 = math.radians(float(self.node_lng.mean())) if self.node_count else 0.0
+        self.node_x, self.node_y = self.project(self.node_lat, self.node_lng)
+        self.shape_x, self.shape_y = self.project(self.shape_lat, self.shape_lng)
+        # the search loop runs in Python: plain lists index much faster than arrays
+        self._indptr = self.indptr.tolist()
+        self._indices = self.indices.tolist()
+        self._weights = self.seg_length[self.edge_seg].tolist()
+        self._xs = self.node_x.tolist()
+        self._ys = self.node_y.tolist()
+        # hazard lookups: shape points sorted by x, and the two edges of every segment
+        self._shape_by_x = np.argsort(self.shape_x, kind="stable")
+        self._shape_x_sorted = self.shape_x[self._shape_by_x]
+        self.seg_edges = np.argsort(self.edge_seg, kind="stable").reshape(-1, 2)
+        twins = np.empty(len(self.edge_seg), dtype=np.int64)  # the same segment walked the other way
+        twins[self.seg_edges[:, 0]], twins[self.seg_edges[:, 1]] = self.seg_edges[:, 1], self.seg_edges[:, 0]
+        self._twins = twins.tolist()
+        self.node_index = SpatialIndex(NODE_CELL_M)
+        self.node_index.insert_many(range(self.node_count), self.node_lat, self.node_lng)
+        self._penalty_cache.clear()
+        self.ready = True
+
+    # ---------- Geometry ----------
+
+    def project(self, lat, lng):
+        """(x, y) meters east/north of the graph's center."""
+        x = (np.radians(lng) - self.lng0) * math.cos(self.lat0) * METERS_PER_RADIAN
+        y = (np.radians(lat) - self.lat0) * METERS_PER_RADIAN
+        return x, y
+
+    def nearest_node(self, lat: float, lng: float) -> Tuple[int, float]:
+        """(junction id, distance in meters) closest to a point."""
+        distance, node, _ = self.node_index.nearest(lat, lng)[0]
+        return node, distance
+
+    def nearest_nodes(self, lats, lngs) -> Tuple[np.ndarray, np.ndarray]:
+        """Bulk nearest_node: (junction ids, distances in meters) for arrays of points."""
+        distances, nodes = self.node_index.nearest_many(lats, lngs)
+        return np.array(nodes, dtype=np.int64), distances
+
+    def segment_points(self, edge: int) -> np.ndarray:
+        seg = self.edge_seg[edge]
+        start, end = self.seg_ptr[seg], self.seg_ptr[seg + 1]
+        points = np.column_stack((self.shape_lat[start:end], self.shape_lng[start:end]))
+        return points[::-1] if self.edge_rev[edge] else points
+
+    # ---------- Hazards ----------
+
+    def penalties_for(self, hazards: Sequence[dict]) -> Dict[int, float]:
+        """Edge -> length multiplier for the hazards ({"lat", "lng", "radius_m", "severity"}).
+
+        Only shape points in a zone's x-range are tested (they are kept sorted
+        by x), so the cost follows the size of the zones, not of the graph.
+        """
+        if not hazards:
+            return {}
+        key = tuple(sorted((round(h["lat"], 6), round(h["lng"], 6), h["radius_m"], h["severity"]) for h in hazards))
+        penalties = self._penalty_cache.get(key)
+        if penalties is None:
+            factors: Dict[int, float] = {}
+            for hazard in hazards:
+                x, y = self.project(hazard["lat"], hazard["lng"])
+                radius = hazard["radius_m"]
+                lo, hi = np.searchsorted(self._shape_x_sorted, (x - radius, x + radius))
+                points = self._shape_by_x[lo:hi]
+                points = points[(self.shape_x[points] - x) ** 2 + (self.shape_y[points] - y) ** 2 <= radius ** 2]
+                penalty = ROUTE_CRITICAL_PENALTY if hazard["severity"] == "critical" else ROUTE_WARNING_PENALTY
+                segments = np.unique(np.searchsorted(self.seg_ptr, points, side="right") - 1)
+                for edge in self.seg_edges[segments].ravel().tolist():
+                    factors[edge] = max(factors.get(edge, 1.0), penalty)
+            penalties = factors
+            if len(self._penalty_cache) >= PENALTY_CACHE_SIZE:
+                self._penalty_cache.pop(next(iter(self._penalty_cache)))
+            self._penalty_cache[key] = penalties
+        return penalties
+
+    # ---------- Search ----------
+
+    def astar(self, source: int, targets: Sequence[int], penalties: Optional[Dict[int, float]] = None
+              ) -> Optional[Tuple[int, List[int], float]]:
+        """A* from source to the closest of targets: (target, edge ids, weighted cost) or None."""
+        penalties = penalties or {}
+        indptr, indices, weights, xs, ys = self._indptr, self._indices, self._weights, self._xs, self._ys
+        goals = set(targets)
+        # 0.999: the flat projection may overstate a great-circle distance slightly
+        points = [(xs[t], ys[t]) for t in goals]
+        hypot = math.hypot
+
+        def heuristic(node):
+            x, y = xs[node], ys[node]
+            return 0.999 * min(hypot(x - tx, y - ty) for tx, ty in points)
+
+        best = {source: 0.0}
+        via: Dict[int, Tuple[int, int]] = {}  # node -> (previous node, edge that reached it)
+        heap = [(heuristic(source), 0.0, source)]
+        push, pop, inf = heapq.heappush, heapq.heappop, math.inf
+        while heap:
+            _, cost, node = pop(heap)
+            if cost > best[node]:
+                continue
+            if node in goals:
+                edges = []
+                at = node
+                while at != source:
+                    at, edge = via[at]
+                    edges.append(edge)
+                edges.reverse()
+                return node, edges, cost
+            for edge in range(indptr[node], indptr[node + 1]):
+                neighbour = indices[edge]
+                weight = weights[edge]
+                if edge in penalties:
+                    weight *= penalties[edge]
+                candidate = cost + weight
+                if candidate < best.get(neighbour, inf):
+                    best[neighbour] = candidate
+                    via[neighbour] = (node, edge)
+                    push(heap, (candidate + heuristic(neighbour), candidate, neighbour))
+        return None
+
+    def shortest_tree(self, sources: Dict[int, float], penalties: Optional[Dict[int, float]] = None,
+                      targets: Optional[Sequence[int]] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Multi-source Dijkstra from sources (junction -> starting cost), e.g. every safe exit.
+
+        Segments are walkable both ways, so the tree grown out of the exits is
+        also every junction's way back to its closest exit. Returns per-junction
+        (weighted cost, length in meters, edge that reached it or -1, source it
+        hangs from or -1); stops early once every junction in targets is settled.
+        """
+        penalties = penalties or {}
+        indptr, indices, weights = self._indptr, self._indices, self._weights
+        inf = math.inf
+        cost = [inf] * self.node_count
+        length = [inf] * self.node_count
+        parent = [-1] * self.node_count
+        root = [-1] * self.node_count
+        heap = []
+        for node, start in sources.items():
+            cost[node] = length[node] = start
+            root[node] = node
+            heap.append((start, node))
+        heapq.heapify(heap)
+        remaining = set(targets) if targets is not None else None
+        push, pop = heapq.heappush, heapq.heappop
+        while heap:
+            node_cost, node = pop(heap)
+            if node_cost > cost[node]:
+                continue
+            if remaining is not None:
+                remaining.discard(node)
+                if not remaining:
+                    break
+            node_length, node_root = length[node], root[node]
+            for edge in range(indptr[node], indptr[node + 1]):
+                neighbour = indices[edge]
+                weight = weights[edge]
+                candidate = node_cost + (weight * penalties[edge] if edge in penalties else weight)
+                if candidate < cost[neighbour]:
+                    cost[neighbour] = candidate
+                    length[neighbour] = node_length + weight
+                    parent[neighbour] = edge
+                    root[neighbour] = node_root
+                    push(heap, (candidate, neighbour))
+        return (np.array(cost), np.array(length), np.array(parent, dtype=np.int64),
+                np.array(root, dtype=np.int64))
+
+    def tree_path(self, parent: np.ndarray, node: int) -> List[int]:
+        """Edges from node to the root of its shortest_tree(), in walking order."""
+        edges = []
+        edge = int(parent[node])
+        while edge >= 0:
+            back = self._twins[edge]
+            edges.append(back)
+            edge = int(parent[self._indices[back]])
+        return edges
+
+    def polyline(self, edges: List[int]) -> Tuple[List[List[float]], float]:
+        """([lat, lng] polyline, length in meters) of an edge sequence."""
+        if not edges:
+            return [], 0.0
+        pieces = [self.segment_points(edges[0])] + [self.segment_points(edge)[1:] for edge in edges[1:]]
+        length = float(self.seg_length[self.edge_seg[edges]].sum())
+        return np.concatenate(pieces).round(6).tolist(), length
+
+    def stats(self) -> dict:
+        if not self.ready:
+            return {"ready": False, "error": self.error}
+        return {"ready": True, "file": self.path, "junctions": self.node_count,
+                "segments": self.segment_count, "load_seconds": self.load_seconds}
+
+
+road_graph = RoadGraph()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m services.road_graph")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="compile an .osm extract into the routing cache")
+    build.add_argument("path", nargs="?", default=ROAD_GRAPH_FILE)
+    args = parser.parse_args(argv)
+
+    started = time.time()
+    graph = RoadGraph(args.path)
+    graph._set(graph.build())
+    print(f"Compiled {graph.node_count} junctions, {graph.segment_count} segments "
+          f"into {graph._cache_path()} in {time.time() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+Route Cache
+Evacuation routes shared by everyone asking from the same neighbourhood about
+the same danger point, so a crowd hitting /evacuation/route during an incident
+costs one road-graph search per block instead of one per person.
+  - key:     (origin cell, danger cell) on a ROUTE_CACHE_CELL_M grid; the entry
+             holds the route from the origin cell's center, which ends at its
+             safe exit, and each request gets it re-anchored at the caller's
+             own position
+  - expiry:  LRU over ROUTE_CACHE_SIZE entries, each served for ROUTE_CACHE_TTL
+             seconds; concurrent misses on one key wait for a single search
+  - hazards: every lookup passes the open hazards; one not seen before (a new
+             incident, or a raised severity) drops only the entries whose path
+             runs through its zone, found through a spatial index of points
+             sampled along every cached path
+  - warm-up: precompute() plans the routes of every cell within
+             ROUTE_PRECOMPUTE_RADIUS_M of a danger point, nearest first; it is
+             run on a worker thread when a critical alert goes out
+Only road-graph routes are cached; the straight-line fallback is cheaper to
+compute than to look up.
+"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Set, Tuple
+
+from services import evacuation
+from services.road_graph import road_graph
+from services.spatial import haversine, METERS_PER_DEGREE, SpatialIndex
+
+ROUTE_CACHE_SIZE = int(os.getenv("ROUTE_CACHE_SIZE", "2048"))
+ROUTE_CACHE_TTL = float(os.getenv("ROUTE_CACHE_TTL", "120"))
+ROUTE_CACHE_CELL_M = float(os.getenv("ROUTE_CACHE_CELL_M", "100"))
+ROUTE_PRECOMPUTE_RADIUS_M = float(os.getenv("ROUTE_PRECOMPUTE_RADIUS_M", "800"))
+PATH_SAMPLE_M = 50.0  # spacing of the indexed points along a cached path
+
+Cell = Tuple[int, int]
+Key = Tuple[Cell, Cell]
+
+
+def _hazard_key(hazard: dict) -> tuple:
+    return round(hazard["lat"], 5), round(hazard["lng"], 5), hazard["severity"]
+
+
+def _sample(path: List[List[float]]) -> List[Tuple[float, float]]:
+    """Path vertices plus points every PATH_SAMPLE_M along longer legs."""
+    points = [tuple(path[0])]
+    for (lat1, lng1), (lat2, lng2) in zip(path, path[1:]):
+        steps = int(haversine(lat1, lng1, lat2, lng2) // PATH_SAMPLE_M) + 1
+        points.extend((lat1 + (lat2 - lat1) * i / steps, lng1 + (lng2 - lng1) * i / steps)
+                      for i in range(1, steps + 1))
+    return points
+
+
+class _Entry:
+    __slots__ = ("route", "created", "points")
+
+    def __init__(self, route: dict, created: float, points: int):
+        self.route = route
+        self.created = created
+        self.points = points  # path samples in the index, keyed (cache key, i)
+
+
+class RouteCache:
+    def __init__(self, size: int = ROUTE_CACHE_SIZE, ttl: float = ROUTE_CACHE_TTL,
+                 cell_m: float = ROUTE_CACHE_CELL_M, precompute_radius_m: float = ROUTE_PRECOMPUTE_RADIUS_M,
+                 graph=None):
+        self.size = size
+        self.ttl = ttl
+        self.cell_m = cell_m
+        self.precompute_radius_m = precompute_radius_m
+        self.graph = graph or road_graph
+        self._lat_deg = cell_m / METERS_PER_DEGREE
+        self._entries: "OrderedDict[Key, _Entry]" = OrderedDict()
+        self._paths = SpatialIndex(cell_m=evacuation.HAZARD_RADIUS_M)
+        self._pending: Dict[Key, Future] = {}
+        self._hazards: Set[tuple] = set()  # hazards the cached entries already account for
+        self._generation = 0  # bumped whenever a new hazard invalidates entries
+        self._warming: Dict[Cell, float] = {}  # danger cell -> when its precompute started
+        self._lock = threading.Lock()  # lookups run on executor threads
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        self.precomputed = 0
+
+    # ---------- Cells ----------
+
+    def _cell(self, lat: float, lng: float) -> Cell:
+        row = int(math.floor(lat / self._lat_deg))
+        lng_deg = self._lat_deg / max(math.cos(math.radians((row + 0.5) * self._lat_deg)), 0.01)
+        return row, int(math.floor(lng / lng_deg))
+
+    def _center(self, cell: Cell) -> Tuple[float, float]:
+        row, col = cell
+        lat = (row + 0.5) * self._lat_deg
+        lng_deg = self._lat_deg / max(math.cos(math.radians(lat)), 0.01)
+        return lat, (col + 0.5) * lng_deg
+
+    # ---------- Entries ----------
+
+    def _drop(self, key: Key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            for i in range(entry.points):
+                self._paths.remove((key, i))
+
+    def _store(self, key: Key, route: dict, now: float):
+        self._drop(key)
+        points = _sample(route["safe_route"][1:])  # from the first junction on
+        for i, (lat, lng) in enumerate(points):
+            self._paths.insert((key, i), lat, lng)
+        self._entries[key] = _Entry(route, now, len(points))
+        while len(self._entries) > self.size:
+            self._drop(next(iter(self._entries)))
+
+    def sync(self, hazards: List[dict]):
+        """Drop the entries whose path crosses a hazard the cache has not seen yet."""
+        current = {_hazard_key(hazard) for hazard in hazards}
+        with self._lock:
+            added = current - self._hazards
+            self._hazards = current
+            if not added:
+                return
+            self._generation += 1
+            reach = evacuation.HAZARD_RADIUS_M + PATH_SAMPLE_M / 2
+            for lat, lng, _ in added:
+                for key in {point[0] for _, point, _ in self._paths.within(lat, lng, reach)}:
+                    self._drop(key)
+                    self.invalidated += 1
+
+    def _plan(self, key: Key, danger_lat: float, danger_lng: float, hazards: List[dict],
+              now: float) -> Optional[dict]:
+        """The cached route for key, planning it (once across threads) when missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry.created <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.route
+            pending = self._pending.get(key)
+            if pending is None:
+                pending = self._pending[key] = Future()
+                generation = self._generation
+                owner = True
+            else:
+                owner = False
+            self.misses += 1
+        if not owner:
+            return pending.result()
+        try:
+            origin_lat, origin_lng = self._center(key[0])
+            route = evacuation.get_evacuation_route(danger_lat, danger_lng, origin_lat, origin_lng, hazards)
+            if route["routing"] != "road_graph":
+                route = None
+            with self._lock:
+                # planned against hazards that have since changed: hand it out but do not keep it
+                if route is not None and generation == self._generation:
+                    self._store(key, route, now)
+            pending.set_result(route)
+            return route
+        except BaseException as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    # ---------- Lookups ----------
+
+    def route(self, danger_lat: float, danger_lng: float, user_lat: Optional[float] = None,
+              user_lng: Optional[float] = None, hazards: Optional[List[dict]] = None,
+              now: Optional[float] = None) -> dict:
+        """evacuation.get_evacuation_route(), served from the cache when the road graph is up."""
+        hazards = hazards or []
+        if not self.graph.ready:
+            return evacuation.get_evacuation_route(danger_lat, danger_lng, user_lat, user_lng, hazards)
+        if user_lat is None:
+            user_lat = danger_lat - 0.005
+        if user_lng is None:
+            user_lng = danger_lng - 0.002
+        now = time.time() if now is None else now
+        self.sync(hazards)
+        key = (self._cell(user_lat, user_lng), self._cell(danger_lat, danger_lng))
+        cached = self._plan(key, danger_lat, danger_lng, hazards, now)
+        if cached is None:
+            return evacuation.get_evacuation_route(danger_lat, danger_lng, user_lat, user_lng, hazards)
+        return self._anchor(cached, key[0], user_lat, user_lng)
+
+    def _anchor(self, route: dict, origin: Cell, user_lat: float, user_lng: float) -> dict:
+        """The cell's route, starting from the caller instead of the cell center."""
+        center_lat, center_lng = self._center(origin)
+        safe_route = route["safe_route"]
+        first_lat, first_lng = safe_route[1]
+        distance = (route["safe_exit"]["distance_m"] - haversine(center_lat, center_lng, first_lat, first_lng)
+                    + haversine(user_lat, user_lng, first_lat, first_lng))
+        safe_exit = {
+            **route["safe_exit"],
+            "distance_m": round(distance),
+            "estimated_time_min": round(distance / evacuation.WALKING_SPEED, 1),
+        }
+        danger = route["danger_zone"]
+        return {
+            **route,
+            "user_location": {"lat": user_lat, "lng": user_lng},
+            "safe_exit": safe_exit,
+            "safe_route": [[user_lat, user_lng]] + safe_route[1:],
+            "blocked_route": [[user_lat, user_lng], [danger["lat"], danger["lng"]],
+                              [safe_exit["lat"], safe_exit["lng"]]],
+        }
+
+    # ---------- Warm-up ----------
+
+    def precompute(self, danger_lat: float, danger_lng: float, hazards: Optional[List[dict]] = None,
+                   now: Optional[float] = None) -> int:
+        """Plan the route of every cell within the precompute radius; returns how many were searched."""
+        if not self.graph.ready:
+            return 0
+        hazards = hazards or []
+        now = time.time() if now is None else now
+        danger = self._cell(danger_lat, danger_lng)
+        with self._lock:
+            started = self._warming.get(danger)
+            if started is not None and now - started < self.ttl:
+                return 0
+            self._warming = {cell: ts for cell, ts in self._warming.items() if now - ts < self.ttl}
+            self._warming[danger] = now
+        self.sync(hazards)
+        reach = int(math.ceil(self.precompute_radius_m / self.cell_m)) + 1
+        cells = []
+        d_row, d_col = danger
+        for row in range(d_row - reach, d_row + reach + 1):
+            for col in range(d_col - reach, d_col + reach + 1):
+                lat, lng = self._center((row, col))
+                distance = haversine(danger_lat, danger_lng, lat, lng)
+                if distance <= self.precompute_radius_m:
+                    cells.append((distance, self._cell(lat, lng)))
+        searched = 0
+        for _, cell in sorted(cells):
+            key = (cell, danger)
+            with self._lock:
+                if key in self._entries:
+                    continue
+            self._plan(key, danger_lat, danger_lng, hazards, now)
+            searched += 1
+        self.precomputed += searched
+        return searched
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._paths.clear()
+            self._hazards = set()
+            self._warming.clear()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidated": self.invalidated,
+            "precomputed": self.precomputed,
+        }
+
+
+route_cache = RouteCache()
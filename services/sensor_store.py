@@ -0,0 +1,228 @@
+"""
+Latest-Value Sensor Store
+Keeps the newest reading per (node_id, sensor_type), joined to SensorPosition rows.
+Each sensor type is its own column block (NumPy arrays + row index) guarded by
+its own lock, so writers for different sensor types never contend and bounding
+box reads are a vectorized mask instead of a dict scan. Positions are also
+kept in a spatial index (services/spatial.py) for nearest / radius lookups.
+"""
+import math
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services.spatial import SpatialIndex
+
+DEFAULT_NODE = "default"
+POSITION_CELL_M = 250.0  # spatial index cells for sensor positions
+
+# SensorPosition.sensor_type uses the dashboard names, ingest uses the endpoint names
+POSITION_TYPE_ALIASES = {
+    "ultra-sonic": "ultrasonic",
+    "earthquake": "seismic",
+}
+
+
+def normalize_sensor_type(sensor_type: str) -> str:
+    return POSITION_TYPE_ALIASES.get(sensor_type, sensor_type)
+
+
+class _Column:
+    """Array-backed latest values for every node of one sensor type."""
+
+    def __init__(self, capacity: int = 64):
+        self.lock = threading.Lock()
+        self.rows: Dict[str, int] = {}
+        self.payloads: List[dict] = []
+        self.values = np.full(capacity, np.nan)
+        self.lat = np.full(capacity, np.nan)
+        self.lng = np.full(capacity, np.nan)
+
+    def _grow(self):
+        capacity = len(self.values) * 2
+        for name in ("values", "lat", "lng"):
+            old = getattr(self, name)
+            new = np.full(capacity, np.nan)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def row_for(self, node_id: str) -> int:
+        row = self.rows.get(node_id)
+        if row is None:
+            row = len(self.payloads)
+            if row == len(self.values):
+                self._grow()
+            self.rows[node_id] = row
+            self.payloads.append(None)
+        return row
+
+    def remove(self, node_id: str):
+        """Drop a node's row; the last row moves into the gap so the arrays stay dense."""
+        row = self.rows.pop(node_id, None)
+        if row is None:
+            return
+        last = len(self.payloads) - 1
+        if row != last:
+            moved = self.payloads[row] = self.payloads[last]
+            self.rows[moved["node_id"]] = row
+            for array in (self.values, self.lat, self.lng):
+                array[row] = array[last]
+        self.payloads.pop()
+        for array in (self.values, self.lat, self.lng):
+            array[last] = np.nan
+
+
+class SensorStore:
+    def __init__(self):
+        self._columns: Dict[str, _Column] = {}
+        self._columns_lock = threading.Lock()
+        self._positions: Dict[str, dict] = {}
+        self._default_nodes: Dict[str, str] = {}
+        self.position_index = SpatialIndex(cell_m=POSITION_CELL_M)
+
+    # ---------- Positions ----------
+
+    def load_positions(self, positions):
+        """Replace the position table from SensorPosition rows."""
+        self._positions = {}
+        self._default_nodes = {}
+        self.position_index.clear()
+        self.add_positions(positions)
+
+    def add_position(self, pos):
+        self.add_positions([pos])
+
+    def add_positions(self, positions):
+        """Add or move positions (objects or rows with id, name, lat, lng, sensor_type)."""
+        node_ids, lats, lngs, items = [], [], [], []
+        for pos in positions:
+            node_id = str(pos.id)
+            sensor_type = normalize_sensor_type(pos.sensor_type)
+            position = self._positions[node_id] = {"name": pos.name, "lat": pos.lat, "lng": pos.lng,
+                                                   "sensor_type": sensor_type}
+            self._default_nodes.setdefault(sensor_type, node_id)
+            node_ids.append(node_id)
+            lats.append(pos.lat)
+            lngs.append(pos.lng)
+            items.append(position)
+
+            column = self._columns.get(sensor_type)
+            if column is not None:
+                with column.lock:
+                    row = column.rows.get(node_id)
+                    if row is not None:
+                        column.lat[row], column.lng[row] = pos.lat, pos.lng
+        self.position_index.insert_many(node_ids, lats, lngs, items)
+
+    def remove_position(self, position_id):
+        """Forget a deleted position and its latest readings."""
+        node_id = str(position_id)
+        for column in list(self._columns.values()):
+            with column.lock:
+                column.remove(node_id)
+        position = self._positions.pop(node_id, None)
+        if position is None:
+            return
+        self.position_index.remove(node_id)
+        sensor_type = position["sensor_type"]
+        if self._default_nodes.get(sensor_type) == node_id:
+            del self._default_nodes[sensor_type]
+            for other_id, other in self._positions.items():
+                if other["sensor_type"] == sensor_type:
+                    self._default_nodes[sensor_type] = other_id
+                    break
+
+    def apply_position_changes(self, created, deleted_ids):
+        """Follow the positions table; a position_snapshot listener."""
+        for position_id in deleted_ids:
+            self.remove_position(position_id)
+        self.add_positions(created)
+
+    def position(self, node_id: str) -> Optional[dict]:
+        return self._positions.get(node_id)
+
+    def location(self, node_id: str) -> dict:
+        """{"lat", "lng"} of the node's position, or {} if it has none."""
+        position = self._positions.get(node_id)
+        return {"lat": position["lat"], "lng": position["lng"]} if position else {}
+
+    def nearby(self, lat: float, lng: float, k: int = 10, radius_m: Optional[float] = None,
+               sensor_type: Optional[str] = None) -> List[dict]:
+        """Closest positions first, as {"node_id", "name", "lat", "lng", "sensor_type", "distance_m"}."""
+        wanted = normalize_sensor_type(sensor_type) if sensor_type is not None else None
+
+        def matches(position):
+            return wanted is None or position["sensor_type"] == wanted
+
+        hits = self.position_index.nearest(lat, lng, k, max_m=radius_m if radius_m is not None else math.inf,
+                                           where=matches)
+        return [{"node_id": node_id, **position, "distance_m": round(distance, 1)}
+                for distance, node_id, position in hits]
+
+    def resolve_node(self, sensor_type: str, node_id: Optional[str] = None) -> str:
+        """Readings without a node_id belong to the first registered node of that type."""
+        if node_id is not None:
+            return node_id
+        return self._default_nodes.get(sensor_type, DEFAULT_NODE)
+
+    # ---------- Writes ----------
+
+    def _column(self, sensor_type: str) -> _Column:
+        column = self._columns.get(sensor_type)
+        if column is None:
+            with self._columns_lock:
+                column = self._columns.setdefault(sensor_type, _Column())
+        return column
+
+    def update(self, payload: dict):
+        """Store a reading payload; it must carry "sensor" and "node_id"."""
+        sensor_type, node_id = payload["sensor"], payload["node_id"]
+        position = self._positions.get(node_id)
+        column = self._column(sensor_type)
+        with column.lock:
+            row = column.row_for(node_id)
+            column.payloads[row] = payload
+            column.values[row] = payload["value"]
+            if position is not None:
+                column.lat[row], column.lng[row] = position["lat"], position["lng"]
+
+    # ---------- Reads ----------
+
+    def get(self, sensor_type: str, node_id: str) -> Optional[dict]:
+        column = self._columns.get(sensor_type)
+        if column is None:
+            return None
+        with column.lock:
+            row = column.rows.get(node_id)
+            return column.payloads[row] if row is not None else None
+
+    def snapshot(self, sensor_type: Optional[str] = None,
+                 bbox: Optional[Tuple[float, float, float, float]] = None) -> List[dict]:
+        """Latest payloads, optionally filtered by sensor type and/or
+        a (min_lat, min_lng, max_lat, max_lng) bounding box."""
+        if sensor_type is not None:
+            column = self._columns.get(normalize_sensor_type(sensor_type))
+            columns = [column] if column is not None else []
+        else:
+            columns = list(self._columns.values())
+
+        result = []
+        for column in columns:
+            with column.lock:
+                count = len(column.payloads)
+                if bbox is None:
+                    result.extend(column.payloads)
+                    continue
+                min_lat, min_lng, max_lat, max_lng = bbox
+                lat, lng = column.lat[:count], column.lng[:count]
+                mask = (lat >= min_lat) & (lat <= max_lat) & (lng >= min_lng) & (lng <= max_lng)
+                payloads = column.payloads
+                result.extend(payloads[i] for i in np.flatnonzero(mask))
+        return result
+
+    def __len__(self):
+        return sum(len(column.payloads) for column in list(self._columns.values()))
+
+
+latest_readings = SensorStore()
@@ -0,0 +1,414 @@
+"""
+Spatial Index
+In-memory point index behind every "what is near here" lookup: safe exits
+(services/evacuation.py), sensor positions (services/sensor_store.py), open
+incidents (services/incidents.py) and road junctions (services/road_graph.py).
+  - points sit in square cells of cell_m meters on an equirectangular
+    projection, so inserting, moving or removing a point is a dict operation
+    and nothing is ever rebuilt
+  - nearest() walks rings of cells outwards from the query and stops once no
+    unvisited cell can hold anything closer than the k-th hit; a ring wider
+    than the number of occupied cells means the points are sparse, and they
+    are simply all measured
+  - within() reads only the cells the circle overlaps
+Distances are great-circle meters. haversine_matrix() gives the full
+distance matrix between two point sets for bulk work.
+"""
+import bisect
+import heapq
+import itertools
+import math
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+EARTH_RADIUS = 6371000.0
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS / 180
+# ring bounds come from the projection; leave room for its error against haversine
+RING_SLACK = 0.99
+SCAN_BELOW = 16  # indexes this small are scanned point by point; NumPy call overhead would dominate
+MATRIX_BELOW = 2048  # nearest_many() measures indexes this small against every query outright
+
+
+def haversine(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Calculate distance between two points in meters."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = math.radians(lat2 - lat1)
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return EARTH_RADIUS * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def haversine_np(lat1, lng1, lat2, lng2) -> np.ndarray:
+    """Element-wise great-circle distance in meters."""
+    lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def haversine_matrix(lat1, lng1, lat2, lng2) -> np.ndarray:
+    """(len(lat1), len(lat2)) matrix of great-circle distances in meters."""
+    lat1, lng1 = np.radians(np.asarray(lat1, dtype=float))[:, None], np.radians(np.asarray(lng1, dtype=float))[:, None]
+    lat2, lng2 = np.radians(np.asarray(lat2, dtype=float))[None, :], np.radians(np.asarray(lng2, dtype=float))[None, :]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+Hit = Tuple[float, Hashable, Any]  # (distance in meters, key, item)
+
+
+class SpatialIndex:
+    """Keyed points in a uniform grid with k-nearest and radius queries.
+
+    ref_lat fixes the east-west cell width; it defaults to the first point
+    inserted, which is right for anything the size of a district or a city.
+    Each cell keeps its points in a dict for updates and, once queried, as
+    arrays, so a query measures every candidate cell in one vectorized pass.
+    """
+
+    def __init__(self, cell_m: float = 250.0, ref_lat: Optional[float] = None):
+        self.cell_m = cell_m
+        self.ref_lat = ref_lat
+        self._cells: Dict[Tuple[int, int], Dict[Hashable, Tuple[float, float, Any]]] = {}
+        self._packed: Dict[Tuple[int, int], tuple] = {}  # cell -> arrays, dropped when the cell changes
+        self._all: Optional[tuple] = None  # every point as one pack, dropped on any change
+        self._table: Optional[tuple] = None  # cell lookup table over _all for nearest_many
+        self._cell_of: Dict[Hashable, Tuple[int, int]] = {}
+        self._extent: Optional[List[int]] = None  # [min row, max row, min col, max col]; only grows
+        if ref_lat is not None:
+            self._set_ref(ref_lat)
+
+    def _set_ref(self, ref_lat: float):
+        self.ref_lat = ref_lat
+        self._lat_deg = self.cell_m / METERS_PER_DEGREE
+        self._lng_deg = self._lat_deg / max(math.cos(math.radians(ref_lat)), 0.01)
+
+    def __len__(self) -> int:
+        return len(self._cell_of)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._cell_of
+
+    def __iter__(self) -> Iterator[Tuple[Hashable, float, float, Any]]:
+        """(key, lat, lng, item) of every point."""
+        for members in self._cells.values():
+            for key, (lat, lng, item) in members.items():
+                yield key, lat, lng, item
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self._lat_deg)), int(math.floor(lng / self._lng_deg))
+
+    def _grow(self, min_row: int, max_row: int, min_col: int, max_col: int):
+        extent = self._extent
+        if extent is None:
+            self._extent = [min_row, max_row, min_col, max_col]
+        else:
+            self._extent = [min(extent[0], min_row), max(extent[1], max_row),
+                            min(extent[2], min_col), max(extent[3], max_col)]
+
+    # ---------- Writes ----------
+
+    def insert(self, key: Hashable, lat: float, lng: float, item: Any = None):
+        """Add a point, or move it if the key is already indexed."""
+        if self.ref_lat is None:
+            self._set_ref(lat)
+        if key in self._cell_of:
+            self.remove(key)
+        cell = self._cell(lat, lng)
+        self._cells.setdefault(cell, {})[key] = (lat, lng, item)
+        self._packed.pop(cell, None)
+        self._all = self._table = None
+        self._cell_of[key] = cell
+        self._grow(cell[0], cell[0], cell[1], cell[1])
+
+    def insert_many(self, keys: Sequence[Hashable], lats, lngs, items: Optional[Sequence[Any]] = None):
+        """Bulk insert; cells are computed in one vectorized pass."""
+        lats, lngs = np.asarray(lats, dtype=float), np.asarray(lngs, dtype=float)
+        if not len(lats):
+            return
+        if self.ref_lat is None:
+            self._set_ref(float(lats.mean()))
+        rows = np.floor(lats / self._lat_deg).astype(np.int64)
+        cols = np.floor(lngs / self._lng_deg).astype(np.int64)
+        items = items if items is not None else [None] * len(lats)
+        cells, cell_of, packed = self._cells, self._cell_of, self._packed
+        for key, lat, lng, row, col, item in zip(keys, lats.tolist(), lngs.tolist(),
+                                                 rows.tolist(), cols.tolist(), items):
+            if key in cell_of:
+                self.remove(key)
+            cell = (row, col)
+            members = cells.get(cell)
+            if members is None:
+                members = cells[cell] = {}
+            members[key] = (lat, lng, item)
+            packed.pop(cell, None)
+            cell_of[key] = cell
+        self._all = self._table = None
+        self._grow(int(rows.min()), int(rows.max()), int(cols.min()), int(cols.max()))
+
+    def remove(self, key: Hashable) -> bool:
+        cell = self._cell_of.pop(key, None)
+        if cell is None:
+            return False
+        members = self._cells[cell]
+        del members[key]
+        if not members:
+            del self._cells[cell]
+        self._packed.pop(cell, None)
+        self._all = self._table = None
+        return True
+
+    def clear(self):
+        self._cells.clear()
+        self._packed.clear()
+        self._all = self._table = None
+        self._cell_of.clear()
+        self._extent = None
+
+    def get(self, key: Hashable) -> Optional[Tuple[float, float, Any]]:
+        """(lat, lng, item) of a key, or None."""
+        cell = self._cell_of.get(key)
+        return self._cells[cell][key] if cell is not None else None
+
+    # ---------- Queries ----------
+
+    def _pack(self, cell: Tuple[int, int]) -> tuple:
+        """(keys, items, lat radians, lng radians, cos lat) of a cell."""
+        packed = self._packed.get(cell)
+        if packed is None:
+            members = self._cells[cell]
+            lat = np.radians(np.fromiter((point[0] for point in members.values()), float, len(members)))
+            lng = np.radians(np.fromiter((point[1] for point in members.values()), float, len(members)))
+            packed = self._packed[cell] = (list(members), [point[2] for point in members.values()],
+                                           lat, lng, np.cos(lat))
+        return packed
+
+    def _pack_all(self) -> tuple:
+        """Every point as one pack, grouped by cell in self._cells order."""
+        if self._all is None:
+            keys = list(itertools.chain.from_iterable(self._cells.values()))
+            points = list(itertools.chain.from_iterable(members.values() for members in self._cells.values()))
+            lat = np.radians(np.fromiter((point[0] for point in points), float, len(points)))
+            lng = np.radians(np.fromiter((point[1] for point in points), float, len(points)))
+            self._all = (keys, [point[2] for point in points], lat, lng, np.cos(lat))
+        return self._all
+
+    def _measure(self, lat: float, lng: float, cells: Optional[List[Tuple[int, int]]]
+                 ) -> Tuple[list, list, np.ndarray]:
+        """(packs, start offset of each pack, distances) of every point in the cells (None: all)."""
+        packs = [self._pack(cell) for cell in cells] if cells is not None else [self._pack_all()]
+        if len(packs) == 1:
+            starts = [0]
+            _, _, p_lat, p_lng, p_cos = packs[0]
+        else:
+            starts = list(itertools.accumulate((len(pack[0]) for pack in packs[:-1]), initial=0))
+            p_lat, p_lng, p_cos = (np.concatenate([pack[i] for pack in packs]) for i in (2, 3, 4))
+        phi, lam = math.radians(lat), math.radians(lng)
+        a = np.sin((p_lat - phi) / 2) ** 2 + math.cos(phi) * p_cos * np.sin((p_lng - lam) / 2) ** 2
+        return packs, starts, 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    @staticmethod
+    def _point(packs: list, starts: list, i: int) -> Tuple[Hashable, Any]:
+        """(key, item) of the i-th measured point."""
+        j = bisect.bisect_right(starts, i) - 1
+        pack = packs[j]
+        return pack[0][i - starts[j]], pack[1][i - starts[j]]
+
+    def _scan(self, lat: float, lng: float, max_m: float, where: Optional[Callable[[Any], bool]]) -> List[Hit]:
+        """Every point within max_m, closest first, measured one by one."""
+        hits = []
+        for key, p_lat, p_lng, item in self:
+            distance = haversine(lat, lng, p_lat, p_lng)
+            if distance <= max_m and (where is None or where(item if item is not None else key)):
+                hits.append((distance, key, item))
+        hits.sort(key=lambda hit: hit[0])
+        return hits
+
+    def _ring(self, row: int, col: int, r: int) -> List[Tuple[int, int]]:
+        """Occupied cells at Chebyshev distance r from (row, col)."""
+        cells = self._cells
+        if r == 0:
+            return [(row, col)] if (row, col) in cells else []
+        min_row, max_row, min_col, max_col = self._extent
+        ring = []
+        c0, c1 = max(col - r, min_col), min(col + r, max_col)
+        for edge_row in (row - r, row + r):
+            if min_row <= edge_row <= max_row:
+                ring.extend((edge_row, c) for c in range(c0, c1 + 1))
+        for r_ in range(max(row - r + 1, min_row), min(row + r - 1, max_row) + 1):
+            if min_col <= col - r:
+                ring.append((r_, col - r))
+            if col + r <= max_col:
+                ring.append((r_, col + r))
+        return [cell for cell in ring if cell in cells]
+
+    def nearest(self, lat: float, lng: float, k: int = 1, max_m: float = math.inf,
+                where: Optional[Callable[[Any], bool]] = None) -> List[Hit]:
+        """Up to k closest points within max_m, closest first.
+
+        where(item) (the key when the point has no item) rejects candidates;
+        rejected points do not count towards k.
+        """
+        if not self._cell_of or k <= 0:
+            return []
+        if len(self._cell_of) < SCAN_BELOW:
+            return self._scan(lat, lng, max_m, where)[:k]
+        hits: list = []  # max-heap of (-distance, key, item)
+        row, col = self._cell(lat, lng)
+        min_row, max_row, min_col, max_col = self._extent
+        # meters every ring adds in the narrower of the two directions at this latitude
+        scale = math.cos(math.radians(lat)) / max(math.cos(math.radians(self.ref_lat)), 0.01)
+        ring_m = self.cell_m * min(1.0, scale) * RING_SLACK
+        first = max(min_row - row, row - max_row, min_col - col, col - max_col, 0)
+        last = max(row - min_row, max_row - row, col - min_col, max_col - col)
+        r = first
+        while r <= last:
+            # nothing outside rings 0..r-1 is closer than r - 1 rings
+            reach = (r - 1) * ring_m
+            if reach > max_m or (len(hits) == k and reach >= -hits[0][0]):
+                break
+            if 8 * r > len(self._cells):
+                # sparse points: measuring all of them beats walking empty rings
+                hits = []
+                self._collect(hits, k, max_m, where, *self._measure(lat, lng, None))
+                break
+            if r == 0:  # ring 1 is always needed after ring 0: measure both at once
+                cells = self._ring(row, col, 0) + self._ring(row, col, 1)
+                r = 1
+            else:
+                cells = self._ring(row, col, r)
+            r += 1
+            if cells:
+                self._collect(hits, k, max_m, where, *self._measure(lat, lng, cells))
+        return [(-neg, key, item) for neg, key, item in sorted(hits, reverse=True)]
+
+    @staticmethod
+    def _collect(hits: list, k: int, max_m: float, where, packs: list, starts: list, distances: np.ndarray):
+        """Merge measured points into the k-bounded max-heap `hits`."""
+        limit = -hits[0][0] if len(hits) == k else max_m
+        candidates = np.flatnonzero(distances <= min(limit, max_m))
+        if not len(candidates):
+            return
+        if where is None and len(candidates) > k:
+            candidates = candidates[np.argpartition(distances[candidates], k - 1)[:k]]
+        for i in candidates[np.argsort(distances[candidates], kind="stable")].tolist():
+            distance = float(distances[i])
+            if len(hits) == k and distance >= -hits[0][0]:
+                break
+            key, item = SpatialIndex._point(packs, starts, i)
+            if where is not None and not where(item if item is not None else key):
+                continue
+            if len(hits) == k:
+                heapq.heapreplace(hits, (-distance, key, item))
+            else:
+                heapq.heappush(hits, (-distance, key, item))
+
+    def within(self, lat: float, lng: float, radius_m: float,
+               where: Optional[Callable[[Any], bool]] = None) -> List[Hit]:
+        """Every point within radius_m, closest first."""
+        if not self._cell_of:
+            return []
+        if len(self._cell_of) < SCAN_BELOW:
+            return self._scan(lat, lng, radius_m, where)
+        d_lat = radius_m / METERS_PER_DEGREE
+        d_lng = d_lat / max(math.cos(math.radians(lat)), 0.01)
+        row0, col0 = self._cell(lat - d_lat, lng - d_lng)
+        row1, col1 = self._cell(lat + d_lat, lng + d_lng)
+        min_row, max_row, min_col, max_col = self._extent
+        row0, row1 = max(row0, min_row), min(row1, max_row)
+        col0, col1 = max(col0, min_col), min(col1, max_col)
+        if row0 > row1 or col0 > col1:
+            return []
+        if (row1 - row0 + 1) * (col1 - col0 + 1) > len(self._cells):
+            cells = None
+        else:
+            cells = [(r, c) for r in range(row0, row1 + 1) for c in range(col0, col1 + 1) if (r, c) in self._cells]
+        if cells == []:
+            return []
+        packs, starts, distances = self._measure(lat, lng, cells)
+        inside = np.flatnonzero(distances <= radius_m)
+        hits = []
+        for i in inside[np.argsort(distances[inside], kind="stable")].tolist():
+            key, item = self._point(packs, starts, i)
+            if where is None or where(item if item is not None else key):
+                hits.append((float(distances[i]), key, item))
+        return hits
+
+    def _cell_table(self) -> tuple:
+        """(sorted cell codes, start in _all, size, max size) of every occupied cell."""
+        if self._table is None:
+            cells = list(self._cells)  # the order _pack_all() lays the points out in
+            sizes = np.array([len(self._cells[cell]) for cell in cells])
+            starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+            codes = np.array([self._code(row, col) for row, col in cells], dtype=np.int64)
+            order = np.argsort(codes)
+            self._table = (codes[order], starts[order], sizes[order], int(sizes.max()))
+        return self._table
+
+    def _code(self, rows, cols):
+        min_row, _, min_col, max_col = self._extent
+        return (rows - min_row + 1) * (max_col - min_col + 3) + (cols - min_col + 1)
+
+    def nearest_many(self, lats, lngs, chunk: int = 4_000_000) -> Tuple[np.ndarray, list]:
+        """(distances, keys) of the closest point to every query point.
+
+        Small indexes (exits, hazards) get one distance matrix per block of
+        queries. Larger ones measure each query against the 3x3 cells around
+        it in one padded matrix; a query whose best hit is not provably the
+        closest (nothing within one ring) falls back to nearest().
+        """
+        lats, lngs = np.asarray(lats, dtype=float), np.asarray(lngs, dtype=float)
+        if not self._cell_of:
+            return np.full(len(lats), np.inf), [None] * len(lats)
+        keys, _, p_lats, p_lngs, p_cos = self._pack_all()
+        distances = np.empty(len(lats))
+        nearest = np.empty(len(lats), dtype=np.int64)
+        if len(keys) < MATRIX_BELOW:
+            p_lats, p_lngs = np.degrees(p_lats), np.degrees(p_lngs)
+            step = max(1, chunk // len(keys))
+            for start in range(0, len(lats), step):
+                matrix = haversine_matrix(lats[start:start + step], lngs[start:start + step], p_lats, p_lngs)
+                best = matrix.argmin(axis=1)
+                nearest[start:start + step] = best
+                distances[start:start + step] = matrix[np.arange(len(best)), best]
+            return distances, [keys[i] for i in nearest.tolist()]
+
+        codes, starts, sizes, widest = self._cell_table()
+        min_row, max_row, min_col, max_col = self._extent
+        rows = np.floor(lats / self._lat_deg).astype(np.int64)
+        cols = np.floor(lngs / self._lng_deg).astype(np.int64)
+        slots = np.arange(widest)
+        step = max(1, chunk // (9 * widest))
+        for start in range(0, len(lats), step):
+            end = start + step
+            row, col = rows[start:end, None], cols[start:end, None]
+            # the 3x3 block around every query, clipped to the occupied extent
+            block_rows = np.clip(row + np.repeat([-1, 0, 1], 3)[None, :], min_row - 1, max_row + 1)
+            block_cols = np.clip(col + np.tile([-1, 0, 1], 3)[None, :], min_col - 1, max_col + 1)
+            wanted = self._code(block_rows, block_cols)
+            at = np.minimum(np.searchsorted(codes, wanted), len(codes) - 1)
+            found = codes[at] == wanted
+            first = np.where(found, starts[at], 0)
+            count = np.where(found, sizes[at], 0)
+            # (queries, 9 cells x widest) candidate slots, padded past each cell's size
+            index = (first[:, :, None] + slots[None, None, :]).reshape(len(row), -1)
+            valid = (slots[None, None, :] < count[:, :, None]).reshape(len(row), -1)
+            index = np.where(valid, index, 0)
+            phi, lam = np.radians(lats[start:end, None]), np.radians(lngs[start:end, None])
+            a = (np.sin((p_lats[index] - phi) / 2) ** 2
+                 + np.cos(phi) * p_cos[index] * np.sin((p_lngs[index] - lam) / 2) ** 2)
+            matrix = np.where(valid, 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1.0))), np.inf)
+            best = matrix.argmin(axis=1)
+            nearest[start:end] = index[np.arange(len(best)), best]
+            distances[start:end] = matrix[np.arange(len(best)), best]
+        result = [keys[i] for i in nearest.tolist()]
+        # everything outside the 3x3 block is at least one ring away
+        scale = np.cos(np.radians(lats)) / max(math.cos(math.radians(self.ref_lat)), 0.01)
+        unsure = np.flatnonzero(distances > self.cell_m * np.minimum(1.0, scale) * RING_SLACK)
+        for i in unsure.tolist():
+            hits = self.nearest(float(lats[i]), float(lngs[i]))
+            distances[i], result[i] = hits[0][0], hits[0][1]
+        return distances, result
+
+    def stats(self) -> dict:
+        return {"points": len(self), "cells": len(self._cells), "cell_m": self.cell_m}
@@ -0,0 +1,134 @@
+"""
+WebSocket Subscriptions
+Clients narrow what they receive over /ws by sending:
+  {"action": "subscribe", "sensors": [...], "severities": [...],
+   "nodes": [...], "bbox": [min_lat, min_lng, max_lat, max_lng]}
+Every field is optional; an omitted field matches everything.
+{"action": "unsubscribe"} goes back to receiving everything.
+
+Filtered clients are indexed per dimension (value -> clients), so matching a
+payload is a few set lookups instead of testing every connection.
+"""
+from collections import defaultdict
+from typing import Dict, Optional, Set, Tuple
+
+# subscription field -> payload field
+DIMENSIONS = (
+    ("sensors", "sensor"),
+    ("severities", "threat_level"),
+    ("nodes", "node_id"),
+)
+
+
+class Subscription:
+    __slots__ = ("sensors", "severities", "nodes", "bbox")
+
+    def __init__(self, sensors=None, severities=None, nodes=None,
+                 bbox: Optional[Tuple[float, float, float, float]] = None):
+        self.sensors = frozenset(sensors) if sensors else None
+        self.severities = frozenset(severities) if severities else None
+        self.nodes = frozenset(str(n) for n in nodes) if nodes else None
+        self.bbox = bbox
+
+    @classmethod
+    def from_message(cls, message: dict) -> "Subscription":
+        """Build from a client "subscribe" message. Raises ValueError if malformed."""
+        fields = {}
+        for name, _ in DIMENSIONS:
+            values = message.get(name)
+            if values is not None and not isinstance(values, list):
+                raise ValueError(f"{name} must be a list")
+            fields[name] = values
+        bbox = message.get("bbox")
+        if bbox is not None:
+            if not isinstance(bbox, list) or len(bbox) != 4:
+                raise ValueError("bbox must be [min_lat, min_lng, max_lat, max_lng]")
+            bbox = tuple(float(v) for v in bbox)
+        return cls(bbox=bbox, **fields)
+
+    @property
+    def is_filtered(self) -> bool:
+        return any(getattr(self, name) is not None for name, _ in DIMENSIONS) or self.bbox is not None
+
+    def in_bbox(self, payload: dict) -> bool:
+        lat, lng = payload.get("lat"), payload.get("lng")
+        if lat is None or lng is None:
+            return False
+        min_lat, min_lng, max_lat, max_lng = self.bbox
+        return min_lat <= lat <= max_lat and min_lng <= lng <= max_lng
+
+    def to_dict(self) -> dict:
+        result = {name: sorted(getattr(self, name)) for name, _ in DIMENSIONS if getattr(self, name) is not None}
+        if self.bbox is not None:
+            result["bbox"] = list(self.bbox)
+        return result
+
+
+class SubscriptionIndex:
+    def __init__(self):
+        self.everyone: Set[object] = set()
+        self.filtered: Dict[object, Subscription] = {}
+        self._by_value = {name: defaultdict(set) for name, _ in DIMENSIONS}
+        self._unconstrained = {name: set() for name, _ in DIMENSIONS}
+
+    def add(self, client):
+        self.everyone.add(client)
+
+    def remove(self, client):
+        self.everyone.discard(client)
+        subscription = self.filtered.pop(client, None)
+        if subscription is None:
+            return
+        for name, _ in DIMENSIONS:
+            values = getattr(subscription, name)
+            if values is None:
+                self._unconstrained[name].discard(client)
+                continue
+            index = self._by_value[name]
+            for value in values:
+                index[value].discard(client)
+                if not index[value]:
+                    del index[value]
+
+    def set(self, client, subscription: Subscription):
+        self.remove(client)
+        if not subscription.is_filtered:
+            self.everyone.add(client)
+            return
+        self.filtered[client] = subscription
+        for name, _ in DIMENSIONS:
+            values = getattr(subscription, name)
+            if values is None:
+                self._unconstrained[name].add(client)
+            else:
+                for value in values:
+                    self._by_value[name][value].add(client)
+
+    def _match_filtered(self, payload: dict) -> Set[object]:
+        matched = None
+        for name, field in DIMENSIONS:
+            value = payload.get(field)
+            if name == "nodes" and value is not None:
+                value = str(value)
+            candidates = self._by_value[name].get(value)
+            unconstrained = self._unconstrained[name]
+            dimension = (candidates | unconstrained) if candidates else unconstrained
+            matched = dimension if matched is None else matched & dimension
+            if not matched:
+                return set()
+        return {c for c in matched if self.filtered[c].bbox is None or self.filtered[c].in_bbox(payload)}
+
+    def match(self, payload: dict):
+        """Clients interested in a single reading payload."""
+        if not self.filtered:
+            return self.everyone
+        return self.everyone | self._match_filtered(payload)
+
+    def match_batch(self, readings):
+        """Split a batch per client. Returns (everyone, {client: [reading indexes]})."""
+        per_client = defaultdict(list)
+        if self.filtered:
+            for i, payload in enumerate(readings):
+                for client in self._match_filtered(payload):
+                    per_client[client].append(i)
+        return self.everyone, per_client
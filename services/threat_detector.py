@@ -1,29 +1,55 @@
 """
 Threat Detection Service
-Real-time inference for hackathon demo.
-Thresholds:
+Table-driven: each sensor type has one rule (comparison, warning/critical
+thresholds, hysteresis band, alert texts) loaded from config/thresholds.json, and
+SensorThreshold rows override the thresholds for a sensor type or a single
+node. Batches are classified in NumPy one sensor type at a time.
+The detector remembers the last level of every (node, sensor) stream and only
+builds an alert when that level changes; steady readings cost a comparison.
+A stream only drops to a lower level once the value clears the threshold by
+the rule's hysteresis band, so values hovering at a threshold do not flap.
+Alerts go to the incident engine (services/incidents.py) for deduplication.
+Default thresholds:
   - Gas: > 800 ppm = warning, > 1200 = critical
   - Ultrasonic: < 50 cm = warning, < 20 = critical
   - Temperature: > 30 C = warning, > 45 = critical
   - Humidity: > 60% = warning, > 85% = critical
-  - Earthquake: > 2.0 = warning, > 5.0 = critical
+  - Earthquake: >= 2.0 = warning, >= 5.0 = critical
 """
+import itertools
+import json
+import os
 from datetime import datetime
-from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services.metrics import Counter, log
 
 SAFE = "safe"
 WARNING = "warning"
 CRITICAL = "critical"
+LEVELS = (SAFE, WARNING, CRITICAL)  # index = level code
+
+THRESHOLDS_FILE = os.getenv(
+    "THRESHOLDS_FILE", os.path.join(os.path.dirname(__file__), os.pardir, "config", "thresholds.json"))
+
+_alert_ids = itertools.count(1)  # continued after the persisted alerts by seed_alert_ids()
 
-alert_history = deque(maxlen=50)
+EVALUATIONS = Counter("aura_detector_evaluations_total", "Readings classified by the threat detector")
 
-latest_sensor_values = {}
 
+def seed_alert_ids(next_id: int):
+    """Continue alert ids after those already persisted (IncidentLog.load)."""
+    global _alert_ids
+    _alert_ids = itertools.count(next_id)
 
-def _create_alert(sensor, severity, title, message, value):
-    alert = {
-        "id": len(alert_history) + 1,
+
+def _create_alert(sensor, severity, title, message, value, node_id=None):
+    return {
+        "id": next(_alert_ids),
         "sensor": sensor,
+        "node_id": node_id,
         "severity": severity,
         "title": title,
         "message": message,
@@ -31,95 +57,166 @@ def _create_alert(sensor, severity, title, message, value):
         "timestamp": datetime.utcnow().isoformat(),
         "acknowledged": False,
     }
-    if severity != SAFE:
-        alert_history.appendleft(alert)
-    latest_sensor_values[sensor] = {"value": value, "threat_level": severity}
-    return alert
+
+
+class Rule:
+    """Thresholds for one sensor type. op ">"/">=" alerts above, "<"/"<=" below."""
+    __slots__ = ("op", "warning", "critical", "hysteresis", "messages", "sign", "inclusive")
+
+    def __init__(self, op: str, warning: float, critical: float, messages: Dict[str, list],
+                 hysteresis: float = 0.0):
+        if op not in (">", ">=", "<", "<="):
+            raise ValueError(f"Unsupported comparison: {op}")
+        self.op = op
+        self.sign = 1.0 if op.startswith(">") else -1.0
+        self.inclusive = op.endswith("=")
+        if self.sign * critical < self.sign * warning:
+            raise ValueError(f"critical ({critical}) must be beyond warning ({warning}) for '{op}'")
+        self.warning = float(warning)
+        self.critical = float(critical)
+        self.hysteresis = float(hysteresis)
+        self.messages = messages
+
+    def with_thresholds(self, warning: float, critical: float) -> "Rule":
+        return Rule(self.op, warning, critical, self.messages, self.hysteresis)
+
+    def level(self, value: float, hold: bool = False) -> int:
+        """Level code of value; hold=True moves it one hysteresis band toward alerting."""
+        signed = self.sign * value + (self.hysteresis if hold else 0.0)
+        if self.inclusive:
+            return (signed >= self.sign * self.warning) + (signed >= self.sign * self.critical)
+        return (signed > self.sign * self.warning) + (signed > self.sign * self.critical)
+
+    def to_dict(self) -> dict:
+        return {"op": self.op, "warning": self.warning, "critical": self.critical, "hysteresis": self.hysteresis}
+
+
+def load_rules(path: str = THRESHOLDS_FILE) -> Dict[str, Rule]:
+    with open(path) as f:
+        table = json.load(f)
+    return {
+        sensor_type: Rule(spec["op"], spec["warning"], spec["critical"], spec["messages"], spec.get("hysteresis", 0.0))
+        for sensor_type, spec in table.items()
+    }
 
 
 class ThreatDetector:
-    def __init__(self):
-        print("[OK] Threat Detector initialized (all 4 sensors active)")
-
-    def detect_temperature(self, temp_c):
-        if temp_c <= 30:
-            return _create_alert("temperature", SAFE,
-                "Temperature Normal",
-                f"Temperature at {temp_c:.1f} C -- safe range.", temp_c)
-        elif temp_c <= 45:
-            return _create_alert("temperature", WARNING,
-                "High Temperature",
-                f"Temperature elevated ({temp_c:.1f} C). Heat advisory.", temp_c)
-        else:
-            return _create_alert("temperature", CRITICAL,
-                "EXTREME HEAT ALERT",
-                f"Temperature critically high ({temp_c:.1f} C)! Possible fire!", temp_c)
-
-    def detect_humidity(self, humidity_pct):
-        if humidity_pct <= 60:
-            return _create_alert("humidity", SAFE,
-                "Humidity Normal",
-                f"Humidity at {humidity_pct:.1f}% -- comfortable.", humidity_pct)
-        elif humidity_pct <= 85:
-            return _create_alert("humidity", WARNING,
-                "Humidity Advisory",
-                f"Humidity elevated ({humidity_pct:.1f}%). Monitor conditions.", humidity_pct)
-        else:
-            return _create_alert("humidity", CRITICAL,
-                "HUMIDITY CRITICAL",
-                f"Humidity at {humidity_pct:.1f}% -- extreme conditions!", humidity_pct)
-
-    def detect_gas_threat(self, mq_value):
-        if mq_value <= 800:
-            return _create_alert("gas-leakage", SAFE,
-                "Air Quality Normal",
-                f"Gas level at {mq_value:.0f} ppm -- no hazard.", mq_value)
-        elif mq_value <= 1200:
-            return _create_alert("gas-leakage", WARNING,
-                "Gas Detected -- Monitor",
-                f"Elevated gas reading ({mq_value:.0f} ppm). Monitor area.", mq_value)
+    def __init__(self, rules: Optional[Dict[str, Rule]] = None):
+        self.defaults = rules or load_rules()
+        self.rules = dict(self.defaults)
+        self.node_rules: Dict[str, Dict[str, Rule]] = {}  # sensor_type -> node_id -> rule
+        self._levels: Dict[tuple, int] = {}  # (node_id, sensor_type) -> last level code
+        log.info("threat_detector_ready", rules=len(self.rules))
+
+    # ---------- Thresholds ----------
+
+    def set_threshold(self, sensor_type: str, warning: float, critical: float, node_id: Optional[str] = None):
+        """Raises KeyError for unknown sensor types, ValueError for inverted thresholds."""
+        rule = self.defaults[sensor_type].with_thresholds(warning, critical)
+        if node_id is None:
+            self.rules[sensor_type] = rule
         else:
-            return _create_alert("gas-leakage", CRITICAL,
-                "SMOKE / GAS ALERT",
-                f"Dangerous gas ({mq_value:.0f} ppm). Evacuate immediately!", mq_value)
-
-    def detect_water_level(self, distance_cm):
-        if distance_cm >= 50:
-            return _create_alert("ultrasonic", SAFE,
-                "Water Level Safe",
-                f"Water at safe distance ({distance_cm:.1f} cm).", distance_cm)
-        elif distance_cm >= 20:
-            return _create_alert("ultrasonic", WARNING,
-                "Rising Water Level",
-                f"Water level rising ({distance_cm:.1f} cm). Monitor closely.", distance_cm)
+            self.node_rules.setdefault(sensor_type, {})[node_id] = rule
+
+    def clear_threshold(self, sensor_type: str, node_id: Optional[str] = None):
+        if node_id is None:
+            self.rules[sensor_type] = self.defaults[sensor_type]
         else:
-            return _create_alert("ultrasonic", CRITICAL,
-                "FLOOD WARNING -- EVACUATE",
-                f"Critical water level ({distance_cm:.1f} cm)! Flash flood imminent!", distance_cm)
-
-    def detect_seismic(self, magnitude):
-        if magnitude < 2.0:
-            return _create_alert("seismic", SAFE,
-                "Seismic Activity Normal",
-                f"No significant seismic activity detected (Magnitude {magnitude:.1f}).", magnitude)
-        elif magnitude < 5.0:
-            return _create_alert("seismic", WARNING,
-                "Minor Seismic Activity Detected",
-                f"Minor seismic event detected (Magnitude {magnitude:.1f}). Stay alert.", magnitude)
+            self.node_rules.get(sensor_type, {}).pop(node_id, None)
+
+    def load_overrides(self, rows):
+        """Apply SensorThreshold rows on top of the config defaults."""
+        self.rules = dict(self.defaults)
+        self.node_rules = {}
+        for row in rows:
+            try:
+                self.set_threshold(row.sensor_type, row.warning, row.critical, row.node_id)
+            except (KeyError, ValueError) as e:
+                log.warning("threshold_override_ignored", row.id, override=row.id, error=e)
+
+    def rule_for(self, sensor_type: str, node_id: Optional[str] = None) -> Optional[Rule]:
+        overrides = self.node_rules.get(sensor_type)
+        if overrides and node_id in overrides:
+            return overrides[node_id]
+        return self.rules.get(sensor_type)
+
+    # ---------- Evaluation ----------
+
+    def levels(self, sensor_type: str, values, node_ids=None, hold: bool = False) -> np.ndarray:
+        """Level codes (0 safe, 1 warning, 2 critical) for an array of one sensor type's values.
+
+        hold=True evaluates every value one hysteresis band toward alerting:
+        the level a stream keeps while on its way down.
+        """
+        rule = self.rules[sensor_type]
+        signed = rule.sign * np.asarray(values, dtype=float)
+        if hold:
+            signed += rule.hysteresis
+        overrides = self.node_rules.get(sensor_type)
+        if overrides and node_ids is not None:
+            rules = [overrides.get(node_id, rule) for node_id in node_ids]
+            warning = rule.sign * np.array([r.warning for r in rules])
+            critical = rule.sign * np.array([r.critical for r in rules])
         else:
-            return _create_alert("seismic", CRITICAL,
-                "MAJOR SEISMIC ALERT",
-                f"Critical seismic event (Magnitude {magnitude:.1f})! Drop, Cover, and Hold On!", magnitude)
-
-    def analyze(self, sensor_type, value):
-        if sensor_type == "temperature":
-            return self.detect_temperature(value)
-        elif sensor_type == "humidity":
-            return self.detect_humidity(value)
-        elif sensor_type == "gas-leakage":
-            return self.detect_gas_threat(value)
-        elif sensor_type == "ultrasonic":
-            return self.detect_water_level(value)
-        elif sensor_type == "seismic":
-            return self.detect_seismic(value)
-        return None
+            warning, critical = rule.sign * rule.warning, rule.sign * rule.critical
+        compare = np.greater_equal if rule.inclusive else np.greater
+        return compare(signed, warning).astype(np.int8) + compare(signed, critical)
+
+    def _transition(self, sensor_type: str, node_id, value: float, code: int) -> Optional[dict]:
+        key = (node_id, sensor_type)
+        if self._levels.get(key, 0) == code:
+            return None
+        self._levels[key] = code
+        severity = LEVELS[code]
+        title, message = self.rule_for(sensor_type, node_id).messages[severity]
+        return _create_alert(sensor_type, severity, title, message.format(value=value), value, node_id)
+
+    def analyze(self, sensor_type: str, value: float, node_id: Optional[str] = None) -> Tuple[str, Optional[dict]]:
+        """(threat level, alert) for one reading; alert is None unless the stream changed level."""
+        EVALUATIONS.inc()
+        rule = self.rule_for(sensor_type, node_id)
+        if rule is None:
+            return SAFE, None
+        code = rule.level(value)
+        previous = self._levels.get((node_id, sensor_type), 0)
+        if code < previous:
+            code = max(code, min(previous, rule.level(value, hold=True)))
+        return LEVELS[code], self._transition(sensor_type, node_id, value, code)
+
+    def analyze_batch(self, readings) -> List[Tuple[str, Optional[dict]]]:
+        """Analyze (sensor_type, value, node_id) triples, in order, one NumPy pass per sensor type."""
+        EVALUATIONS.inc(len(readings))
+        results: List[Tuple[str, Optional[dict]]] = [(SAFE, None)] * len(readings)
+        groups: Dict[str, List[int]] = {}
+        for i, (sensor_type, _, _) in enumerate(readings):
+            groups.setdefault(sensor_type, []).append(i)
+
+        for sensor_type, indices in groups.items():
+            if sensor_type not in self.rules:
+                continue
+            values = [readings[i][1] for i in indices]
+            node_ids = [readings[i][2] for i in indices]
+            codes = self.levels(sensor_type, values, node_ids).tolist()
+            held = self.levels(sensor_type, values, node_ids, hold=True).tolist()
+            last_levels = self._levels
+            for i, node_id, value, code, held_code in zip(indices, node_ids, values, codes, held):
+                previous = last_levels.get((node_id, sensor_type), 0)
+                if code < previous:
+                    code = max(code, min(previous, held_code))
+                if previous == code:
+                    results[i] = (LEVELS[code], None)
+                else:
+                    results[i] = (LEVELS[code], self._transition(sensor_type, node_id, value, code))
+        return results
+
+    def describe(self) -> dict:
+        return {
+            sensor_type: {
+                **rule.to_dict(),
+                "nodes": {node_id: r.to_dict() for node_id, r in self.node_rules.get(sensor_type, {}).items()},
+            }
+            for sensor_type, rule in self.rules.items()
+        }
+
+
+threat_detector = ThreatDetector()
@@ -0,0 +1,267 @@
+"""
+Vision Inference Pool
+Fire/accident detection runs in separate worker processes so YOLO never
+competes with the API event loop for the GIL.
+  - capture streams (services/capture.py) overwrite a single "latest frame"
+    slot per camera, so stale frames are dropped instead of queued
+  - a dispatcher thread takes the newest frame from every camera, drops the
+    ones the motion/heat pre-filter finds uninteresting (services/prefilter.py)
+    and sends the rest to a worker as one batched YOLO call
+  - detections come back to the asyncio loop through an asyncio.Queue
+Per camera we track the frame age at detection time and the inference latency.
+
+The model is only ever loaded inside the workers, in the background after
+startup; the API serves requests while the vision subsystem warms up.
+VISION_MODEL_SIZE picks yolov8n/s/m and VISION_MODEL_FORMAT can export the
+weights once to ONNX or OpenVINO for faster CPU inference.
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from services.capture import CaptureSupervisor
+from services.metrics import SECONDS_BUCKETS, Histogram, log
+from services.prefilter import FramePrefilter
+
+VISION_WORKERS = int(os.getenv("VISION_WORKERS", "1"))
+VISION_MAX_BATCH = int(os.getenv("VISION_MAX_BATCH", "8"))
+VISION_IMGSZ = int(os.getenv("VISION_IMGSZ", "640"))
+VISION_MODEL_SIZE = os.getenv("VISION_MODEL_SIZE", "n")  # n | s | m
+VISION_MODEL_FORMAT = os.getenv("VISION_MODEL_FORMAT", "pt")  # pt | onnx | openvino
+VISION_MODEL_PATH = os.getenv("VISION_MODEL_PATH") or f"yolov8{VISION_MODEL_SIZE}.pt"
+
+EXPORT_SUFFIXES = {"onnx": ".onnx", "openvino": "_openvino_model"}
+
+# Labels treated as hazards. The stock COCO models have no fire class; vehicles stand in as an
+# accident proxy until a custom fire model is trained.
+DANGER_LABELS = {"fire", "smoke", "accident", "car crash", "car", "truck"}
+DANGER_CONFIDENCE = 0.7
+
+FRAME_AGE_SECONDS = Histogram("aura_camera_frame_age_seconds", "Capture to detection, per inferred frame",
+                              SECONDS_BUCKETS, ["camera"])
+INFERENCE_SECONDS = Histogram("aura_camera_inference_seconds", "Round trip of one batched YOLO call",
+                              SECONDS_BUCKETS)
+
+
+# ---------- Worker process side ----------
+
+_MODEL = None
+
+
+def resolve_model(model_path: str, model_format: str, imgsz: int) -> str:
+    """Weights to load for the requested format, exporting the .pt once if needed."""
+    if model_format == "pt":
+        return model_path
+    if model_format not in EXPORT_SUFFIXES:
+        raise ValueError(f"Unsupported VISION_MODEL_FORMAT: {model_format}")
+    exported = os.path.splitext(model_path)[0] + EXPORT_SUFFIXES[model_format]
+    if not os.path.exists(exported):
+        from ultralytics import YOLO
+        log.info("vision_model_export", model=model_path, format=model_format, pid=os.getpid())
+        exported = YOLO(model_path).export(format=model_format, imgsz=imgsz)
+    return exported
+
+
+def _init_worker(model_path: str, model_format: str, imgsz: int):
+    global _MODEL
+    try:
+        from ultralytics import YOLO
+        weights = resolve_model(model_path, model_format, imgsz)
+        _MODEL = YOLO(weights, task="detect")
+        log.info("vision_model_loaded", weights=weights, pid=os.getpid())
+    except ImportError:
+        log.warning("vision_model_missing", reason="ultralytics not installed", pid=os.getpid())
+    except Exception as e:
+        log.error("vision_model_failed", error=e, pid=os.getpid())
+
+
+def _warmup(imgsz: int) -> bool:
+    """First inference allocates the runtime's buffers; do it before real frames arrive."""
+    if _MODEL is None:
+        return False
+    _MODEL(np.zeros((imgsz, imgsz, 3), dtype=np.uint8), verbose=False)
+    return True
+
+
+def _infer_batch(frames) -> List[List[tuple]]:
+    """Run one YOLO call over a list of frames; returns [(label, conf), ...] per frame."""
+    if _MODEL is None:
+        return [[] for _ in frames]
+    results = _MODEL(frames, verbose=False)
+    return [
+        [(_MODEL.names[int(box.cls)], float(box.conf)) for box in r.boxes]
+        for r in results
+    ]
+
+
+def classify(detections) -> Optional[tuple]:
+    """Most confident hazard detection as (label, confidence), or None."""
+    best = None
+    for label, conf in detections:
+        if conf > DANGER_CONFIDENCE and label.lower() in DANGER_LABELS:
+            if best is None or conf > best[1]:
+                best = (label, conf)
+    return best
+
+
+# ---------- API process side ----------
+
+def _downscale(frame, size: int):
+    height, width = frame.shape[:2]
+    scale = size / max(height, width)
+    if scale >= 1:
+        return frame
+    return cv2.resize(frame, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+
+
+class CameraStats:
+    __slots__ = ("frames", "frame_age", "inference_ms")
+
+    def __init__(self):
+        self.frames = 0
+        self.frame_age = None
+        self.inference_ms = None
+
+    def to_dict(self) -> dict:
+        return {
+            "frames_inferred": self.frames,
+            "frame_age_ms": None if self.frame_age is None else round(self.frame_age * 1000, 1),
+            "inference_ms": None if self.inference_ms is None else round(self.inference_ms, 1),
+        }
+
+
+class VisionPool:
+    def __init__(self, workers: int = VISION_WORKERS, max_batch: int = VISION_MAX_BATCH,
+                 imgsz: int = VISION_IMGSZ, model_path: str = VISION_MODEL_PATH,
+                 model_format: str = VISION_MODEL_FORMAT, cameras: Optional[CaptureSupervisor] = None):
+        self.workers = workers
+        self.max_batch = max_batch
+        self.imgsz = imgsz
+        self.model_path = model_path
+        self.model_format = model_format
+        self.ready = False
+        self.model_loaded = False
+        self.warmup_seconds: Optional[float] = None
+        self.cameras = cameras or CaptureSupervisor()
+        self.stats: Dict[str, CameraStats] = {}
+        self.prefilters: Dict[str, FramePrefilter] = {}
+        self.results: Optional[asyncio.Queue] = None
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._in_flight = threading.Semaphore(workers)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._running = False
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self.results = asyncio.Queue()
+        self._executor = self._new_executor()
+        self._running = True
+        threading.Thread(target=self._warm_up, name="vision-warmup", daemon=True).start()
+        threading.Thread(target=self._dispatch, name="vision-dispatch", daemon=True).start()
+
+    def _warm_up(self):
+        started = time.time()
+        futures = [self._executor.submit(_warmup, self.imgsz) for _ in range(self.workers)]
+        try:
+            self.model_loaded = all(future.result() for future in futures)
+        except Exception as e:
+            log.error("vision_warmup_failed", error=e)
+        self.warmup_seconds = round(time.time() - started, 2)
+        self.ready = True
+        log.info("vision_ready", seconds=self.warmup_seconds, model_loaded=self.model_loaded)
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # spawn: never fork the API process (threads, event loop, sockets)
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.model_path, self.model_format, self.imgsz),
+        )
+
+    def stop(self):
+        self._running = False
+        self.cameras.stop()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _dispatch(self):
+        while self._running:
+            self._in_flight.acquire()
+            batch = []
+            while not batch and self._running:
+                for camera_id, slot in self.cameras.slots():
+                    frame, captured_at = slot.take()
+                    if frame is None:
+                        continue
+                    prefilter = self.prefilters.setdefault(camera_id, FramePrefilter())
+                    if not prefilter.should_infer(frame, captured_at):
+                        continue
+                    batch.append((camera_id, _downscale(frame, self.imgsz), captured_at))
+                    if len(batch) >= self.max_batch:
+                        break
+                if not batch:
+                    time.sleep(0.01)
+            if not batch:
+                self._in_flight.release()
+                return
+
+            started = time.time()
+            try:
+                future = self._executor.submit(_infer_batch, [frame for _, frame, _ in batch])
+            except BrokenProcessPool as e:
+                log.error("vision_pool_died", error=e)
+                self._in_flight.release()
+                self._executor = self._new_executor()
+                time.sleep(1)
+                continue
+            meta = [(camera_id, captured_at) for camera_id, _, captured_at in batch]
+            future.add_done_callback(lambda f, meta=meta, started=started: self._on_result(f, meta, started))
+
+    def _on_result(self, future, meta, started):
+        self._in_flight.release()
+        if not self._running:
+            return
+        try:
+            detections = future.result()
+        except Exception as e:
+            log.error("vision_inference_failed", error=e)
+            return
+        finished = time.time()
+        inference_ms = (finished - started) * 1000
+        INFERENCE_SECONDS.observe(finished - started)
+        for (camera_id, captured_at), frame_detections in zip(meta, detections):
+            stats = self.stats.setdefault(camera_id, CameraStats())
+            stats.frames += 1
+            stats.frame_age = finished - captured_at
+            stats.inference_ms = inference_ms
+            FRAME_AGE_SECONDS.labels(camera_id).observe(stats.frame_age)
+            result = {"camera_id": camera_id, "captured_at": captured_at, "detections": frame_detections}
+            self._loop.call_soon_threadsafe(self.results.put_nowait, result)
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready,
+            "model": self.model_path,
+            "format": self.model_format,
+            "model_loaded": self.model_loaded,
+            "warmup_seconds": self.warmup_seconds,
+        }
+
+    def report(self) -> dict:
+        report = self.cameras.health()
+        for camera_id, health in report.items():
+            health.update((self.stats.get(camera_id) or CameraStats()).to_dict())
+            health.update((self.prefilters.get(camera_id) or FramePrefilter()).to_dict())
+        return report
+
+
+vision_pool = VisionPool()
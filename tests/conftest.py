@@ -0,0 +1,184 @@
+"""
+Shared fixtures: every test gets its own throwaway WAL-mode SQLite file with
+the application's tables, never ./sqlite.db. Apps are assembled from the
+routers a test needs; main is only imported (never started, which would start
+the cameras) by tests of its ingest path, with its components swapped for
+ones on the test database.
+"""
+import os
+import sys
+from functools import partial
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from config.db import Base, enable_sqlite_wal  # noqa: E402
+import models  # noqa: E402,F401  ensure models are registered
+import models.camera  # noqa: E402,F401
+import models.incident  # noqa: E402,F401
+import models.outbox  # noqa: E402,F401
+import models.position_chain  # noqa: E402,F401
+import models.sensor_position  # noqa: E402,F401
+import models.sensor_rollup  # noqa: E402,F401
+import models.sensor_threshold  # noqa: E402,F401
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = enable_sqlite_wal(create_engine(f"sqlite:///{tmp_path / 'test.db'}",
+                                             connect_args={"check_same_thread": False}))
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def sessions(engine):
+    return sessionmaker(bind=engine, autocommit=False, autoflush=False)
+
+
+@pytest.fixture
+def get_db(sessions):
+    """Replacement for routes.sensor_positions.get_db bound to the test database."""
+    def get_db():
+        db = sessions()
+        try:
+            yield db
+        finally:
+            db.close()
+    return get_db
+
+
+@pytest.fixture
+def chain(engine):
+    from services.integrity import PositionChain
+    return PositionChain(engine=engine)
+
+
+@pytest.fixture
+def snapshot(engine):
+    from services.position_snapshot import PositionSnapshot
+    snapshot = PositionSnapshot(engine=engine)
+    snapshot.load()
+    return snapshot
+
+
+@pytest.fixture
+def positions_client(engine, get_db, chain, snapshot, monkeypatch):
+    """The /positions router on the test database, with its own chain and snapshot."""
+    import routes.sensor_positions as positions_routes
+    from services.position_import import PositionImport
+    monkeypatch.setattr(positions_routes, "position_chain", chain)
+    monkeypatch.setattr(positions_routes, "position_snapshot", snapshot)
+    monkeypatch.setattr(positions_routes, "PositionImport",
+                        partial(PositionImport, engine=engine, chain=chain, snapshot=snapshot))
+    app = FastAPI()
+    app.include_router(positions_routes.router)
+    app.dependency_overrides[positions_routes.get_db] = get_db
+    return TestClient(app)
+
+
+@pytest.fixture(scope="session")
+def main_module(tmp_path_factory):
+    """main, imported from a scratch directory: it creates ./sqlite.db's tables on import."""
+    cwd = os.getcwd()
+    scratch = tmp_path_factory.mktemp("app")
+    (scratch / "static").symlink_to(os.path.join(ROOT, "static"))  # mounted relative to the cwd
+    os.chdir(scratch)
+    try:
+        import main
+    finally:
+        os.chdir(cwd)
+    return main
+
+
+@pytest.fixture
+def app_main(main_module, engine, monkeypatch):
+    """main with fresh in-memory state and a reading writer on the test database."""
+    from services.anomaly import AnomalyDetector
+    from services.connection_manager import ConnectionManager
+    from services.delta import DeltaFilter
+    from services.incidents import IncidentEngine
+    from services.reading_writer import ReadingWriter
+    from services.sensor_store import SensorStore
+    from services.threat_detector import ThreatDetector
+    monkeypatch.setattr(main_module, "anomaly_detector", AnomalyDetector())
+    monkeypatch.setattr(main_module, "delta_filter", DeltaFilter())
+    monkeypatch.setattr(main_module, "manager", ConnectionManager())
+    monkeypatch.setattr(main_module, "incident_engine", IncidentEngine())
+    monkeypatch.setattr(main_module, "latest_readings", SensorStore())
+    monkeypatch.setattr(main_module, "reading_writer", ReadingWriter(engine=engine))
+    monkeypatch.setattr(main_module, "threat_detector", ThreatDetector())
+    return main_module
+
+
+GRID_ORIGIN = (11.670, 76.120)  # on Safe Zone Alpha, the other SAFE_EXITS lie around the grid
+GRID_SPACING = 0.002  # degrees between junctions, ~220 m
+GRID_SIZE = 5
+
+
+@pytest.fixture
+def grid_point():
+    """(lat, lng) of junction (row, col) of the road_grid fixture."""
+    def grid_point(row, col):
+        return GRID_ORIGIN[0] + row * GRID_SPACING, GRID_ORIGIN[1] + col * GRID_SPACING
+    return grid_point
+
+
+@pytest.fixture
+def road_grid(tmp_path, grid_point, monkeypatch):
+    """A loaded RoadGraph of a GRID_SIZE x GRID_SIZE street grid, one shape node per block,
+    plus a motorway and a private footpath that must not be walkable. It is the graph
+    services.evacuation routes on."""
+    import services.evacuation
+    from services.road_graph import RoadGraph
+    ids = {}
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<osm version="0.6">']
+
+    def node(lat, lng):
+        ids[(lat, lng)] = node_id = len(ids) + 1
+        lines.append(f'  <node id="{node_id}" lat="{lat:.7f}" lon="{lng:.7f}"/>')
+        return node_id
+
+    def way(refs, **tags):
+        lines.append(f'  <way id="{len(lines)}">')
+        lines.extend(f'    <nd ref="{ref}"/>' for ref in refs)
+        lines.extend(f'    <tag k="{k}" v="{v}"/>' for k, v in tags.items())
+        lines.append('  </way>')
+
+    junctions = [[node(*grid_point(r, c)) for c in range(GRID_SIZE)] for r in range(GRID_SIZE)]
+    for i in range(GRID_SIZE):
+        row, col = [junctions[i][0]], [junctions[0][i]]
+        for j in range(1, GRID_SIZE):
+            row += [node(*grid_point(i, j - 0.5)), junctions[i][j]]
+            col += [node(*grid_point(j - 0.5, i)), junctions[j][i]]
+        way(row, highway="residential")
+        way(col, highway="residential")
+    diagonal = [junctions[i][i] for i in range(GRID_SIZE)]
+    way(diagonal, highway="motorway")
+    way(diagonal[::-1], highway="footway", access="private")
+    lines.append('</osm>')
+
+    path = tmp_path / "roads.osm"
+    path.write_text("\n".join(lines))
+    graph = RoadGraph(str(path))
+    assert graph.load()
+    monkeypatch.setattr(services.evacuation, "road_graph", graph)
+    monkeypatch.setattr(services.evacuation, "_snapped_exits", {})
+    return graph
+
+
+@pytest.fixture
+def archive_store(tmp_path, monkeypatch):
+    """An empty archive under tmp_path, in place of ./archive wherever history reads it."""
+    import services.history
+    from services.archive import ArchiveStore
+    store = ArchiveStore(str(tmp_path / "archive"))
+    monkeypatch.setattr(services.history, "archive", store)
+    return store
@@ -0,0 +1,100 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import routes.alerts as alerts_routes
+from routes.sensor_positions import get_db as app_get_db
+from services.incident_log import IncidentLog
+from services.incidents import IncidentEngine
+from services.threat_detector import CRITICAL, SAFE, WARNING, _create_alert
+
+T0 = 1_700_000_000.0
+
+
+@pytest.fixture
+def incidents(engine, monkeypatch):
+    incident_engine = IncidentEngine()
+    log = IncidentLog(engine=engine, incidents=incident_engine)
+    monkeypatch.setattr(alerts_routes, "incident_log", log)
+    monkeypatch.setattr(alerts_routes, "incident_engine", incident_engine)
+    return log
+
+
+@pytest.fixture
+def client(get_db):
+    app = FastAPI()
+    app.include_router(alerts_routes.router)
+    app.dependency_overrides[app_get_db] = get_db
+    return TestClient(app)
+
+
+def _open(log, count, sensor="temperature", severity=WARNING):
+    """count incidents on distinct nodes without positions, each one version, flushed to disk."""
+    for i in range(count):
+        alert = _create_alert(sensor, severity, "High", "too hot", 40, f"node-{i}")
+        log.incidents.ingest(alert, ts=T0 + i)
+    log.flush()
+
+
+def test_pages_newest_first_with_cursor(incidents, client):
+    _open(incidents, 25)
+    first = client.get("/alerts", params={"limit": 10}).json()
+    assert [item["id"] for item in first["items"]] == list(range(25, 15, -1))
+    second = client.get("/alerts", params={"limit": 10, "cursor": first["next_cursor"]}).json()
+    assert [item["id"] for item in second["items"]] == list(range(15, 5, -1))
+    last = client.get("/alerts", params={"limit": 10, "cursor": second["next_cursor"]}).json()
+    assert [item["id"] for item in last["items"]] == list(range(5, 0, -1))
+    assert last["next_cursor"] is None
+
+
+def test_unchanged_listing_is_304(incidents, client):
+    _open(incidents, 3)
+    response = client.get("/alerts")
+    assert response.headers["etag"] == '"3"'
+    assert client.get("/alerts", headers={"If-None-Match": '"3"'}).status_code == 304
+    _open(incidents, 1)
+    assert client.get("/alerts", headers={"If-None-Match": '"3"'}).status_code == 200
+
+
+def test_truncated_since_page_continues_instead_of_304(incidents, client):
+    _open(incidents, 150)
+    first = client.get("/alerts", params={"since": 0, "limit": 100})
+    page = first.json()
+    assert len(page["items"]) == 100 and page["version"] == 100
+    assert first.headers["etag"] == '"100"'
+
+    # what a poller sends next: since=<page version> with the ETag it was given
+    second = client.get("/alerts", params={"since": page["version"], "limit": 100},
+                        headers={"If-None-Match": first.headers["etag"]})
+    assert second.status_code == 200
+    rest = second.json()
+    assert [item["version"] for item in rest["items"]] == list(range(101, 151))
+    assert rest["version"] == 150 and second.headers["etag"] == '"150"'
+
+    caught_up = client.get("/alerts", params={"since": 150, "limit": 100},
+                           headers={"If-None-Match": second.headers["etag"]})
+    assert caught_up.status_code == 304
+
+
+def test_stale_etag_with_old_since_still_gets_changes(incidents, client):
+    _open(incidents, 5)
+    page = client.get("/alerts", params={"since": 2}, headers={"If-None-Match": '"5"'}).json()
+    assert [item["version"] for item in page["items"]] == [3, 4, 5] and page["version"] == 5
+
+
+def test_since_reports_resolution_and_filters(incidents, client):
+    _open(incidents, 2)
+    incidents.incidents.ingest(_create_alert("humidity", CRITICAL, "Wet", "wet", 90, "node-h"), ts=T0 + 10)
+    incidents.incidents.ingest(_create_alert("temperature", SAFE, "ok", "ok", 20, "node-0"), ts=T0 + 20)
+    incidents.flush()
+    changed = client.get("/alerts", params={"since": 2}).json()["items"]
+    assert [(item["id"], item["status"]) for item in changed] == [(3, "open"), (1, "resolved")]
+    critical = client.get("/alerts", params={"severity": "critical"}).json()["items"]
+    assert [item["id"] for item in critical] == [3]
+    assert client.get("/alerts", params={"status": "bogus"}).status_code == 400
+
+
+def test_single_alert_and_missing(incidents, client):
+    _open(incidents, 1)
+    assert client.get("/alerts/1").json()["id"] == 1
+    assert client.get("/alerts/99").status_code == 404
@@ -0,0 +1,82 @@
+import random
+import statistics
+import time
+
+from fastapi.testclient import TestClient
+
+from services.anomaly import AnomalyDetector, StreamStats
+from services.threat_detector import SAFE, WARNING
+
+T0 = 1_700_000_000.0
+# flat for 40 readings 5 s apart, then 3.6 C/min up to 27.9 C: still below the warning threshold
+RAMP = [20 + 0.01 * i for i in range(40)] + [20.4 + 0.3 * i for i in range(1, 26)]
+
+
+def _feed(detector, sensor, values, node_id="1", step=5.0, start=T0):
+    return [detector.observe(sensor, value, node_id, start + i * step) for i, value in enumerate(values)]
+
+
+def test_window_statistics_match_recomputation():
+    rng = random.Random(3)
+    stats = StreamStats(window=20)
+    values, times = [], []
+    for i in range(137):  # several laps of the ring, each one rebasing the times
+        value, ts = rng.gauss(50, 5), T0 + i * 2.5
+        stats.add(value, ts)
+        values.append(value)
+        times.append(ts)
+
+    values, times = values[-20:], times[-20:]
+    mean_t = statistics.fmean(times)
+    slope = (sum((t - mean_t) * x for t, x in zip(times, values))
+             / sum((t - mean_t) ** 2 for t in times))
+    assert abs(stats.mean - statistics.fmean(values)) < 1e-9
+    assert abs(stats.variance() - statistics.variance(values)) < 1e-6
+    assert abs(stats.slope() - slope) < 1e-9
+
+
+def test_noise_stays_quiet():
+    rng = random.Random(5)
+    results = _feed(AnomalyDetector(), "temperature", [22 + rng.gauss(0, 0.3) for _ in range(300)])
+    assert not any(active for active, _ in results)
+
+
+def test_rising_temperature_alerts_once():
+    results = _feed(AnomalyDetector(), "temperature", RAMP)
+    alerts = [alert for _, alert in results if alert]
+    assert [alert["trend"] for alert in alerts] == ["rising"]
+    assert alerts[0]["severity"] == WARNING and alerts[0]["node_id"] == "1"
+    assert results[-1][0]  # still active, no repeat alert
+
+
+def test_falling_distance_means_water_rising():
+    values = [150.0] * 30 + [150 - 2 * i for i in range(1, 30)]  # 24 cm/min closer
+    alerts = [alert for _, alert in _feed(AnomalyDetector(), "ultrasonic", values) if alert]
+    assert "falling" in [alert["trend"] for alert in alerts]
+    assert not any(alert["trend"] == "rising" for alert in alerts)
+
+
+def test_spike_needs_warm_up_and_is_per_stream():
+    detector = AnomalyDetector(min_samples=10)
+    assert _feed(detector, "gas-leakage", [400.0] * 5 + [700.0])[-1] == (False, None)  # still warming up
+
+    detector = AnomalyDetector(min_samples=10)
+    _feed(detector, "gas-leakage", [400.0] * 20)
+    active, alert = detector.observe("gas-leakage", 700.0, "1", T0 + 200)
+    assert active and alert["trend"] == "spike"
+    assert detector.observe("gas-leakage", 700.0, "2", T0 + 200) == (False, None)
+    assert detector.observe("radiation", 1e6, "1", T0) == (False, None)  # no trend rule
+
+
+def test_trending_reading_is_a_warning_and_listed(app_main):
+    start = time.time() - len(RAMP) * 5
+    payloads = [app_main._build_payload("temperature", value, "1", SAFE, None, start + i * 5)
+                for i, value in enumerate(RAMP)]
+    assert payloads[0]["threat_level"] == SAFE
+    assert payloads[-1]["threat_level"] == WARNING
+
+    client = TestClient(app_main.app)
+    streams = client.get("/sensor/trends", params={"sensor": "temperature"}).json()
+    assert [(s["node_id"], s["active"]) for s in streams] == [("1", ["rising"])]
+    assert streams[0]["slope_per_min"] > 3
+    assert client.get("/sensor/trends", params={"node_id": "2"}).json() == []
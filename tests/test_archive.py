@@ -0,0 +1,94 @@
+import time
+
+import numpy as np
+import pytest
+from sqlalchemy import func, select
+
+from models import SensorReading
+from models.sensor_rollup import SensorRollup1d, SensorRollup1m
+from services.archive import DAY, ArchiveStore
+from services.history import query_history
+from services.reading_writer import ReadingWriter
+
+TODAY = int(time.time() // DAY * DAY)
+START = TODAY - 5 * DAY
+
+
+@pytest.fixture
+def readings(engine, archive_store):
+    """Five days and a bit of readings every 10 minutes from two nodes, ending now."""
+    writer = ReadingWriter(engine=engine, batch_size=5000, max_queue=10 ** 6)
+    ts = np.arange(START, time.time(), 600, dtype=float)
+    for node_id, offset in (("1", 0.0), ("2", 100.0)):
+        for i, t in enumerate(ts):
+            level = "warning" if i % 7 == 0 else "safe"
+            writer.submit({"sensor": "gas", "node_id": node_id, "value": offset + i % 50, "threat_level": level},
+                          float(t))
+    writer.flush()
+    return ts
+
+
+def _count(engine, model):
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(model.__table__)).scalar()
+
+
+def _history(engine, step):
+    with engine.connect() as conn:
+        return query_history(conn, "gas", START, time.time(), step=step)
+
+
+def _assert_same_series(before, after):
+    assert before.keys() == after.keys()
+    for node_id, series in before.items():
+        for name, column in series.items():
+            assert after[node_id][name] == pytest.approx(column, rel=1e-6), (node_id, name)
+
+
+def test_compaction_moves_old_days_and_history_stays_the_same(engine, readings, archive_store):
+    before = {step: _history(engine, step)["series"] for step in (600, 3600, DAY)}
+    total = _count(engine, SensorReading)
+    days_before = _count(engine, SensorRollup1d)
+
+    moved = archive_store.compact(engine, older_than_days=2)
+    assert moved == 2 * int(np.sum(readings < TODAY - 2 * DAY))
+    assert archive_store.archived_until == TODAY - 2 * DAY
+    assert _count(engine, SensorReading) == total - moved
+    assert _count(engine, SensorRollup1d) == days_before  # kept: day queries never read the archive
+    with engine.connect() as conn:
+        oldest_minute = conn.execute(select(func.min(SensorRollup1m.bucket))).scalar()
+    assert oldest_minute >= TODAY - 2 * DAY
+
+    for step, series in before.items():
+        after = _history(engine, step)
+        assert after["archive"] is (step < DAY)
+        _assert_same_series(series, after["series"])
+
+    assert archive_store.compact(engine, older_than_days=2) == 0  # nothing left to move
+
+
+def test_partition_layout(engine, readings, archive_store):
+    archive_store.compact(engine, older_than_days=2)
+    [partition] = archive_store.partitions("gas", START, START + DAY)
+    assert partition.nodes == ["1", "2"] and len(partition) == 2 * 144
+    assert partition.ts.dtype == np.uint32 and partition.value.dtype == np.float32
+    assert partition.threat_levels == ["safe", "warning"]
+    first = slice(partition.offsets[0], partition.offsets[1])
+    assert np.all(np.diff(partition.timestamps()[first]) > 0)
+
+
+def test_import_merges_and_ignores_duplicates(engine, readings, archive_store, tmp_path, capsys):
+    archive_store.compact(engine, older_than_days=2)
+    other = ArchiveStore(str(tmp_path / "other"))
+    day = START + DAY
+    other.write_partition("gas", day, ["3", "3"], [day + 60, day + 120], [7.0, 8.0], ["safe", "safe"])
+    other.write_partition("gas", day, ["3"], [day + 60], [7.0], ["safe"])  # a repeated export
+    other.write_partition("gas", START + 30 * DAY, ["3"], [START + 30 * DAY], [9.0], ["safe"])  # past the horizon
+
+    assert archive_store.import_archive(other.root, engine) == 2
+    assert archive_store.import_archive(other.root, engine) == 2  # merged again: still no duplicates
+    assert capsys.readouterr().out == ""  # reported through the event log, not stdout
+    [partition] = archive_store.partitions("gas", day, day + DAY)
+    assert partition.nodes == ["1", "2", "3"] and len(partition) == 2 * 144 + 2
+    series = _history(engine, 60)["series"]["3"]
+    assert series["count"] == [1, 1] and series["avg"] == [7.0, 8.0]
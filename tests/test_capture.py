@@ -0,0 +1,113 @@
+import time
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import routes.cameras as camera_routes
+import services.capture as capture
+from routes.sensor_positions import get_db as app_get_db
+from services.capture import CONNECTED, RECONNECTING, STOPPED, CaptureStream, CaptureSupervisor
+from services.vision import VisionPool
+
+
+class FakeCapture:
+    """A video source: `frames` good frames, then the stream breaks."""
+
+    def __init__(self, opened=True, frames=10 ** 9):
+        self.opened = opened
+        self.frames = frames
+        self.released = False
+
+    def isOpened(self):
+        return self.opened
+
+    def grab(self):
+        time.sleep(0.001)
+        self.frames -= 1
+        return self.frames >= 0
+
+    def retrieve(self):
+        return True, np.zeros((4, 4, 3), dtype=np.uint8)
+
+    def release(self):
+        self.released = True
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(capture, "CAPTURE_BACKOFF_MIN", 0.01)
+    monkeypatch.setattr(capture, "CAPTURE_BACKOFF_MAX", 0.04)
+
+
+def _wait(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.005)
+    assert condition()
+
+
+def test_stream_reconnects_with_backoff_until_frames_arrive():
+    sources = iter([FakeCapture(opened=False), FakeCapture(opened=False), FakeCapture(frames=3), FakeCapture()])
+    stream = CaptureStream("cam1", "rtsp://cam1", sampling_fps=0, source_factory=lambda url: next(sources))
+    stream.start()
+    _wait(lambda: stream.frames_sampled >= 5)
+    stream.stop()
+    stream.join(2)
+    health = stream.health()
+    assert health["reconnects"] == 3 and health["last_error"] == "failed to read frame"
+    assert health["frames_dropped"] >= 1 and stream.state == STOPPED
+    assert stream.slot.take()[0] is not None
+
+
+def test_backoff_doubles_up_to_the_cap():
+    stream = CaptureStream("cam1", "rtsp://cam1", 1, source_factory=lambda url: FakeCapture(opened=False))
+    stream.start()
+    _wait(lambda: stream.reconnects >= 4)
+    assert stream.state == RECONNECTING and stream._backoff == 0.04
+    stream.stop()
+
+
+def test_supervisor_runs_exactly_the_enabled_cameras():
+    supervisor = CaptureSupervisor(source_factory=lambda url: FakeCapture())
+
+    class Row:
+        def __init__(self, camera_id, url, fps=1.0, enabled=True):
+            self.camera_id, self.url, self.sampling_fps, self.enabled = camera_id, url, fps, enabled
+
+    supervisor.sync([Row("a", "u1"), Row("b", "u2"), Row("c", "u3", enabled=False)])
+    first_a = supervisor.streams["a"]
+    assert sorted(supervisor.streams) == ["a", "b"]
+    _wait(lambda: first_a.state == CONNECTED)
+
+    supervisor.sync([Row("a", "u1"), Row("b", "u2-moved")])
+    assert supervisor.streams["a"] is first_a and supervisor.streams["b"].url == "u2-moved"
+    supervisor.sync([])
+    assert supervisor.streams == {} and first_a._stopping.is_set()
+
+
+def test_camera_api_registers_and_removes_streams(get_db, monkeypatch):
+    pool = VisionPool(cameras=CaptureSupervisor(source_factory=lambda url: FakeCapture()))
+    monkeypatch.setattr(camera_routes, "vision_pool", pool)
+    app = FastAPI()
+    app.include_router(camera_routes.router)
+    app.dependency_overrides[app_get_db] = get_db
+    client = TestClient(app)
+
+    created = client.post("/cameras", json={"name": "gate", "url": "rtsp://gate", "sampling_fps": 2}).json()
+    assert created["camera_id"] == f"camera-{created['id']}"
+    assert created["health"]["url"] == "rtsp://gate" and created["health"]["sampling_fps"] == 2
+    disabled = client.post("/cameras", json={"name": "spare", "url": "rtsp://spare", "enabled": False}).json()
+    assert disabled["health"] is None
+    assert client.post("/cameras", json={"name": "x", "url": "y", "sampling_fps": 0}).status_code == 422
+    placed = client.post("/cameras", json={"name": "well", "url": "rtsp://well", "position_id": 7}).json()
+    assert placed["camera_id"] == "7"
+    again = client.post("/cameras", json={"name": "well 2", "url": "rtsp://well2", "position_id": 7})
+    assert again.status_code == 409 and pool.cameras.streams["7"].url == "rtsp://well"
+    assert client.delete(f"/cameras/{placed['id']}").json() == {"status": "deleted"}
+
+    assert [camera["name"] for camera in client.get("/cameras").json()] == ["gate", "spare"]
+    assert client.delete(f"/cameras/{created['id']}").json() == {"status": "deleted"}
+    assert pool.cameras.streams == {}
+    assert client.delete(f"/cameras/{created['id']}").status_code == 404
@@ -0,0 +1,101 @@
+import asyncio
+import json
+
+import pytest
+
+from services.connection_manager import COALESCE, DROP_OLDEST, ConnectionManager
+
+
+class FakeSocket:
+    """Records what the writer sends; `gate` holds sends back like a slow network."""
+
+    def __init__(self, fail=False):
+        self.sent = []
+        self.fail = fail
+        self.closed = False
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        await self.gate.wait()
+        if self.fail:
+            raise ConnectionResetError("peer gone")
+        self.sent.append(json.loads(text))
+
+    async def close(self):
+        self.closed = True
+
+
+def _reading(value, node_id="1", sensor="temperature"):
+    return {"sensor": sensor, "node_id": node_id, "value": value, "threat_level": "safe"}
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_slow_client_does_not_hold_up_the_others():
+    async def main():
+        manager = ConnectionManager(max_queue=10, policy=COALESCE)
+        fast, slow = FakeSocket(), FakeSocket()
+        slow.gate.clear()
+        await manager.connect(fast)
+        await manager.connect(slow)
+        for value in range(5):
+            await asyncio.wait_for(manager.broadcast(_reading(value)), 0.1)
+            await _settle()
+        assert [m["value"] for m in fast.sent] == [0, 1, 2, 3, 4]
+        assert slow.sent == [] and manager.queue_depths() == [0, 1]  # coalesced to the newest reading
+
+        slow.gate.set()
+        await _settle()
+        assert [m["value"] for m in slow.sent] == [0, 4]  # the one in flight, then the newest
+        manager.disconnect(fast)
+        manager.disconnect(slow)
+    asyncio.run(main())
+
+
+def test_full_queue_drops_the_oldest():
+    async def main():
+        manager = ConnectionManager(max_queue=3, policy=DROP_OLDEST)
+        socket = FakeSocket()
+        socket.gate.clear()
+        client = manager.attach(socket)
+        for value in range(6):
+            await manager.broadcast(_reading(value))
+        assert [json.loads(text)["value"] for text in client.pending.values()] == [3, 4, 5]
+        assert manager.dropped_messages() == 3
+        manager.disconnect(socket)
+    asyncio.run(main())
+
+
+def test_failing_socket_is_evicted():
+    async def main():
+        manager = ConnectionManager()
+        broken = FakeSocket(fail=True)
+        await manager.connect(broken)
+        await manager.broadcast(_reading(1))
+        await _settle()
+        assert manager.active_connections == [] and broken.closed
+    asyncio.run(main())
+
+
+def test_stalled_socket_times_out():
+    async def main():
+        manager = ConnectionManager(send_timeout=0.05)
+        stalled = FakeSocket()
+        stalled.gate.clear()
+        await manager.connect(stalled)
+        await manager.broadcast(_reading(1))
+        await asyncio.sleep(0.2)
+        assert manager.active_connections == [] and stalled.closed
+    asyncio.run(main())
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        ConnectionManager(policy="block")
@@ -0,0 +1,51 @@
+from services.delta import DeltaFilter
+
+
+def _reading(value, level="safe", node_id="1", sensor="temperature"):
+    return {"sensor": sensor, "node_id": node_id, "value": value, "threat_level": level}
+
+
+def test_unchanged_values_are_suppressed_until_the_keyframe():
+    delta = DeltaFilter(max_rate=1, keyframe_interval=30)
+    assert delta.should_send(_reading(20.0), now=0)
+    assert not delta.should_send(_reading(20.0), now=5)
+    assert delta.should_send(_reading(20.0), now=30)
+    assert delta.suppressed == 1 and delta.sent == 2
+
+
+def test_changes_are_rate_limited_and_flushed_later():
+    delta = DeltaFilter(max_rate=1, keyframe_interval=30)
+    latest = {}
+
+    def send(value, now):
+        latest[("1", "temperature")] = _reading(value)
+        return delta.should_send(latest[("1", "temperature")], now=now)
+
+    assert send(20.0, 0)
+    assert not send(21.0, 0.2) and not send(22.0, 0.4)  # held back, stream marked dirty
+    assert delta.flush_dirty(lambda node_id, sensor: latest[(node_id, sensor)], now=0.5) == [_reading(22.0)]
+    assert delta.flush_dirty(lambda node_id, sensor: latest[(node_id, sensor)], now=0.6) == []
+    assert send(23.0, 1.6)
+
+
+def test_threat_transitions_are_sent_immediately():
+    delta = DeltaFilter(max_rate=0.1)
+    assert delta.should_send(_reading(20.0), now=0)
+    assert delta.should_send(_reading(35.0, "warning"), now=0.1)
+    assert not delta.should_send(_reading(36.0, "warning"), now=0.2)
+
+
+def test_epsilon_and_disabled_mode():
+    delta = DeltaFilter(max_rate=100, epsilon=0.5)
+    assert delta.should_send(_reading(20.0), now=0)
+    assert not delta.should_send(_reading(20.4), now=1)
+    assert delta.should_send(_reading(20.6), now=2)
+    off = DeltaFilter(enabled=False)
+    assert all(off.should_send(_reading(20.0)) for _ in range(3))
+
+
+def test_streams_are_independent():
+    delta = DeltaFilter(max_rate=1)
+    assert delta.should_send(_reading(1.0, node_id="1"), now=0)
+    assert delta.should_send(_reading(1.0, node_id="2"), now=0)
+    assert delta.should_send(_reading(1.0, sensor="humidity"), now=0)
@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from services import evacuation, evacuation_planner
+from services.evacuation_planner import assign_exits, plan
+
+
+@pytest.fixture
+def users(grid_point):
+    """One user just off every junction of the road grid."""
+    return [{"id": f"u{r}{c}", "lat": grid_point(r, c)[0] + 0.0001, "lng": grid_point(r, c)[1] - 0.0001}
+            for r in range(5) for c in range(5)]
+
+
+def _cheapest_exit(graph, user, zones):
+    """(exit id, distance) by one A* per exit: least hazard-weighted walk, snaps included."""
+    node, snap = graph.nearest_node(user["lat"], user["lng"])
+    penalties = graph.penalties_for(zones)
+    options = []
+    for exit_pt in evacuation.SAFE_EXITS:
+        exit_node, exit_snap = graph.nearest_node(exit_pt["lat"], exit_pt["lng"])
+        _, edges, cost = graph.astar(node, [exit_node], penalties)
+        options.append((exit_snap + cost, exit_pt["id"], snap + graph.polyline(edges)[1] + exit_snap))
+    _, exit_id, distance = min(options)
+    return exit_id, distance
+
+
+def test_assign_exits_respects_capacity_at_least_cost():
+    cost = np.array([[1.0, 5.0], [2.0, 3.0], [1.5, 9.0], [np.inf, np.inf]])
+    assert assign_exits(cost, np.array([4, 4])).tolist() == [0, 0, 0, -1]
+    # exit 0 takes two: the user losing least by moving (row 1, +1) goes to exit 1
+    assert assign_exits(cost, np.array([2, 4])).tolist() == [0, 1, 0, -1]
+    # more people than places: capacities scale up, nobody is left out
+    assert sorted(assign_exits(cost[:3], np.array([1, 1])).tolist()) == [0, 0, 1]
+
+
+def test_assign_exits_moves_excess_past_full_exits():
+    # three exits over capacity trade users among themselves; only the far one has room
+    rng = np.random.default_rng(0)
+    cost = np.column_stack([rng.uniform(0, 1000, 25), 3000 + rng.uniform(0, 1000, 25),
+                            rng.uniform(0, 1000, 25), rng.uniform(0, 1000, 25)])
+    choice = assign_exits(cost, np.array([7, 7, 7, 7]))
+    assert np.bincount(choice, minlength=4).tolist() == [7, 4, 7, 7]
+
+
+def test_nearest_exit_plan_matches_single_routes(road_grid, grid_point, users):
+    danger = grid_point(2, 2)
+    zones = [{"lat": danger[0], "lng": danger[1], "radius_m": evacuation.HAZARD_RADIUS_M, "severity": "critical"}]
+    result = plan(users, *danger, graph=road_grid)
+    assert result["routing"] == "road_graph" and result["unreachable"] == []
+    assert sum(exit_pt["assigned"] for exit_pt in result["exits"]) == len(users)
+    for user, entry in zip(users, result["plans"]):
+        exit_id, distance = _cheapest_exit(road_grid, user, zones)
+        assert entry["id"] == user["id"] and entry["exit_id"] == exit_id
+        assert entry["distance_m"] == pytest.approx(distance, abs=1)
+
+
+def test_routes_run_from_the_user_to_the_exit(road_grid, users):
+    result = plan(users[:3], include_routes=True, graph=road_grid)
+    exits = {exit_pt["id"]: exit_pt for exit_pt in evacuation.SAFE_EXITS}
+    for user, entry in zip(users, result["plans"]):
+        exit_pt = exits[entry["exit_id"]]
+        assert entry["route"][0] == [user["lat"], user["lng"]]
+        assert entry["route"][-1] == [exit_pt["lat"], exit_pt["lng"]]
+
+
+def test_capacity_aware_plan_spreads_the_load(road_grid, users, monkeypatch):
+    monkeypatch.setattr(evacuation, "SAFE_EXITS", [{**exit_pt, "capacity": 7} for exit_pt in evacuation.SAFE_EXITS])
+    nearest = plan(users, graph=road_grid)
+    assert max(exit_pt["assigned"] for exit_pt in nearest["exits"]) > 7
+
+    result = plan(users, capacity_aware=True, graph=road_grid)
+    assert result["capacity_aware"] and result["unreachable"] == []
+    loads = [exit_pt["assigned"] for exit_pt in result["exits"]]
+    assert max(loads) <= 7 and sum(loads) == len(users)
+    assert sum(e["distance_m"] for e in result["plans"]) >= sum(e["distance_m"] for e in nearest["plans"])
+
+
+def test_worker_pool_gives_the_same_plan(road_grid, users, monkeypatch):
+    monkeypatch.setattr(evacuation_planner, "PLAN_WORKERS", 2)
+    monkeypatch.setattr(evacuation_planner, "PLAN_POOL_MIN_NODES", 0)
+    try:
+        pooled = plan(users, capacity_aware=True, graph=road_grid)
+    finally:
+        evacuation_planner.shutdown()
+    monkeypatch.setattr(evacuation_planner, "PLAN_WORKERS", 1)
+    local = plan(users, capacity_aware=True, graph=road_grid)
+    assert pooled["plans"] == local["plans"]
+
+
+def test_straight_line_plan_without_a_graph(road_grid, users, monkeypatch):
+    monkeypatch.setattr(road_grid, "ready", False)
+    result = plan(users[:4], capacity_aware=True, include_routes=True, graph=road_grid)
+    assert result["routing"] == "straight_line"
+    assert [len(entry["route"]) for entry in result["plans"]] == [2, 2, 2, 2]
+
+
+def test_plan_endpoint(app_main, road_grid, users, monkeypatch):
+    monkeypatch.setattr(evacuation_planner, "road_graph", road_grid)
+    client = TestClient(app_main.app)
+    response = client.post("/evacuation/plan", json={"users": users, "capacity_aware": True})
+    body = response.json()
+    assert body["status"] == "success" and len(body["plans"]) == len(users)
+    assert body["routing"] == "road_graph" and "route" not in body["plans"][0]
+
+    monkeypatch.setattr(evacuation_planner, "PLAN_MAX_USERS", 2)
+    assert client.post("/evacuation/plan", json={"users": users}).status_code == 413
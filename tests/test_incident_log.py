@@ -0,0 +1,55 @@
+import itertools
+
+import pytest
+
+import services.threat_detector as threat_detector
+from services.incident_log import IncidentLog
+from services.incidents import IncidentEngine
+from services.threat_detector import CRITICAL, WARNING, _create_alert
+
+T0 = 1_700_000_000.0
+
+
+@pytest.fixture(autouse=True)
+def fresh_alert_ids(monkeypatch):
+    """load() reseeds the module-wide alert counter; put it back afterwards."""
+    monkeypatch.setattr(threat_detector, "_alert_ids", itertools.count(1))
+
+
+def _restart(engine):
+    log = IncidentLog(engine=engine, incidents=IncidentEngine())
+    log.load()
+    return log
+
+
+def test_restart_continues_incident_and_alert_ids(engine, monkeypatch):
+    first = _restart(engine)
+    for i in range(3):
+        first.incidents.ingest(_create_alert("temperature", WARNING, "High", "hot", 40, f"node-{i}"), ts=T0 + i)
+    first.flush()
+    persisted = [alert["id"] for incident in first.incidents.query(limit=10) for alert in incident["alerts"]]
+
+    monkeypatch.setattr(threat_detector, "_alert_ids", itertools.count(1))  # the process restarts
+    second = _restart(engine)
+    incident, _ = second.incidents.ingest(_create_alert("humidity", CRITICAL, "Wet", "wet", 95, "node-9"),
+                                          ts=T0 + 100)
+    assert incident.id == 4
+    assert incident.alerts[0]["id"] == max(persisted) + 1
+    assert second.version == 6  # three opened, then closed by the restart
+
+
+def test_restart_closes_incidents_left_open(engine, sessions):
+    first = _restart(engine)
+    first.incidents.ingest(_create_alert("temperature", WARNING, "High", "hot", 40, "node-1"), ts=T0)
+    first.flush()
+    second = _restart(engine)
+    with sessions() as db:
+        row = second.get(db, 1)
+        assert second.changes(db, since=1) == [row]
+    assert row["status"] == "resolved" and row["version"] == 2
+
+
+def test_empty_database_starts_from_one(engine, monkeypatch):
+    monkeypatch.setattr(threat_detector, "_alert_ids", itertools.count(50))
+    _restart(engine)
+    assert _create_alert("temperature", WARNING, "High", "hot", 40)["id"] == 1
@@ -0,0 +1,128 @@
+from services.incidents import OPEN, RESOLVED, IncidentEngine
+from services.threat_detector import CRITICAL, SAFE, WARNING, ThreatDetector, _create_alert
+
+T0 = 1_700_000_000.0
+# about 100 m apart, and a point about 2 km away
+NEAR_A, NEAR_B, FAR = (14.5995, 120.9842), (14.6004, 120.9842), (14.6175, 120.9842)
+
+
+def _alert(sensor="temperature", severity=WARNING, node_id="1"):
+    return _create_alert(sensor, severity, severity, severity, 0, node_id)
+
+
+def _levels(detector, sensor, values, node_id="1"):
+    return [detector.analyze(sensor, value, node_id) for value in values]
+
+
+def test_hysteresis_holds_a_level_near_its_threshold():
+    detector = ThreatDetector()  # temperature: warning above 30, critical above 45, band 1
+    results = _levels(detector, "temperature", [31, 29.5, 30.5, 29.2, 30.8, 29.1])
+    assert [level for level, _ in results] == [WARNING] * 6
+    assert [bool(alert) for _, alert in results] == [True] + [False] * 5  # no flapping
+
+    level, alert = detector.analyze("temperature", 28.9, "1")  # below the band
+    assert level == SAFE and alert["severity"] == SAFE
+    assert detector.analyze("temperature", 30.5, "1")[0] == WARNING  # going up needs no band
+
+
+def test_hysteresis_steps_down_one_level_at_a_time():
+    detector = ThreatDetector()
+    levels = [level for level, _ in _levels(detector, "temperature", [50, 44.5, 43.9, 29.5, 28])]
+    assert levels == [CRITICAL, CRITICAL, WARNING, WARNING, SAFE]
+
+
+def test_hysteresis_below_threshold_ops():
+    detector = ThreatDetector()  # ultrasonic: warning below 50 cm, band 3
+    levels = [level for level, _ in _levels(detector, "ultrasonic", [45, 52, 47, 53.5])]
+    assert levels == [WARNING, WARNING, WARNING, SAFE]
+
+
+def test_alerts_of_one_stream_fold_into_one_incident():
+    engine = IncidentEngine()
+    incident, notify = engine.ingest(_alert(), ts=T0)
+    assert notify and incident.status == OPEN
+    again, notify = engine.ingest(_alert(), ts=T0 + 10)
+    assert again is incident and not notify and incident.suppressed == 1
+
+    raised, notify = engine.ingest(_alert(severity=CRITICAL), ts=T0 + 20)
+    assert raised is incident and notify and incident.severity == CRITICAL
+    assert engine.stats()["notified"] == 2 and engine.stats()["suppressed"] == 1
+
+
+def test_nearby_alerts_share_an_incident_distant_ones_do_not():
+    engine = IncidentEngine(radius_m=500)
+    first, _ = engine.ingest(_alert(node_id="1"), *NEAR_A, ts=T0)
+    second, notify = engine.ingest(_alert("gas-leakage", node_id="2"), *NEAR_B, ts=T0 + 5)
+    assert second is first and not notify
+    assert sorted(first.sensors) == ["gas-leakage", "temperature"] and sorted(first.node_ids) == ["1", "2"]
+
+    far, notify = engine.ingest(_alert(node_id="3"), *FAR, ts=T0 + 5)
+    assert far is not first and notify
+    assert engine.stats()["open"] == 2 and len(engine.hazards()) == 2
+
+
+def test_grouping_only_joins_recent_incidents():
+    engine = IncidentEngine(window=300)
+    first, _ = engine.ingest(_alert(node_id="1"), *NEAR_A, ts=T0)
+    later, notify = engine.ingest(_alert(node_id="2"), *NEAR_B, ts=T0 + 301)
+    assert later is not first and notify
+
+
+def test_resolves_when_every_stream_is_safe():
+    engine = IncidentEngine()
+    incident, _ = engine.ingest(_alert(node_id="1"), *NEAR_A, ts=T0)
+    engine.ingest(_alert(node_id="2"), *NEAR_B, ts=T0 + 1)
+    engine.ingest(_alert(severity=SAFE, node_id="1"), ts=T0 + 2)
+    assert incident.status == OPEN
+    engine.ingest(_alert(severity=SAFE, node_id="2"), ts=T0 + 3)
+    assert incident.status == RESOLVED and engine.hazards() == []
+    assert incident.to_dict()["resolved_at"] is not None
+
+
+def test_flapping_stream_reopens_within_the_cooldown():
+    engine = IncidentEngine(cooldown=120)
+    incident, _ = engine.ingest(_alert(), ts=T0)
+    engine.ingest(_alert(severity=SAFE), ts=T0 + 10)
+    reopened, notify = engine.ingest(_alert(), ts=T0 + 100)
+    assert reopened is incident and incident.status == OPEN and not notify
+
+    engine.ingest(_alert(severity=SAFE), ts=T0 + 110)
+    fresh, notify = engine.ingest(_alert(), ts=T0 + 110 + 121)
+    assert fresh is not incident and notify and fresh.id == incident.id + 1
+
+
+def test_transient_incidents_expire_after_the_window():
+    engine = IncidentEngine(window=300)
+    camera, _ = engine.ingest(_alert("camera", CRITICAL, "cam1"), ts=T0, transient=True)
+    held, _ = engine.ingest(_alert(node_id="9"), ts=T0)
+    engine.expire(T0 + 299)
+    assert camera.status == OPEN
+    engine.expire(T0 + 400)
+    assert camera.status == RESOLVED and camera.resolved_ts == T0 + 300
+    assert held.status == OPEN  # a threshold stream is still above its level
+
+
+def test_evicted_incidents_leave_the_spatial_index():
+    engine = IncidentEngine(retention=3)
+    for i in range(10):
+        engine.ingest(_alert(node_id=str(i)), FAR[0] + i * 0.1, FAR[1], ts=T0 + i)  # ~11 km apart, all open
+    assert len(engine.store) == len(engine.zones) == 3
+    assert sorted(incident_id for incident_id, *_ in engine.zones) == [8, 9, 10]
+    assert len(engine.hazards(T0 + 10)) == 3
+
+
+def test_hazards_leave_out_expired_incidents():
+    engine = IncidentEngine(window=300)
+    engine.ingest(_alert("camera", CRITICAL, "cam1"), *NEAR_A, ts=T0, transient=True)
+    assert engine.hazards(T0 + 299) == [{"lat": NEAR_A[0], "lng": NEAR_A[1], "severity": CRITICAL}]
+    assert engine.hazards(T0 + 300) == []  # no alert since, and nothing else to expire it
+
+
+def test_versions_and_dirty_tracking():
+    engine = IncidentEngine()
+    engine.seed(next_id=41, version=7)
+    incident, _ = engine.ingest(_alert(), ts=T0)
+    engine.ingest(_alert(), ts=T0 + 1)
+    assert incident.id == 41 and incident.version == 9
+    assert engine.take_dirty() == [incident] and engine.take_dirty() == []
+    assert [row["id"] for row in engine.query(status=OPEN)] == [41]
@@ -0,0 +1,87 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from services.threat_detector import CRITICAL, SAFE, _create_alert
+
+
+def _stored_ts(main):
+    return main.reading_writer._buffer[-1]["ts"]
+
+
+def test_node_timestamp_is_kept_when_plausible(app_main):
+    ts = time.time() - 600  # buffered on the node for ten minutes
+    payload = app_main._build_payload("temperature", 21.0, "1", SAFE, None, ts)
+    assert _stored_ts(app_main) == ts
+    assert payload["timestamp"] == app_main._iso_timestamp(ts)
+
+
+def test_missing_zero_and_far_off_timestamps_get_server_time(app_main):
+    for ts in (None, 0.0, 86400.0 * 365 * 80, time.time() - 86400 * 2, float("nan")):
+        before = time.time()
+        app_main._build_payload("temperature", 21.0, "1", SAFE, None, ts)
+        assert before <= _stored_ts(app_main) <= time.time(), ts
+
+
+def test_epoch_zero_formats_as_epoch(main_module):
+    assert main_module._iso_timestamp(0) == "1970-01-01T00:00:00Z"
+
+
+def test_future_timestamp_does_not_expire_open_incidents(app_main):
+    now = time.time()
+    # a camera detection: nothing holds it open, it resolves after a quiet window
+    app_main.incident_engine.ingest(_create_alert("camera", CRITICAL, "FIRE", "fire", 0, "cam1"), ts=now,
+                                    transient=True)
+    app_main._build_payload("temperature", 50.0, "1", CRITICAL,
+                            _create_alert("temperature", CRITICAL, "Hot", "hot", 50, "1"), now + 10 * 86400)
+    assert app_main.incident_engine.stats()["open"] == 2
+
+
+@pytest.fixture
+def broadcasts(app_main, monkeypatch):
+    sent = []
+
+    async def broadcast(message):
+        sent.append(message)
+
+    monkeypatch.setattr(app_main.manager, "broadcast", broadcast)
+    return sent
+
+
+def test_batch_coalesces_each_stream_into_one_broadcast(app_main, broadcasts):
+    client = TestClient(app_main.app)
+    now = time.time()
+    records = [{"sensor": "temperature", "node_id": "1", "value": 20.0 + i, "ts": now - 10 + i} for i in range(5)]
+    records += [{"sensor": "humidity", "node_id": "1", "value": 40.0},
+                {"sensor": "temperature", "node_id": "2", "value": 50.0}]
+    response = client.post("/sensor/batch", json=records)
+    assert response.json() == {"status": "ok", "accepted": 7, "broadcast": 3}
+
+    [message] = broadcasts
+    assert message["sensor"] == "batch"
+    latest = {(r["node_id"], r["sensor"]): r for r in message["readings"]}
+    assert latest[("1", "temperature")]["value"] == 24.0
+    assert latest[("2", "temperature")]["threat_level"] == "critical"
+    assert "alert" in latest[("2", "temperature")]
+    assert len(app_main.reading_writer._buffer) == 7  # every reading is persisted
+    assert app_main.latest_readings.get("temperature", "1")["value"] == 24.0
+
+
+def test_batch_keeps_the_transition_alert_through_coalescing(app_main, broadcasts):
+    client = TestClient(app_main.app)
+    client.post("/sensor/batch", json=[{"sensor": "temperature", "node_id": "1", "value": v} for v in (20, 35, 36)])
+    [reading] = broadcasts[0]["readings"]
+    assert reading["value"] == 36 and reading["threat_level"] == "warning"
+    assert reading["alert"]["severity"] == "warning"
+
+
+def test_batch_validation(app_main, broadcasts):
+    client = TestClient(app_main.app)
+    assert client.post("/sensor/batch", json=[{"sensor": "temperature"}]).status_code == 422
+    assert client.post("/sensor/batch", json=[]).json()["accepted"] == 0
+    unknown = client.post("/sensor/batch", json=[{"sensor": "lava-level", "value": 1.0}])
+    assert unknown.status_code == 422
+    too_many = [{"sensor": "humidity", "value": 40.0}] * (app_main.SENSOR_BATCH_MAX + 1)
+    assert client.post("/sensor/batch", json=too_many).status_code == 422
+    assert broadcasts == [] and len(app_main.reading_writer._buffer) == 0
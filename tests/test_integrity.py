@@ -0,0 +1,144 @@
+import pytest
+from sqlalchemy import insert, select, update
+
+from services import integrity
+from services.integrity import (PositionChain, batches_table, chain_table, generate_position_hash, merkle_levels,
+                                merkle_proof, position_hash, positions_table, record_many, verify_proof)
+from services.outbox import outbox_table
+
+T0 = 1_700_000_000.0
+
+
+def _provision(engine, count, register=None):
+    rows = [{"id": i, "name": f"site-{i}", "lat": 6.9 + i / 1000, "lng": 79.86, "sensor_type": "temperature"}
+            for i in range(1, count + 1)]
+    with engine.begin() as conn:
+        conn.execute(insert(positions_table), rows)
+        record_many(conn, [(row["id"], "CREATED", generate_position_hash(row, "CREATED")) for row in rows],
+                    T0, register=register)
+    return rows
+
+
+def _outbox(engine):
+    with engine.connect() as conn:
+        return conn.execute(select(outbox_table.c.path, outbox_table.c.key).order_by(outbox_table.c.id)).all()
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 8, 33])
+def test_every_leaf_proves_against_the_root(size):
+    hashes = [generate_position_hash({"id": i}, "CREATED") for i in range(size)]
+    levels = merkle_levels(hashes)
+    root = levels[-1][0].hex()
+    for index, entry_hash in enumerate(hashes):
+        proof = merkle_proof(levels, index)
+        assert len(proof) <= max(1, (size - 1).bit_length())
+        assert verify_proof(entry_hash, proof, root)
+        assert not verify_proof("ff" * 32, proof, root)
+
+
+def test_direct_hash_matches_json_hash():
+    row = {"id": 7, "name": "Gate \"B\" — north", "lat": 6.123456789, "lng": -79.5, "sensor_type": "ultrasonic"}
+    assert position_hash(7, row["name"], row["lat"], row["lng"], row["sensor_type"], "CREATED") == \
+        generate_position_hash(row, "CREATED")
+    assert position_hash(7, "x", 1, 2.0, "t", "DELETED") == \
+        generate_position_hash({"id": 7, "name": "x", "lat": 1, "lng": 2.0, "sensor_type": "t"}, "DELETED")
+
+
+def test_changes_are_anchored_as_one_root(engine):
+    _provision(engine, 5)
+    assert _outbox(engine) == []
+    chain = PositionChain(engine=engine)
+    assert chain.seal(T0) == 5
+    batch_id = chain.proof(1)["entries"][0]["batch"]["id"]
+    assert _outbox(engine) == [("/anchor", f"batch:{batch_id}:{chain.last_root}")]
+
+    with engine.begin() as conn:
+        record_many(conn, [(6, "CREATED", "ab" * 32)], T0)
+    assert PositionChain(engine=engine, anchor_path="").seal(T0) == 1
+    assert len(_outbox(engine)) == 1  # an empty path keeps roots local
+
+
+def test_register_each_queues_a_delivery_per_change(engine, monkeypatch):
+    monkeypatch.setattr(integrity, "CHAIN_REGISTER_EACH", True)
+    rows = _provision(engine, 3)
+    data_hash = generate_position_hash(rows[0], "CREATED")
+    events = _outbox(engine)
+    assert [path for path, _ in events] == ["/register"] * 3
+    assert events[0].key == f"position:1:{data_hash}"
+    with engine.begin() as conn:
+        record_many(conn, [(4, "CREATED", "cd" * 32)], T0, register=False)
+    assert len(_outbox(engine)) == 3
+
+
+def test_seal_links_and_batches(engine):
+    _provision(engine, 10)
+    chain = PositionChain(engine=engine, batch_max=4)
+    assert [chain.seal(T0) for _ in range(4)] == [4, 4, 2, 0]
+    with engine.connect() as conn:
+        batches = conn.execute(select(batches_table).order_by(batches_table.c.id)).all()
+        entries = conn.execute(select(chain_table).order_by(chain_table.c.seq)).all()
+    assert [batch.size for batch in batches] == [4, 4, 2]
+    assert entries[0].prev_hash == "0"
+    assert all(entries[i].prev_hash == entries[i - 1].entry_hash for i in range(1, len(entries)))
+    assert batches[1].chain_head == entries[7].entry_hash
+
+
+def test_proof_verifies_and_tracks_the_row(engine):
+    _provision(engine, 6)
+    chain = PositionChain(engine=engine)
+    assert chain.proof(99) is None
+    assert chain.proof(3)["entries"][0]["sealed"] is False
+    chain.seal(T0)
+    chain._trees.clear()  # rebuilt from the stored leaves
+    proof = chain.proof(3)
+    entry = proof["entries"][0]
+    assert proof["matches_chain"] and entry["verified"]
+    assert verify_proof(entry["entry_hash"], entry["proof"], entry["batch"]["root"])
+
+    with engine.begin() as conn:
+        conn.execute(update(positions_table).where(positions_table.c.id == 3).values(lat=0.0))
+    assert chain.proof(3)["matches_chain"] is False
+
+
+def test_audit_reports_tampering(engine):
+    _provision(engine, 8)
+    chain = PositionChain(engine=engine)
+    chain.seal(T0)
+    assert chain.audit(workers=1)["ok"]
+
+    with engine.begin() as conn:
+        conn.execute(update(positions_table).where(positions_table.c.id == 2).values(name="moved"))
+        conn.execute(positions_table.delete().where(positions_table.c.id == 5))
+        conn.execute(insert(positions_table).values(id=50, name="ghost", lat=1.0, lng=2.0, sensor_type="x"))
+        conn.execute(update(chain_table).where(chain_table.c.seq == 4).values(data_hash="00" * 32))
+    report = chain.audit(workers=1)
+    assert not report["ok"]
+    assert report["modified"] == [2, 4] and report["missing"] == [5] and report["unrecorded"] == [50]
+    assert report["broken_links"] == [4]
+
+
+def test_adopt_records_existing_positions_once_without_registering(engine):
+    with engine.begin() as conn:
+        conn.execute(insert(positions_table), [{"id": i, "name": f"old-{i}", "lat": 1.0, "lng": 2.0,
+                                                "sensor_type": "humidity"} for i in (1, 2)])
+    chain = PositionChain(engine=engine)
+    assert chain.adopt() == 2 and chain.adopt() == 0
+    assert _outbox(engine) == []
+    chain.seal(T0)
+    assert chain.audit(workers=1)["ok"]
+
+
+def test_api_create_and_delete_are_chained_and_registered(positions_client, chain, engine):
+    created = positions_client.post("/positions", json={"name": "gate", "lat": 6.9, "lng": 79.8,
+                                                        "sensor_type": "temperature"}).json()
+    assert positions_client.delete(f"/positions/{created['id']}").json() == {"status": "deleted"}
+    assert positions_client.delete(f"/positions/{created['id']}").status_code == 404
+    assert _outbox(engine) == []
+
+    chain.seal(T0)
+    proof = positions_client.get(f"/positions/{created['id']}/proof").json()
+    assert [entry["action"] for entry in proof["entries"]] == ["CREATED", "DELETED"]
+    assert proof["exists"] is False and proof["matches_chain"]
+    assert all(entry["verified"] for entry in proof["entries"])
+    assert proof["entries"][0]["batch"]["anchor"] == "pending"  # queued for the receiver
+    assert positions_client.get("/positions/999/proof").status_code == 404
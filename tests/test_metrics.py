@@ -0,0 +1,113 @@
+import io
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+import services.metrics as metrics
+from services.metrics import COUNTER, Counter, EventLog, Gauge, Histogram, Registry
+
+
+def test_render_prometheus_text():
+    registry = Registry()
+    counter = Counter("x_events_total", "events", ["sensor"], registry=registry)
+    counter.labels("temperature").inc()
+    counter.labels("temperature").inc(2)
+    counter.labels('gas "leak"').inc()
+    histogram = Histogram("x_seconds", "latency", buckets=(0.1, 1.0), registry=registry)
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value)
+    Gauge("x_depth", "queue", lambda: 3, registry=registry)
+    Gauge("x_dropped_total", "drops", lambda: {"a": 1, "b": None}, labels=["queue"], kind=COUNTER,
+          registry=registry)
+    Gauge("x_broken", "not up yet", lambda: 1 / 0, registry=registry)
+
+    lines = registry.render().splitlines()
+    assert "# TYPE x_events_total counter" in lines
+    assert 'x_events_total{sensor="temperature"} 3' in lines
+    assert 'x_events_total{sensor="gas \\"leak\\""} 1' in lines
+    assert 'x_seconds_bucket{le="0.1"} 1' in lines
+    assert 'x_seconds_bucket{le="1"} 2' in lines
+    assert 'x_seconds_bucket{le="+Inf"} 3' in lines
+    assert "x_seconds_sum 5.55" in lines and "x_seconds_count 3" in lines
+    assert "x_depth 3" in lines
+    assert "# TYPE x_dropped_total counter" in lines and 'x_dropped_total{queue="a"} 1' in lines
+    assert not any(line.startswith("x_dropped_total{queue=\"b\"}") or line.startswith("x_broken ") for line in lines)
+
+
+def test_duplicate_names_and_wrong_labels_are_rejected():
+    registry = Registry()
+    counter = Counter("y_total", "y", ["a"], registry=registry)
+    with pytest.raises(ValueError):
+        Counter("y_total", "again", registry=registry)
+    with pytest.raises(ValueError):
+        counter.labels("one", "two")
+
+
+def test_threads_never_lose_increments():
+    counter = Counter("z_total", "z", registry=None)
+    workers = [threading.Thread(target=lambda: [counter.inc() for _ in range(20000)]) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert counter.value() == 80000
+
+
+def test_log_is_logfmt_and_rate_limited(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(metrics.time, "time", lambda: now[0])
+    stream = io.StringIO()
+    log = EventLog(name="test-metrics", level="INFO", rate_limit=2, interval=10, stream=stream)
+    suppressed = metrics.LOG_SUPPRESSED.value("camera_reconnect")
+
+    for _ in range(5):
+        log.warning("camera_reconnect", "cam1", error="connection refused", retry_in=2.0)
+    log.warning("camera_reconnect", "cam2", error="timeout")  # its own window
+    log.debug("reading", value=1)  # below the level
+    now[0] += 10
+    log.warning("camera_reconnect", "cam1", error="connection refused")
+
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 4
+    assert lines[0].startswith("ts=1970-01-01T00:16:40.000Z level=warning event=camera_reconnect ")
+    assert lines[0].endswith('error="connection refused" retry_in=2')
+    assert "suppressed=3" in lines[3] and "suppressed" not in lines[2]
+    assert metrics.LOG_SUPPRESSED.value("camera_reconnect") - suppressed == 3
+
+
+def test_quiet_log_windows_are_dropped(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(metrics.time, "time", lambda: now[0])
+    log = EventLog(name="test-metrics", level="INFO", rate_limit=1, interval=10, stream=io.StringIO())
+    for node in range(100):
+        log.warning("node_clock_skew", str(node))
+    assert len(log._windows) == 100
+    now[0] += 15
+    log.warning("node_clock_skew", "0")
+    assert len(log._windows) == 100  # expired, but could still have a suppressed count to report
+    now[0] += 10
+    log.warning("node_clock_skew", "new")
+    assert list(log._windows) == [("node_clock_skew", "0"), ("node_clock_skew", "new")]
+
+
+def test_metrics_endpoint(app_main):
+    def sample(text, name):
+        values = [float(line.rsplit(" ", 1)[1]) for line in text.splitlines() if line.startswith(name + " ")]
+        return values[0] if values else 0.0
+
+    client = TestClient(app_main.app)
+    before = client.get("/metrics").text
+    assert client.post("/sensor/temperature", json={"value": 21.5, "node_id": "1"}).status_code == 200
+    client.post("/sensor/batch", json=[{"sensor": "humidity", "node_id": "1", "value": v} for v in (40, 41)])
+
+    response = client.get("/metrics")
+    assert response.status_code == 200 and response.headers["content-type"] == metrics.CONTENT_TYPE
+    text = response.text
+    assert "# HELP aura_readings_total Readings ingested" in text.splitlines()
+    assert "# TYPE aura_ingest_seconds histogram" in text.splitlines()
+    readings = 'aura_readings_total{sensor="%s"}'
+    assert sample(text, readings % "temperature") == sample(before, readings % "temperature") + 1
+    assert sample(text, readings % "humidity") == sample(before, readings % "humidity") + 2
+    assert sample(text, 'aura_ingest_seconds_count{sensor="temperature"}') >= 1
+    assert sample(text, "aura_ingest_batch_seconds_count") >= 1
@@ -0,0 +1,156 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+from sqlalchemy import select
+
+from services.outbox import DEAD, DELIVERED, PENDING, Outbox, enqueue, enqueue_many, outbox_table, position_event
+
+BASE_URL = "http://chain.test"
+
+
+def _rows(engine):
+    with engine.connect() as conn:
+        return conn.execute(select(outbox_table).order_by(outbox_table.c.id)).all()
+
+
+def _queue(engine, count=1, now=None):
+    with engine.begin() as conn:
+        enqueue_many(conn, [position_event(i, f"hash{i}") for i in range(1, count + 1)], now)
+
+
+def _deliver(box, handler, rounds=1):
+    async def main():
+        async with box.client(transport=httpx.MockTransport(handler)) as client:
+            return [await box.deliver_due(client) for _ in range(rounds)]
+    return asyncio.run(main())
+
+
+def test_delivers_with_idempotency_key(engine):
+    _queue(engine, 2)
+    seen = []
+
+    def handler(request):
+        seen.append((request.url.path, request.headers["idempotency-key"], json.loads(request.content)))
+        return httpx.Response(200)
+
+    box = Outbox(engine=engine, base_url=BASE_URL)
+    assert _deliver(box, handler, rounds=2) == [2, 0]
+    assert sorted(seen) == [("/register", "position:1:hash1", {"sensor_id": 1, "data_hash": "hash1"}),
+                            ("/register", "position:2:hash2", {"sensor_id": 2, "data_hash": "hash2"})]
+    assert [(row.status, row.attempts) for row in _rows(engine)] == [(DELIVERED, 1)] * 2
+    assert box.stats()["delivered"] == 2 and box.stats()["backlog"] == 0
+
+
+@pytest.mark.parametrize("status, outcome", [
+    (201, DELIVERED), (409, DELIVERED),  # 409: the receiver already has it
+    (500, PENDING), (503, PENDING), (408, PENDING), (425, PENDING), (429, PENDING),
+    (400, DEAD), (404, DEAD), (422, DEAD),
+])
+def test_response_classification(engine, status, outcome):
+    _queue(engine)
+    box = Outbox(engine=engine, base_url=BASE_URL)
+    _deliver(box, lambda request: httpx.Response(status))
+    row = _rows(engine)[0]
+    assert row.status == outcome and row.attempts == 1
+    if outcome != DELIVERED:
+        assert row.last_error == f"HTTP {status} from /register"
+        assert (box.dead, box.retried) == ((1, 0) if outcome == DEAD else (0, 1))
+
+
+def test_connection_errors_are_retried(engine):
+    _queue(engine)
+
+    def handler(request):
+        raise httpx.ConnectError("connection refused", request=request)
+
+    _deliver(Outbox(engine=engine, base_url=BASE_URL), handler)
+    row = _rows(engine)[0]
+    assert row.status == PENDING and row.last_error.startswith("ConnectError")
+
+
+def test_backoff_doubles_up_to_the_cap(engine):
+    box = Outbox(engine=engine, base_url=BASE_URL, backoff_base=2, backoff_max=60)
+    _queue(engine)
+    now = time.time()
+    for attempts in range(8):
+        event = box.claim(now + 10_000)[0]
+        assert event.attempts == attempts
+        box.record([event], [("HTTP 503", True)], now)
+        delay = _rows(engine)[0].next_attempt_at - now
+        limit = min(60, 2 * 2 ** attempts)
+        assert limit / 2 <= delay <= limit
+    assert box.claim(now) == []  # not due yet
+
+
+def test_failed_events_are_posted_again_until_acknowledged(engine):
+    _queue(engine)
+    responses = iter([httpx.Response(503), httpx.Response(429), httpx.Response(200)])
+    keys = []
+
+    def handler(request):
+        keys.append(request.headers["idempotency-key"])
+        return next(responses)
+
+    box = Outbox(engine=engine, base_url=BASE_URL, backoff_base=0)
+    assert _deliver(box, handler, rounds=4) == [1, 1, 1, 0]
+    assert keys == ["position:1:hash1"] * 3
+    row = _rows(engine)[0]
+    assert row.status == DELIVERED and row.attempts == 3 and row.last_error is None
+
+
+def test_known_keys_are_queued_once(engine):
+    with engine.begin() as conn:
+        enqueue(conn, *position_event(1, "hash1"))
+        enqueue(conn, *position_event(1, "hash1"))
+        enqueue(conn, *position_event(1, "hash2"))
+    assert [row.key for row in _rows(engine)] == ["position:1:hash1", "position:1:hash2"]
+
+
+def test_claims_oldest_due_first_in_batches(engine):
+    now = time.time()
+    _queue(engine, 5, now)
+    with engine.begin() as conn:
+        enqueue(conn, "/register", {}, "later", now + 3600)
+    box = Outbox(engine=engine, base_url=BASE_URL, batch_size=3)
+    assert [event.key for event in box.claim(now)] == [f"position:{i}:hash{i}" for i in (1, 2, 3)]
+    assert box.backlog == 6
+    assert _deliver(box, lambda request: httpx.Response(200), rounds=3) == [3, 2, 0]
+
+
+def test_prune_keeps_recent_and_undelivered(engine):
+    now = time.time()
+    _queue(engine, 3, now)
+    box = Outbox(engine=engine, base_url=BASE_URL, retention=3600, batch_size=2)
+    _deliver(box, lambda request: httpx.Response(200))
+    assert box.prune(now + 60) == 0
+    assert box.prune(now + 7200) == 2
+    assert [row.status for row in _rows(engine)] == [PENDING]
+
+
+def test_worker_delivers_on_notify(engine, monkeypatch):
+    box = Outbox(engine=engine, base_url=BASE_URL, poll_interval=30)
+    posted = []
+
+    def handler(request):
+        posted.append(request.headers["idempotency-key"])
+        return httpx.Response(200)
+
+    monkeypatch.setattr(box, "client", lambda: httpx.AsyncClient(base_url=BASE_URL,
+                                                                transport=httpx.MockTransport(handler)))
+
+    async def main():
+        task = asyncio.create_task(box.run())
+        await asyncio.sleep(0.2)  # first round finds nothing and waits out the poll interval
+        _queue(engine, 1)
+        box.notify()
+        for _ in range(100):
+            if posted:
+                break
+            await asyncio.sleep(0.02)
+        task.cancel()
+
+    asyncio.run(main())
+    assert posted == ["position:1:hash1"]
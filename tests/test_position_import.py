@@ -0,0 +1,128 @@
+import asyncio
+import json
+
+import pytest
+from sqlalchemy import select
+
+from services import integrity
+from services.outbox import outbox_table
+from services.position_import import PositionImport, import_lines, stream_lines, validate
+
+ROWS = [
+    {"name": "Gate", "lat": 6.9271, "lng": 79.8612, "sensor_type": "temperature"},
+    {"name": "Well", "lat": "6.93", "lng": 79.87, "sensor_type": "ultra-sonic"},
+    {"name": "Hill", "lat": -6.5, "lng": -179.5, "sensor_type": "earthquake"},
+]
+
+
+def _jsonl(records):
+    return "\n".join(r if isinstance(r, str) else json.dumps(r) for r in records) + "\n"
+
+
+def _deliveries(engine):
+    with engine.connect() as conn:
+        return conn.execute(select(outbox_table.c.path).order_by(outbox_table.c.id)).scalars().all()
+
+
+@pytest.mark.parametrize("record, error", [
+    ({**ROWS[0], "name": " "}, "name must be a non-empty string"),
+    ({**ROWS[0], "sensor_type": None}, "sensor_type must be a non-empty string"),
+    ({**ROWS[0], "lat": 90.5}, "lat must be within [-90, 90]"),
+    ({**ROWS[0], "lng": float("nan")}, "lng must be within [-180, 180]"),
+    ({**ROWS[0], "lat": "north"}, "lat must be a number"),
+    ({**ROWS[0], "lat": True}, "lat must be a number"),
+    ({k: v for k, v in ROWS[0].items() if k != "lng"}, "lng must be a number"),
+    ([1, 2], "expected an object"),
+])
+def test_validate_names_the_problem(record, error):
+    with pytest.raises(ValueError, match=error.replace("[", r"\[")):
+        validate(record)
+
+
+def test_jsonl_import_reports_rejected_lines(positions_client, engine, chain):
+    body = _jsonl([ROWS[0], "{not json", {**ROWS[1], "lat": 91}, "", ROWS[1], ["x"], ROWS[2]])
+    report = positions_client.post("/positions/import", content=body,
+                                   headers={"Content-Type": "application/x-ndjson"}).json()
+    assert (report["format"], report["valid"], report["imported"], report["rejected"]) == ("jsonl", 3, 3, 3)
+    assert [error["line"] for error in report["errors"]] == [2, 3, 6]
+    assert report["errors"][0]["error"].startswith("invalid JSON")
+    assert report["errors"][1]["error"] == "lat must be within [-90, 90]"
+    assert (report["first_id"], report["last_id"]) == (1, 3)
+
+    listed = positions_client.get("/positions")
+    assert [p["name"] for p in listed.json()] == ["Gate", "Well", "Hill"]
+    assert listed.json()[1]["lat"] == 6.93 and listed.headers["etag"] == '"3"'
+    audit = chain.audit(workers=1)
+    assert audit["ok"] and audit["entries"] == 3 and audit["unsealed"] == 0
+    assert _deliveries(engine) == ["/anchor"]  # one root for the import, not a /register per row
+
+
+def test_csv_import_by_content_type(positions_client):
+    body = ("Name,LAT,lng,sensor_type,notes\r\n"
+            '"Gate, north",6.9,79.8,temperature,ok\r\n'
+            "Well,6.91,79.81,humidity\r\n"  # a column short
+            "\r\n"
+            "Hill,6.92,200,humidity,\r\n")
+    report = positions_client.post("/positions/import", content=body, headers={"Content-Type": "text/csv"}).json()
+    assert report["format"] == "csv" and report["imported"] == 1
+    assert report["errors"] == [{"line": 3, "error": "expected 5 columns, got 4"},
+                                {"line": 5, "error": "lng must be within [-180, 180]"}]
+    assert positions_client.get("/positions").json()[0]["name"] == "Gate, north"
+
+
+def test_csv_without_the_required_header_is_refused(positions_client):
+    response = positions_client.post("/positions/import", params={"format": "csv"},
+                                     content="name,lat,longitude\nGate,1,2\n")
+    assert response.status_code == 400
+    assert response.json()["detail"]["error"] == "CSV header is missing lng, sensor_type"
+    assert positions_client.get("/positions").json() == []
+
+
+def test_invalid_utf8_is_refused(positions_client):
+    response = positions_client.post("/positions/import", content=_jsonl(ROWS[:1]).encode() + b"\xff\xfe\n")
+    assert response.status_code == 400 and "utf-8" in response.json()["detail"]["error"]
+    assert positions_client.get("/positions").json() == []
+
+
+def test_dry_run_writes_nothing(positions_client, engine):
+    report = positions_client.post("/positions/import", params={"dry_run": True}, content=_jsonl(ROWS)).json()
+    assert report["dry_run"] and report["valid"] == 3 and report["imported"] == 0
+    assert positions_client.get("/positions").json() == [] and _deliveries(engine) == []
+
+
+def test_batches_commit_on_their_own(engine, chain, snapshot):
+    job = PositionImport(engine=engine, batch_size=4, chain=chain, snapshot=snapshot, max_errors=2)
+    lines = _jsonl([{**ROWS[0], "name": f"site-{i}"} for i in range(10)] + ["bad"] * 5).splitlines()
+    import_lines(job, lines)
+    job.sync()
+    report = job.report()
+    assert report["batches"] == 3 and report["imported"] == 10
+    assert report["rejected"] == 5 and len(report["errors"]) == 2  # every bad row counted, two reported
+    assert snapshot.version == 10 and chain.audit(workers=1)["ok"]
+
+
+def test_register_each_does_not_apply_to_imports(engine, chain, snapshot, monkeypatch):
+    monkeypatch.setattr(integrity, "CHAIN_REGISTER_EACH", True)
+    job = PositionImport(engine=engine, batch_size=2, chain=chain, snapshot=snapshot)
+    import_lines(job, _jsonl(ROWS).splitlines())
+    job.sync()
+    assert job.report()["batches"] == 2 and _deliveries(engine) == ["/anchor"]
+
+
+def test_stream_lines_reassembles_split_chunks():
+    text = "﻿namé,1\nsecond line\nno newline at the end"
+    data = text.encode("utf-8")
+    chunks = [data[i:i + 3] for i in range(0, len(data), 3)]  # splits lines and the é
+
+    async def collect():
+        async def body():
+            for chunk in chunks:
+                yield chunk
+        return [line for lines in [batch async for batch in stream_lines(body())] for line in lines]
+
+    assert asyncio.run(collect()) == ["namé,1", "second line", "no newline at the end"]
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        PositionImport("xml")
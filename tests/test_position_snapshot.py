@@ -0,0 +1,103 @@
+import json
+
+from sqlalchemy import delete, insert
+
+from services.integrity import generate_position_hash, positions_table, record_many
+from services.position_snapshot import PositionSnapshot
+
+SITE = {"lat": 6.9271, "lng": 79.8612, "sensor_type": "temperature"}
+
+
+def _create(client, name):
+    return client.post("/positions", json={"name": name, **SITE}).json()["id"]
+
+
+def _write(engine, created=(), deleted=()):
+    """Another process's change: rows and chain entries committed without the API."""
+    with engine.begin() as conn:
+        rows = [{"id": i, "name": f"site-{i}", **SITE} for i in created]
+        if rows:
+            conn.execute(insert(positions_table), rows)
+        for i in deleted:
+            conn.execute(delete(positions_table).where(positions_table.c.id == i))
+        record_many(conn, [(row["id"], "CREATED", generate_position_hash(row, "CREATED")) for row in rows]
+                    + [(i, "DELETED", "00" * 32) for i in deleted])
+
+
+def test_listing_is_versioned_and_conditional(positions_client):
+    ids = [_create(positions_client, name) for name in ("Gate", "Well", "Hill")]
+    response = positions_client.get("/positions")
+    assert [p["id"] for p in response.json()] == ids
+    assert response.headers["etag"] == '"3"' and response.headers["x-positions-version"] == "3"
+    assert response.json()[0] == {"id": ids[0], "name": "Gate", **SITE}
+
+    cached = positions_client.get("/positions", headers={"If-None-Match": '"3"'})
+    assert cached.status_code == 304 and cached.content == b""
+
+    positions_client.delete(f"/positions/{ids[1]}")
+    changed = positions_client.get("/positions", headers={"If-None-Match": '"3"'})
+    assert changed.status_code == 200 and changed.headers["etag"] == '"4"'
+    assert [p["id"] for p in changed.json()] == [ids[0], ids[2]]
+
+
+def test_since_version_returns_the_changes(positions_client):
+    first = _create(positions_client, "Gate")
+    _create(positions_client, "Well")
+    version = int(positions_client.get("/positions").headers["etag"].strip('"'))
+    third = _create(positions_client, "Hill")
+    positions_client.delete(f"/positions/{first}")
+
+    delta = positions_client.get("/positions", params={"since_version": version}).json()
+    assert delta["version"] == version + 2 and not delta["full"]
+    assert [p["id"] for p in delta["upserts"]] == [third] and delta["deleted"] == [first]
+
+    caught_up = positions_client.get("/positions", params={"since_version": version + 2},
+                                     headers={"If-None-Match": f'"{version + 2}"'})
+    assert caught_up.status_code == 304
+    empty = positions_client.get("/positions", params={"since_version": version + 2}).json()
+    assert empty["upserts"] == [] and empty["deleted"] == []
+
+
+def test_created_then_deleted_is_only_a_deletion(positions_client):
+    _create(positions_client, "Gate")
+    gone = _create(positions_client, "Well")
+    positions_client.delete(f"/positions/{gone}")
+    delta = positions_client.get("/positions", params={"since_version": 1}).json()
+    assert delta["upserts"] == [] and delta["deleted"] == [gone]
+
+
+def test_versions_older_than_the_changelog_get_everything(engine):
+    snapshot = PositionSnapshot(engine=engine, changelog=2)
+    snapshot.load()
+    _write(engine, created=[1, 2, 3, 4])
+    snapshot.refresh()
+    version, body = snapshot.delta(1)
+    delta = json.loads(body)
+    assert version == 4 and delta["full"] and [p["id"] for p in delta["upserts"]] == [1, 2, 3, 4]
+    assert json.loads(snapshot.delta(2)[1])["full"] is False
+    assert json.loads(snapshot.delta(99)[1])["full"]  # ahead of the server: a reset, not an empty delta
+
+
+def test_refresh_picks_up_other_writers_and_tells_listeners(engine):
+    snapshot = PositionSnapshot(engine=engine)
+    snapshot.load()
+    changes = []
+    snapshot.listeners.append(lambda created, deleted: changes.append(([row.id for row in created], deleted)))
+
+    _write(engine, created=[5, 6])
+    assert snapshot.refresh() == 2 and snapshot.refresh() == 0
+    _write(engine, created=[2], deleted=[5])  # an id below the newest one
+    snapshot.refresh()
+    assert changes == [([5, 6], []), ([2], [5])]
+    assert [p["id"] for p in json.loads(snapshot.listing()[1])] == [2, 6]
+
+
+def test_restart_serves_the_same_bytes(engine):
+    _write(engine, created=[1, 2, 3])
+    _write(engine, deleted=[2])
+    live = PositionSnapshot(engine=engine)
+    live.refresh()
+    restarted = PositionSnapshot(engine=engine)
+    restarted.load()
+    assert restarted.version == live.version == 4
+    assert restarted.listing() == live.listing()
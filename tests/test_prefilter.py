@@ -0,0 +1,45 @@
+import numpy as np
+
+from services.prefilter import FramePrefilter
+
+
+def _scene(seed=0):
+    """A dull grey-green scene with some texture."""
+    rng = np.random.default_rng(seed)
+    frame = np.full((240, 320, 3), (90, 110, 100), dtype=np.uint8)
+    frame[::8, :, :] = rng.integers(60, 140, size=(30, 320, 1), dtype=np.uint8)
+    return frame
+
+
+def test_static_scene_is_skipped_until_the_keyframe():
+    prefilter = FramePrefilter(keyframe_interval=10)
+    frame = _scene()
+    assert prefilter.should_infer(frame, now=0)  # nothing to compare with yet
+    assert not prefilter.should_infer(frame.copy(), now=1)
+    assert not prefilter.should_infer(frame.copy(), now=5)
+    assert prefilter.should_infer(frame.copy(), now=10)
+    assert prefilter.to_dict() == {"frames_prefiltered_out": 2, "frames_passed": 2}
+
+
+def test_motion_passes():
+    prefilter = FramePrefilter()
+    frame = _scene()
+    prefilter.should_infer(frame, now=0)
+    moved = frame.copy()
+    moved[60:180, 80:240] = 250  # something large walks in
+    assert prefilter.should_infer(moved, now=1)
+    assert prefilter.last_scores["motion"] > 0.2
+
+
+def test_flame_colours_pass_without_motion():
+    prefilter = FramePrefilter(motion=1.1, change=2.0)  # only the fire score can trigger
+    frame = _scene()
+    frame[200:240, 0:40] = (0, 140, 255)  # bright orange (BGR), ~2% of the frame
+    prefilter.should_infer(frame, now=0)
+    assert prefilter.should_infer(frame.copy(), now=1)
+    assert prefilter.last_scores["fire"] > 0.01
+
+
+def test_disabled_passes_everything():
+    prefilter = FramePrefilter(enabled=False)
+    assert all(prefilter.should_infer(_scene(), now=i) for i in range(3))
@@ -0,0 +1,92 @@
+import asyncio
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import OperationalError
+
+from models import SensorReading
+from services.reading_writer import ReadingWriter
+
+T0 = 1_700_000_000.0
+
+
+def _payload(i, node_id="1", sensor="temperature"):
+    return {"sensor": sensor, "node_id": node_id, "value": float(i), "threat_level": "safe"}
+
+
+def _stored(engine):
+    with engine.connect() as conn:
+        return conn.execute(select(SensorReading.value).order_by(SensorReading.id)).scalars().all()
+
+
+def test_flush_writes_buffered_readings(engine):
+    writer = ReadingWriter(engine=engine, batch_size=3)
+    for i in range(7):
+        writer.submit(_payload(i), T0 + i)
+    writer.flush()
+    assert _stored(engine) == [float(i) for i in range(7)]
+    assert writer.stats()["written"] == 7 and writer.stats()["flushes"] == 3
+
+
+def test_full_buffer_drops_oldest(engine):
+    writer = ReadingWriter(engine=engine, max_queue=3)
+    for i in range(5):
+        writer.submit(_payload(i), T0 + i)
+    writer.flush()
+    assert _stored(engine) == [2.0, 3.0, 4.0]
+    assert writer.dropped == 2
+
+
+def _run_until(writer, done, timeout=5.0):
+    async def main():
+        task = asyncio.create_task(writer.run())
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while not done() and loop.time() < deadline:
+            await asyncio.sleep(0.01)
+        task.cancel()
+    asyncio.run(main())
+
+
+def test_failed_batch_is_requeued_and_retried(engine, monkeypatch):
+    writer = ReadingWriter(engine=engine, batch_size=4, flush_interval=0.01)
+    write_batch = writer.write_batch
+    calls = []
+
+    def flaky(rows):
+        calls.append(len(rows))
+        if len(calls) == 1:
+            raise OperationalError("INSERT", {}, Exception("database is locked"))
+        write_batch(rows)
+
+    monkeypatch.setattr(writer, "write_batch", flaky)
+    for i in range(6):
+        writer.submit(_payload(i), T0 + i)
+    _run_until(writer, lambda: writer.written == 6)
+
+    assert _stored(engine) == [float(i) for i in range(6)]  # nothing lost, still in order
+    assert writer.failed_flushes == 1 and writer.dropped == 0
+    assert writer.stats()["failed_flushes"] == 1
+
+
+def test_requeue_respects_capacity(engine):
+    writer = ReadingWriter(engine=engine, max_queue=5, batch_size=4)
+    for i in range(4):
+        writer.submit(_payload(i), T0 + i)
+    rows = writer._take_batch()
+    for i in range(4, 7):  # newer readings arrive while the failed batch was out
+        writer.submit(_payload(i), T0 + i)
+    writer._requeue(rows)
+    writer.flush()
+    assert _stored(engine) == [2.0, 3.0, 4.0, 5.0, 6.0]
+    assert writer.dropped == 2
+
+
+def test_rollups_follow_the_readings(engine):
+    from models.sensor_rollup import ROLLUPS
+    writer = ReadingWriter(engine=engine)
+    for i in range(3):
+        writer.submit(_payload(10 + i), T0 + i)
+    writer.flush()
+    with engine.connect() as conn:
+        for model in ROLLUPS:
+            assert conn.execute(select(func.count()).select_from(model.__table__)).scalar() >= 1
@@ -0,0 +1,102 @@
+import math
+
+import pytest
+
+from services import evacuation
+from services.road_graph import RoadGraph
+from services.spatial import haversine
+
+
+def _node(graph, grid_point, row, col):
+    node, distance = graph.nearest_node(*grid_point(row, col))
+    assert distance < 1
+    return node
+
+
+def _blocks(grid_point, *cells):
+    return sum(haversine(*grid_point(*a), *grid_point(*b)) for a, b in zip(cells, cells[1:]))
+
+
+def test_compiles_junctions_and_collapses_shape_nodes(road_grid):
+    assert road_grid.node_count == 25  # motorway and private path add no junctions
+    assert road_grid.segment_count == 40  # 2 x 5 streets of 4 blocks
+    assert len(road_grid.shape_lat) == 40 * 3
+    assert road_grid.stats()["ready"] and road_grid.stats()["junctions"] == 25
+
+
+def test_shortest_route_follows_the_street(road_grid, grid_point):
+    source, target = _node(road_grid, grid_point, 0, 0), _node(road_grid, grid_point, 0, 4)
+    found, edges, cost = road_grid.astar(source, [target])
+    assert found == target and len(edges) == 4
+    polyline, length = road_grid.polyline(edges)
+    assert len(polyline) == 9  # every shape node, shared junctions once
+    assert polyline[0] == pytest.approx(list(grid_point(0, 0))) and polyline[-1] == pytest.approx(list(grid_point(0, 4)))
+    assert length == pytest.approx(cost) == pytest.approx(_blocks(grid_point, (0, 0), (0, 4)), rel=1e-3)
+
+
+def test_no_diagonal_shortcut(road_grid, grid_point):
+    source, target = _node(road_grid, grid_point, 0, 0), _node(road_grid, grid_point, 4, 4)
+    _, _, cost = road_grid.astar(source, [target])
+    assert cost == pytest.approx(_blocks(grid_point, (0, 0), (0, 4), (4, 4)), rel=1e-3)
+
+
+def test_hazard_zone_is_routed_around(road_grid, grid_point):
+    lat, lng = grid_point(0, 2)
+    penalties = road_grid.penalties_for([{"lat": lat, "lng": lng, "radius_m": 50, "severity": "critical"}])
+    assert len(penalties) == 3 * 2  # the three segments at that junction, both ways
+    source, target = _node(road_grid, grid_point, 0, 0), _node(road_grid, grid_point, 0, 4)
+    _, edges, cost = road_grid.astar(source, [target], penalties)
+    polyline, length = road_grid.polyline(edges)
+    assert not any(math.isclose(p[0], lat) and math.isclose(p[1], lng) for p in polyline)
+    assert length == pytest.approx(cost)
+    assert length == pytest.approx(_blocks(grid_point, (0, 0), (0, 1), (1, 1), (1, 3), (0, 3), (0, 4)), rel=1e-3)
+
+
+def test_shortest_tree_agrees_with_astar(road_grid, grid_point):
+    exits = [_node(road_grid, grid_point, 0, 0), _node(road_grid, grid_point, 4, 3)]
+    lat, lng = grid_point(2, 2)
+    penalties = road_grid.penalties_for([{"lat": lat, "lng": lng, "radius_m": 300, "severity": "warning"}])
+    cost, length, parent, root = road_grid.shortest_tree({node: 0.0 for node in exits}, penalties)
+    for node in range(road_grid.node_count):
+        target, edges, expected = road_grid.astar(node, exits, penalties)
+        assert cost[node] == pytest.approx(expected)
+        assert root[node] in exits
+        path = road_grid.tree_path(parent, node)
+        assert road_grid.polyline(path)[1] == pytest.approx(length[node])
+        if path:
+            assert road_grid.indices[path[-1]] == root[node]
+
+
+def test_compiled_cache_is_reused_until_the_extract_changes(road_grid, monkeypatch):
+    calls = []
+    build = RoadGraph.build
+    monkeypatch.setattr(RoadGraph, "build", lambda self: calls.append(1) or build(self))
+
+    reloaded = RoadGraph(road_grid.path)
+    assert reloaded.load() and calls == []
+    assert reloaded.node_count == road_grid.node_count
+
+    with open(road_grid.path, "a") as f:
+        f.write("\n")
+    assert RoadGraph(road_grid.path).load() and calls == [1]
+
+
+def test_missing_extract_is_reported(tmp_path):
+    graph = RoadGraph(str(tmp_path / "missing.osm"))
+    assert not graph.load()
+    assert graph.stats() == {"ready": False, "error": f"no road graph at {graph.path}"}
+
+
+def test_evacuation_route_on_the_graph(road_grid, grid_point):
+    user = grid_point(1, 3)
+    route = evacuation.get_evacuation_route(*grid_point(4, 4), *user)
+    assert route["routing"] == "road_graph"
+    assert route["safe_exit"]["id"] == 1  # Safe Zone Alpha sits on junction (0, 0)
+    assert route["safe_route"][0] == list(user) and route["safe_route"][-1] == [11.67, 76.12]
+    assert route["safe_exit"]["distance_m"] == round(_blocks(grid_point, (1, 3), (1, 0), (0, 0)))
+
+
+def test_straight_line_without_a_graph(road_grid, grid_point, monkeypatch):
+    monkeypatch.setattr(road_grid, "ready", False)
+    route = evacuation.get_evacuation_route(*grid_point(4, 4), *grid_point(1, 3))
+    assert route["routing"] == "straight_line" and len(route["safe_route"]) == 3
@@ -0,0 +1,125 @@
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from services import evacuation
+from services.route_cache import RouteCache
+from services.spatial import haversine
+
+T0 = 1_700_000_000.0
+
+
+@pytest.fixture
+def cache(road_grid):
+    return RouteCache(graph=road_grid)
+
+
+@pytest.fixture
+def danger(grid_point):
+    return grid_point(4, 4)
+
+
+@pytest.fixture
+def user(cache, grid_point):
+    """A cell center next to junction (1, 3)."""
+    return cache._center(cache._cell(*grid_point(1, 3)))
+
+
+def test_same_neighbourhood_shares_one_search(cache, danger, user):
+    first = cache.route(*danger, *user, now=T0)
+    neighbour = (user[0] + 0.0001, user[1] + 0.0001)
+    second = cache.route(*danger, *neighbour, now=T0 + 1)
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 1, "invalidated": 0, "precomputed": 0}
+
+    assert first["routing"] == second["routing"] == "road_graph"
+    assert second["safe_route"][0] == list(neighbour) and second["safe_route"][1:] == first["safe_route"][1:]
+    assert second["user_location"] == {"lat": neighbour[0], "lng": neighbour[1]}
+    junction = first["safe_route"][1]
+    offset = haversine(*neighbour, *junction) - haversine(*user, *junction)
+    assert second["safe_exit"]["distance_m"] == pytest.approx(first["safe_exit"]["distance_m"] + offset, abs=1)
+
+    direct = evacuation.get_evacuation_route(*danger, *neighbour)
+    assert second["safe_exit"]["id"] == direct["safe_exit"]["id"]
+    assert second["safe_exit"]["distance_m"] == pytest.approx(direct["safe_exit"]["distance_m"], abs=1)
+
+
+def test_entries_expire_and_are_evicted(road_grid, danger, grid_point):
+    cache = RouteCache(graph=road_grid, size=2, ttl=60)
+    cells = [grid_point(1, 3), grid_point(2, 2), grid_point(3, 1)]
+    for point in cells:
+        cache.route(*danger, *point, now=T0)
+    assert cache.stats()["entries"] == 2  # least recently used dropped
+
+    cache.route(*danger, *cells[2], now=T0 + 30)
+    assert cache.hits == 1
+    cache.route(*danger, *cells[2], now=T0 + 61)
+    assert cache.hits == 1 and cache.misses == 4
+
+
+def test_new_hazard_drops_only_routes_through_it(cache, danger, user, grid_point):
+    route = cache.route(*danger, *user, now=T0)
+    cache.route(*danger, *grid_point(4, 0), now=T0)
+    on_path = route["safe_route"][2]
+    hazard = {"lat": on_path[0], "lng": on_path[1], "severity": "warning"}
+
+    cache.route(*danger, *user, hazards=[hazard], now=T0 + 1)
+    assert cache.invalidated == 1 and cache.misses == 3
+    cache.route(*danger, *grid_point(4, 0), hazards=[hazard], now=T0 + 1)
+    assert cache.hits == 1  # that route never came near the hazard
+
+    cache.route(*danger, *user, hazards=[hazard], now=T0 + 2)
+    assert cache.hits == 2  # a hazard already planned around invalidates nothing
+    cache.route(*danger, *user, hazards=[{**hazard, "severity": "critical"}], now=T0 + 3)
+    assert cache.invalidated == 2  # a raised severity is a new hazard
+
+
+def test_concurrent_misses_wait_for_one_search(cache, danger, user, monkeypatch):
+    calls = []
+    plan = evacuation.get_evacuation_route
+
+    def slow(*args):
+        calls.append(args)
+        time.sleep(0.2)
+        return plan(*args)
+
+    monkeypatch.setattr(evacuation, "get_evacuation_route", slow)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.route(*danger, *user, now=T0)))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1 and len(results) == 5
+    assert all(result["safe_route"] == results[0]["safe_route"] for result in results)
+
+
+def test_precompute_warms_the_cells_around_a_danger(road_grid, danger, grid_point):
+    cache = RouteCache(graph=road_grid, precompute_radius_m=300)
+    searched = cache.precompute(*danger, now=T0)
+    assert searched == cache.stats()["entries"] > 20
+    assert cache.precompute(*danger, now=T0 + 1) == 0  # already warming within the TTL
+
+    near = (danger[0] - 0.001, danger[1] - 0.001)
+    cache.route(*danger, *near, now=T0 + 2)
+    assert cache.hits == 1
+
+
+def test_straight_line_routes_are_not_cached(cache, danger, user, road_grid, monkeypatch):
+    monkeypatch.setattr(road_grid, "ready", False)
+    assert cache.route(*danger, *user, now=T0)["routing"] == "straight_line"
+    assert cache.precompute(*danger, now=T0) == 0
+    assert cache.stats()["entries"] == 0
+
+
+def test_route_endpoint_uses_the_cache(app_main, road_grid, danger, user, monkeypatch):
+    cache = RouteCache(graph=road_grid)
+    monkeypatch.setattr(app_main, "route_cache", cache)
+    client = TestClient(app_main.app)
+    params = {"danger_lat": danger[0], "danger_lng": danger[1], "user_lat": user[0], "user_lng": user[1]}
+    first = client.get("/evacuation/route", params=params).json()
+    second = client.get("/evacuation/route", params=params).json()
+    assert first == second and first["routing"] == "road_graph"
+    assert cache.stats()["hits"] == 1
@@ -0,0 +1,64 @@
+from types import SimpleNamespace
+
+from services.sensor_store import DEFAULT_NODE, SensorStore
+
+
+def _position(position_id, sensor_type="temperature", lat=6.9, lng=79.86):
+    return SimpleNamespace(id=position_id, name=f"site-{position_id}", lat=lat, lng=lng, sensor_type=sensor_type)
+
+
+def _reading(node_id, value, sensor="temperature"):
+    return {"sensor": sensor, "node_id": node_id, "value": value, "threat_level": "safe"}
+
+
+def test_latest_value_per_node_and_bbox():
+    store = SensorStore()
+    store.load_positions([_position(1, lat=6.90), _position(2, lat=7.50)])
+    for value in (20.0, 21.0):
+        store.update(_reading("1", value))
+    store.update(_reading("2", 30.0))
+    store.update(_reading("loose", 25.0))  # no position: never inside a bbox
+
+    assert store.get("temperature", "1")["value"] == 21.0
+    assert len(store) == 3
+    assert [p["node_id"] for p in store.snapshot("temperature", (6.8, 79.0, 7.0, 80.0))] == ["1"]
+    assert store.snapshot("humidity") == []
+
+
+def test_snapshot_accepts_dashboard_sensor_names():
+    store = SensorStore()
+    store.load_positions([_position(1, "ultra-sonic")])
+    store.update(_reading("1", 42.0, sensor="ultrasonic"))
+    assert [p["value"] for p in store.snapshot("ultra-sonic")] == [42.0]
+    assert store.resolve_node("ultrasonic") == "1"
+
+
+def test_removed_position_drops_its_readings():
+    store = SensorStore()
+    store.load_positions([_position(i, lat=6.9 + i / 100) for i in (1, 2, 3)])
+    for i in (1, 2, 3):
+        store.update(_reading(str(i), float(i)))
+    store.update(_reading("1", 1.0, sensor="humidity"))
+
+    store.remove_position(1)  # the last row moves into its slot
+    assert store.get("temperature", "1") is None and store.get("humidity", "1") is None
+    assert sorted(p["node_id"] for p in store.snapshot()) == ["2", "3"]
+    assert [p["node_id"] for p in store.snapshot("temperature", (6.925, 79.0, 6.935, 80.0))] == ["3"]
+    store.update(_reading("3", 33.0))
+    assert store.get("temperature", "3")["value"] == 33.0 and store.get("temperature", "2")["value"] == 2.0
+    assert store.resolve_node("temperature") == "2"
+
+    store.remove_position(2)
+    store.remove_position(3)
+    store.remove_position(99)
+    assert store.snapshot() == [] and store.resolve_node("temperature") == DEFAULT_NODE
+
+
+def test_position_changes_follow_the_snapshot():
+    store = SensorStore()
+    store.load_positions([_position(1)])
+    store.update(_reading("1", 20.0))
+    store.apply_position_changes([_position(2, lat=7.0)], [1])
+    assert store.position("1") is None and store.position("2")["lat"] == 7.0
+    assert store.snapshot() == []
+    assert [hit["node_id"] for hit in store.nearby(7.0, 79.86, k=5)] == ["2"]
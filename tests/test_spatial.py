@@ -0,0 +1,102 @@
+import math
+import random
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import routes.sensor_positions as positions_routes
+from services.sensor_store import SensorStore
+from services.spatial import haversine, haversine_matrix, SpatialIndex
+
+CENTER = (14.5995, 120.9842)
+
+
+def _points(count, spread=0.05, seed=1):
+    rng = random.Random(seed)
+    return [(i, CENTER[0] + rng.uniform(-spread, spread), CENTER[1] + rng.uniform(-spread, spread))
+            for i in range(count)]
+
+
+def _index(points, cell_m=250.0):
+    index = SpatialIndex(cell_m=cell_m)
+    index.insert_many([key for key, _, _ in points], [lat for _, lat, _ in points], [lng for _, _, lng in points])
+    return index
+
+
+def _brute(points, lat, lng, radius=math.inf, where=None):
+    hits = [(haversine(lat, lng, p_lat, p_lng), key) for key, p_lat, p_lng in points
+            if where is None or where(key)]
+    return sorted(hit for hit in hits if hit[0] <= radius)
+
+
+@pytest.mark.parametrize("count", [10, 500, 5000])  # scanned point by point, then walked ring by ring
+def test_nearest_and_within_match_brute_force(count):
+    points = _points(count)
+    index = _index(points)
+    rng = random.Random(2)
+    for _ in range(25):
+        lat, lng = CENTER[0] + rng.uniform(-0.07, 0.07), CENTER[1] + rng.uniform(-0.07, 0.07)
+        expected = _brute(points, lat, lng)
+        hits = index.nearest(lat, lng, k=5)
+        assert [key for _, key, _ in hits] == [key for _, key in expected[:5]]
+        assert [d for d, _, _ in hits] == pytest.approx([d for d, _ in expected[:5]])
+
+        within = index.within(lat, lng, 800)
+        assert [key for _, key, _ in within] == [key for _, key in _brute(points, lat, lng, 800)]
+
+        even = index.nearest(lat, lng, k=3, max_m=2000, where=lambda key: key % 2 == 0)
+        assert [key for _, key, _ in even] == [key for _, key in _brute(points, lat, lng, 2000, lambda k: k % 2 == 0)[:3]]
+
+
+def test_insert_moves_and_remove_forgets():
+    index = _index(_points(100))
+    far = (CENTER[0] + 1, CENTER[1] + 1)
+    index.insert(7, *far, item={"name": "moved"})
+    assert len(index) == 100 and index.get(7) == (far[0], far[1], {"name": "moved"})
+    distance, key, item = index.nearest(*far)[0]
+    assert key == 7 and distance == pytest.approx(0) and item == {"name": "moved"}
+
+    assert index.remove(7) and not index.remove(7)
+    assert 7 not in index and index.nearest(*far)[0][1] != 7
+    index.clear()
+    assert index.nearest(*CENTER) == [] and index.within(*CENTER, 1000) == []
+
+
+@pytest.mark.parametrize("count", [300, 3000])  # one distance matrix, or 3x3 cell blocks
+def test_nearest_many_matches_nearest(count):
+    points = _points(count)
+    index = _index(points)
+    queries = _points(400, spread=0.08, seed=3)
+    lats, lngs = [lat for _, lat, _ in queries], [lng for _, _, lng in queries]
+    distances, keys = index.nearest_many(lats, lngs)
+    for (_, lat, lng), distance, key in zip(queries, distances.tolist(), keys):
+        best, best_key, _ = index.nearest(lat, lng)[0]
+        assert distance == pytest.approx(best) and key == best_key
+
+
+def test_haversine_matrix_matches_haversine():
+    a, b = _points(4, seed=4), _points(3, seed=5)
+    matrix = haversine_matrix([p[1] for p in a], [p[2] for p in a], [p[1] for p in b], [p[2] for p in b])
+    expected = np.array([[haversine(p[1], p[2], q[1], q[2]) for q in b] for p in a])
+    assert matrix == pytest.approx(expected)
+
+
+def test_nearby_positions_endpoint(positions_client, monkeypatch):
+    store = SensorStore()
+    store.add_positions([
+        SimpleNamespace(id=1, name="Gate", lat=CENTER[0], lng=CENTER[1], sensor_type="temperature"),
+        SimpleNamespace(id=2, name="Well", lat=CENTER[0] + 0.001, lng=CENTER[1], sensor_type="ultra-sonic"),
+        SimpleNamespace(id=3, name="Hill", lat=CENTER[0] + 0.05, lng=CENTER[1], sensor_type="temperature"),
+    ])
+    monkeypatch.setattr(positions_routes, "latest_readings", store)
+
+    hits = positions_client.get("/positions/nearby", params={"lat": CENTER[0], "lng": CENTER[1]}).json()
+    assert [hit["node_id"] for hit in hits] == ["1", "2", "3"]
+    assert hits[1]["distance_m"] == pytest.approx(111.2, abs=0.5) and hits[1]["sensor_type"] == "ultrasonic"
+
+    params = {"lat": CENTER[0], "lng": CENTER[1], "radius_m": 1000, "sensor_type": "temperature"}
+    assert [hit["name"] for hit in positions_client.get("/positions/nearby", params=params).json()] == ["Gate"]
+    params = {"lat": CENTER[0], "lng": CENTER[1], "sensor_type": "ultra-sonic", "k": 1}
+    assert [hit["name"] for hit in positions_client.get("/positions/nearby", params=params).json()] == ["Well"]
+    assert positions_client.get("/positions/nearby", params={"lat": 91, "lng": 0}).status_code == 422
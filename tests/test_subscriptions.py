@@ -0,0 +1,101 @@
+import asyncio
+import json
+
+import pytest
+
+from services.connection_manager import ConnectionManager
+from services.subscriptions import Subscription, SubscriptionIndex
+
+
+def _reading(sensor="temperature", node_id="1", level="safe", lat=None, lng=None):
+    payload = {"sensor": sensor, "node_id": node_id, "value": 1.0, "threat_level": level}
+    if lat is not None:
+        payload.update(lat=lat, lng=lng)
+    return payload
+
+
+def test_subscription_from_message():
+    subscription = Subscription.from_message({"action": "subscribe", "sensors": ["gas"], "nodes": [7],
+                                              "bbox": [6, 79, 7, "80"]})
+    assert subscription.to_dict() == {"sensors": ["gas"], "nodes": ["7"], "bbox": [6.0, 79.0, 7.0, 80.0]}
+    assert not Subscription.from_message({"action": "subscribe"}).is_filtered
+    with pytest.raises(ValueError):
+        Subscription.from_message({"sensors": "gas"})
+    with pytest.raises(ValueError):
+        Subscription.from_message({"bbox": [1, 2, 3]})
+
+
+def test_index_matches_every_dimension():
+    index = SubscriptionIndex()
+    everyone, gas, critical_node, area = object(), object(), object(), object()
+    for client in (everyone, gas, critical_node, area):
+        index.add(client)
+    index.set(gas, Subscription(sensors=["gas"]))
+    index.set(critical_node, Subscription(severities=["critical"], nodes=[2]))
+    index.set(area, Subscription(bbox=(6.0, 79.0, 7.0, 80.0)))
+
+    assert index.match(_reading("gas")) == {everyone, gas}
+    assert index.match(_reading("temperature", node_id="2", level="critical")) == {everyone, critical_node}
+    assert index.match(_reading("temperature", node_id="2", level="warning")) == {everyone}
+    assert index.match(_reading(lat=6.5, lng=79.5)) == {everyone, area}
+    assert index.match(_reading(lat=8.0, lng=79.5)) == {everyone}
+
+    index.set(gas, Subscription())  # unsubscribe: back to everything
+    index.remove(critical_node)
+    assert index.match(_reading("humidity", node_id="2", level="critical")) == {everyone, gas}
+
+
+def test_batch_is_split_per_filtered_client():
+    index = SubscriptionIndex()
+    gas, humidity = object(), object()
+    for client in (gas, humidity):
+        index.add(client)
+    index.set(gas, Subscription(sensors=["gas"]))
+    index.set(humidity, Subscription(sensors=["humidity"]))
+    everyone, per_client = index.match_batch([_reading("gas"), _reading("humidity"), _reading("gas", "2")])
+    assert everyone == set() and dict(per_client) == {gas: [0, 2], humidity: [1]}
+
+
+class FakeSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+
+def test_clients_only_receive_what_they_subscribed_to():
+    async def main():
+        manager = ConnectionManager()
+        gas, everything = FakeSocket(), FakeSocket()
+        await manager.connect(gas)
+        await manager.connect(everything)
+        manager.subscribe(gas, Subscription(sensors=["gas"]))
+        await manager.broadcast(_reading("temperature"))
+        await manager.broadcast({"sensor": "batch", "readings": [_reading("gas"), _reading("humidity")]})
+        await asyncio.sleep(0.01)
+        assert gas.sent == [{"sensor": "batch", "readings": [_reading("gas")]}]
+        assert [message["sensor"] for message in everything.sent] == ["temperature", "batch"]
+        assert len(everything.sent[1]["readings"]) == 2
+        for socket in (gas, everything):
+            manager.disconnect(socket)
+    asyncio.run(main())
+
+
+def test_subscribe_messages_over_the_socket(app_main):
+    async def main():
+        socket = FakeSocket()
+        await app_main.manager.connect(socket)
+        app_main.handle_client_message(socket, json.dumps({"action": "subscribe", "sensors": ["gas"]}))
+        app_main.handle_client_message(socket, json.dumps({"action": "subscribe", "bbox": "everywhere"}))
+        app_main.handle_client_message(socket, "ping")
+        app_main.handle_client_message(socket, json.dumps({"action": "unsubscribe"}))
+        await asyncio.sleep(0.01)
+        assert socket.sent[0] == {"type": "subscription", "filters": {"sensors": ["gas"]}}
+        assert socket.sent[1]["type"] == "error"
+        assert socket.sent[2] == {"type": "subscription", "filters": {}}
+        app_main.manager.disconnect(socket)
+    asyncio.run(main())
@@ -0,0 +1,127 @@
+import random
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import routes.thresholds as threshold_routes
+from routes.sensor_positions import get_db as app_get_db
+from services.threat_detector import CRITICAL, SAFE, WARNING, Rule, ThreatDetector
+
+MESSAGES = {level: [level, "{value}"] for level in (SAFE, WARNING, CRITICAL)}
+
+
+@pytest.mark.parametrize("sensor, value, level", [
+    ("temperature", 30, SAFE),      # ">" is exclusive
+    ("temperature", 30.5, WARNING),
+    ("temperature", 46, CRITICAL),
+    ("seismic", 2.0, WARNING),      # ">=" is inclusive
+    ("seismic", 5.0, CRITICAL),
+    ("ultrasonic", 60, SAFE),       # "<" alerts below
+    ("ultrasonic", 40, WARNING),
+    ("ultrasonic", 10, CRITICAL),
+])
+def test_config_table_levels(sensor, value, level):
+    assert ThreatDetector().analyze(sensor, value, "1")[0] == level
+
+
+def test_alert_only_when_the_level_changes():
+    detector = ThreatDetector()
+    level, alert = detector.analyze("temperature", 50, "1")
+    assert level == CRITICAL and alert["severity"] == CRITICAL and alert["node_id"] == "1"
+    assert "50" in alert["message"]
+    assert detector.analyze("temperature", 55, "1") == (CRITICAL, None)
+    assert detector.analyze("temperature", 50, "2")[1] is not None  # streams are per node
+    assert detector.analyze("unknown", 1e9, "1") == (SAFE, None)
+
+
+def test_rule_rejects_inverted_thresholds_and_bad_ops():
+    with pytest.raises(ValueError):
+        Rule(">", 50, 40, MESSAGES)
+    with pytest.raises(ValueError):
+        Rule("<", 20, 50, MESSAGES)
+    with pytest.raises(ValueError):
+        Rule("==", 1, 2, MESSAGES)
+
+
+def test_node_override_and_clear():
+    detector = ThreatDetector()
+    detector.set_threshold("temperature", 20, 25, node_id="greenhouse")
+    assert detector.analyze("temperature", 22, "greenhouse")[0] == WARNING
+    assert detector.analyze("temperature", 22, "kitchen")[0] == SAFE
+    assert detector.describe()["temperature"]["nodes"]["greenhouse"]["warning"] == 20
+
+    detector.clear_threshold("temperature", node_id="greenhouse")
+    assert detector.rule_for("temperature", "greenhouse") is detector.rules["temperature"]
+    with pytest.raises(KeyError):
+        detector.set_threshold("radiation", 1, 2)
+    with pytest.raises(ValueError):
+        detector.set_threshold("temperature", 40, 30)
+
+
+def test_invalid_override_rows_are_skipped():
+    detector = ThreatDetector()
+    detector.load_overrides([
+        SimpleNamespace(id=1, sensor_type="radiation", node_id=None, warning=1, critical=2),
+        SimpleNamespace(id=2, sensor_type="humidity", node_id=None, warning=90, critical=80),
+        SimpleNamespace(id=3, sensor_type="humidity", node_id=None, warning=40, critical=50),
+    ])
+    assert detector.rules["humidity"].warning == 40
+    assert "radiation" not in detector.rules
+
+
+def test_levels_vectorized_with_overrides():
+    detector = ThreatDetector()
+    detector.set_threshold("gas-leakage", 100, 200, node_id="b")
+    codes = detector.levels("gas-leakage", [150, 150, 900, 1300], ["a", "b", "a", "a"])
+    assert codes.tolist() == [0, 1, 1, 2]
+
+
+def test_batch_matches_sequential_analyze():
+    rng = random.Random(7)
+    sensors = {"temperature": (0, 60), "humidity": (30, 100), "ultrasonic": (0, 80), "seismic": (0, 7)}
+    readings = []
+    for _ in range(2000):
+        sensor = rng.choice(list(sensors))
+        readings.append((sensor, rng.uniform(*sensors[sensor]), rng.choice(["1", "2", "3"])))
+
+    sequential, batched = ThreatDetector(), ThreatDetector()
+    for detector in (sequential, batched):
+        detector.set_threshold("temperature", 10, 20, node_id="2")
+    expected = [sequential.analyze(*reading) for reading in readings]
+    actual = batched.analyze_batch(readings)
+
+    assert [level for level, _ in actual] == [level for level, _ in expected]
+    assert [bool(alert) for _, alert in actual] == [bool(alert) for _, alert in expected]
+    assert [a["severity"] for _, a in actual if a] == [a["severity"] for _, a in expected if a]
+
+
+@pytest.fixture
+def client(get_db, monkeypatch):
+    monkeypatch.setattr(threshold_routes, "threat_detector", ThreatDetector())
+    app = FastAPI()
+    app.include_router(threshold_routes.router)
+    app.dependency_overrides[app_get_db] = get_db
+    return TestClient(app)
+
+
+def test_thresholds_api(client):
+    row = client.put("/thresholds", json={"sensor_type": "temperature", "node_id": "7",
+                                          "warning": 25, "critical": 35}).json()
+    assert row["sensor_type"] == "temperature" and row["node_id"] == "7"
+    alias = client.put("/thresholds", json={"sensor_type": "earthquake", "warning": 3, "critical": 6}).json()
+    assert alias["sensor_type"] == "seismic"  # dashboard names map to the rule's type
+    assert client.get("/thresholds").json()["temperature"]["nodes"]["7"]["critical"] == 35
+    assert threshold_routes.threat_detector.analyze("temperature", 28, "7")[0] == WARNING
+
+    again = client.put("/thresholds", json={"sensor_type": "temperature", "node_id": "7",
+                                            "warning": 26, "critical": 36}).json()
+    assert again["id"] == row["id"]  # one row per (sensor type, node)
+
+    assert client.put("/thresholds", json={"sensor_type": "radiation", "warning": 1, "critical": 2}).status_code == 404
+    assert client.put("/thresholds", json={"sensor_type": "temperature", "warning": 9, "critical": 2}).status_code == 400
+
+    assert client.delete(f"/thresholds/{row['id']}").json() == {"status": "deleted"}
+    assert client.get("/thresholds").json()["temperature"]["nodes"] == {}
+    assert client.delete(f"/thresholds/{row['id']}").status_code == 404
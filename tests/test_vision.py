@@ -0,0 +1,101 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from services.capture import LatestFrame
+from services.prefilter import FramePrefilter
+from services.vision import VisionPool, _downscale, _infer_batch, _init_worker, classify, resolve_model
+
+
+class FakeCameras:
+    def __init__(self, camera_ids):
+        self.slots_by_id = {camera_id: LatestFrame() for camera_id in camera_ids}
+
+    def slots(self):
+        return list(self.slots_by_id.items())
+
+    def stop(self):
+        pass
+
+    def health(self):
+        return {camera_id: {"state": "connected"} for camera_id in self.slots_by_id}
+
+
+def _frame(value=0, size=(480, 640)):
+    return np.full((*size, 3), value, dtype=np.uint8)
+
+
+def test_classify_picks_the_most_confident_hazard():
+    assert classify([("person", 0.99), ("car", 0.75), ("Fire", 0.9), ("smoke", 0.5)]) == ("Fire", 0.9)
+    assert classify([("person", 0.99), ("fire", 0.6)]) is None
+
+
+def test_downscale_keeps_the_aspect_ratio():
+    assert _downscale(_frame(size=(720, 1280)), 640).shape == (360, 640, 3)
+    small = _frame(size=(240, 320))
+    assert _downscale(small, 640) is small
+
+
+def test_latest_frame_drops_unconsumed_frames():
+    slot = LatestFrame()
+    for value in range(3):
+        slot.put(_frame(value))
+    frame, captured_at = slot.take()
+    assert frame[0, 0, 0] == 2 and captured_at > 0 and slot.dropped == 2
+    assert slot.take()[0] is None
+
+
+def test_dispatch_batches_the_newest_frame_of_every_camera():
+    """The dispatcher and result path, with a thread standing in for the worker process (no model loaded)."""
+    async def main():
+        cameras = FakeCameras(["cam1", "cam2"])
+        pool = VisionPool(workers=1, max_batch=8, imgsz=320, cameras=cameras)
+        pool.prefilters = {camera_id: FramePrefilter(enabled=False) for camera_id in ("cam1", "cam2")}
+        pool._loop = asyncio.get_running_loop()
+        pool.results = asyncio.Queue()
+        pool._executor = ThreadPoolExecutor(max_workers=1)
+        pool._running = True
+        for value in range(3):
+            cameras.slots_by_id["cam1"].put(_frame(value))
+        cameras.slots_by_id["cam2"].put(_frame(9))
+        threading.Thread(target=pool._dispatch, daemon=True).start()
+
+        results = [await asyncio.wait_for(pool.results.get(), 5) for _ in range(2)]
+        pool.stop()
+        assert sorted(result["camera_id"] for result in results) == ["cam1", "cam2"]
+        assert all(result["detections"] == [] for result in results)
+        report = pool.report()
+        assert report["cam1"]["frames_inferred"] == 1 and report["cam1"]["frame_age_ms"] is not None
+        assert cameras.slots_by_id["cam1"].dropped == 2
+    asyncio.run(main())
+
+
+def test_model_resolution_by_format(tmp_path):
+    weights = str(tmp_path / "yolov8n.pt")
+    assert resolve_model(weights, "pt", 640) == weights
+    exported = tmp_path / "yolov8n.onnx"
+    exported.write_bytes(b"")
+    assert resolve_model(weights, "onnx", 640) == str(exported)  # exported once, reused afterwards
+    with pytest.raises(ValueError):
+        resolve_model(weights, "tflite", 640)
+
+
+def test_pool_warms_up_in_the_background_without_a_model():
+    pool = VisionPool(workers=1, cameras=FakeCameras([]))
+    assert pool.status()["ready"] is False
+    _init_worker("missing.pt", "pt", 320)  # the worker initializer, here in-process: no model, no crash
+    pool._executor = ThreadPoolExecutor(max_workers=1)
+    pool._warm_up()
+    assert pool.status()["ready"] is True and pool.status()["model_loaded"] is False
+    assert pool.warmup_seconds is not None
+    assert _infer_batch([_frame()]) == [[]]
+
+
+def test_health_answers_while_vision_warms_up(app_main):
+    from fastapi.testclient import TestClient
+    health = TestClient(app_main.app).get("/health").json()
+    assert health["status"] == "ok"
+    assert set(health["vision"]) == {"ready", "model", "format", "model_loaded", "warmup_seconds"}